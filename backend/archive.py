@@ -0,0 +1,241 @@
+"""
+Hot/cold archival of old submissions.
+
+Registrations, requirements and contacts older than ARCHIVE_AFTER_DAYS, or
+marked completed by an admin, are moved out of the hot tables into gzip
+NDJSON segment files under settings.archive_dir, ARCHIVE_CHUNK_SIZE rows at a
+time. Each chunk is one transaction: the segment is written and fsynced
+first, then its archive_segments manifest row is inserted and the rows are
+deleted together, so a crash leaves either the rows in the hot table or a
+committed segment. A file without a manifest row is an aborted chunk and is
+removed by the next run.
+
+Archived rows are removed with Core deletes: they leave no tombstones (sync
+clients keep them), keep counting in the trend rollups and drop out of the
+donation matches. They stay searchable and exportable from the segments
+through /api/admin/archive/<kind>. Run from cron:
+
+    python backend/archive.py --run
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import DateTime, and_, func, inspect, or_, select
+
+from config import settings
+from logger import logger_manager
+from matching import REGISTRATION, REQUIREMENT, remove_record
+from models import ArchiveSegment, Contact, Registration, Requirements, mapped_columns
+
+ARCHIVE_MODELS = {
+    "registrations": Registration,
+    "requirements": Requirements,
+    "contacts": Contact,
+}
+
+# Columns matched case-insensitively by the archive search (the admin list columns; contacts by sender and text)
+SEARCH_FIELDS = {
+    "registrations": ["manufacturer", "model", "serial", "city_state"],
+    "requirements": ["school_name", "current_pianos", "preferred_type", "teacher_name", "background", "commitment"],
+    "contacts": ["name", "email", "message"],
+}
+
+MATCH_TYPES = {"registrations": REGISTRATION, "requirements": REQUIREMENT}
+
+ORPHAN_GRACE_SECONDS = 3600  # a segment without manifest row may still belong to a running chunk
+
+def encode_row(row) -> Dict:
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+
+def decode_row(model, data: Dict):
+    """Rebuild a (transient) model object from an archived line, for to_dict() and the export writers"""
+    values = {}
+    for prop in inspect(model).column_attrs:
+        value = data.get(prop.key)
+        if value is not None and isinstance(prop.columns[0].type, DateTime):
+            value = datetime.fromisoformat(value)
+        values[prop.key] = value
+    return model(**values)
+
+def eligible(model, cutoff: Optional[datetime]):
+    """Rows older than `cutoff` (None: no age rule) or marked completed"""
+    conditions = [model.completed_at.isnot(None)]
+    if cutoff is not None:
+        conditions.append(model.created_at < cutoff)
+    return or_(*conditions)
+
+def write_segment(kind: str, rows: List[Dict]) -> Tuple[Path, int, str]:
+    """Write rows as a gzip NDJSON file; returns (path relative to archive_dir, size, sha256)"""
+    folder = settings.archive_dir / kind
+    folder.mkdir(parents=True, exist_ok=True)
+    relative = Path(kind) / f"{rows[0]['id']:010d}-{rows[-1]['id']:010d}-{uuid.uuid4().hex[:8]}.ndjson.gz"
+    target = settings.archive_dir / relative
+    tmp = target.with_name(target.name + ".tmp")
+
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as output:
+            for row in rows:
+                output.write((json.dumps(encode_row(row), ensure_ascii=False) + "\n").encode("utf-8"))
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, target)
+
+    digest = hashlib.sha256(target.read_bytes()).hexdigest()
+    return relative, target.stat().st_size, digest
+
+def archive_chunk(engine, kind: str, cutoff: Optional[datetime], chunk_size: int) -> int:
+    """Move one chunk of eligible rows into a new segment; returns the number of rows moved"""
+    model = ARCHIVE_MODELS[kind]
+    table = model.__table__
+    with engine.begin() as conn:
+        rows = conn.execute(
+            # by attribute name, user agent decoded: segments stay readable without the lookup table
+            select(*mapped_columns(model)).where(eligible(model, cutoff)).order_by(table.c.id).limit(chunk_size)
+            .with_for_update(of=table)
+        ).mappings().all()
+        if not rows:
+            return 0
+        ids = [row["id"] for row in rows]
+
+        relative, size, digest = write_segment(kind, rows)
+        try:
+            conn.execute(ArchiveSegment.__table__.insert().values(
+                table_name=kind, path=relative.as_posix(), first_id=ids[0], last_id=ids[-1],
+                row_count=len(ids), size_bytes=size, sha256=digest,
+            ))
+            if kind in MATCH_TYPES:
+                for record_id in ids:
+                    remove_record(conn, MATCH_TYPES[kind], record_id)
+            deleted = conn.execute(table.delete().where(table.c.id.in_(ids))).rowcount
+            if deleted != len(ids):
+                raise RuntimeError(f"{kind}: {len(ids) - deleted} rows of the chunk were archived concurrently")
+        except Exception:
+            (settings.archive_dir / relative).unlink(missing_ok=True)
+            raise
+    return len(ids)
+
+def remove_orphans(engine) -> int:
+    """Delete segment files left by chunks that never committed"""
+    if not settings.archive_dir.exists():
+        return 0
+    with engine.connect() as conn:
+        known = set(conn.execute(select(ArchiveSegment.path)).scalars())
+    removed = 0
+    for path in settings.archive_dir.glob("*/*.ndjson.gz*"):
+        relative = path.relative_to(settings.archive_dir).as_posix()
+        if relative not in known and time.time() - path.stat().st_mtime > ORPHAN_GRACE_SECONDS:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+def run_archive(engine, after_days: Optional[int] = None, chunk_size: Optional[int] = None,
+                kinds=None, log=print) -> Dict[str, int]:
+    """Archive every eligible row in chunks; returns rows moved per table"""
+    after_days = settings.archive_after_days if after_days is None else after_days
+    chunk_size = chunk_size or settings.archive_chunk_size
+    cutoff = datetime.utcnow() - timedelta(days=after_days) if after_days > 0 else None
+
+    orphans = remove_orphans(engine)
+    if orphans:
+        log(f"Removed {orphans} unreferenced segment files")
+    moved = {}
+    for kind in kinds or ARCHIVE_MODELS:
+        moved[kind] = 0
+        while True:
+            count = archive_chunk(engine, kind, cutoff, chunk_size)
+            if not count:
+                break
+            moved[kind] += count
+        if moved[kind]:
+            log(f"Archived {moved[kind]} {kind}")
+    logger_manager.logger.info(f"Archive run moved {moved}")
+    return moved
+
+def segments(db, kind: str) -> List[ArchiveSegment]:
+    """Manifest rows of a table, newest rows first"""
+    return db.query(ArchiveSegment).filter(ArchiveSegment.table_name == kind) \
+        .order_by(ArchiveSegment.last_id.desc()).all()
+
+def read_segment(segment: ArchiveSegment) -> List[Dict]:
+    with gzip.open(settings.archive_dir / segment.path, "rt", encoding="utf-8") as source:
+        return [json.loads(line) for line in source if line.strip()]
+
+def iter_archived(db, kind: str, search: str = "", newest_first: bool = True) -> Iterator[Dict]:
+    """Archived rows of `kind` matching `search` (same case-insensitive substring rule as the admin lists)"""
+    needle = search.casefold()
+    ordered = segments(db, kind)
+    for segment in ordered if newest_first else reversed(ordered):
+        rows = read_segment(segment)
+        for row in reversed(rows) if newest_first else rows:
+            if not needle or any(needle in str(row.get(field) or "").casefold() for field in SEARCH_FIELDS[kind]):
+                yield row
+
+def search_archive(db, kind: str, search: str, page: int, limit: int) -> Tuple[List[Dict], int]:
+    """One page of matching archived rows (as to_dict()) plus the total match count"""
+    model = ARCHIVE_MODELS[kind]
+    start = (page - 1) * limit
+    data, total = [], 0
+    for row in iter_archived(db, kind, search):
+        if start <= total < start + limit:
+            data.append(decode_row(model, row).to_dict())
+        total += 1
+    return data, total
+
+def summary(db) -> Dict[str, Dict]:
+    """Archived rows, segments and bytes per table"""
+    result = {kind: {"rows": 0, "segments": 0, "bytes": 0} for kind in ARCHIVE_MODELS}
+    for kind, rows, count, size in db.query(
+        ArchiveSegment.table_name, func.sum(ArchiveSegment.row_count), func.count(ArchiveSegment.id),
+        func.sum(ArchiveSegment.size_bytes)
+    ).group_by(ArchiveSegment.table_name):
+        result[kind] = {"rows": int(rows or 0), "segments": count, "bytes": int(size or 0)}
+    return result
+
+def verify(db) -> List[str]:
+    """Paths of segments that are missing or whose checksum no longer matches the manifest"""
+    broken = []
+    for segment in db.query(ArchiveSegment).order_by(ArchiveSegment.id):
+        path = settings.archive_dir / segment.path
+        if not path.exists() or hashlib.sha256(path.read_bytes()).hexdigest() != segment.sha256:
+            broken.append(segment.path)
+    return broken
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old or completed submissions into archive segments")
+    parser.add_argument("--run", action="store_true", help="archive all eligible rows")
+    parser.add_argument("--after-days", type=int, help=f"age rule in days (default {settings.archive_after_days}, 0 = off)")
+    parser.add_argument("--chunk-size", type=int, help="rows per segment and transaction")
+    parser.add_argument("--verify", action="store_true", help="check every segment against its manifest checksum")
+    parser.add_argument("--search", nargs=2, metavar=("TABLE", "TEXT"), help="print archived rows matching TEXT")
+    args = parser.parse_args()
+
+    from models import SessionLocal, create_tables, engine
+
+    create_tables()
+    if args.run:
+        run_archive(engine, args.after_days, args.chunk_size)
+    elif args.verify:
+        db = SessionLocal()
+        try:
+            broken = verify(db)
+        finally:
+            db.close()
+        print("\n".join(broken) if broken else "All segments verified")
+        raise SystemExit(1 if broken else 0)
+    elif args.search:
+        db = SessionLocal()
+        try:
+            for row in iter_archived(db, args.search[0], args.search[1]):
+                print(json.dumps(row, ensure_ascii=False))
+        finally:
+            db.close()
+    else:
+        parser.print_help()
@@ -0,0 +1,379 @@
+"""
+Optional ASGI serving mode for Clavisnova.
+
+Public form endpoints and the admin list/stats/delete API are served natively
+async: DB access goes through SQLAlchemy asyncio (aiosqlite/asyncpg), mail
+through aiosmtplib, so a single process can
+hold hundreds of slow in-flight requests. URLs and payloads are identical to
+the Flask app; every other route (exports, ...) falls through to it.
+
+Run with (from the backend directory):
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2
+"""
+import contextlib
+import functools
+import os
+import sys
+import time
+from email.message import EmailMessage
+from pathlib import Path
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+# backend/ must win over the repo-root main.py when resolving `main`
+current_dir = Path(__file__).resolve().parent
+if not sys.path or sys.path[0] != str(current_dir):
+    sys.path.insert(0, str(current_dir))
+
+from config import settings
+from async_database import async_db_manager
+from logger import logger_manager
+from idempotency import KEY_HEADER, REPLAYED_HEADER, claim_error, idempotency_store
+from matching import match_engine
+from models import Contact, Registration, Requirements
+from notifications import build_notification
+from replica import READ_AFTER_COOKIE, parse_position, replica_router
+from backup import backup_scheduler
+from outbox import outbox_replicator
+from breaker import database_breaker, is_outage
+from intake import intake_journal, store_async
+from events import event_retention
+from schemas import (
+    RegistrationResponse, RequirementsResponse,
+    HealthResponse, ErrorResponse, ValidationError, contact_form, registration_form, requirements_form
+)
+
+def _client_meta(request: Request) -> dict:
+    return {
+        "ip_address": request.client.host if request.client else None,
+        "user_agent": request.headers.get("user-agent"),
+    }
+
+async def _json_body(request: Request) -> dict:
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def _journaled(reference: str, message: str) -> JSONResponse:
+    """202 for a submission journaled during a database outage (see intake.py)"""
+    return JSONResponse({"id": None, "message": message, "queued": True, "reference": reference}, status_code=202)
+
+def idempotent(scope: str, form):
+    """Replay the stored response to client retries of a form submission (see idempotency.py)
+
+    The store is shared with the Flask app; its blocking calls run in the threadpool.
+    Invalid submissions (see `form`) are rejected by the endpoint without a claim.
+    """
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(request: Request):
+            if not settings.idempotency_enabled or database_breaker.is_open():
+                return await endpoint(request)  # the store lives in the database: do not wait on it during an outage
+            try:
+                form(await _json_body(request))
+            except ValidationError:
+                return await endpoint(request)
+            try:
+                claim = await run_in_threadpool(
+                    idempotency_store.claim, scope, request.headers.get(KEY_HEADER),
+                    _client_meta(request)["ip_address"], await request.body()
+                )
+            except Exception as e:
+                if is_outage(e):
+                    database_breaker.record_failure(e)
+                logger_manager.logger.error(f"Idempotency store unavailable, handling {scope} without it: {e}")
+                return await endpoint(request)
+
+            if claim.state == "replay":
+                logger_manager.logger.info(f"Replaying stored {scope} response")
+                return Response(claim.body, status_code=claim.status_code, media_type="application/json",
+                                headers={REPLAYED_HEADER: "true"})
+            if claim.state != "new":
+                message, status = claim_error(claim)
+                headers = {"Retry-After": "1"} if status == 409 else None
+                return JSONResponse(ErrorResponse(message=message).__dict__, status_code=status, headers=headers)
+
+            try:
+                response = await endpoint(request)
+            except Exception:
+                await run_in_threadpool(idempotency_store.release, claim)
+                raise
+            try:
+                if response.status_code < 500:
+                    await run_in_threadpool(idempotency_store.complete, claim, response.status_code, response.body.decode("utf-8"))
+                else:
+                    await run_in_threadpool(idempotency_store.release, claim)
+            except Exception as e:
+                logger_manager.logger.error(f"Failed to store {scope} response for replay: {e}")
+            return response
+        return wrapper
+    return decorator
+
+async def send_notification_email(form_type: str, form_data: dict):
+    """Send notification email without blocking the event loop"""
+    try:
+        if not settings.notification_email:
+            logger_manager.logger.warning("Notification email not configured, skipping email notification")
+            return
+
+        content = build_notification(form_type, form_data)
+        if content is None:
+            return
+        subject, body = content
+
+        import aiosmtplib
+
+        msg = EmailMessage()
+        msg["Subject"] = subject
+        msg["From"] = settings.mail_default_sender or settings.mail_username
+        msg["To"] = settings.notification_email
+        msg.set_content(body, cte="base64")
+
+        await aiosmtplib.send(
+            msg,
+            hostname=settings.mail_server,
+            port=settings.mail_port,
+            username=settings.mail_username or None,
+            password=settings.mail_password or None,
+            use_tls=settings.mail_use_ssl,
+            start_tls=settings.mail_use_tls,
+            timeout=30,
+        )
+        logger_manager.logger.info(f"Notification email sent for {form_type} submission")
+
+    except Exception as e:
+        logger_manager.logger.error(f"Failed to send notification email: {e}")
+        # Don't raise exception to avoid breaking the main flow
+
+def _pagination(page: int, limit: int, total: int) -> dict:
+    total_pages = (total + limit - 1) // limit
+    return {
+        "page": page,
+        "limit": limit,
+        "total": total,
+        "total_pages": total_pages,
+        "has_next": page < total_pages,
+        "has_prev": page > 1
+    }
+
+# Health check endpoint
+async def health_check(request: Request):
+    try:
+        await async_db_manager.ping()
+        db_status = "healthy"
+    except Exception as e:
+        db_status = f"unhealthy: {str(e)}"
+
+    response = HealthResponse(
+        status="healthy" if db_status == "healthy" else "unhealthy",
+        timestamp=time.time(),
+        version=settings.version,
+        database=db_status,
+        registrations=0,
+        uptime=time.time(),
+        memory_usage=0.0
+    )
+    return JSONResponse(response.__dict__)
+
+# Registration endpoints
+@idempotent("registration", registration_form)
+async def create_registration(request: Request):
+    try:
+        registration = registration_form(await _json_body(request), **_client_meta(request))
+        row = dict(registration.__dict__)
+
+        stored, reference = await store_async("registration", row, async_db_manager.save_registration)
+        if reference is not None:
+            return _journaled(reference, "Registration received")
+        result_id, duplicate_of = stored
+        logger_manager.logger.info(f"Registration saved to database with ID: {result_id}")
+        if duplicate_of is not None and result_id == duplicate_of:
+            # Merged duplicate (double click / client retry): nothing new was stored or needs notifying
+            return JSONResponse({"id": result_id, "message": "Registration already received", "duplicate_of": duplicate_of})
+
+        await send_notification_email("registration", {
+            'manufacturer': registration.manufacturer,
+            'model': registration.model,
+            'serial': registration.serial,
+            'year': registration.year,
+            'height': registration.height,
+            'city_state': registration.city_state,
+            'access': registration.access
+        })
+
+        match_engine.schedule("registration", result_id)
+        body = RegistrationResponse(id=result_id, message="Registration created successfully").__dict__
+        if duplicate_of is not None:
+            body["duplicate_of"] = duplicate_of
+        return JSONResponse(body, status_code=201)
+
+    except ValidationError as e:
+        logger_manager.logger.warning(f"Validation error: {e}")
+        return JSONResponse(ErrorResponse(message=str(e)).__dict__, status_code=400)
+    except Exception as e:
+        logger_manager.logger.error(f"Registration error: {e}", exc_info=True)
+        return JSONResponse(ErrorResponse(message="Internal server error").__dict__, status_code=500)
+
+# Requirements endpoints
+@idempotent("requirements", requirements_form)
+async def create_requirements(request: Request):
+    try:
+        requirements = requirements_form(await _json_body(request), **_client_meta(request))
+        row = dict(requirements.__dict__)
+
+        result_id, reference = await store_async("requirements", row, async_db_manager.save_requirements)
+        if reference is not None:
+            return _journaled(reference, "Requirements received")
+        match_engine.schedule("requirement", result_id)
+
+        await send_notification_email("requirements", {
+            'school_name': requirements.school_name,
+            'current_pianos': requirements.current_pianos,
+            'preferred_type': requirements.preferred_type,
+            'teacher_name': requirements.teacher_name
+        })
+
+        return JSONResponse(RequirementsResponse(id=result_id, message="Requirements submitted successfully").__dict__, status_code=201)
+
+    except ValidationError as e:
+        return JSONResponse(ErrorResponse(message=str(e)).__dict__, status_code=400)
+    except Exception as e:
+        logger_manager.logger.error(f"Requirements error: {e}")
+        return JSONResponse(ErrorResponse(message="Internal server error").__dict__, status_code=500)
+
+# Contact endpoints
+@idempotent("contact", contact_form)
+async def create_contact(request: Request):
+    try:
+        contact = contact_form(await _json_body(request), **_client_meta(request))
+        row = dict(contact.__dict__)
+
+        cid, reference = await store_async("contact", row, async_db_manager.save_contact)
+        if reference is not None:
+            return _journaled(reference, "Contact received")
+
+        await send_notification_email("contact", {
+            'name': contact.name,
+            'email': contact.email,
+            'message': contact.message
+        })
+
+        return JSONResponse({"id": cid, "message": "Contact submitted"}, status_code=201)
+    except ValidationError as e:
+        return JSONResponse(ErrorResponse(message=str(e)).__dict__, status_code=400)
+    except Exception as e:
+        logger_manager.logger.error(f"Contact error: {e}", exc_info=True)
+        return JSONResponse(ErrorResponse(message="Internal server error").__dict__, status_code=500)
+
+# Admin endpoints
+async def _use_replica(request: Request) -> bool:
+    """Same routing as db_manager.get_read_db: the replica unless it lags or misses this admin's write"""
+    if not replica_router.enabled:
+        return False
+    return await run_in_threadpool(replica_router.use_replica, parse_position(request.cookies.get(READ_AFTER_COOKIE)))
+
+def _list_endpoint(model, label: str):
+    async def endpoint(request: Request):
+        try:
+            page = int(request.query_params.get('page', 1))
+            limit = int(request.query_params.get('limit', 25))
+            search = request.query_params.get('search', '')
+
+            data, total = await async_db_manager.list_page(model, page, limit, search, await _use_replica(request))
+            return JSONResponse({"success": True, "data": data, "pagination": _pagination(page, limit, total)})
+        except Exception as e:
+            logger_manager.logger.error(f"Get {label} error: {e}")
+            return JSONResponse({"success": False, "message": "Internal server error"}, status_code=500)
+    return endpoint
+
+async def get_stats(request: Request):
+    try:
+        replica = await _use_replica(request)
+        registration_count = await async_db_manager.count(Registration, replica)
+        requirements_count = await async_db_manager.count(Requirements, replica)
+        stats = {
+            "registrations": registration_count,
+            "requirements": requirements_count,
+            "total_submissions": registration_count + requirements_count
+        }
+        return JSONResponse({"success": True, "stats": stats})
+    except Exception as e:
+        logger_manager.logger.error(f"Get stats error: {e}")
+        return JSONResponse({"success": False, "message": "Internal server error"}, status_code=500)
+
+def _delete_endpoint(model, label: str):
+    async def endpoint(request: Request):
+        try:
+            try:
+                record_id = int(request.path_params['id'])
+            except ValueError:
+                return JSONResponse({"success": False, "message": "Invalid ID format"}, status_code=400)
+
+            if not await async_db_manager.delete(model, record_id):
+                return JSONResponse({"success": False, "message": f"{label} not found"}, status_code=404)
+            response = JSONResponse({"success": True, "message": f"{label} deleted successfully"})
+            if replica_router.enabled:
+                position = await run_in_threadpool(replica_router.note_write)
+                response.set_cookie(READ_AFTER_COOKIE, str(position), max_age=settings.read_your_writes_seconds,
+                                    httponly=True, secure=request.url.scheme == "https",
+                                    samesite="none" if request.url.scheme == "https" else "lax")
+            return response
+        except Exception as e:
+            logger_manager.logger.error(f"Delete {label.lower()} error: {e}")
+            return JSONResponse({"success": False, "message": "Internal server error"}, status_code=500)
+    return endpoint
+
+def _flask_fallback():
+    """Mount the Flask app for routes that have no native async handler (exports, ...)"""
+    from a2wsgi import WSGIMiddleware
+    from main import app as flask_app
+
+    return WSGIMiddleware(flask_app)
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    from main import create_app
+
+    await run_in_threadpool(create_app)
+    backup_scheduler.start()
+    outbox_replicator.start()
+    intake_journal.start()
+    event_retention.start()
+    yield
+    await async_db_manager.dispose()
+
+routes = [
+    Route('/api/health', health_check, methods=['GET']),
+    Route('/api/registration', create_registration, methods=['POST']),
+    Route('/api/requirements', create_requirements, methods=['POST']),
+    Route('/api/contact', create_contact, methods=['POST']),
+    Route('/api/admin/registrations', _list_endpoint(Registration, "registrations"), methods=['GET']),
+    Route('/api/admin/requirements', _list_endpoint(Requirements, "requirements"), methods=['GET']),
+    Route('/api/admin/contacts', _list_endpoint(Contact, "contacts"), methods=['GET']),
+    Route('/api/admin/stats', get_stats, methods=['GET']),
+    Route('/api/admin/delete/registration/{id}', _delete_endpoint(Registration, "Registration"), methods=['GET']),
+    Route('/api/admin/delete/requirement/{id}', _delete_endpoint(Requirements, "Requirement"), methods=['GET']),
+    Route('/api/admin/delete/contact/{id}', _delete_endpoint(Contact, "Contact"), methods=['GET']),
+    Mount('/', app=_flask_fallback()),
+]
+
+# Ensure FRONTEND_URL from env is included in allowed origins (same as main.py)
+cors_origins = list(settings.cors_origins)
+frontend_url = os.getenv("FRONTEND_URL")
+if frontend_url and frontend_url not in cors_origins:
+    cors_origins.append(frontend_url)
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=cors_origins, allow_credentials=True,
+                           allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
@@ -0,0 +1,212 @@
+"""
+Async data path used by the ASGI serving mode (see asgi.py).
+
+The engine is created lazily so that importing this module never requires
+aiosqlite/asyncpg to be installed unless the async mode is actually used.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from sqlalchemy import func, or_, select, text
+
+from config import settings
+from logger import logger_manager
+from models import Contact, Registration, Requirements
+from sqlite_profile import apply_sqlite_profile, read_only_url
+
+# Columns searched by the admin list endpoints (same as the Flask handlers)
+SEARCH_COLUMNS = {
+    Registration: [Registration.manufacturer, Registration.model, Registration.serial, Registration.city_state],
+    Requirements: [
+        Requirements.school_name, Requirements.current_pianos, Requirements.preferred_type,
+        Requirements.teacher_name, Requirements.background, Requirements.commitment
+    ],
+    Contact: [],
+}
+
+def build_async_url(raw_url: str) -> str:
+    """Map a sync DATABASE_URL to its asyncio driver (aiosqlite / asyncpg)"""
+    if not raw_url:
+        return raw_url
+    scheme, _, rest = raw_url.partition("://")
+    if scheme in ("sqlite", "sqlite+pysqlite"):
+        return f"sqlite+aiosqlite://{rest}"
+    if scheme in ("postgres", "postgresql", "postgresql+psycopg2", "postgresql+psycopg"):
+        # asyncpg does not understand libpq's sslmode, it takes ssl=<mode> instead
+        parts = urlsplit(f"postgresql+asyncpg://{rest}")
+        query = [("ssl", v) if k == "sslmode" else (k, v) for k, v in parse_qsl(parts.query)]
+        return urlunsplit(parts._replace(query=urlencode(query)))
+    return raw_url
+
+class AsyncDatabaseManager:
+    def __init__(self, database_url: Optional[str] = None):
+        self.logger = logger_manager
+        self.database_url = build_async_url(database_url or settings.database_url)
+        self._engine = None
+        self._read_engine = None
+        self._replica_engine = None
+        self._sessionmaker = None
+        self._read_sessionmaker = None
+        self._replica_sessionmaker = None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from sqlalchemy.ext.asyncio import create_async_engine
+
+            self._engine = create_async_engine(self.database_url, echo=settings.debug)
+            apply_sqlite_profile(self._engine.sync_engine)
+        return self._engine
+
+    @property
+    def read_engine(self):
+        """Admin reads use separate read-only connections on SQLite (same as models.read_engine)"""
+        if self._read_engine is None:
+            url = read_only_url(self.database_url) if settings.sqlite_read_only_admin else None
+            if url is None:
+                return self.engine
+            from sqlalchemy.ext.asyncio import create_async_engine
+
+            self._read_engine = create_async_engine(url, echo=settings.debug)
+            apply_sqlite_profile(self._read_engine.sync_engine, read_only=True)
+        return self._read_engine
+
+    @property
+    def replica_engine(self):
+        """Engine of the optional read replica (DATABASE_READ_URL); routing is decided in replica.py"""
+        if self._replica_engine is None and settings.database_read_url:
+            from sqlalchemy.ext.asyncio import create_async_engine
+
+            url = build_async_url(settings.database_read_url)
+            self._replica_engine = create_async_engine(read_only_url(url) or url, echo=settings.debug)
+            apply_sqlite_profile(self._replica_engine.sync_engine, read_only=True)
+        return self._replica_engine
+
+    def get_db(self):
+        """Get async database session"""
+        if self._sessionmaker is None:
+            from sqlalchemy.ext.asyncio import AsyncSession
+            from sqlalchemy.orm import sessionmaker
+
+            # expire_on_commit=False keeps generated ids readable without a refresh SELECT
+            self._sessionmaker = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        return self._sessionmaker()
+
+    def get_read_db(self, replica: bool = False):
+        """Get async session for admin reads (on the read replica when the caller's check allows it)"""
+        from sqlalchemy.ext.asyncio import AsyncSession
+        from sqlalchemy.orm import sessionmaker
+
+        if replica and self.replica_engine is not None:
+            if self._replica_sessionmaker is None:
+                self._replica_sessionmaker = sessionmaker(self.replica_engine, class_=AsyncSession, expire_on_commit=False)
+            return self._replica_sessionmaker()
+        if self._read_sessionmaker is None:
+            self._read_sessionmaker = sessionmaker(self.read_engine, class_=AsyncSession, expire_on_commit=False)
+        return self._read_sessionmaker()
+
+    async def dispose(self):
+        if self._replica_engine is not None:
+            await self._replica_engine.dispose()
+            self._replica_engine = None
+        if self._read_engine is not None:
+            await self._read_engine.dispose()
+            self._read_engine = None
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+        self._sessionmaker = None
+        self._read_sessionmaker = None
+        self._replica_sessionmaker = None
+
+    async def ping(self) -> None:
+        async with self.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    async def _save(self, obj, operation: str) -> int:
+        async with self.get_db() as db:
+            try:
+                db.add(obj)
+                await db.commit()
+                return obj.id
+            except Exception as e:
+                await db.rollback()
+                self.logger.log_database_error(operation, e)
+                raise
+
+    async def save_registration(self, data: Dict[str, Any]) -> Tuple[int, Optional[int]]:
+        """Save a new registration unless it is a merged duplicate; returns (id, duplicate_of)"""
+        from dedupe import registration_fingerprint
+        from sqlalchemy.exc import IntegrityError
+
+        fingerprint = registration_fingerprint(data.get("manufacturer"), data.get("serial"), data.get("model"))
+        for attempt in range(2):
+            primary = await self._find_primary(fingerprint)
+            if primary is not None and settings.duplicate_registration_policy == "merge":
+                return primary, primary
+            try:
+                registration = Registration(**data, fingerprint=fingerprint, duplicate_of=primary)
+                return await self._save(registration, "registration_save"), primary
+            except IntegrityError:
+                # A concurrent copy became the primary between the lookup and the insert: look again
+                if attempt:
+                    raise
+
+    async def _find_primary(self, fingerprint: Optional[str]) -> Optional[int]:
+        if not fingerprint:
+            return None
+        async with self.get_db() as db:
+            return (await db.execute(
+                select(Registration.id)
+                .where(Registration.fingerprint == fingerprint, Registration.duplicate_of.is_(None))
+                .limit(1)
+            )).scalar()
+
+    async def save_requirements(self, data: Dict[str, Any]) -> int:
+        """Save new requirements"""
+        return await self._save(Requirements(**data), "requirements_save")
+
+    async def save_contact(self, data: Dict[str, Any]) -> int:
+        """Save a new contact message"""
+        return await self._save(Contact(**data), "contact_save")
+
+    async def list_page(self, model, page: int, limit: int, search: str = "",
+                        replica: bool = False) -> Tuple[List[Dict], int]:
+        """Get one page of `model` rows (newest first, id breaks ties) plus the total matching count"""
+        async with self.get_read_db(replica) as db:
+            query = select(model)
+            count_query = select(func.count(model.id))
+            columns = SEARCH_COLUMNS.get(model, [])
+            if search and columns:
+                search_filter = or_(*[column.ilike(f"%{search}%") for column in columns])
+                query = query.where(search_filter)
+                count_query = count_query.where(search_filter)
+
+            total = (await db.execute(count_query)).scalar()
+            result = await db.execute(
+                query.order_by(model.created_at.desc(), model.id.desc()).offset((page - 1) * limit).limit(limit)
+            )
+            return [row.to_dict() for row in result.scalars().all()], total
+
+    async def count(self, model, replica: bool = False) -> int:
+        async with self.get_read_db(replica) as db:
+            return (await db.execute(select(func.count(model.id)))).scalar()
+
+    async def delete(self, model, record_id: int) -> bool:
+        """Delete one row, returning False when it does not exist"""
+        async with self.get_db() as db:
+            try:
+                # ORM delete (not a bulk DELETE) so the tombstone hook in models.py fires
+                obj = await db.get(model, record_id)
+                if obj is None:
+                    return False
+                await db.delete(obj)
+                await db.commit()
+                return True
+            except Exception as e:
+                await db.rollback()
+                self.logger.log_database_error(f"{model.__tablename__}_delete", e)
+                raise
+
+# Create global async database manager instance
+async_db_manager = AsyncDatabaseManager()
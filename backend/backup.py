@@ -0,0 +1,407 @@
+"""
+Online backups into settings.backup_dir.
+
+SQLite is copied with the online backup API, BACKUP_STEP_PAGES pages per
+step with a pause in between, so the database lock is only held briefly and
+writers keep going (a copy that keeps being restarted by concurrent writes
+falls back to a single pass, which in WAL mode does not block writers
+either). PostgreSQL is dumped table by table with COPY inside one
+REPEATABLE READ READ ONLY transaction, so the dump is a consistent snapshot.
+
+Every backup is gzip-compressed and gets a JSON manifest next to it with its
+SHA-256 and the row count of each table. Restores check both before the
+live database is replaced. Backups run every BACKUP_INTERVAL_HOURS from a
+background thread (one process at a time, via a lock file) and the newest
+BACKUP_KEEP are kept. By hand:
+
+    python backend/backup.py --run
+    python backend/backup.py --verify data/backup/clavisnova-20250101T000000Z.sqlite.gz
+    python backend/backup.py --restore data/backup/clavisnova-20250101T000000Z.sqlite.gz --force
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import settings
+from logger import logger_manager
+from models import Base
+from sqlite_profile import is_sqlite, sqlite_path
+
+PREFIX = "clavisnova-"
+SUFFIXES = {"sqlite": ".sqlite.gz", "postgresql": ".pgdump.gz"}
+MAX_RESTARTS = 5  # stepped SQLite copies restarted this often fall back to one pass
+COPY_END = "\\.\n"
+
+class BackupError(Exception):
+    """A backup file is missing, corrupted or does not match its manifest"""
+
+def manifest_path(path: Path) -> Path:
+    return path.with_name(path.name + ".json")
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _fsync_replace(tmp: Path, target: Path):
+    with open(tmp, "rb") as written:
+        os.fsync(written.fileno())
+    os.replace(tmp, target)
+
+def _compress(source: Path, target: Path):
+    tmp = target.with_name(target.name + ".tmp")
+    with open(source, "rb") as raw, open(tmp, "wb") as out:
+        with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6, mtime=0) as compressed:
+            shutil.copyfileobj(raw, compressed, 1024 * 1024)
+    _fsync_replace(tmp, target)
+
+def _table_counts(conn) -> Dict[str, int]:
+    """Row counts of the application tables present in a sqlite3 connection"""
+    present = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return {table.name: conn.execute(f'SELECT COUNT(*) FROM "{table.name}"').fetchone()[0]
+            for table in Base.metadata.sorted_tables if table.name in present}
+
+def _check_sqlite_copy(path: Path) -> Dict[str, int]:
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != "ok":
+            raise BackupError(f"integrity_check failed: {result}")
+        return _table_counts(conn)
+    finally:
+        conn.close()
+
+def copy_sqlite(database_path: str, target: Path, pages: int, sleep: float) -> int:
+    """Online copy of a live SQLite database; returns how often the stepped copy was restarted"""
+    source = sqlite3.connect(database_path, timeout=settings.sqlite_busy_timeout / 1000)
+    restarts, last = 0, None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last
+        if last is not None and remaining > last:  # another connection wrote: the copy started over
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise BackupError("stepped copy keeps restarting")
+        last = remaining
+
+    try:
+        for attempt_pages in (pages, -1):
+            dest = sqlite3.connect(target)
+            try:
+                source.backup(dest, pages=attempt_pages, progress=progress, sleep=sleep)
+                return restarts
+            except BackupError:
+                logger_manager.logger.warning(f"SQLite backup restarted {restarts} times, copying in one pass")
+            finally:
+                dest.close()
+    finally:
+        source.close()
+    return restarts
+
+def backup_sqlite(database_url: str, target: Path) -> Dict[str, int]:
+    tmp = target.with_name(target.name + ".db.tmp")
+    try:
+        copy_sqlite(sqlite_path(database_url), tmp, settings.backup_step_pages, settings.backup_step_sleep_ms / 1000)
+        counts = _check_sqlite_copy(tmp)
+        _compress(tmp, target)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return counts
+
+def _copy_columns(table) -> str:
+    return ", ".join(f'"{column.name}"' for column in table.columns)
+
+def dump_postgres(engine, output) -> Dict[str, int]:
+    """Write every table as a `COPY ... FROM stdin` block (pg_dump plain format) to a text stream"""
+    counts = {}
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+        with conn.begin():
+            conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+            cursor = conn.connection.cursor()
+            output.write(f"-- Clavisnova backup {datetime.utcnow().isoformat()}Z\n")
+            for table in Base.metadata.sorted_tables:
+                counts[table.name] = conn.exec_driver_sql(f'SELECT COUNT(*) FROM "{table.name}"').scalar()
+                output.write(f'COPY "{table.name}" ({_copy_columns(table)}) FROM stdin;\n')
+                cursor.copy_expert(f'COPY "{table.name}" ({_copy_columns(table)}) TO STDOUT', output)
+                output.write(COPY_END)
+    return counts
+
+def backup_postgres(engine, target: Path) -> Dict[str, int]:
+    tmp = target.with_name(target.name + ".tmp")
+    try:
+        with open(tmp, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as compressed:
+                with io.TextIOWrapper(compressed, encoding="utf-8", newline="\n") as text_output:
+                    counts = dump_postgres(engine, text_output)
+        _fsync_replace(tmp, target)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return counts
+
+def iter_copy_blocks(source) -> Iterator[Tuple[str, Iterator[str]]]:
+    """(COPY statement, data lines) pairs of a dump; each block must be consumed before the next"""
+    for line in source:
+        if line.startswith("COPY "):
+            def lines(stream=source):
+                for data in stream:
+                    if data == COPY_END:
+                        return
+                    yield data
+                raise BackupError("dump ends inside a COPY block")
+            yield line.rstrip("\n").rstrip(";"), lines()
+
+class _LineReader(io.TextIOBase):
+    """Minimal file object over an iterator of lines, for cursor.copy_expert(... FROM STDIN)"""
+
+    def __init__(self, lines: Iterator[str]):
+        self._lines = lines
+        self._buffer = ""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size) if self._buffer else next(self._lines, "")
+
+def backup_name(engine_name: str, moment: datetime) -> str:
+    return f"{PREFIX}{moment.strftime('%Y%m%dT%H%M%SZ')}{SUFFIXES[engine_name]}"
+
+def create_backup(engine=None, backup_dir: Optional[Path] = None) -> Path:
+    """Write one compressed backup plus its manifest; returns the backup path"""
+    from models import engine as default_engine
+
+    engine = engine or default_engine
+    backup_dir = Path(backup_dir or settings.backup_dir)
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    database_url = str(engine.url)
+    engine_name = "sqlite" if is_sqlite(database_url) else engine.dialect.name
+    if engine_name not in SUFFIXES:
+        raise BackupError(f"Backups are not supported for {engine_name}")
+
+    started = time.monotonic()
+    target = backup_dir / backup_name(engine_name, datetime.utcnow())
+    counts = backup_sqlite(database_url, target) if engine_name == "sqlite" else backup_postgres(engine, target)
+    manifest = {
+        "file": target.name,
+        "engine": engine_name,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "sha256": file_sha256(target),
+        "bytes": target.stat().st_size,
+        "tables": counts,
+        "seconds": round(time.monotonic() - started, 3),
+    }
+    tmp = manifest_path(target).with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    _fsync_replace(tmp, manifest_path(target))
+    logger_manager.logger.info(f"Backup written: {target.name} ({manifest['bytes']} bytes, {manifest['seconds']}s)")
+    return target
+
+def list_backups(backup_dir: Optional[Path] = None) -> List[Path]:
+    """Completed backups (those with a manifest), oldest first"""
+    backup_dir = Path(backup_dir or settings.backup_dir)
+    if not backup_dir.exists():
+        return []
+    return sorted(path for path in backup_dir.glob(f"{PREFIX}*.gz") if manifest_path(path).exists())
+
+def rotate(keep: int, backup_dir: Optional[Path] = None) -> List[Path]:
+    """Delete all but the newest `keep` backups; returns the deleted paths"""
+    backups = list_backups(backup_dir)
+    removed = backups[:-keep] if keep > 0 else []
+    for path in removed:
+        manifest_path(path).unlink(missing_ok=True)
+        path.unlink(missing_ok=True)
+    return removed
+
+def load_manifest(path: Path) -> Dict:
+    path = Path(path)
+    try:
+        manifest = json.loads(manifest_path(path).read_text())
+    except (OSError, ValueError) as e:
+        raise BackupError(f"{path.name}: manifest unreadable: {e}")
+    if not path.exists():
+        raise BackupError(f"{path.name}: backup file missing")
+    if file_sha256(path) != manifest["sha256"]:
+        raise BackupError(f"{path.name}: checksum mismatch")
+    return manifest
+
+def _decompress(path: Path, target: Path):
+    with gzip.open(path, "rb") as source, open(target, "wb") as out:
+        shutil.copyfileobj(source, out, 1024 * 1024)
+
+def _expect_counts(manifest: Dict, counts: Dict[str, int]):
+    if counts != manifest["tables"]:
+        differing = sorted(name for name in set(counts) | set(manifest["tables"])
+                           if counts.get(name) != manifest["tables"].get(name))
+        raise BackupError(f"{manifest['file']}: row counts differ from the manifest for {', '.join(differing)}")
+
+def verify_backup(path: Path) -> Dict:
+    """Check checksum, readability and row counts without touching any database; returns the manifest"""
+    path = Path(path)
+    manifest = load_manifest(path)
+    if manifest["engine"] == "sqlite":
+        tmp = path.with_name(path.name + ".verify.tmp")
+        try:
+            _decompress(path, tmp)
+            _expect_counts(manifest, _check_sqlite_copy(tmp))
+        finally:
+            tmp.unlink(missing_ok=True)
+    else:
+        counts = {}
+        with gzip.open(path, "rt", encoding="utf-8", newline="\n") as source:
+            for statement, lines in iter_copy_blocks(source):
+                counts[statement.split('"')[1]] = sum(1 for _ in lines)
+        _expect_counts(manifest, counts)
+    return manifest
+
+def restore_backup(path: Path, database_url: Optional[str] = None, force: bool = False, engine=None) -> Dict:
+    """Replace a database with a verified backup; the app should be stopped. Returns the manifest."""
+    path = Path(path)
+    manifest = load_manifest(path)
+    database_url = database_url or settings.database_url
+
+    if manifest["engine"] == "sqlite":
+        target = sqlite_path(database_url)
+        if target is None:
+            raise BackupError("SQLite backups restore into a SQLite file database")
+        target = Path(target)
+        if target.exists() and not force:
+            raise BackupError(f"{target} exists; pass --force to replace it")
+        tmp = target.with_name(target.name + ".restore.tmp")
+        try:
+            _decompress(path, tmp)
+            _expect_counts(manifest, _check_sqlite_copy(tmp))
+            for stale in (target.with_name(target.name + "-wal"), target.with_name(target.name + "-shm")):
+                stale.unlink(missing_ok=True)  # they belong to the database being replaced
+            _fsync_replace(tmp, target)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return manifest
+
+    from models import build_engine
+
+    engine = engine or build_engine(database_url)
+    if not force:
+        raise BackupError("Restoring PostgreSQL truncates every table; pass --force")
+    Base.metadata.create_all(bind=engine)
+    tables = Base.metadata.sorted_tables
+    with engine.begin() as conn:
+        cursor = conn.connection.cursor()
+        cursor.execute(f"TRUNCATE {', '.join(chr(34) + t.name + chr(34) for t in tables)} RESTART IDENTITY CASCADE")
+        with gzip.open(path, "rt", encoding="utf-8", newline="\n") as source:
+            for statement, lines in iter_copy_blocks(source):
+                cursor.copy_expert(statement, _LineReader(lines))
+        counts = {}
+        for table in tables:
+            counts[table.name] = conn.exec_driver_sql(f'SELECT COUNT(*) FROM "{table.name}"').scalar()
+            if "id" in table.columns and table.columns["id"].autoincrement in (True, "auto"):
+                conn.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('\"{table.name}\"', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM \"{table.name}\"), 1), "
+                    f"(SELECT MAX(id) FROM \"{table.name}\") IS NOT NULL)"
+                )
+        _expect_counts(manifest, {name: counts[name] for name in manifest["tables"] if name in counts})
+    return manifest
+
+class BackupScheduler:
+    """Background thread writing a backup whenever the newest one is older than the interval"""
+
+    def __init__(self, interval_hours: float, keep: int, check_seconds: float = 300):
+        self.interval = interval_hours * 3600
+        self.keep = keep
+        self.check_seconds = check_seconds
+        self._pid = None
+        self._stop = threading.Event()
+
+    def due(self, now: Optional[float] = None) -> bool:
+        backups = list_backups()
+        if not backups:
+            return True
+        return (now or time.time()) - backups[-1].stat().st_mtime >= self.interval
+
+    def run_if_due(self) -> Optional[Path]:
+        """Back up and rotate unless another process is doing it or a recent backup exists"""
+        settings.backup_dir.mkdir(parents=True, exist_ok=True)
+        with open(settings.backup_dir / ".lock", "w") as lock:
+            try:
+                import fcntl
+
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except ImportError:
+                pass  # no cross-process lock on this platform
+            except OSError:
+                return None  # another worker is backing up
+            if not self.due():
+                return None
+            path = create_backup()
+            rotate(self.keep)
+            return path
+
+    def _loop(self):
+        while not self._stop.wait(self.check_seconds):
+            try:
+                self.run_if_due()
+            except Exception as e:
+                logger_manager.logger.error(f"Scheduled backup failed: {e}")
+
+    def start(self):
+        """Start the thread once per process (BACKUP_INTERVAL_HOURS=0 disables it)"""
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        threading.Thread(target=self._loop, name="backup", daemon=True).start()
+
+backup_scheduler = BackupScheduler(settings.backup_interval_hours, settings.backup_keep)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Back up, verify and restore the database")
+    parser.add_argument("--run", action="store_true", help="write a backup now and rotate old ones")
+    parser.add_argument("--list", action="store_true", help="list backups")
+    parser.add_argument("--verify", metavar="FILE", help="check a backup without restoring it")
+    parser.add_argument("--restore", metavar="FILE", help="verify a backup and replace the database with it")
+    parser.add_argument("--database-url", help="restore target (default DATABASE_URL)")
+    parser.add_argument("--force", action="store_true", help="replace an existing database")
+    args = parser.parse_args()
+
+    try:
+        if args.run:
+            print(create_backup())
+            for removed in rotate(settings.backup_keep):
+                print(f"Removed {removed.name}")
+        elif args.list:
+            for path in list_backups():
+                manifest = json.loads(manifest_path(path).read_text())
+                print(f"{path.name}  {manifest['bytes']:>12} bytes  {sum(manifest['tables'].values()):>9} rows")
+        elif args.verify:
+            manifest = verify_backup(args.verify)
+            print(f"OK {manifest['file']}: {sum(manifest['tables'].values())} rows in {len(manifest['tables'])} tables")
+        elif args.restore:
+            manifest = restore_backup(args.restore, args.database_url, args.force)
+            print(f"Restored {manifest['file']} ({sum(manifest['tables'].values())} rows)")
+        else:
+            parser.print_help()
+    except BackupError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
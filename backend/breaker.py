@@ -0,0 +1,130 @@
+"""
+Circuit breakers around the storage backends.
+
+After BREAKER_FAILURE_THRESHOLD consecutive failures (errors that mean the
+backend is unreachable, or calls slower than BREAKER_SLOW_SECONDS) a breaker
+opens and callers fail fast instead of waiting on timeouts. After
+BREAKER_RESET_SECONDS one caller is let through as a probe (half-open): its
+success closes the breaker, its failure opens it again.
+
+The database breaker guards form intake (submissions are journaled while it
+is open, see intake.py); the Supabase breaker pauses the outbox replicator.
+"""
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict
+
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from config import settings
+from logger import logger_manager
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose breaker is open"""
+
+def is_outage(error: Exception) -> bool:
+    """Whether an error means the backend is down or overloaded (as opposed to a bad request)"""
+    if isinstance(error, (OperationalError, InterfaceError, DisconnectionError, PoolTimeoutError,
+                          FutureTimeoutError, TimeoutError, ConnectionError, CircuitOpenError)):
+        return True
+    response = getattr(error, "response", None)  # requests.HTTPError
+    status = getattr(response, "status_code", None)
+    return status is not None and (status >= 500 or status == 429)
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float, slow_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.slow_seconds = slow_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        """True while calls are refused (does not hand out the half-open probe)"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at < self.reset_seconds
+            return self.state == HALF_OPEN and self._probing
+
+    def allow(self) -> bool:
+        """Whether a call may go to the backend now; the first call after the reset timeout is the probe"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self, seconds: float = 0.0):
+        if seconds > self.slow_seconds:
+            self.record_failure(f"slow call ({seconds:.1f}s)")
+            return
+        with self._lock:
+            if self.state != CLOSED:
+                logger_manager.logger.info(f"{self.name} circuit closed")
+            self.state, self.failures, self._probing = CLOSED, 0, False
+
+    def record_failure(self, reason=None):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger_manager.logger.error(f"{self.name} circuit opened after {self.failures} failures: {reason}")
+                self.state, self.opened_at = OPEN, time.monotonic()
+
+    def call(self, func, *args, **kwargs):
+        """Run func through the breaker; outages count as failures and are re-raised"""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if is_outage(e):
+                self.record_failure(e)
+            else:
+                self.record_success(time.monotonic() - started)  # the backend answered
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    async def call_async(self, func, *args, **kwargs):
+        """call() for coroutine functions"""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        started = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            if is_outage(e):
+                self.record_failure(e)
+            else:
+                self.record_success(time.monotonic() - started)
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    def status(self) -> Dict:
+        return {"state": self.state, "failures": self.failures}
+
+def _build(name: str) -> CircuitBreaker:
+    return CircuitBreaker(name, settings.breaker_failure_threshold, settings.breaker_reset_seconds,
+                          settings.breaker_slow_seconds)
+
+database_breaker = _build("database")
+supabase_breaker = _build("supabase")
@@ -0,0 +1,181 @@
+"""
+Incremental "changed since" support for exports and the admin sync feed.
+
+A watermark is either a plain ISO timestamp or an opaque cursor returned by
+/api/admin/changes. The cursor remembers, per table, the (updated_at, id) of
+the last row handed out plus the last tombstone id, so consecutive calls
+never skip or repeat rows even when many rows share one updated_at value.
+
+Cursor timestamps keep the full precision of the column (microseconds on
+PostgreSQL, whole seconds for SQLite's CURRENT_TIMESTAMP). The feed only hands
+out rows whose updated_at is strictly before the database clock, so on SQLite a
+later write to a delivered row always lands strictly after the cursor.
+Tombstones are tracked with one id watermark per table.
+"""
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import String, and_, func, literal, or_, select
+
+from models import Contact, Registration, Requirements, Tombstone
+
+CHANGE_TABLES = {
+    "registrations": Registration,
+    "requirements": Requirements,
+    "contacts": Contact,
+}
+
+class InvalidWatermark(ValueError):
+    pass
+
+def parse_timestamp(value: str) -> datetime:
+    """Parse an ISO-8601 timestamp; aware values are converted to naive UTC like the DB columns"""
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise InvalidWatermark(f"Invalid timestamp: {value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    raw = json.dumps(state, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str) -> Dict[str, Any]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        raise InvalidWatermark("Invalid cursor")
+    if not isinstance(state, dict):
+        raise InvalidWatermark("Invalid cursor")
+    return state
+
+def parse_since(value: Optional[str]) -> Dict[str, Any]:
+    """Turn a `since` parameter (timestamp or cursor) into cursor state"""
+    if not value:
+        return {}
+    try:
+        ts = parse_timestamp(value)
+    except InvalidWatermark:
+        return decode_cursor(value)
+    stamp = _stamp(ts)
+    state = {name: [stamp, 0] for name in CHANGE_TABLES}
+    state["since"] = stamp
+    return state
+
+def since_timestamp(value: Optional[str], table: str) -> Optional[str]:
+    """Watermark timestamp for one table (used by the `since` export filter)"""
+    position = parse_since(value).get(table)
+    return position[0] if position else None
+
+def _stamp(value: Optional[datetime]) -> Optional[str]:
+    """Full-precision text form of a timestamp, as stored in cursors"""
+    if value is None:
+        return None
+    return value.isoformat(sep=" ", timespec="microseconds" if value.microsecond else "seconds")
+
+def _parse_stamp(stamp: str) -> datetime:
+    try:
+        return datetime.fromisoformat(stamp)
+    except (TypeError, ValueError):
+        raise InvalidWatermark(f"Invalid timestamp: {stamp}")
+
+def _ts_forms(dialect_name: str, stamp: str) -> list:
+    """Bind values for one instant, in ascending storage order.
+
+    SQLite keeps timestamps as text: CURRENT_TIMESTAMP writes 'YYYY-MM-DD HH:MM:SS'
+    while Python-bound values carry '.ffffff', so a whole-second instant has two
+    stored forms. Other databases compare real timestamps at full precision.
+    """
+    value = _parse_stamp(stamp)
+    if dialect_name != "sqlite":
+        return [value]
+    full = literal(value.strftime("%Y-%m-%d %H:%M:%S.%f"), type_=String)
+    if value.microsecond:
+        return [full]
+    return [literal(value.strftime("%Y-%m-%d %H:%M:%S"), type_=String), full]
+
+def after(column, dialect_name: str, stamp: str):
+    return column > _ts_forms(dialect_name, stamp)[-1]
+
+def before(column, dialect_name: str, stamp: str):
+    return column < _ts_forms(dialect_name, stamp)[0]
+
+def at(column, dialect_name: str, stamp: str):
+    return column.in_(_ts_forms(dialect_name, stamp))
+
+def tombstone_watermarks(state: Dict[str, Any]) -> Dict[str, int]:
+    """Per-table tombstone ids; cursors from before per-table watermarks held one shared id"""
+    marks = state.get("tombstones")
+    if isinstance(marks, int):
+        return {name: marks for name in CHANGE_TABLES}
+    return dict(marks or {})
+
+def changed_since(query, model, dialect_name: str, stamp: Optional[str], last_id: int = 0):
+    """Filter `query` to rows changed after (stamp, last_id), in watermark order"""
+    if stamp:
+        query = query.filter(or_(
+            after(model.updated_at, dialect_name, stamp),
+            and_(at(model.updated_at, dialect_name, stamp), model.id > last_id)
+        ))
+    return query.order_by(model.updated_at, model.id)
+
+def collect_changes(db, state: Dict[str, Any], tables: List[str], limit: int) -> Tuple[Dict, List, Dict, bool]:
+    """Rows inserted/updated per table and deletions after the watermark in `state`"""
+    dialect_name = db.bind.dialect.name
+    settled = _stamp(db.execute(select(func.now())).scalar())
+    new_state = dict(state)
+    has_more = False
+    changes = {}
+
+    for name in tables:
+        model = CHANGE_TABLES[name]
+        stamp, last_id = (state.get(name) or [None, 0])
+        position = _parse_stamp(stamp) if stamp else None
+        query = db.query(model).filter(before(model.updated_at, dialect_name, settled))
+        rows = changed_since(query, model, dialect_name, stamp, last_id).limit(limit + 1).all()
+        if len(rows) > limit:
+            has_more = True
+            rows = rows[:limit]
+
+        inserted, updated = [], []
+        for row in rows:
+            # A row created after the watermark position is new to the consumer even if edited since
+            created = row.created_at
+            is_new = (position is None or created is None or created > position
+                      or (created == position and row.id > last_id))
+            (inserted if is_new else updated).append(row.to_dict())
+        changes[name] = {"inserted": inserted, "updated": updated}
+        if rows:
+            new_state[name] = [_stamp(rows[-1].updated_at), rows[-1].id]
+
+    # Every table gets its own tombstone watermark from the first call on, so widening
+    # `tables` later still returns deletions made since the cursor was issued
+    marks = tombstone_watermarks(state)
+    missing = [name for name in CHANGE_TABLES if name not in marks]
+    if missing:
+        start = db.query(Tombstone.table_name, func.max(Tombstone.id)).filter(Tombstone.table_name.in_(missing))
+        if state.get("since"):
+            start = start.filter(before(Tombstone.deleted_at, dialect_name, state["since"]))
+        found = dict(start.group_by(Tombstone.table_name).all())
+        marks.update({name: found.get(name) or 0 for name in missing})
+
+    deleted = []
+    for name in tables:
+        tombstones = (db.query(Tombstone)
+                      .filter(Tombstone.table_name == name, Tombstone.id > marks[name])
+                      .order_by(Tombstone.id).limit(limit + 1).all())
+        if len(tombstones) > limit:
+            has_more = True
+            tombstones = tombstones[:limit]
+        if tombstones:
+            marks[name] = tombstones[-1].id
+        deleted += [t.to_dict() for t in tombstones]
+
+    new_state["tombstones"] = marks
+    new_state.pop("since", None)
+    return changes, deleted, new_state, has_more
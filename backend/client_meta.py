@@ -0,0 +1,131 @@
+"""
+Backfill of the compact client metadata columns.
+
+Submissions used to store ip_address as text and the full user_agent on
+every row. They are now stored as client_ip (packed bytes, inet on
+PostgreSQL) and user_agent_hash into the deduplicated user_agents table (see
+models.py). Databases created before keep the old text columns; until their
+rows are converted those rows read back without IP and user agent.
+
+The backfill walks each table by id, CLIENT_META_CHUNK_SIZE rows per short
+transaction, writes the compact values and clears the old ones, so it can run
+while the app serves traffic. Once nothing is left, --drop-legacy removes the
+old columns (SQLite needs 3.35+ and a VACUUM afterwards to return the space):
+
+    python backend/client_meta.py --backfill
+    python backend/client_meta.py --status
+    python backend/client_meta.py --drop-legacy
+"""
+import argparse
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, inspect, text
+
+from models import Contact, PackedIP, Registration, Requirements, remember_user_agents, user_agent_hash
+
+MODELS = (Registration, Requirements, Contact)
+LEGACY_COLUMNS = ("ip_address", "user_agent")
+
+def legacy_columns(engine, model) -> List[str]:
+    """Old text columns still present in this table"""
+    present = {column["name"] for column in inspect(engine).get_columns(model.__tablename__)}
+    return [name for name in LEGACY_COLUMNS if name in present]
+
+def _pending_clause(legacy: List[str]) -> str:
+    return " OR ".join(f"{name} IS NOT NULL" for name in legacy)
+
+def backfill_chunk(engine, model, legacy: List[str], after_id: int, chunk_size: int) -> Tuple[int, Optional[int]]:
+    """Convert the next chunk of rows after `after_id`; returns (rows converted, last id or None when done)"""
+    table = model.__tablename__
+    ip = "ip_address" if "ip_address" in legacy else "NULL"
+    agent = "user_agent" if "user_agent" in legacy else "NULL"
+    update = text(
+        f"UPDATE {table} SET client_ip = COALESCE(:ip, client_ip), "
+        f"user_agent_hash = COALESCE(:agent_hash, user_agent_hash), "
+        f"updated_at = CURRENT_TIMESTAMP, "  # exported columns change: new export cache version and changes feed entry
+        + ", ".join(f"{name} = NULL" for name in legacy) + " WHERE id = :id"
+    ).bindparams(bindparam("ip", type_=PackedIP()))
+    with engine.begin() as conn:
+        rows = conn.execute(
+            text(f"SELECT id, {ip} AS ip, {agent} AS agent FROM {table} "
+                 f"WHERE id > :after AND ({_pending_clause(legacy)}) ORDER BY id LIMIT :limit"),
+            {"after": after_id, "limit": chunk_size},
+        ).all()
+        if not rows:
+            return 0, None
+        remember_user_agents(conn, [row.agent for row in rows])
+        conn.execute(update, [{"id": row.id, "ip": row.ip, "agent_hash": user_agent_hash(row.agent)} for row in rows])
+    return len(rows), rows[-1].id
+
+def backfill(engine, chunk_size: int = 1000, pause_seconds: float = 0.0, log=print) -> int:
+    """Convert every row still holding old text metadata; returns the rows converted"""
+    total = 0
+    for model in MODELS:
+        legacy = legacy_columns(engine, model)
+        if not legacy:
+            continue
+        converted, last_id = 0, 0
+        while True:
+            count, last_id = backfill_chunk(engine, model, legacy, last_id, chunk_size)
+            if last_id is None:
+                break
+            converted += count
+            if pause_seconds:
+                time.sleep(pause_seconds)  # leave room for the live traffic
+        log(f"Converted {converted} {model.__tablename__} rows")
+        total += converted
+    return total
+
+def status(engine) -> Dict[str, int]:
+    """Rows per table still holding old text metadata (tables without old columns are left out)"""
+    remaining = {}
+    with engine.connect() as conn:
+        for model in MODELS:
+            legacy = legacy_columns(engine, model)
+            if legacy:
+                remaining[model.__tablename__] = conn.execute(
+                    text(f"SELECT COUNT(*) FROM {model.__tablename__} WHERE {_pending_clause(legacy)}")
+                ).scalar()
+    return remaining
+
+def drop_legacy(engine, log=print) -> List[str]:
+    """Drop the old columns of fully converted tables; returns the dropped table.column names"""
+    if engine.dialect.name == "sqlite" and sqlite3.sqlite_version_info < (3, 35):
+        raise RuntimeError(f"SQLite {sqlite3.sqlite_version} cannot drop columns (needs 3.35+)")
+    remaining = status(engine)
+    dropped = []
+    for model in MODELS:
+        table = model.__tablename__
+        if remaining.get(table):
+            log(f"Skipping {table}: {remaining[table]} rows not converted yet")
+            continue
+        for name in legacy_columns(engine, model):
+            with engine.begin() as conn:
+                conn.exec_driver_sql(f"ALTER TABLE {table} DROP COLUMN {name}")
+            dropped.append(f"{table}.{name}")
+    if dropped and engine.dialect.name == "sqlite":
+        log("Run VACUUM to return the freed pages to the file system")
+    return dropped
+
+if __name__ == "__main__":
+    from config import settings
+
+    parser = argparse.ArgumentParser(description="Convert submissions to the compact IP and user agent storage")
+    parser.add_argument("--backfill", action="store_true", help="convert rows still holding text metadata")
+    parser.add_argument("--status", action="store_true", help="show rows not converted yet")
+    parser.add_argument("--drop-legacy", action="store_true", help="drop the old text columns once converted")
+    parser.add_argument("--chunk-size", type=int, default=settings.client_meta_chunk_size)
+    parser.add_argument("--pause-ms", type=float, default=settings.client_meta_pause_ms, help="sleep between chunks")
+    args = parser.parse_args()
+
+    from models import create_tables, engine
+
+    create_tables()
+    if args.backfill:
+        print(f"Converted {backfill(engine, args.chunk_size, args.pause_ms / 1000.0)} rows")
+    if args.drop_legacy:
+        print(f"Dropped: {', '.join(drop_legacy(engine)) or 'nothing'}")
+    if args.status or not (args.backfill or args.drop_legacy):
+        print(status(engine))
@@ -16,6 +16,85 @@ class Settings:
         # Database settings
         self.database_url: str = os.getenv("DATABASE_URL", "sqlite:///./data/Clavisnova.db")
 
+        # SQLite tuning, applied on every new connection (ignored for other databases)
+        self.sqlite_journal_mode: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+        self.sqlite_busy_timeout: int = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # ms
+        self.sqlite_synchronous: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+        self.sqlite_mmap_size: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256*1024*1024)))  # 256MB
+        self.sqlite_cache_size: int = int(os.getenv("SQLITE_CACHE_SIZE", "-20000"))  # negative = KiB
+        self.sqlite_temp_store: str = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+        self.sqlite_read_only_admin: bool = self._get_env_bool("SQLITE_READ_ONLY_ADMIN", True)
+
+        # Connection pool (PostgreSQL; SQLite opens its connections per use). Handlers check connections out
+        # only on their first statement and hold times are measured per request (see request_db.py)
+        self.db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "5"))
+        self.db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+        self.pool_hold_warn_ms: float = float(os.getenv("POOL_HOLD_WARN_MS", "500"))
+
+        # Backfill of the compact IP / user agent columns for rows stored before them (see client_meta.py)
+        self.client_meta_chunk_size: int = int(os.getenv("CLIENT_META_CHUNK_SIZE", "1000"))
+        self.client_meta_pause_ms: float = float(os.getenv("CLIENT_META_PAUSE_MS", "0"))
+
+        # Optional read replica for admin lists, stats, searches and full exports (see replica.py)
+        self.database_read_url: Optional[str] = os.getenv("DATABASE_READ_URL") or None
+        self.read_replica_max_lag_seconds: float = float(os.getenv("READ_REPLICA_MAX_LAG_SECONDS", "10"))  # else read the primary
+        self.read_replica_check_seconds: float = float(os.getenv("READ_REPLICA_CHECK_SECONDS", "2"))  # lag re-measured this often
+        self.read_your_writes_seconds: int = int(os.getenv("READ_YOUR_WRITES_SECONDS", "60"))  # after an admin delete
+
+        # Group commit for form submissions (batch concurrent inserts into one transaction)
+        self.group_commit_enabled: bool = self._get_env_bool("GROUP_COMMIT_ENABLED", False)
+        self.group_commit_max_batch: int = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "64"))
+        self.group_commit_max_wait_ms: float = float(os.getenv("GROUP_COMMIT_MAX_WAIT_MS", "5"))
+
+        # Circuit breakers around the database and Supabase (see breaker.py); while the database breaker is
+        # open, accepted submissions are appended to an fsync-batched journal and replayed later (intake.py)
+        self.breaker_failure_threshold: int = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+        self.breaker_reset_seconds: float = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+        self.breaker_slow_seconds: float = float(os.getenv("BREAKER_SLOW_SECONDS", "5"))
+        self.intake_journal_enabled: bool = self._get_env_bool("INTAKE_JOURNAL_ENABLED", True)
+        self.intake_journal_dir: Path = Path(os.getenv("INTAKE_JOURNAL_DIR", "./data/journal"))
+        self.intake_journal_flush_ms: float = float(os.getenv("INTAKE_JOURNAL_FLUSH_MS", "10"))  # fsync batch window
+        self.intake_replay_seconds: float = float(os.getenv("INTAKE_REPLAY_SECONDS", "2"))
+
+        # Supabase copy: submissions commit locally with an outbox row in the same transaction and a
+        # background replicator pushes them to Supabase in batches (see outbox.py)
+        self.supabase_replication: bool = self._get_env_bool("USE_SUPABASE_REST", False)
+        self.outbox_batch_size: int = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+        self.outbox_poll_seconds: float = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+        self.outbox_max_attempts: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "20"))  # then parked as failed
+        self.outbox_retry_max_seconds: float = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "300"))  # backoff cap
+
+        # Idempotent form submissions: retries with the same Idempotency-Key header (or, without one,
+        # the same body from the same IP within the window) get the first response replayed
+        self.idempotency_enabled: bool = self._get_env_bool("IDEMPOTENCY_ENABLED", True)
+        self.idempotency_key_ttl_seconds: int = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", str(24*3600)))
+        self.idempotency_window_seconds: int = int(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", "300"))  # 0 disables body matching
+        self.idempotency_lock_seconds: int = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "120"))  # lease of an in-flight request
+        self.idempotency_wait_seconds: float = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))  # retry waits this long for it
+
+        # Duplicate registrations (same manufacturer/serial/model): "flag" stores them marked, "merge" drops them
+        self.duplicate_registration_policy: str = os.getenv("DUPLICATE_REGISTRATION_POLICY", "flag").lower()
+
+        # Donation matching (registrations <-> requirements), top-K candidates kept per record
+        self.matching_enabled: bool = self._get_env_bool("MATCHING_ENABLED", True)
+        self.match_top_k: int = int(os.getenv("MATCH_TOP_K", "10"))
+
+        # Locations: offline gazetteer (city,state,latitude,longitude CSV) and default search radius
+        self.gazetteer_path: Path = Path(os.getenv("GAZETTEER_PATH", str(Path(__file__).parent / "gazetteer.csv")))
+        self.geo_default_radius_km: float = float(os.getenv("GEO_DEFAULT_RADIUS_KM", "100"))
+
+        # Admin dashboard: fetch the first pages on separate pooled connections in parallel
+        self.dashboard_concurrent_queries: bool = self._get_env_bool("DASHBOARD_CONCURRENT_QUERIES", False)
+
+        # Live admin events (SSE)
+        self.sse_heartbeat_seconds: float = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+        self.sse_retry_ms: int = int(os.getenv("SSE_RETRY_MS", "3000"))
+        self.sse_max_stream_seconds: float = float(os.getenv("SSE_MAX_STREAM_SECONDS", "300"))  # frees the worker thread, client reconnects
+        self.sse_fallback_poll_seconds: float = float(os.getenv("SSE_FALLBACK_POLL_SECONDS", "2"))
+        self.sse_replay_limit: int = int(os.getenv("SSE_REPLAY_LIMIT", "500"))
+        # submission_events older than this are deleted, except the newest SSE_REPLAY_LIMIT (0 = keep all)
+        self.sse_event_retention_hours: float = float(os.getenv("SSE_EVENT_RETENTION_HOURS", "24"))
+
         # Security settings
         self.secret_key: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 
@@ -46,12 +125,37 @@ class Settings:
         # Data paths
         self.data_dir: Path = Path("./data")
         self.logs_dir: Path = Path("./logs")
-        self.backup_dir: Path = self.data_dir / "backup"
+        self.backup_dir: Path = Path(os.getenv("BACKUP_DIR", str(self.data_dir / "backup")))
+        self.export_cache_dir: Path = self.data_dir / "exports"
+        self.events_signal_path: Path = self.data_dir / "events.signal"
+        self.export_cache_max_bytes: int = int(os.getenv("EXPORT_CACHE_MAX_BYTES", str(200*1024*1024)))  # 200MB
+
+        # Background export jobs (export_jobs.py): built in a pool of EXPORT_JOB_WORKERS processes per worker,
+        # at most EXPORT_JOB_MAX_ACTIVE queued or running at once, results kept for EXPORT_JOB_TTL_SECONDS
+        self.export_jobs_dir: Path = Path(os.getenv("EXPORT_JOBS_DIR", str(self.data_dir / "export_jobs")))
+        self.export_job_workers: int = int(os.getenv("EXPORT_JOB_WORKERS", "2"))
+        self.export_job_max_active: int = int(os.getenv("EXPORT_JOB_MAX_ACTIVE", "8"))
+        self.export_job_ttl_seconds: int = int(os.getenv("EXPORT_JOB_TTL_SECONDS", "3600"))
+        self.export_job_progress_rows: int = int(os.getenv("EXPORT_JOB_PROGRESS_ROWS", "1000"))
+        self.export_job_stale_seconds: int = int(os.getenv("EXPORT_JOB_STALE_SECONDS", "900"))
+
+        # Archival: rows older than ARCHIVE_AFTER_DAYS (0 = never by age) or marked completed move from the
+        # hot tables into compressed NDJSON segments, ARCHIVE_CHUNK_SIZE rows per segment and transaction
+        self.archive_dir: Path = Path(os.getenv("ARCHIVE_DIR", str(self.data_dir / "archive")))
+        self.archive_after_days: int = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+        self.archive_chunk_size: int = int(os.getenv("ARCHIVE_CHUNK_SIZE", "1000"))
+
+        # Online backups: one every BACKUP_INTERVAL_HOURS (0 = only by hand), newest BACKUP_KEEP kept.
+        # SQLite is copied BACKUP_STEP_PAGES pages at a time with BACKUP_STEP_SLEEP_MS between steps
+        self.backup_interval_hours: float = float(os.getenv("BACKUP_INTERVAL_HOURS", "24"))
+        self.backup_keep: int = int(os.getenv("BACKUP_KEEP", "7"))
+        self.backup_step_pages: int = int(os.getenv("BACKUP_STEP_PAGES", "256"))
+        self.backup_step_sleep_ms: int = int(os.getenv("BACKUP_STEP_SLEEP_MS", "20"))
 
         # Ensure directories exist
         self.data_dir.mkdir(exist_ok=True)
         self.logs_dir.mkdir(exist_ok=True)
-        self.backup_dir.mkdir(exist_ok=True)
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
 
     def _get_env_bool(self, key: str, default: bool = False) -> bool:
         """Get boolean value from environment variable"""
@@ -0,0 +1,241 @@
+"""
+Consistency check between the local database and the Supabase copy.
+
+With USE_SUPABASE_REST=true submissions are copied to Supabase by the outbox
+replicator (outbox.py), and anything edited on one side only or lost on the
+way makes the copies drift. This compares them without downloading either
+table: the id space is split into FANOUT
+ranges and each side returns a (row count, digest) per range, local and
+remote in parallel. Only ranges whose digests differ are split again, down to
+ranges of at most LEAF_SIZE ids, and only those rows are fetched from both
+sides and diffed field by field.
+
+A row digests as md5 of its SYNC_FIELDS as text joined by \\x1f (NULL as \\N);
+a range digests as md5 of its row digests in id order. Supabase computes the
+same with the function in RPC_SQL, created once in the SQL editor:
+
+    python backend/consistency.py --print-sql
+    python backend/consistency.py            # exit status 1 when the copies differ
+"""
+import argparse
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+
+import supabase_client
+from supabase_client import SYNC_FIELDS
+from models import Contact, Registration, Requirements, mapped_columns
+
+RPC_NAME = "clavisnova_range_digests"
+
+MODELS = {"registrations": Registration, "requirements": Requirements, "contacts": Contact}
+
+FANOUT = 16  # sub-ranges per mismatching range
+LEAF_SIZE = 256  # ranges this small are diffed row by row
+WORKERS = 8
+
+SEPARATOR = "\x1f"
+NULL = "\\N"
+
+RPC_SQL = f"""
+create or replace function {RPC_NAME}(table_name text, columns text[], los bigint[], his bigint[])
+returns table(lo bigint, hi bigint, row_count bigint, digest text)
+language plpgsql stable as $$
+declare
+  row_text text;
+begin
+  select string_agg(format('coalesce(t.%I::text, %L)', c, '{NULL}'), ' || chr(31) || ')
+    into row_text from unnest(array['id'] || columns) as c;
+  return query execute format(
+    'select b.lo, b.hi, count(t.id), '
+    'md5(coalesce(string_agg(md5(%s), '''' order by t.id) filter (where t.id is not null), '''')) '
+    'from unnest($1, $2) as b(lo, hi) left join %I t on t.id >= b.lo and t.id < b.hi '
+    'group by b.lo, b.hi order by b.lo', row_text, table_name)
+  using los, his;
+end $$;
+"""
+
+Range = Tuple[int, int]  # lo <= id < hi
+
+def field_text(value) -> str:
+    return NULL if value is None else str(value)
+
+def row_digest(row: Dict, fields: Sequence[str]) -> str:
+    text = SEPARATOR.join(field_text(row.get(name)) for name in ["id", *fields])
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+def range_digest(rows: List[Dict], fields: Sequence[str]) -> Tuple[int, str]:
+    joined = "".join(row_digest(row, fields) for row in rows)
+    return len(rows), hashlib.md5(joined.encode("utf-8")).hexdigest()
+
+def split(span: Range, parts: int) -> List[Range]:
+    lo, hi = span
+    step = max(-(-(hi - lo) // parts), 1)
+    return [(start, min(start + step, hi)) for start in range(lo, hi, step)]
+
+def merge_adjacent(ranges: List[Range]) -> List[Range]:
+    merged: List[Range] = []
+    for lo, hi in sorted(ranges):
+        if merged and merged[-1][1] == lo:
+            merged[-1] = (merged[-1][0], hi)
+        else:
+            merged.append((lo, hi))
+    return merged
+
+class LocalSide:
+    """Digests and rows from the local database"""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def rows(self, table: str, span: Range) -> List[Dict]:
+        model = MODELS[table]
+        columns = mapped_columns(model, ["id", *SYNC_FIELDS[table]])  # ip_address and user_agent decoded
+        with self.engine.connect() as conn:
+            return [dict(row) for row in conn.execute(
+                select(*columns).where(model.id >= span[0], model.id < span[1]).order_by(model.id)
+            ).mappings()]
+
+    def bounds(self, table: str) -> Optional[Range]:
+        from sqlalchemy import func
+
+        model = MODELS[table]
+        with self.engine.connect() as conn:
+            low, high = conn.execute(select(func.min(model.id), func.max(model.id))).one()
+        return None if low is None else (low, high)
+
+    def digests(self, table: str, ranges: List[Range]) -> Dict[Range, Tuple[int, str]]:
+        return {span: range_digest(self.rows(table, span), SYNC_FIELDS[table]) for span in ranges}
+
+class RemoteSide:
+    """Digests (via the RPC_SQL function) and rows from Supabase through PostgREST"""
+
+    def rows(self, table: str, span: Range) -> List[Dict]:
+        return supabase_client.select_range(table, ["id", *SYNC_FIELDS[table]], span[0], span[1])
+
+    def bounds(self, table: str) -> Optional[Range]:
+        return supabase_client.id_bounds(table)
+
+    def digests(self, table: str, ranges: List[Range]) -> Dict[Range, Tuple[int, str]]:
+        result = supabase_client.call_rpc(RPC_NAME, {
+            "table_name": table, "columns": SYNC_FIELDS[table],
+            "los": [lo for lo, _ in ranges], "his": [hi for _, hi in ranges],
+        })
+        return {(item["lo"], item["hi"]): (item["row_count"], item["digest"]) for item in result}
+
+def _archived_ids(db, table: str, ids: List[int]) -> set:
+    """Which of `ids` were moved to archive segments locally (and so are expected on Supabase only)"""
+    from archive import read_segment, segments
+
+    wanted, found = set(ids), set()
+    for segment in segments(db, table):
+        if any(segment.first_id <= record_id <= segment.last_id for record_id in wanted):
+            found.update(row["id"] for row in read_segment(segment) if row["id"] in wanted)
+    return found
+
+def diff_rows(table: str, local_rows: List[Dict], remote_rows: List[Dict]) -> Dict[str, List]:
+    local_by_id = {row["id"]: row for row in local_rows}
+    remote_by_id = {row["id"]: row for row in remote_rows}
+    changed = []
+    for record_id in sorted(local_by_id.keys() & remote_by_id.keys()):
+        fields = {name: [local_by_id[record_id].get(name), remote_by_id[record_id].get(name)]
+                  for name in SYNC_FIELDS[table]
+                  if field_text(local_by_id[record_id].get(name)) != field_text(remote_by_id[record_id].get(name))}
+        if fields:
+            changed.append({"id": record_id, "fields": fields})
+    return {
+        "missing_remote": sorted(local_by_id.keys() - remote_by_id.keys()),
+        "missing_local": sorted(remote_by_id.keys() - local_by_id.keys()),
+        "changed": changed,
+    }
+
+def compare_table(table: str, local, remote, pool: ThreadPoolExecutor, fanout: int = FANOUT,
+                  leaf_size: int = LEAF_SIZE, db=None) -> Dict:
+    """Diff one table; returns the differences plus how much had to be compared"""
+    started = time.monotonic()
+    local_bounds, remote_bounds = pool.map(lambda side: side.bounds(table), (local, remote))
+    known = [b for b in (local_bounds, remote_bounds) if b]
+    stats = {"levels": 0, "ranges_compared": 0, "rows_fetched": 0}
+    result = {"missing_remote": [], "missing_local": [], "changed": [], "archived": []}
+    if not known:
+        return {**result, **stats, "seconds": 0.0}
+
+    pending = split((min(b[0] for b in known), max(b[1] for b in known) + 1), fanout)
+    leaves: List[Range] = []
+    while pending:
+        stats["levels"] += 1
+        stats["ranges_compared"] += len(pending)
+        local_future = pool.submit(local.digests, table, pending)
+        remote_digests = remote.digests(table, pending)
+        local_digests = local_future.result()
+        next_level = []
+        for span in pending:
+            if local_digests[span] == remote_digests.get(span):
+                continue
+            if span[1] - span[0] <= leaf_size:
+                leaves.append(span)
+            else:
+                next_level.extend(split(span, fanout))
+        pending = next_level
+
+    leaves = merge_adjacent(leaves)
+    fetched = list(zip(pool.map(lambda span: local.rows(table, span), leaves),
+                       pool.map(lambda span: remote.rows(table, span), leaves)))
+    for local_rows, remote_rows in fetched:
+        stats["rows_fetched"] += len(local_rows) + len(remote_rows)
+        for key, values in diff_rows(table, local_rows, remote_rows).items():
+            result[key].extend(values)
+
+    if db is not None and result["missing_local"]:
+        archived = _archived_ids(db, table, result["missing_local"])
+        result["archived"] = sorted(archived)
+        result["missing_local"] = [record_id for record_id in result["missing_local"] if record_id not in archived]
+    return {**result, **stats, "seconds": round(time.monotonic() - started, 3)}
+
+def check(engine, tables: Optional[Sequence[str]] = None, remote=None, fanout: int = FANOUT,
+          leaf_size: int = LEAF_SIZE, workers: int = WORKERS) -> Dict[str, Dict]:
+    """Compare every table; a table is consistent when its three difference lists are empty"""
+    from sqlalchemy.orm import Session
+
+    local, remote = LocalSide(engine), remote or RemoteSide()
+    with ThreadPoolExecutor(max_workers=workers) as pool, Session(engine) as db:
+        return {table: compare_table(table, local, remote, pool, fanout, leaf_size, db)
+                for table in tables or SYNC_FIELDS}
+
+def consistent(report: Dict[str, Dict]) -> bool:
+    return not any(result[key] for result in report.values() for key in ("missing_remote", "missing_local", "changed"))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the local database with the Supabase copy")
+    parser.add_argument("--tables", nargs="+", choices=list(SYNC_FIELDS), help="tables to compare (default all)")
+    parser.add_argument("--fanout", type=int, default=FANOUT, help="sub-ranges per mismatching range")
+    parser.add_argument("--leaf-size", type=int, default=LEAF_SIZE, help="ranges diffed row by row")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    parser.add_argument("--print-sql", action="store_true", help="print the Supabase function to create")
+    args = parser.parse_args()
+
+    if args.print_sql:
+        print(RPC_SQL)
+        raise SystemExit(0)
+
+    from models import engine
+
+    report = check(engine, args.tables, fanout=args.fanout, leaf_size=args.leaf_size)
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        for table, result in report.items():
+            print(f"{table}: {len(result['missing_remote'])} missing on Supabase, "
+                  f"{len(result['missing_local'])} missing locally, {len(result['changed'])} changed, "
+                  f"{len(result['archived'])} archived ({result['ranges_compared']} ranges, "
+                  f"{result['rows_fetched']} rows fetched, {result['seconds']}s)")
+            for key in ("missing_remote", "missing_local"):
+                if result[key]:
+                    print(f"  {key}: {result[key]}")
+            for item in result["changed"]:
+                print(f"  changed {item['id']}: {item['fields']}")
+    raise SystemExit(0 if consistent(report) else 1)
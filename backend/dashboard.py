@@ -0,0 +1,131 @@
+"""
+Single round-trip payload for the admin dashboard.
+
+/api/admin/dashboard returns the stats and the first page of every admin list
+in one response. All counts (plus the max id/updated_at used for the section
+ETags) come from one aggregate SELECT. The first pages come from the same
+session, or from one pooled connection per section when concurrent
+queries are enabled. Sections whose ETag the client already holds are sent
+back without rows.
+"""
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func, select
+
+from models import Contact, Registration, Requirements
+
+DASHBOARD_SECTIONS = {
+    "registrations": Registration,
+    "requirements": Requirements,
+    "contacts": Contact,
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def _section_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=len(DASHBOARD_SECTIONS), thread_name_prefix="dashboard")
+    return _executor
+
+def parse_known(value: Optional[str]) -> Dict[str, str]:
+    """Parse `known=registrations:etag,contacts:etag` into a dict"""
+    known = {}
+    for item in (value or "").split(","):
+        name, _, etag = item.strip().partition(":")
+        if name and etag:
+            known[name] = etag
+    return known
+
+def section_etag(count, max_id, max_updated, limit: int) -> str:
+    raw = f"{count}:{max_id}:{max_updated}:{limit}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+def combined_etag(sections: Dict[str, Dict[str, Any]]) -> str:
+    raw = ",".join(f"{name}:{section['etag']}" for name, section in sorted(sections.items()))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+def section_summaries(db, limit: int) -> Dict[str, Dict[str, Any]]:
+    """Count, max id and max updated_at of every section in one SELECT"""
+    columns = []
+    for model in DASHBOARD_SECTIONS.values():
+        columns += [
+            select(func.count(model.id)).scalar_subquery(),
+            select(func.max(model.id)).scalar_subquery(),
+            select(func.max(model.updated_at)).scalar_subquery(),
+        ]
+    row = db.execute(select(*columns)).one()
+
+    summaries = {}
+    for index, name in enumerate(DASHBOARD_SECTIONS):
+        count, max_id, max_updated = row[index * 3:index * 3 + 3]
+        summaries[name] = {"total": count or 0, "etag": section_etag(count, max_id, max_updated, limit)}
+    return summaries
+
+def first_page(db, model, limit: int):
+    rows = db.query(model).order_by(model.created_at.desc(), model.id.desc()).limit(limit).all()
+    return [row.to_dict() for row in rows]
+
+def _first_page_in_own_session(session_factory, model, limit: int):
+    db = session_factory()
+    try:
+        return first_page(db, model, limit)
+    finally:
+        db.close()
+
+def _pagination(total: int, limit: int) -> Dict[str, Any]:
+    # Same shape as the paginated admin list endpoints, always page 1
+    total_pages = (total + limit - 1) // limit
+    return {
+        "page": 1,
+        "limit": limit,
+        "total": total,
+        "total_pages": total_pages,
+        "has_next": 1 < total_pages,
+        "has_prev": False
+    }
+
+def build_dashboard(session_factory, limit: int, known: Optional[Dict[str, str]] = None,
+                    concurrent: bool = False) -> Dict[str, Any]:
+    """Stats plus the first `limit` rows of each section; unchanged sections carry no rows"""
+    known = known or {}
+    db = session_factory()
+    try:
+        summaries = section_summaries(db, limit)
+        stale = [name for name in DASHBOARD_SECTIONS if known.get(name) != summaries[name]["etag"]]
+
+        if concurrent and len(stale) > 1:
+            futures = {
+                name: _section_executor().submit(
+                    _first_page_in_own_session, session_factory, DASHBOARD_SECTIONS[name], limit
+                )
+                for name in stale
+            }
+            pages = {name: future.result() for name, future in futures.items()}
+        else:
+            pages = {name: first_page(db, DASHBOARD_SECTIONS[name], limit) for name in stale}
+    finally:
+        db.close()
+
+    sections = {}
+    for name, summary in summaries.items():
+        section = {"etag": summary["etag"], "pagination": _pagination(summary["total"], limit)}
+        if name in pages:
+            section["data"] = pages[name]
+        else:
+            section["unchanged"] = True
+        sections[name] = section
+
+    registrations = summaries["registrations"]["total"]
+    requirements = summaries["requirements"]["total"]
+    return {
+        "stats": {
+            "registrations": registrations,
+            "requirements": requirements,
+            "contacts": summaries["contacts"]["total"],
+            "total_submissions": registrations + requirements
+        },
+        "sections": sections
+    }
@@ -2,18 +2,99 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 from typing import List, Dict, Any, Optional, Tuple
 import json
-from models import Registration, Requirements, SystemLog, SessionLocal, engine
+from models import Registration, Requirements, SystemLog, SessionLocal, ReadSessionLocal, ReplicaSessionLocal, engine
 from logger import logger_manager
 from config import settings
+import rollups  # noqa: F401  registers the rollup counter hooks on the submission models
+import outbox  # noqa: F401  registers the Supabase outbox hooks
 
 class DatabaseManager:
     def __init__(self):
         self.logger = logger_manager
+        self._group_writer = None
 
     def get_db(self) -> Session:
         """Get database session"""
         return SessionLocal()
 
+    def get_read_db(self, replica: bool = True) -> Session:
+        """Get database session for admin reads.
+
+        Uses the read replica while it is fresh enough for this request (see replica.py),
+        else the primary (read-only connection on SQLite). replica=False is for reads that
+        must not miss committed rows, such as watermark-based change feeds.
+        """
+        if replica and ReplicaSessionLocal is not None:
+            from replica import read_after, replica_router
+
+            if replica_router.use_replica(read_after.get()):
+                return ReplicaSessionLocal()
+        return ReadSessionLocal()
+
+    def get_group_writer(self):
+        """Get the per-process group-commit writer (None when disabled)"""
+        if not settings.group_commit_enabled:
+            return None
+        if self._group_writer is None:
+            from events import event_broadcaster
+            from group_commit import GroupCommitWriter
+
+            self._group_writer = GroupCommitWriter(
+                engine,
+                max_batch=settings.group_commit_max_batch,
+                max_wait=settings.group_commit_max_wait_ms / 1000.0,
+                on_commit=event_broadcaster.notify
+            )
+        return self._group_writer
+
+    def insert_row(self, model, values: Dict[str, Any]) -> int:
+        """Insert one row and return its id, batched through group commit when enabled"""
+        from geo import location_columns
+
+        # Resolved here so the Core insert of the group-commit path stores the location too
+        values = {**values, **location_columns(model, values)}
+        writer = self.get_group_writer()
+        if writer is not None:
+            return writer.insert(model, values)
+
+        db = self.get_db()
+        try:
+            obj = model(**values)
+            db.add(obj)
+            db.flush()  # populates the id from the INSERT itself, no refresh SELECT needed
+            new_id = obj.id
+            db.commit()
+            return new_id
+        except Exception as e:
+            db.rollback()
+            self.logger.log_database_error(f"{model.__tablename__}_save", e)
+            raise
+        finally:
+            db.close()
+
+    def insert_registration(self, values: Dict[str, Any]) -> Tuple[int, Optional[int]]:
+        """Insert a registration unless it is a merged duplicate; returns (id, duplicate_of)"""
+        from dedupe import find_primary, registration_fingerprint
+        from sqlalchemy.exc import IntegrityError
+
+        fingerprint = registration_fingerprint(values.get("manufacturer"), values.get("serial"), values.get("model"))
+        for attempt in range(2):
+            db = self.get_db()
+            try:
+                primary = find_primary(db, fingerprint)
+            finally:
+                db.close()
+
+            if primary is not None and settings.duplicate_registration_policy == "merge":
+                return primary, primary
+            try:
+                new_id = self.insert_row(Registration, dict(values, fingerprint=fingerprint, duplicate_of=primary))
+                return new_id, primary
+            except IntegrityError:
+                # A concurrent copy became the primary between the lookup and the insert: look again
+                if attempt:
+                    raise
+
     # Registration methods
     async def save_registration(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Save a new registration"""
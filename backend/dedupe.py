@@ -0,0 +1,122 @@
+"""
+Duplicate piano registration detection.
+
+Every registration gets a fingerprint of its manufacturer, serial and model
+with case, accents, whitespace and punctuation folded away. The fingerprint
+column is indexed, so an incoming submission is matched against earlier ones
+with a single index lookup. The first row with a fingerprint is the primary;
+later copies are either stored with duplicate_of pointing at it ("flag") or
+not stored at all ("merge"), per DUPLICATE_REGISTRATION_POLICY.
+
+Rows created before fingerprints existed are handled by the batch backfill,
+which also prints the dedupe report:
+
+    python backend/dedupe.py --backfill --report
+"""
+import argparse
+import hashlib
+import unicodedata
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select
+
+from models import Registration
+
+def normalize_key_part(value) -> str:
+    """Fold case, accents, whitespace and punctuation: ' C. Bechstein ' -> 'cbechstein'"""
+    text = unicodedata.normalize("NFKD", str(value or "")).casefold()
+    return "".join(ch for ch in text if ch.isalnum())
+
+def registration_fingerprint(manufacturer, serial, model) -> Optional[str]:
+    """Fingerprint of one piano, or None when there is no serial to identify it by"""
+    serial_key = normalize_key_part(serial)
+    if not serial_key:
+        return None
+    raw = "|".join([normalize_key_part(manufacturer), serial_key, normalize_key_part(model)])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def find_primary(db, fingerprint: Optional[str]) -> Optional[int]:
+    """Id of the primary registration with this fingerprint (index lookup)"""
+    if not fingerprint:
+        return None
+    return db.execute(
+        select(Registration.id)
+        .where(Registration.fingerprint == fingerprint, Registration.duplicate_of.is_(None))
+        .limit(1)
+    ).scalar()
+
+def backfill_fingerprints(engine, chunk_size: int = 1000, log=print) -> Dict[str, int]:
+    """Fingerprint existing rows in id order, flagging later copies of an earlier piano"""
+    table = Registration.__table__
+    stats = {"scanned": 0, "fingerprinted": 0, "duplicates": 0}
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(table.c.id, table.c.manufacturer, table.c.serial, table.c.model,
+                       table.c.fingerprint, table.c.duplicate_of)
+                .where(table.c.id > last_id).order_by(table.c.id).limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                fingerprint = registration_fingerprint(row.manufacturer, row.serial, row.model)
+                if fingerprint == row.fingerprint:
+                    continue
+                primary = find_primary(conn, fingerprint)
+                duplicate_of = primary if primary is not None and primary != row.id else None
+                conn.execute(table.update().where(table.c.id == row.id)
+                             .values(fingerprint=fingerprint, duplicate_of=duplicate_of))
+                stats["fingerprinted"] += 1
+                stats["duplicates"] += duplicate_of is not None
+        last_id = rows[-1].id
+        stats["scanned"] += len(rows)
+    log(f"Fingerprinted {stats['fingerprinted']} of {stats['scanned']} registrations, {stats['duplicates']} duplicates")
+    return stats
+
+def duplicate_report(db, limit: int = 100) -> List[Dict]:
+    """Groups of registrations sharing a fingerprint, largest first"""
+    groups = db.execute(
+        select(Registration.fingerprint, func.count(Registration.id).label("copies"))
+        .where(Registration.fingerprint.isnot(None))
+        .group_by(Registration.fingerprint)
+        .having(func.count(Registration.id) > 1)
+        .order_by(func.count(Registration.id).desc(), Registration.fingerprint)
+        .limit(limit)
+    ).all()
+
+    report = []
+    for fingerprint, copies in groups:
+        rows = db.query(Registration).filter(Registration.fingerprint == fingerprint).order_by(Registration.id).all()
+        primary = next((r for r in rows if r.duplicate_of is None), rows[0])
+        report.append({
+            "fingerprint": fingerprint,
+            "copies": copies,
+            "primary": primary.to_dict(),
+            "duplicate_ids": [r.id for r in rows if r.id != primary.id]
+        })
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fingerprint registrations and report duplicates")
+    parser.add_argument("--backfill", action="store_true", help="fingerprint rows created before dedupe existed")
+    parser.add_argument("--report", action="store_true", help="print groups of duplicate registrations")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    from models import SessionLocal, create_tables, engine
+
+    create_tables()
+    if args.backfill:
+        backfill_fingerprints(engine, args.chunk_size)
+    if args.report:
+        db = SessionLocal()
+        try:
+            for group in duplicate_report(db):
+                primary = group["primary"]
+                print(f"#{primary['id']} {primary['manufacturer']} {primary['model']} {primary['serial']}: "
+                      f"duplicates {group['duplicate_ids']}")
+        finally:
+            db.close()
+    if not (args.backfill or args.report):
+        parser.print_help()
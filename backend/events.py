@@ -0,0 +1,343 @@
+"""
+Live submission events for the admin dashboard (Server-Sent Events).
+
+Every insert/delete of a registration, requirement or contact appends a row to
+submission_events in the same transaction (see models.py), and the writer
+pokes a cross-worker notification channel:
+
+- PostgreSQL: NOTIFY queued in the writing transaction (delivered on commit),
+  received by one LISTEN connection per worker
+- SQLite: the mtime of a small signal file next to the database, after commit
+
+One broadcaster thread per worker wakes on the channel (or every few seconds
+as a fallback), reads the new events once and fans them out to all open SSE
+streams, so the number of admin tabs does not multiply database load.
+Reconnecting clients send Last-Event-ID and get the missed events replayed
+from the table. A background job per worker keeps the table to that replay
+window: it deletes events older than SSE_EVENT_RETENTION_HOURS, but always
+keeps the newest SSE_REPLAY_LIMIT.
+"""
+import json
+import os
+import queue
+import select as select_module
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, select
+from sqlalchemy.orm import Session
+
+from config import settings
+from logger import logger_manager
+from models import (
+    Contact, Registration, Requirements, SubmissionEvent, ReadSessionLocal, engine
+)
+from sqlite_profile import is_sqlite
+
+PG_CHANNEL = "clavisnova_submission_events"
+EVENT_MODELS = (Registration, Requirements, Contact)
+
+class FileSignalChannel:
+    """Cross-process wakeup for SQLite deployments: writers bump a file's mtime"""
+
+    transactional = False
+
+    def __init__(self, path: Path, poll_interval: float = 0.2):
+        self.path = Path(path)
+        self.poll_interval = poll_interval
+
+    def _mtime(self) -> int:
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def signal(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a"):
+                pass
+            os.utime(self.path)
+        except OSError as e:
+            logger_manager.logger.warning(f"Event signal failed: {e}")
+
+    def wait(self, wake: threading.Event, timeout: float):
+        """Block until the file changes, `wake` is set or `timeout` elapses"""
+        seen = self._mtime()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if wake.wait(min(self.poll_interval, max(deadline - time.monotonic(), 0))):
+                return
+            if self._mtime() != seen:
+                return
+
+    def close(self):
+        pass
+
+class PgNotifyChannel:
+    """Cross-process wakeup for PostgreSQL: NOTIFY from writers, LISTEN in each worker"""
+
+    # NOTIFY is queued inside the writing transaction and delivered by PostgreSQL on commit
+    transactional = True
+
+    def __init__(self, engine, channel: str = PG_CHANNEL, poll_interval: float = 0.25):
+        self.engine = engine
+        self.channel = channel
+        self.poll_interval = poll_interval
+        self._listen_conn = None
+        self._listen_pid: Optional[int] = None
+
+    def signal(self):
+        try:
+            with self.engine.begin() as conn:
+                self.signal_in(conn)
+        except Exception as e:
+            logger_manager.logger.warning(f"Event NOTIFY failed: {e}")
+
+    def signal_in(self, connection):
+        """Queue the NOTIFY on the caller's transaction (no extra connection or round trip after commit)"""
+        connection.exec_driver_sql(f"NOTIFY {self.channel}")
+
+    def _listener(self):
+        if self._listen_pid != os.getpid():
+            # Inherited from the parent across fork: the socket belongs to the parent
+            self._listen_conn = None
+        if self._listen_conn is None:
+            raw = self.engine.raw_connection()
+            raw.detach()  # dedicated connection, never returned to the pool
+            dbapi_conn = raw.connection
+            dbapi_conn.autocommit = True
+            dbapi_conn.cursor().execute(f"LISTEN {self.channel}")
+            self._listen_conn = dbapi_conn
+            self._listen_pid = os.getpid()
+        return self._listen_conn
+
+    def wait(self, wake: threading.Event, timeout: float):
+        try:
+            conn = self._listener()
+        except Exception as e:
+            logger_manager.logger.warning(f"Event LISTEN failed, polling instead: {e}")
+            wake.wait(timeout)
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline:
+                if wake.is_set():
+                    return
+                readable, _, _ = select_module.select([conn], [], [], self.poll_interval)
+                if readable:
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        return
+        except Exception as e:
+            # Dropped connection (server restart, idle timeout): reconnect on the next wait
+            logger_manager.logger.warning(f"Event LISTEN connection lost, reconnecting: {e}")
+            self.close()
+            wake.wait(max(deadline - time.monotonic(), 0))
+
+    def close(self):
+        if self._listen_conn is not None:
+            try:
+                self._listen_conn.close()
+            except Exception:
+                pass
+            self._listen_conn = None
+
+def build_channel():
+    if is_sqlite(settings.database_url):
+        return FileSignalChannel(settings.events_signal_path)
+    return PgNotifyChannel(engine)
+
+def format_sse(payload: Dict[str, Any], event_type: Optional[str] = None) -> str:
+    """Serialize one event in text/event-stream framing"""
+    lines = []
+    if payload.get("id") is not None:
+        lines.append(f"id: {payload['id']}")
+    lines.append(f"event: {event_type or payload.get('type', 'message')}")
+    lines.append(f"data: {json.dumps(payload, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+class EventBroadcaster:
+    def __init__(self, session_factory, channel, fallback_interval: float = 2.0, queue_size: int = 1000):
+        self.session_factory = session_factory
+        self.channel = channel
+        self.fallback_interval = fallback_interval
+        self.queue_size = queue_size
+        self.logger = logger_manager
+        self._subscribers: Set[queue.Queue] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._last_id = 0
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def _ensure_started(self):
+        # Started lazily (and again after fork) so every gunicorn worker gets its own thread
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                if self._pid != os.getpid():
+                    # Streams inherited across fork belong to the parent; a restarted
+                    # thread in the same worker keeps serving the open ones
+                    self._pid = os.getpid()
+                    self._subscribers = set()
+                    self._last_id = self.latest_id()
+                self._thread = threading.Thread(target=self._run, name="event-broadcaster", daemon=True)
+                self._thread.start()
+
+    def subscribe(self) -> queue.Queue:
+        """Register a stream; new events are put on the returned queue (None = too slow, reconnect)"""
+        self._ensure_started()
+        subscription: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: queue.Queue):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def notify(self, signal_channel: bool = True):
+        """Called after a commit that wrote submission events"""
+        self._wake.set()
+        if signal_channel:
+            self.channel.signal()
+
+    def latest_id(self) -> int:
+        db = self.session_factory()
+        try:
+            return db.query(func.max(SubmissionEvent.id)).scalar() or 0
+        finally:
+            db.close()
+
+    def fetch_after(self, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        db = self.session_factory()
+        try:
+            rows = (db.query(SubmissionEvent).filter(SubmissionEvent.id > after_id)
+                    .order_by(SubmissionEvent.id).limit(limit).all())
+            return [row.to_dict() for row in rows]
+        finally:
+            db.close()
+
+    def replay(self, after_id: int, limit: int = 500) -> Optional[List[Dict[str, Any]]]:
+        """Events missed since `after_id`, or None when the gap is too large to replay"""
+        events = self.fetch_after(after_id, limit + 1)
+        return None if len(events) > limit else events
+
+    def _dispatch(self):
+        while True:
+            events = self.fetch_after(self._last_id, 500)
+            if not events:
+                return
+            self._last_id = events[-1]["id"]
+            with self._lock:
+                subscribers = list(self._subscribers)
+            for subscription in subscribers:
+                for payload in events:
+                    try:
+                        subscription.put_nowait(payload)
+                    except queue.Full:
+                        # Slow consumer: drop it, the client reconnects with Last-Event-ID
+                        self.unsubscribe(subscription)
+                        self._drain(subscription)
+                        subscription.put_nowait(None)
+                        break
+            if len(events) < 500:
+                return
+
+    @staticmethod
+    def _drain(subscription: queue.Queue):
+        try:
+            while True:
+                subscription.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _run(self):
+        while True:
+            try:
+                self.channel.wait(self._wake, self.fallback_interval)
+                self._wake.clear()
+                self._dispatch()
+            except Exception as e:
+                self.logger.logger.error(f"Event broadcaster error: {e}")
+                time.sleep(self.fallback_interval)
+
+class EventRetention:
+    """Background thread deleting submission events that fell out of the replay window"""
+
+    def __init__(self, engine, keep: int, retention_hours: float, check_seconds: float = 300):
+        self.engine = engine
+        self.keep = keep
+        self.retention_hours = retention_hours
+        self.check_seconds = check_seconds
+        self._pid = None
+        self._stop = threading.Event()
+
+    def prune(self) -> int:
+        """Delete events older than the retention that are not among the newest `keep`; returns the number removed"""
+        table = SubmissionEvent.__table__
+        cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+        with self.engine.begin() as conn:
+            newest = conn.execute(select(func.max(table.c.id))).scalar()
+            if newest is None:
+                return 0
+            # The newest row always stays: ids keep growing, so Last-Event-ID and replica positions stay valid
+            return conn.execute(delete(table).where(table.c.id <= newest - max(self.keep, 1),
+                                                    table.c.created_at < cutoff)).rowcount
+
+    def _loop(self):
+        while not self._stop.wait(self.check_seconds):
+            try:
+                self.prune()
+            except Exception as e:
+                logger_manager.logger.error(f"Pruning submission events failed: {e}")
+
+    def start(self):
+        """Start the thread once per process (SSE_EVENT_RETENTION_HOURS=0 keeps every event)"""
+        if self.retention_hours <= 0 or self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        threading.Thread(target=self._loop, name="event-retention", daemon=True).start()
+
+event_retention = EventRetention(engine, settings.sse_replay_limit, settings.sse_event_retention_hours)
+
+# Create global event broadcaster instance
+event_broadcaster = EventBroadcaster(
+    ReadSessionLocal,
+    build_channel(),
+    fallback_interval=settings.sse_fallback_poll_seconds
+)
+
+def _track_submission_writes(session, flush_context, instances):
+    if any(isinstance(obj, EVENT_MODELS) for obj in list(session.new) + list(session.deleted)):
+        session.info["submission_events"] = True
+
+def _notify_in_transaction(session, flush_context):
+    # On PostgreSQL the NOTIFY rides on the session's own connection, so AsyncSession
+    # commits (asgi.py) never run a blocking psycopg2 round trip on the event loop
+    if session.info.get("submission_events") and event_broadcaster.channel.transactional:
+        event_broadcaster.channel.signal_in(session.connection())
+
+def _signal_after_commit(session):
+    if session.info.pop("submission_events", False):
+        event_broadcaster.notify(signal_channel=not event_broadcaster.channel.transactional)
+
+def _clear_after_rollback(session, previous_transaction):
+    session.info.pop("submission_events", None)
+
+# Applies to every ORM session, including the ones behind AsyncSession (asgi.py)
+event.listen(Session, "before_flush", _track_submission_writes)
+event.listen(Session, "after_flush", _notify_in_transaction)
+event.listen(Session, "after_commit", _signal_after_commit)
+event.listen(Session, "after_soft_rollback", _clear_after_rollback)
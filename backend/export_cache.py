@@ -0,0 +1,124 @@
+"""
+Versioned on-disk cache of generated export files.
+
+Files live under settings.data_dir/exports and are keyed by export kind,
+format and table version (row count, max id and max updated_at), so a
+repeat export of an unchanged table is served straight from disk: no row
+fetch and no workbook generation. The total size is bounded with LRU
+eviction. Recency is the file's atime (set explicitly on every hit), so the
+mtime, and with it Last-Modified, stays the build time.
+
+Entries are handed out as open file handles: another worker may replace or
+evict the file at any moment, and an already opened file stays readable.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional
+
+from sqlalchemy import func
+
+from config import settings
+from logger import logger_manager
+
+def table_version(db, model) -> str:
+    """Cheap fingerprint of a table's contents (one aggregate query).
+
+    Writes that change exported columns must bump updated_at: ORM and Core
+    update() statements do through the column's onupdate, raw SQL has to set it.
+    """
+    count, max_id, max_updated = db.query(
+        func.count(model.id), func.max(model.id), func.max(model.updated_at)
+    ).one()
+    raw = f"{count}:{max_id}:{max_updated}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+class ExportCache:
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.logger = logger_manager
+        self._lock = threading.Lock()
+
+    def path_for(self, kind: str, fmt: str, version: str) -> Path:
+        return self.root / f"{kind}-{version}.{fmt}"
+
+    def lookup(self, kind: str, fmt: str, version: str) -> Optional[BinaryIO]:
+        """Open the cached file, or None on a miss"""
+        path = self.path_for(kind, fmt, version)
+        try:
+            handle = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        try:
+            # LRU: mark as recently used without touching the mtime
+            os.utime(path, ns=(time.time_ns(), os.fstat(handle.fileno()).st_mtime_ns))
+        except OSError:
+            pass
+        return handle
+
+    def get_or_build(self, kind: str, fmt: str, version: str, build: Callable[[Path], None]) -> BinaryIO:
+        """Open the cached file for (kind, fmt, version), building it on a miss"""
+        cached = self.lookup(kind, fmt, version)
+        if cached is not None:
+            return cached
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(kind, fmt, version)
+        with self._lock:
+            cached = self.lookup(kind, fmt, version)
+            if cached is not None:
+                return cached
+            # Build into a temp file and rename, so concurrent workers never serve a partial file
+            fd, tmp_name = tempfile.mkstemp(dir=self.root, prefix=f".{kind}-", suffix=f".{fmt}")
+            os.close(fd)
+            try:
+                build(Path(tmp_name))
+                os.replace(tmp_name, path)
+            except Exception:
+                if os.path.exists(tmp_name):
+                    os.unlink(tmp_name)
+                raise
+            handle = open(path, "rb")
+            self._drop_stale(kind, fmt, keep=path)
+            self.evict(keep=path)
+        return handle
+
+    def _drop_stale(self, kind: str, fmt: str, keep: Path):
+        """Older versions of the same export can never be served again"""
+        for old in self.root.glob(f"{kind}-*.{fmt}"):
+            if old != keep:
+                old.unlink(missing_ok=True)
+
+    def evict(self, keep: Optional[Path] = None):
+        """Remove least recently used files (except `keep`) until the cache fits in max_bytes"""
+        files = []
+        for entry in self.root.glob("*-*.*"):
+            if entry.name.startswith(".") or entry == keep:
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((max(stat.st_atime, stat.st_mtime), stat.st_size, entry))
+
+        total = sum(size for _, size, _ in files)
+        if keep is not None and keep.exists():
+            total += keep.stat().st_size
+        for _, size, entry in sorted(files):
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+            self.logger.logger.info(f"Export cache evicted {entry.name}")
+
+    def clear(self):
+        for entry in self.root.glob("*"):
+            if entry.is_file():
+                entry.unlink(missing_ok=True)
+
+# Create global export cache instance
+export_cache = ExportCache(settings.export_cache_dir, settings.export_cache_max_bytes)
@@ -0,0 +1,282 @@
+"""
+Background export jobs.
+
+Building a large Excel export is CPU-bound (openpyxl) and used to tie up a
+request worker for its whole duration, long enough for proxies to time the
+download out. Export jobs move the build out of the request:
+
+    POST   /api/admin/export-jobs               {"kind": "registrations", "since": ..., "format": ...}
+    GET    /api/admin/export-jobs/<id>          status and row progress
+    GET    /api/admin/export-jobs/<id>/result   the file, once done
+    DELETE /api/admin/export-jobs/<id>          cancel (or discard a finished result)
+
+Jobs are export_jobs rows, so any worker answers for any job. Each worker
+submits its jobs to its own ProcessPoolExecutor of EXPORT_JOB_WORKERS
+processes (spawned, not forked, since workers run threads); at most
+EXPORT_JOB_MAX_ACTIVE jobs may be queued or running at once. The pool process
+reads the rows itself and every EXPORT_JOB_PROGRESS_ROWS rows records its
+progress, which is also where it notices a cancellation. Results are written
+under EXPORT_JOBS_DIR and removed EXPORT_JOB_TTL_SECONDS after the job
+finished. A job that stopped reporting for EXPORT_JOB_STALE_SECONDS (its
+worker was restarted) is marked failed.
+"""
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from config import settings
+from exports import EXPORTS, query_rows, write_rows
+from logger import logger_manager
+from models import ExportJob
+
+QUEUED = "queued"
+RUNNING = "running"
+CANCELLING = "cancelling"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+EXPIRED = "expired"
+ACTIVE = (QUEUED, RUNNING, CANCELLING)
+FINISHED = (DONE, FAILED, CANCELLED)
+
+class JobLimitError(Exception):
+    """Too many export jobs queued or running"""
+
+class JobCancelled(Exception):
+    pass
+
+def _stamp(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+def describe(job: ExportJob, now: Optional[datetime] = None) -> Dict:
+    """Public view of a job"""
+    status = job.status
+    if status == DONE and job.expires_at and job.expires_at <= (now or datetime.utcnow()):
+        status = EXPIRED  # not swept yet
+    url = f"/api/admin/export-jobs/{job.id}"
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "format": job.fmt,
+        "since": job.since,
+        "status": status,
+        "rows_done": job.rows_done,
+        "rows_total": job.rows_total,
+        "progress": round(100.0 * job.rows_done / job.rows_total, 1) if job.rows_total else None,
+        "error": job.error,
+        "created_at": _stamp(job.created_at),
+        "started_at": _stamp(job.started_at),
+        "finished_at": _stamp(job.finished_at),
+        "expires_at": _stamp(job.expires_at),
+        "status_url": url,
+        "result_url": f"{url}/result" if status == DONE else None,
+    }
+
+class ExportJobs:
+    def __init__(self, engine, read_engine, root: Path, workers: int, max_active: int, ttl_seconds: int,
+                 progress_rows: int, stale_seconds: int):
+        self.engine = engine
+        self.read_engine = read_engine
+        self.root = Path(root)
+        self.workers = workers
+        self.max_active = max_active
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.progress_rows = max(1, progress_rows)
+        self.stale = timedelta(seconds=stale_seconds)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    # Request side
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, kind: str, fmt: str, since: Optional[str] = None) -> Dict:
+        """Queue a job and hand it to the pool; raises JobLimitError when too many are active"""
+        self.sweep()
+        now = datetime.utcnow()
+        with Session(self.engine) as db:
+            active = db.query(func.count(ExportJob.id)).filter(ExportJob.status.in_(ACTIVE)).scalar()
+            if active >= self.max_active:
+                raise JobLimitError(f"{active} export jobs are already queued or running")
+            job = ExportJob(id=uuid.uuid4().hex, kind=kind, fmt=fmt, since=since, status=QUEUED, rows_done=0,
+                            created_at=now, heartbeat_at=now)
+            db.add(job)
+            db.commit()
+            info = describe(job, now)
+        try:
+            future = self._pool().submit(run_job, info["id"])
+        except Exception as e:
+            self._finish(info["id"], FAILED, (QUEUED,), error=f"Could not start the export: {e}")
+            raise
+        future.add_done_callback(lambda done, job_id=info["id"]: self._on_done(job_id, done))
+        return info
+
+    def _on_done(self, job_id: str, future: Future):
+        error = future.exception()
+        if error is None:
+            return
+        # The pool process died (killed, out of memory): the pool is unusable from now on
+        logger_manager.logger.error(f"Export job {job_id} lost its process: {error!r}")
+        self._finish(job_id, FAILED, ACTIVE, error=f"Export process failed: {error!r}")
+        with self._lock:
+            if self._executor is not None and getattr(self._executor, "_broken", False):
+                self._executor = None
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with Session(self.engine) as db:
+            job = db.get(ExportJob, job_id)
+            return describe(job) if job else None
+
+    def result_path(self, job_id: str) -> Optional[Path]:
+        """The result file of a finished, unexpired job"""
+        with Session(self.engine) as db:
+            job = db.get(ExportJob, job_id)
+            if job is None or job.path is None or describe(job)["status"] != DONE:
+                return None
+            return self.root / job.path
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Cancel a queued or running job, or discard the result of a finished one"""
+        now = datetime.utcnow()
+        table = ExportJob.__table__
+        with self.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.id == job_id, table.c.status == QUEUED)
+                         .values(status=CANCELLED, finished_at=now, expires_at=now + self.ttl))
+            conn.execute(table.update().where(table.c.id == job_id, table.c.status == RUNNING)
+                         .values(status=CANCELLING))  # the pool process stops at its next progress report
+            path = conn.execute(select(table.c.path).where(table.c.id == job_id, table.c.status == DONE)).scalar()
+            if path:
+                conn.execute(table.update().where(table.c.id == job_id)
+                             .values(status=EXPIRED, path=None, expires_at=now))
+        if path:
+            (self.root / path).unlink(missing_ok=True)
+        return self.get(job_id)
+
+    def sweep(self) -> int:
+        """Fail stale jobs, remove expired results and forget long expired jobs; returns the results removed"""
+        now = datetime.utcnow()
+        table = ExportJob.__table__
+        with self.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.status.in_((RUNNING, CANCELLING)),
+                                              table.c.heartbeat_at < now - self.stale)
+                         .values(status=FAILED, error="The export process stopped reporting progress",
+                                 finished_at=now, expires_at=now + self.ttl))
+            conn.execute(table.update().where(table.c.status == QUEUED, table.c.created_at < now - self.stale)
+                         .values(status=FAILED, error="The export never started (its worker was restarted)",
+                                 finished_at=now, expires_at=now + self.ttl))
+            expired = conn.execute(select(table.c.id, table.c.path).where(table.c.status.in_(FINISHED),
+                                                                          table.c.expires_at <= now)).all()
+            if expired:
+                conn.execute(table.update().where(table.c.id.in_([row.id for row in expired]))
+                             .values(status=EXPIRED, path=None))
+            conn.execute(table.delete().where(table.c.status == EXPIRED, table.c.expires_at <= now - self.ttl))
+        for row in expired:
+            if row.path:
+                (self.root / row.path).unlink(missing_ok=True)
+        if self.root.exists():
+            for partial in self.root.glob("*.part"):  # left behind by a killed pool process
+                try:
+                    if datetime.utcfromtimestamp(partial.stat().st_mtime) < now - self.stale:
+                        partial.unlink()
+                except FileNotFoundError:
+                    pass
+        return sum(1 for row in expired if row.path)
+
+    def status(self) -> Dict[str, int]:
+        """Job count per status (for /api/health)"""
+        with self.engine.connect() as conn:
+            return dict(conn.execute(select(ExportJob.status, func.count()).group_by(ExportJob.status)).all())
+
+    # Pool process side
+
+    def _finish(self, job_id: str, status: str, from_states, **values) -> bool:
+        now = datetime.utcnow()
+        table = ExportJob.__table__
+        with self.engine.begin() as conn:
+            return conn.execute(table.update().where(table.c.id == job_id, table.c.status.in_(from_states)).values(
+                status=status, finished_at=now, expires_at=now + self.ttl, **values,
+            )).rowcount > 0
+
+    def _report(self, job_id: str, rows_done: int):
+        table = ExportJob.__table__
+        with self.engine.begin() as conn:
+            updated = conn.execute(table.update().where(table.c.id == job_id, table.c.status == RUNNING)
+                                   .values(rows_done=rows_done, heartbeat_at=datetime.utcnow())).rowcount
+        if not updated:
+            raise JobCancelled(job_id)
+
+    def tracked(self, job_id: str, rows: Iterable) -> Iterator:
+        """Pass rows through, recording progress (and checking for cancellation) every `progress_rows` rows"""
+        done = 0
+        for obj in rows:
+            yield obj
+            done += 1
+            if done % self.progress_rows == 0:
+                self._report(job_id, done)
+        self._report(job_id, done)
+
+    def run(self, job_id: str) -> str:
+        """Build one job's file; returns the job's final status"""
+        now = datetime.utcnow()
+        table = ExportJob.__table__
+        with self.engine.begin() as conn:
+            claimed = conn.execute(table.update().where(table.c.id == job_id, table.c.status == QUEUED)
+                                   .values(status=RUNNING, started_at=now, heartbeat_at=now)).rowcount
+            job = conn.execute(select(table).where(table.c.id == job_id)).one()
+        if not claimed:
+            return job.status  # cancelled while queued
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        name = f"{job_id}.{job.fmt}"
+        partial = self.root / f"{name}.part"
+        db = Session(self.read_engine)
+        try:
+            rows = query_rows(db, EXPORTS[job.kind], job.since)
+            total = rows.order_by(None).count()
+            with self.engine.begin() as conn:
+                conn.execute(table.update().where(table.c.id == job_id).values(rows_total=total))
+            write_rows(job.kind, job.fmt, partial, self.tracked(job_id, rows))
+            os.replace(partial, self.root / name)
+            if self._finish(job_id, DONE, (RUNNING,), path=name):
+                return DONE
+            (self.root / name).unlink(missing_ok=True)  # cancelled while the file was being saved
+            raise JobCancelled(job_id)
+        except JobCancelled:
+            partial.unlink(missing_ok=True)
+            self._finish(job_id, CANCELLED, (RUNNING, CANCELLING))
+            return CANCELLED
+        except Exception as e:
+            logger_manager.logger.error(f"Export job {job_id} ({job.kind}) failed: {e}")
+            partial.unlink(missing_ok=True)
+            self._finish(job_id, FAILED, (RUNNING, CANCELLING), error=str(e)[:1000])
+            return FAILED
+        finally:
+            db.close()
+
+def _global_jobs() -> ExportJobs:
+    from models import engine, read_engine
+
+    return ExportJobs(engine, read_engine, settings.export_jobs_dir, settings.export_job_workers,
+                      settings.export_job_max_active, settings.export_job_ttl_seconds,
+                      settings.export_job_progress_rows, settings.export_job_stale_seconds)
+
+export_jobs = _global_jobs()
+
+def run_job(job_id: str) -> str:
+    """Pool entry point (module level, so the spawned process can import it)"""
+    return export_jobs.run(job_id)
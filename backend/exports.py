@@ -0,0 +1,204 @@
+"""
+Export builders for the admin "export" buttons.
+
+Each export kind describes its columns once; the same description is used to
+write the styled Excel workbook (openpyxl) or the CSV fallback. Machine
+consumers get NDJSON instead, streamed lazily from a server-side cursor.
+"""
+import csv
+import json
+import zlib
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import desc
+
+from models import Contact, Registration, Requirements, SystemLog
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_MIMETYPE = 'text/csv'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Tables available as machine-readable NDJSON (one to_dict() object per line)
+NDJSON_MODELS = {
+    "registrations": Registration,
+    "requirements": Requirements,
+    "contacts": Contact,
+    "system_logs": SystemLog,
+}
+
+def _text(value) -> Any:
+    return value or ""
+
+def _timestamp(value) -> str:
+    return str(value) if value else ""
+
+@dataclass
+class ExportSpec:
+    model: Any
+    sheet_title: str
+    header_color: str
+    filename: str
+    columns: List[Tuple[str, Callable[[Any], Any]]]
+
+    @property
+    def headers(self) -> List[str]:
+        return [header for header, _ in self.columns]
+
+    def row(self, obj) -> list:
+        return [getter(obj) for _, getter in self.columns]
+
+EXPORTS = {
+    "registrations": ExportSpec(
+        model=Registration,
+        sheet_title="Piano Registrations",
+        header_color="2E86C1",
+        filename="piano_registrations",
+        columns=[
+            ("ID", lambda r: r.id),
+            ("Manufacturer", lambda r: _text(r.manufacturer)),
+            ("Model", lambda r: _text(r.model)),
+            ("Serial #", lambda r: _text(r.serial)),
+            ("Year", lambda r: _text(r.year)),
+            ("Type", lambda r: _text(r.height)),  # Type stored in height column
+            ("Height", lambda r: _text(r.height)),  # Height/Length (if available)
+            ("Finish", lambda r: _text(r.finish)),
+            ("Condition", lambda r: _text(r.finish)),  # Condition stored in finish column
+            ("Color/Wood", lambda r: _text(r.color_wood)),
+            ("City/State", lambda r: _text(r.city_state)),
+            ("Access", lambda r: _text(r.access)),
+            ("IP Address", lambda r: _text(r.ip_address)),
+            ("Created At", lambda r: _timestamp(r.created_at)),
+            ("Updated At", lambda r: _timestamp(r.updated_at)),
+        ],
+    ),
+    "requirements": ExportSpec(
+        model=Requirements,
+        sheet_title="Requirements",
+        header_color="28B463",
+        filename="requirements",
+        columns=[
+            ("ID", lambda r: r.id),
+            ("School Name", lambda r: _text(r.school_name)),
+            ("Current Pianos", lambda r: _text(r.current_pianos)),
+            ("Preferred Type", lambda r: _text(r.preferred_type)),
+            ("Teacher Name", lambda r: _text(r.teacher_name)),
+            ("Background", lambda r: _text(r.background)),
+            ("Commitment", lambda r: _text(r.commitment)),
+            ("IP Address", lambda r: _text(r.ip_address)),
+            ("Created At", lambda r: _timestamp(r.created_at)),
+            ("Updated At", lambda r: _timestamp(r.updated_at)),
+        ],
+    ),
+}
+
+def excel_available() -> bool:
+    try:
+        import openpyxl  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def default_format() -> str:
+    """xlsx when openpyxl is installed, otherwise the CSV fallback"""
+    if excel_available():
+        return "xlsx"
+    print("WARNING: openpyxl not available, falling back to CSV export")
+    return "csv"
+
+def mimetype_for(fmt: str) -> str:
+    return XLSX_MIMETYPE if fmt == "xlsx" else CSV_MIMETYPE
+
+def query_rows(db, spec: ExportSpec, since: Optional[str] = None):
+    """All rows of the export (newest first), or only rows changed after `since`, streamed in chunks"""
+    if since:
+        from changes import changed_since
+
+        return changed_since(db.query(spec.model), spec.model, db.bind.dialect.name, since).yield_per(1000)
+    return db.query(spec.model).order_by(desc(spec.model.created_at)).yield_per(1000)
+
+def write_xlsx(spec: ExportSpec, rows, output) -> None:
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = spec.sheet_title
+
+    # Header styling
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color=spec.header_color, end_color=spec.header_color, fill_type="solid")
+
+    widths = [len(header) for header in spec.headers]
+    for col_num, header in enumerate(spec.headers, 1):
+        cell = ws.cell(row=1, column=col_num, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+
+    for obj in rows:
+        values = spec.row(obj)
+        ws.append(values)
+        for index, value in enumerate(values):
+            widths[index] = max(widths[index], len(str(value)))
+
+    # Auto-adjust column widths
+    for index, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(index)].width = min(width + 2, 50)  # Max width 50
+
+    wb.save(output)
+
+def write_csv(spec: ExportSpec, rows, output) -> None:
+    writer = csv.writer(output)
+    writer.writerow(spec.headers)
+    for obj in rows:
+        writer.writerow(spec.row(obj))
+
+def write_export(db, kind: str, fmt: str, path, since: Optional[str] = None) -> None:
+    """Write the `kind` export in `fmt` to `path`"""
+    write_rows(kind, fmt, path, query_rows(db, EXPORTS[kind], since))
+
+def write_rows(kind: str, fmt: str, path, rows) -> None:
+    """Write model objects from any source (table query, archive segments) as the `kind` export"""
+    spec = EXPORTS[kind]
+    if fmt == "xlsx":
+        with open(path, "wb") as output:
+            write_xlsx(spec, rows, output)
+    else:
+        with open(path, "w", newline="", encoding="utf-8") as output:
+            write_csv(spec, rows, output)
+
+def iter_ndjson(db, model, batch_size: int = 1000, since: Optional[str] = None) -> Iterator[str]:
+    """Yield one JSON line per row in id order (watermark order with `since`), `batch_size` rows at a time"""
+    if since:
+        from changes import changed_since
+
+        query = changed_since(db.query(model), model, db.bind.dialect.name, since)
+    else:
+        query = db.query(model).order_by(model.id)
+    query = query.execution_options(stream_results=True).yield_per(batch_size)  # server-side cursor on PostgreSQL
+    for obj in query:
+        yield json.dumps(obj.to_dict(), ensure_ascii=False) + "\n"
+
+def iter_chunks(lines: Iterable[str], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Coalesce small lines into ~chunk_size byte chunks for the socket"""
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode("utf-8")
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+def iter_gzip(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip-compress a byte stream incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,335 @@
+"""
+Offline location normalization and a geohash grid index.
+
+Free-text locations ("Brooklyn, NY", "St. Louis, Missouri", "Lincoln High,
+Austin TX") are resolved against the bundled gazetteer (gazetteer.csv: US
+cities plus state centroids, no network) to coordinates, stored on each
+registration/requirement together with the geohash cell of the point. The
+cell column is indexed, so a radius or nearest-N query only reads the 3x3
+block of cells around the origin at the coarsest precision that covers the
+radius, and the exact distance check runs on those few rows.
+
+Rows stored before locations existed are resolved with:
+
+    python backend/geo.py --backfill
+"""
+import argparse
+import csv
+import math
+import re
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, event, or_, select
+
+from config import settings
+from models import Registration, Requirements
+
+US_STATES = {
+    "alabama": "al", "alaska": "ak", "arizona": "az", "arkansas": "ar", "california": "ca",
+    "colorado": "co", "connecticut": "ct", "delaware": "de", "district of columbia": "dc",
+    "florida": "fl", "georgia": "ga", "hawaii": "hi", "idaho": "id", "illinois": "il",
+    "indiana": "in", "iowa": "ia", "kansas": "ks", "kentucky": "ky", "louisiana": "la",
+    "maine": "me", "maryland": "md", "massachusetts": "ma", "michigan": "mi", "minnesota": "mn",
+    "mississippi": "ms", "missouri": "mo", "montana": "mt", "nebraska": "ne", "nevada": "nv",
+    "new hampshire": "nh", "new jersey": "nj", "new mexico": "nm", "new york": "ny",
+    "north carolina": "nc", "north dakota": "nd", "ohio": "oh", "oklahoma": "ok", "oregon": "or",
+    "pennsylvania": "pa", "rhode island": "ri", "south carolina": "sc", "south dakota": "sd",
+    "tennessee": "tn", "texas": "tx", "utah": "ut", "vermont": "vt", "virginia": "va",
+    "washington": "wa", "west virginia": "wv", "wisconsin": "wi", "wyoming": "wy",
+}
+STATE_CODES = set(US_STATES.values())
+
+# Stored cell precision: 6 geohash characters is a cell of about 1.2 x 0.6 km
+CELL_PRECISION = 6
+EARTH_RADIUS_KM = 6371.0088
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+_STATE_CODE_PATTERN = re.compile(r",\s*([A-Za-z]{2})\b")
+_ALIASES = {"nyc": "new york", "sf": "san francisco", "la": "los angeles", "dc": "washington", "philly": "philadelphia"}
+_PREFIXES = {"st": "saint", "ste": "sainte", "ft": "fort", "mt": "mount"}
+
+def region_of(text: str) -> Optional[str]:
+    """US state code from 'City, ST' or a spelled-out state name"""
+    if not text:
+        return None
+    for code in _STATE_CODE_PATTERN.findall(text):
+        if code.lower() in STATE_CODES:
+            return code.lower()
+    lowered = text.lower()
+    for name in sorted(US_STATES, key=len, reverse=True):
+        if re.search(rf"\b{name}\b", lowered):
+            return US_STATES[name]
+    return None
+
+def normalize_place(text: str) -> str:
+    """'  St. Louis ' -> 'saint louis' (accents, case, punctuation and abbreviations folded)"""
+    folded = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii").casefold()
+    words = re.sub(r"[^a-z0-9]+", " ", folded).split()
+    if words and words[0] in _PREFIXES:
+        words[0] = _PREFIXES[words[0]]
+    place = " ".join(words)
+    return _ALIASES.get(place, place)
+
+# Geohash ----------------------------------------------------------------------
+
+def encode_geohash(latitude: float, longitude: float, precision: int = CELL_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        target, span = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (span[0] + span[1]) / 2
+        value <<= 1
+        if target >= middle:
+            value |= 1
+            span[0] = middle
+        else:
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+def cell_span(precision: int) -> Tuple[float, float]:
+    """(latitude degrees, longitude degrees) covered by one cell"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+def neighborhood(latitude: float, longitude: float, precision: int) -> List[str]:
+    """The cell containing the point, then its 8 neighbours (fewer at the poles)"""
+    lat_span, lon_span = cell_span(precision)
+    cells = [encode_geohash(latitude, longitude, precision)]
+    for dlat in (-1, 0, 1):
+        lat = latitude + dlat * lat_span
+        if not -90 <= lat <= 90:
+            continue
+        for dlon in (-1, 0, 1):
+            lon = (longitude + dlon * lon_span + 180) % 360 - 180
+            cell = encode_geohash(lat, lon, precision)
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+def covered_radius_km(latitude: float, precision: int) -> float:
+    """Distance from the point that the 3x3 block around it is guaranteed to cover"""
+    lat_span, lon_span = cell_span(precision)
+    widest = min(abs(latitude) + lat_span, 90.0)
+    return min(lat_span * 111.32, lon_span * 111.32 * math.cos(math.radians(widest)))
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle (haversine) distance"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlambda = phi2 - phi1, math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+# Gazetteer --------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Location:
+    latitude: float
+    longitude: float
+    level: str  # city | state
+    state: str
+    city: Optional[str] = None
+
+    @property
+    def cell(self) -> str:
+        return encode_geohash(self.latitude, self.longitude)
+
+class Gazetteer:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._cities: Optional[Dict[Tuple[str, str], Location]] = None
+        self._states: Dict[str, Location] = {}
+        self._by_name: Dict[str, List[Location]] = {}
+        self._longest = 1
+
+    def _load(self):
+        cities = {}
+        with open(self.path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                state = row["state"].strip().lower()
+                lat, lon = float(row["latitude"]), float(row["longitude"])
+                if not row["city"].strip():
+                    self._states[state] = Location(lat, lon, "state", state)
+                    continue
+                name = normalize_place(row["city"])
+                location = Location(lat, lon, "city", state, row["city"].strip())
+                cities[(name, state)] = location
+                # First listed wins for a bare city name, so the file lists larger cities first
+                self._by_name.setdefault(name, []).append(location)
+                self._longest = max(self._longest, len(name.split()))
+        self._cities = cities
+
+    @property
+    def cities(self) -> Dict[Tuple[str, str], Location]:
+        if self._cities is None:
+            self._load()
+        return self._cities
+
+    def _lookup(self, name: str, state: Optional[str]) -> Optional[Location]:
+        if state:
+            return self.cities.get((name, state))
+        matches = self._by_name.get(name)
+        return matches[0] if matches else None
+
+    def resolve(self, text: str) -> Optional[Location]:
+        """Best location for free text: a known city (in the named state if any), else the state"""
+        if not text or not text.strip():
+            return None
+        self.cities  # load on first use
+        state = region_of(text)
+
+        # Structured "City, ST" / "City, State": try each comma-separated part first
+        for part in text.split(","):
+            found = self._lookup(normalize_place(_strip_state(part)), state)
+            if found:
+                return found
+
+        if not state:
+            return None
+        # Free text naming a state ("Lincoln High School in Austin, Texas"): longest known
+        # city of that state wins; without a state, words like "mobile" are not places
+        words = normalize_place(text).split()
+        for size in range(min(self._longest, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                found = self._lookup(" ".join(words[start:start + size]), state)
+                if found:
+                    return found
+        return self._states.get(state)
+
+def _strip_state(part: str) -> str:
+    """Drop a trailing state code/name and zip code from one comma-separated part"""
+    cleaned = re.sub(r"\b\d{5}(?:-\d{4})?\b", " ", part).strip()
+    lowered = cleaned.lower()
+    for name in sorted(US_STATES, key=len, reverse=True):
+        if lowered.endswith(" " + name) or lowered == name:
+            return cleaned[:len(cleaned) - len(name)]
+    match = re.search(r"\s([A-Za-z]{2})$", cleaned)
+    if match and match.group(1).lower() in STATE_CODES:
+        return cleaned[:match.start()]
+    if cleaned.lower() in STATE_CODES:
+        return ""
+    return cleaned
+
+gazetteer = Gazetteer(settings.gazetteer_path)
+
+# Storage ----------------------------------------------------------------------
+
+def location_text(model, values: Dict) -> str:
+    """The free text a record's location is read from"""
+    if model is Registration:
+        return values.get("city_state") or ""
+    return f"{values.get('school_name') or ''}, {values.get('background') or ''}"
+
+def location_columns(model, values: Dict) -> Dict:
+    """latitude/longitude/geo_cell/geo_level for a row about to be inserted"""
+    if model not in (Registration, Requirements):
+        return {}
+    location = gazetteer.resolve(location_text(model, values))
+    if location is None:
+        return {"latitude": None, "longitude": None, "geo_cell": None, "geo_level": None}
+    return {"latitude": location.latitude, "longitude": location.longitude,
+            "geo_cell": location.cell, "geo_level": location.level}
+
+def _before_insert(mapper, connection, target):
+    if target.geo_cell is not None:
+        return  # already resolved by the caller (DatabaseManager.insert_row)
+    values = {column: getattr(target, column, None) for column in ("city_state", "school_name", "background")}
+    for column, value in location_columns(type(target), values).items():
+        setattr(target, column, value)
+
+for _model in (Registration, Requirements):
+    event.listen(_model, "before_insert", _before_insert)
+
+# Queries ----------------------------------------------------------------------
+
+def _cell_filter(model, cells: List[str]):
+    # A geohash prefix is a contiguous key range, so each cell is one index range scan
+    return or_(*[and_(model.geo_cell >= cell, model.geo_cell < cell + "~") for cell in cells])
+
+def _candidates(db, model, latitude: float, longitude: float, precision: Optional[int], exclude_id=None):
+    query = db.query(model)
+    if precision is None:
+        query = query.filter(model.geo_cell.isnot(None))
+    else:
+        query = query.filter(_cell_filter(model, neighborhood(latitude, longitude, precision)))
+    if exclude_id is not None:
+        query = query.filter(model.id != exclude_id)
+    return [(distance_km(latitude, longitude, row.latitude, row.longitude), row) for row in query.all()]
+
+def precision_for_radius(latitude: float, radius_km: float) -> Optional[int]:
+    """Finest cell precision whose 3x3 block still covers the radius (None: scan everything)"""
+    for precision in range(CELL_PRECISION, 0, -1):
+        if covered_radius_km(latitude, precision) >= radius_km:
+            return precision
+    return None
+
+def within_radius(db, model, latitude: float, longitude: float, radius_km: float,
+                  limit: int = 50, exclude_id: Optional[int] = None) -> List[Tuple[float, object]]:
+    """Rows of `model` within radius_km of the point, nearest first"""
+    precision = precision_for_radius(latitude, radius_km)
+    found = [item for item in _candidates(db, model, latitude, longitude, precision, exclude_id)
+             if item[0] <= radius_km]
+    return sorted(found, key=lambda item: (item[0], item[1].id))[:limit]
+
+def nearest(db, model, latitude: float, longitude: float, limit: int = 10,
+            exclude_id: Optional[int] = None) -> List[Tuple[float, object]]:
+    """The `limit` rows of `model` closest to the point, widening the cell block until it is exact"""
+    for precision in range(CELL_PRECISION, 0, -1):
+        found = sorted(_candidates(db, model, latitude, longitude, precision, exclude_id),
+                       key=lambda item: (item[0], item[1].id))
+        # Rows beyond the covered radius may be beaten by rows in cells outside the block
+        exact = [item for item in found if item[0] <= covered_radius_km(latitude, precision)]
+        if len(exact) >= limit:
+            return exact[:limit]
+    found = _candidates(db, model, latitude, longitude, None, exclude_id)
+    return sorted(found, key=lambda item: (item[0], item[1].id))[:limit]
+
+def backfill_locations(engine, chunk_size: int = 1000, log=print) -> Dict[str, int]:
+    """Resolve locations of existing rows in id order, one chunk per transaction"""
+    stats = {}
+    for model in (Registration, Requirements):
+        table = model.__table__
+        source = [table.c.city_state] if model is Registration else [table.c.school_name, table.c.background]
+        stats[model.__tablename__] = resolved = 0
+        last_id = 0
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(
+                    select(table.c.id, *source).where(table.c.id > last_id).order_by(table.c.id).limit(chunk_size)
+                ).all()
+                if not rows:
+                    break
+                for row in rows:
+                    columns = location_columns(model, dict(row._mapping))
+                    conn.execute(table.update().where(table.c.id == row.id).values(**columns))
+                    resolved += columns["geo_cell"] is not None
+            last_id = rows[-1].id
+        stats[model.__tablename__] = resolved
+        log(f"Resolved {resolved} {model.__tablename__} locations")
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resolve submission locations with the bundled gazetteer")
+    parser.add_argument("--backfill", action="store_true", help="resolve rows stored before locations existed")
+    parser.add_argument("--resolve", metavar="TEXT", help="print the location of one free-text place")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.resolve:
+        print(gazetteer.resolve(args.resolve))
+    if args.backfill:
+        from models import create_tables, engine
+
+        create_tables()
+        backfill_locations(engine, args.chunk_size)
+        print("Run `python backend/matching.py --rebuild` to refresh proximity matches")
+    if not (args.backfill or args.resolve):
+        parser.print_help()
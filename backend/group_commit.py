@@ -0,0 +1,131 @@
+"""
+Group-commit write path for public form submissions.
+
+A single writer thread per process collects inserts that arrive within a few
+milliseconds of each other and commits them in one transaction, so a burst of
+N submissions costs one fsync instead of N. Generated ids come back from the
+INSERT itself (RETURNING on PostgreSQL, lastrowid on SQLite) rather than a
+follow-up SELECT, and each caller's future is completed with its row id.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from logger import logger_manager
+from models import encode_user_agent, record_submission_event
+from outbox import UPSERT, enqueue as enqueue_outbox
+from rollups import apply_insert as apply_rollup_insert
+
+class GroupCommitWriter:
+    def __init__(self, engine, max_batch: int = 64, max_wait: float = 0.005, on_commit=None):
+        self.engine = engine
+        self.on_commit = on_commit
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.logger = logger_manager
+        self._queue: "queue.Queue[Optional[Tuple[Any, Dict[str, Any], Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # (Re)start lazily so the thread also exists in forked gunicorn workers
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, model, values: Dict[str, Any]) -> Future:
+        """Queue one row for insertion; the future resolves to its primary key"""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((model, values, future))
+        return future
+
+    def insert(self, model, values: Dict[str, Any], timeout: float = 30) -> int:
+        """Insert one row through the group commit and wait for its id"""
+        return self.submit(model, values).result(timeout=timeout)
+
+    def stop(self, timeout: float = 5):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _collect(self, first) -> Tuple[List, bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, stopping = self._collect(first)
+            self._commit_batch(batch)
+            if stopping:
+                return
+
+    def _insert(self, conn, model, values) -> int:
+        result = conn.execute(model.__table__.insert().values(**encode_user_agent(conn, values)))
+        new_id = result.inserted_primary_key[0]
+        # Core inserts bypass the ORM hooks, so store the user agent, log the submission event, rollups and outbox explicitly
+        record_submission_event(conn, "created", model.__tablename__, new_id)
+        apply_rollup_insert(conn, model, new_id, result.last_inserted_params())
+        enqueue_outbox(conn, UPSERT, model.__tablename__, new_id, values)
+        return new_id
+
+    def _commit_batch(self, batch: List[Tuple[Any, Dict[str, Any], Future]]):
+        pending = [(model, values, future) for model, values, future in batch
+                   if future.set_running_or_notify_cancel()]
+        if not pending:
+            return
+        try:
+            with self.engine.begin() as conn:
+                ids = [self._insert(conn, model, values) for model, values, _ in pending]
+        except Exception as e:
+            self.logger.log_database_error("group_commit", e)
+            if len(pending) > 1:
+                # Isolate the failing row(s): fall back to one transaction per row
+                for item in pending:
+                    self._commit_single(*item)
+            else:
+                pending[0][2].set_exception(e)
+            return
+
+        if self.on_commit is not None:
+            self.on_commit()
+        for (_, _, future), new_id in zip(pending, ids):
+            future.set_result(new_id)
+        if len(pending) > 1:
+            self.logger.logger.debug(f"Group commit wrote {len(pending)} rows in one transaction")
+
+    def _commit_single(self, model, values, future: Future):
+        try:
+            with self.engine.begin() as conn:
+                new_id = self._insert(conn, model, values)
+        except Exception as e:
+            future.set_exception(e)
+            return
+        if self.on_commit is not None:
+            self.on_commit()
+        future.set_result(new_id)
@@ -0,0 +1,34 @@
+"""
+Gunicorn settings for Clavisnova.
+
+The app is imported once in the master (preload) and the schema check runs
+there before any worker is forked, so workers share the imported modules
+copy-on-write and start serving immediately. Each worker drops the pooled DB
+connections it inherited from the master. GUNICORN_PRELOAD=false turns
+preloading off (each worker then imports the app itself).
+
+Run with (from the backend directory):
+    gunicorn -c gunicorn.conf.py -b 0.0.0.0:$PORT main:app
+"""
+import os
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+def when_ready(server):
+    """Run the once-per-deploy startup in the master, then close its DB connections."""
+    if not preload_app:
+        return  # each worker runs it on its first request instead
+    import main
+    import models
+
+    main.create_app()
+    for pooled in models.all_engines():
+        pooled.dispose()
+
+def post_fork(server, worker):
+    import models
+
+    models.reset_engines_after_fork()
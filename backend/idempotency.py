@@ -0,0 +1,157 @@
+"""
+Idempotent replay of public form submissions.
+
+A slow submission (the synchronous SMTP send) makes browsers and
+frontend/script.js retry, which used to store the row and mail the admins
+twice. Each submission is now keyed by its Idempotency-Key header, or, when
+the client sends none, by a hash of the client IP and the request body
+within IDEMPOTENCY_WINDOW_SECONDS. The first request claims the key in the
+idempotency_keys table, which every worker (and every host on PostgreSQL)
+shares; its response is stored there when it finishes. Retries get that
+response replayed without running the handler again, so nothing is
+inserted or mailed twice. A retry that arrives while the first request is
+still running waits for it up to IDEMPOTENCY_WAIT_SECONDS.
+
+Only the sha256 digests of the key and the body are stored, and expired
+keys are purged in the background of later claims.
+"""
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from config import settings
+from models import IdempotencyRecord, engine
+
+KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+PURGE_INTERVAL = 300  # seconds between purges of expired keys, per process
+POLL_INTERVAL = 0.05  # first wait for an in-flight request, doubled up to 0.5s
+
+@dataclass
+class Claim:
+    """Outcome of claiming a key: new (run the handler), replay, in_progress, mismatch or invalid"""
+    state: str
+    key: Optional[str] = None
+    ttl: int = 0
+    status_code: Optional[int] = None
+    body: Optional[str] = None
+
+def _digest(*parts) -> str:
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+def body_hash(body: bytes) -> str:
+    """Hash of the request body, insensitive to JSON key order and whitespace"""
+    try:
+        text = json.dumps(json.loads(body or b"null"), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        text = (body or b"").decode("utf-8", "replace")
+    return _digest(text)
+
+def request_key(scope: str, header_key: Optional[str], client_ip: Optional[str], request_hash: str) -> Optional[Tuple[str, int]]:
+    """(key, ttl seconds) identifying a submission, or None when it is not deduplicated"""
+    if header_key:
+        return _digest(scope, "key", header_key), settings.idempotency_key_ttl_seconds
+    if settings.idempotency_window_seconds > 0:
+        return _digest(scope, "body", client_ip or "", request_hash), settings.idempotency_window_seconds
+    return None
+
+class IdempotencyStore:
+    """TTL store of submission responses in the idempotency_keys table"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.table = IdempotencyRecord.__table__
+        self._next_purge = 0.0
+
+    def claim(self, scope: str, header_key: Optional[str], client_ip: Optional[str], body: bytes) -> Claim:
+        """Claim a submission, or return the stored response of an earlier identical one"""
+        if header_key is not None and not 0 < len(header_key) <= MAX_KEY_LENGTH:
+            return Claim("invalid")
+        request_hash = body_hash(body)
+        keyed = request_key(scope, header_key, client_ip, request_hash)
+        if keyed is None:
+            return Claim("new")
+        key, ttl = keyed
+
+        self._maybe_purge()
+        deadline = time.monotonic() + settings.idempotency_wait_seconds
+        delay = POLL_INTERVAL
+        while True:
+            now = datetime.utcnow()
+            with self.engine.connect() as conn:
+                row = conn.execute(select(self.table).where(self.table.c.key == key)).first()
+
+            if row is None or row.expires_at <= now:
+                if self._insert(key, request_hash, now, row is not None):
+                    return Claim("new", key, ttl)
+                continue  # another worker claimed it first: read its state
+            if row.request_hash != request_hash:
+                return Claim("mismatch", key)
+            if row.status_code is not None:
+                return Claim("replay", key, ttl, row.status_code, row.response_body)
+            if time.monotonic() >= deadline:
+                return Claim("in_progress", key)
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    def _insert(self, key: str, request_hash: str, now: datetime, replace_expired: bool) -> bool:
+        lease = now + timedelta(seconds=settings.idempotency_lock_seconds)
+        try:
+            with self.engine.begin() as conn:
+                if replace_expired:
+                    conn.execute(delete(self.table).where(self.table.c.key == key, self.table.c.expires_at <= now))
+                conn.execute(insert(self.table).values(key=key, request_hash=request_hash, expires_at=lease))
+            return True
+        except IntegrityError:
+            return False
+
+    def complete(self, claim: Claim, status_code: int, body: str):
+        """Store the response of a claimed submission for replay"""
+        if claim.key is None:
+            return
+        expires_at = datetime.utcnow() + timedelta(seconds=claim.ttl)
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(self.table).where(self.table.c.key == claim.key)
+                .values(status_code=status_code, response_body=body, expires_at=expires_at)
+            )
+
+    def release(self, claim: Claim):
+        """Forget a claimed submission that failed, so a retry runs it again"""
+        if claim.key is None:
+            return
+        with self.engine.begin() as conn:
+            conn.execute(delete(self.table).where(self.table.c.key == claim.key, self.table.c.status_code.is_(None)))
+
+    def purge(self) -> int:
+        """Delete expired keys (finished or abandoned); returns the number removed"""
+        with self.engine.begin() as conn:
+            return conn.execute(delete(self.table).where(self.table.c.expires_at <= datetime.utcnow())).rowcount
+
+    def _maybe_purge(self):
+        if time.monotonic() < self._next_purge:
+            return
+        self._next_purge = time.monotonic() + PURGE_INTERVAL
+        try:
+            self.purge()
+        except Exception:
+            pass  # best effort, retried after the next interval
+
+def claim_error(claim: Claim) -> Tuple[str, int]:
+    """Message and status for a claim that cannot be served (invalid, mismatch, in_progress)"""
+    if claim.state == "invalid":
+        return f"{KEY_HEADER} must be 1-{MAX_KEY_LENGTH} characters", 400
+    if claim.state == "mismatch":
+        return f"{KEY_HEADER} was already used for a different request", 422
+    return "The original request is still being processed, retry shortly", 409
+
+# Global store instance
+idempotency_store = IdempotencyStore(engine)
@@ -0,0 +1,293 @@
+"""
+Durable form intake while the database is down.
+
+Public submissions are inserted through the database circuit breaker
+(breaker.py). When the insert fails with an outage error, or the breaker is
+already open, the submission is appended to a local journal instead and the
+donor gets 202 Accepted right away: nothing is lost and nobody waits on
+connection timeouts.
+
+Each process appends to its own NDJSON file under INTAKE_JOURNAL_DIR. A
+writer thread gathers the appends that arrive within INTAKE_JOURNAL_FLUSH_MS
+and makes them durable with one fsync, and a request is only acknowledged
+after that. A replayer thread (one process at a time, via a lock file) probes
+the database every INTAKE_REPLAY_SECONDS while entries are waiting and
+inserts them in the order they were accepted. Each entry is inserted
+together with an idempotency key in the same transaction, so an entry is
+never inserted twice even if a replay is interrupted. A file is removed once
+its entries are in and no writer holds it. Entries the database rejects
+(bad data rather than an outage) go to rejected.jsonl.
+"""
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from breaker import CircuitOpenError, database_breaker, is_outage
+from config import settings
+from logger import logger_manager
+from models import Contact, IdempotencyRecord, Registration, Requirements
+
+KINDS = {"registration": Registration, "requirements": Requirements, "contact": Contact}
+KEY_TTL = timedelta(days=30)  # replay dedupe keys; journals are replayed long before
+
+try:
+    import fcntl
+except ImportError:  # no file locks on this platform: journals are kept and re-read (replays are deduplicated)
+    fcntl = None
+
+def _try_lock(handle, mode) -> bool:
+    if fcntl is None:
+        return False
+    try:
+        fcntl.flock(handle, mode | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+def entry_key(entry_id: str) -> str:
+    return hashlib.sha256(f"intake:{entry_id}".encode()).hexdigest()
+
+class IntakeJournal:
+    def __init__(self, directory: Path, flush_ms: float, breaker, session_factory=None):
+        self.directory = Path(directory)
+        self.flush_seconds = flush_ms / 1000.0
+        self.breaker = breaker
+        self.session_factory = session_factory
+        self.on_replayed: Optional[Callable[[str, int, Dict], None]] = None
+        self._queue: "queue.Queue[Tuple[Dict, Future]]" = queue.Queue()
+        self._path: Optional[Path] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._replayer_pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    # Writing
+
+    def _ensure_started(self):
+        # (Re)start lazily so the thread also exists in forked gunicorn workers
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue, self._path, self._pid = queue.Queue(), None, os.getpid()
+                self._thread = threading.Thread(target=self._run, name="intake-journal", daemon=True)
+                self._thread.start()
+
+    def append(self, kind: str, values: Dict[str, Any], timeout: float = 10) -> str:
+        """Durably journal one submission; returns its reference once it is fsynced"""
+        entry = {"id": uuid.uuid4().hex, "kind": kind, "accepted_at": time.time(), "values": values}
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((entry, future))
+        future.result(timeout=timeout)
+        return entry["id"]
+
+    def _write(self, data: bytes):
+        """Append and fsync under a shared lock; a file the replayer removed meanwhile is replaced"""
+        while True:
+            if self._path is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._path = self.directory / f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}.ndjson"
+            with open(self._path, "ab") as handle:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_SH)  # waits while the replayer holds the file
+                if os.fstat(handle.fileno()).st_nlink == 0:
+                    self._path = None  # replayed and removed while we waited
+                    continue
+                handle.write(data)
+                handle.flush()
+                os.fsync(handle.fileno())
+                return
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(b"".join(json.dumps(entry, default=str).encode("utf-8") + b"\n" for entry, _ in batch))
+            except Exception as e:
+                logger_manager.logger.error(f"Intake journal write failed: {e}")
+                self._path = None
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for _, future in batch:
+                future.set_result(None)
+
+    # Replaying
+
+    def files(self) -> List[Path]:
+        return sorted(self.directory.glob("*.ndjson")) if self.directory.exists() else []
+
+    def pending(self) -> int:
+        """Journaled entries not yet removed (replayed entries count until their file is removed)"""
+        total = 0
+        for path in self.files():
+            with open(path, "rb") as handle:
+                total += handle.read().count(b"\n")
+        return total
+
+    def _read(self) -> Tuple[List[Dict], List[Tuple[Path, Any]]]:
+        """Entries of every journal file no writer is appending to, in acceptance order; the files stay locked"""
+        entries, locked = [], []
+        for path in self.files():
+            handle = open(path, "rb")
+            if fcntl is not None and not _try_lock(handle, fcntl.LOCK_EX):
+                handle.close()  # mid-append: next round
+                continue
+            complete, _, torn = handle.read().rpartition(b"\n")
+            if torn:
+                # a writer died mid-write; that submission was never acknowledged
+                logger_manager.logger.warning(f"Ignoring a partial journal line in {path.name}")
+            entries.extend(json.loads(line) for line in complete.split(b"\n") if line)
+            locked.append((path, handle))
+        entries.sort(key=lambda entry: entry["accepted_at"])  # stable: file order breaks ties
+        return entries, locked
+
+    def _apply(self, entry: Dict) -> Optional[int]:
+        """Insert one journaled submission; returns its id, or None if it was inserted (or merged) before"""
+        from dedupe import find_primary, registration_fingerprint
+
+        key = entry_key(entry["id"])
+        db = self.session_factory()
+        try:
+            if db.get(IdempotencyRecord, key) is not None:
+                return None
+            values = dict(entry["values"])
+            new_id = None
+            if entry["kind"] == "registration":
+                fingerprint = registration_fingerprint(values.get("manufacturer"), values.get("serial"), values.get("model"))
+                primary = find_primary(db, fingerprint)
+                values.update(fingerprint=fingerprint, duplicate_of=primary)
+                if primary is not None and settings.duplicate_registration_policy == "merge":
+                    values = None
+            if values is not None:
+                record = KINDS[entry["kind"]](**values)
+                db.add(record)
+                db.flush()
+                new_id = record.id
+            db.add(IdempotencyRecord(key=key, request_hash=key, status_code=201,
+                                     response_body=json.dumps({"id": new_id}),
+                                     expires_at=datetime.utcnow() + KEY_TTL))
+            db.commit()
+            return new_id
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _reject(self, entry: Dict, error: Exception):
+        logger_manager.logger.error(f"Journaled {entry['kind']} {entry['id']} rejected by the database: {error}")
+        with open(self.directory / "rejected.jsonl", "a", encoding="utf-8") as out:
+            out.write(json.dumps({**entry, "error": str(error)}, default=str) + "\n")
+        db = self.session_factory()
+        try:
+            key = entry_key(entry["id"])
+            db.add(IdempotencyRecord(key=key, request_hash=key, status_code=400, response_body=None,
+                                     expires_at=datetime.utcnow() + KEY_TTL))
+            db.commit()
+        finally:
+            db.close()
+
+    def replay(self) -> int:
+        """Insert journaled submissions in acceptance order until done or the database fails; returns rows inserted"""
+        if not self.files():
+            return 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / ".replay.lock", "w") as lock:
+            if fcntl is not None and not _try_lock(lock, fcntl.LOCK_EX):
+                return 0  # another process is replaying
+            entries, locked = self._read()
+            inserted = 0
+            try:
+                for entry in entries:
+                    if not self.breaker.allow():
+                        return inserted
+                    started = time.monotonic()
+                    try:
+                        new_id = self._apply(entry)
+                    except Exception as e:
+                        if is_outage(e):
+                            self.breaker.record_failure(e)
+                            return inserted
+                        self.breaker.record_success()
+                        self._reject(entry, e)
+                        continue
+                    self.breaker.record_success(time.monotonic() - started)
+                    if new_id is not None:
+                        inserted += 1
+                        if self.on_replayed is not None:
+                            self.on_replayed(entry["kind"], new_id, entry["values"])
+                for path, _ in locked if fcntl is not None else []:
+                    path.unlink(missing_ok=True)  # still locked: a waiting writer notices and starts a new file
+            finally:
+                for _, handle in locked:
+                    handle.close()
+                if inserted:
+                    logger_manager.logger.info(f"Replayed {inserted} journaled submissions")
+            return inserted
+
+    def _replay_loop(self):
+        while True:
+            time.sleep(settings.intake_replay_seconds)
+            try:
+                self.replay()
+            except Exception as e:
+                logger_manager.logger.error(f"Intake journal replay failed: {e}")
+
+    def start(self):
+        """Start the replayer thread once per process"""
+        if not settings.intake_journal_enabled or self._replayer_pid == os.getpid():
+            return
+        self._replayer_pid = os.getpid()
+        threading.Thread(target=self._replay_loop, name="intake-replay", daemon=True).start()
+
+def _session():
+    from models import SessionLocal
+
+    return SessionLocal()
+
+intake_journal = IntakeJournal(settings.intake_journal_dir, settings.intake_journal_flush_ms, database_breaker, _session)
+
+def store(kind: str, values: Dict[str, Any], insert: Callable[[Dict[str, Any]], Any]) -> Tuple[Any, Optional[str]]:
+    """Insert through the database breaker; on an outage journal the submission instead.
+
+    Returns (insert result, None), or (None, journal reference) when it was journaled.
+    """
+    if not settings.intake_journal_enabled:
+        return insert(values), None
+    try:
+        return database_breaker.call(insert, values), None
+    except Exception as e:
+        if not is_outage(e):
+            raise
+        if not isinstance(e, CircuitOpenError):
+            logger_manager.logger.error(f"Database unavailable, journaling the {kind}: {e}")
+        return None, intake_journal.append(kind, values)
+
+async def store_async(kind: str, values: Dict[str, Any], insert) -> Tuple[Any, Optional[str]]:
+    """store() for the ASGI app's coroutine inserts"""
+    from starlette.concurrency import run_in_threadpool
+
+    if not settings.intake_journal_enabled:
+        return await insert(values), None
+    try:
+        return await database_breaker.call_async(insert, values), None
+    except Exception as e:
+        if not is_outage(e):
+            raise
+        if not isinstance(e, CircuitOpenError):
+            logger_manager.logger.error(f"Database unavailable, journaling the {kind}: {e}")
+        return None, await run_in_threadpool(intake_journal.append, kind, values)
@@ -4,7 +4,9 @@ from flask_mail import Mail, Message
 from sqlalchemy import text
 import time
 import json
+import functools
 import os
+import threading
 import sys
 from pathlib import Path
 from typing import Optional
@@ -16,14 +18,24 @@ if str(current_dir) not in sys.path:
 
 from config import settings
 from database import db_manager
-from supabase_client import create_registration as supabase_create_registration, create_requirements as supabase_create_requirements, create_contact as supabase_create_contact
 from schemas import (
-    RegistrationCreate, RegistrationResponse, RequirementsCreate, RequirementsResponse,
+    RegistrationResponse, RequirementsResponse,
     PaginationParams, PaginatedResponse, StatsResponse, HealthResponse, ErrorResponse,
-    ValidationError
+    ValidationError, contact_form, registration_form, requirements_form
 )
 from logger import logger_manager
 from models import create_tables
+from notifications import build_notification
+from changes import InvalidWatermark
+from events import event_broadcaster, event_retention, format_sse  # also registers the post-commit signal hooks
+from matching import match_engine
+from idempotency import KEY_HEADER, REPLAYED_HEADER, claim_error, idempotency_store
+from replica import READ_AFTER_COOKIE, parse_position, read_after, replica_router
+from backup import backup_scheduler
+from outbox import outbox_replicator
+from breaker import database_breaker, is_outage
+from intake import intake_journal, store
+import request_db
 
 # Email notification helper function
 def send_notification_email(form_type: str, form_data: dict):
@@ -34,64 +46,10 @@ def send_notification_email(form_type: str, form_data: dict):
             return
 
         # Prepare email content based on form type
-        if form_type == "registration":
-            subject = "🎹 新的钢琴捐赠登记 - Clavisnova"
-            body = f"""
-亲爱的管理员，
-
-您收到了一份新的钢琴捐赠登记：
-
-捐赠信息：
-- 制造商: {form_data.get('manufacturer', 'N/A')}
-- 型号: {form_data.get('model', 'N/A')}
-- 序列号: {form_data.get('serial', 'N/A')}
-- 年份: {form_data.get('year', 'N/A')}
-- 类型: {form_data.get('height', 'N/A')}
-- 地点: {form_data.get('city_state', 'N/A')}
-- 联系方式: {form_data.get('access', 'N/A')}
-
-请及时查看管理员后台处理此捐赠请求。
-
-此邮件由 Clavisnova 系统自动发送。
-"""
-
-        elif form_type == "requirements":
-            subject = "🎹 新的学校需求提交 - Clavisnova"
-            body = f"""
-亲爱的管理员，
-
-您收到了一份新的学校钢琴需求提交：
-
-学校信息：
-- 学校名称: {form_data.get('school_name', 'N/A')}
-- 现有钢琴: {form_data.get('current_pianos', 'N/A')}
-- 偏好类型: {form_data.get('preferred_type', 'N/A')}
-- 教师姓名: {form_data.get('teacher_name', 'N/A')}
-
-请及时查看管理员后台处理此需求。
-
-此邮件由 Clavisnova 系统自动发送。
-"""
-
-        elif form_type == "contact":
-            subject = "🎹 新的联系表单提交 - Clavisnova"
-            body = f"""
-亲爱的管理员，
-
-您收到了一份新的联系表单提交：
-
-联系信息：
-- 姓名: {form_data.get('name', 'N/A')}
-- 邮箱: {form_data.get('email', 'N/A')}
-- 消息内容: {form_data.get('message', 'N/A')}
-
-请及时回复用户咨询。
-
-此邮件由 Clavisnova 系统自动发送。
-"""
-
-        else:
+        content = build_notification(form_type, form_data)
+        if content is None:
             return
+        subject, body = content
 
         # Send email
         msg = Message(
@@ -107,6 +65,75 @@ def send_notification_email(form_type: str, form_data: dict):
         logger_manager.logger.error(f"Failed to send notification email: {e}")
         # Don't raise exception to avoid breaking the main flow
 
+def journaled_response(reference: str, message: str):
+    """202 for a submission journaled during a database outage; it gets its id when replayed"""
+    return jsonify({"id": None, "message": message, "queued": True, "reference": reference}), 202
+
+def _after_replay(kind: str, record_id: int, values: dict):
+    """Follow-up work a journaled submission skipped, run once it is in the database"""
+    if kind != "contact":
+        match_engine.schedule("registration" if kind == "registration" else "requirement", record_id)
+    with app.app_context():
+        send_notification_email(kind, values)
+
+intake_journal.on_replayed = _after_replay
+
+def form_data() -> dict:
+    """The submitted JSON object ({} for a missing or malformed body)"""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else {}
+
+def idempotent(scope: str, form):
+    """Replay the stored response to client retries of a form submission (see idempotency.py).
+
+    `form` validates the body first: an invalid submission is rejected by the
+    view without claiming a key, so it never takes a database connection.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not settings.idempotency_enabled or database_breaker.is_open():
+                return view(*args, **kwargs)  # the store lives in the database: do not wait on it during an outage
+            try:
+                form(form_data())
+            except ValidationError:
+                return view(*args, **kwargs)
+            try:
+                claim = idempotency_store.claim(scope, request.headers.get(KEY_HEADER), request.remote_addr, request.get_data())
+            except Exception as e:
+                if is_outage(e):
+                    database_breaker.record_failure(e)
+                logger_manager.logger.error(f"Idempotency store unavailable, handling {scope} without it: {e}")
+                return view(*args, **kwargs)
+
+            if claim.state == "replay":
+                logger_manager.logger.info(f"Replaying stored {scope} response")
+                response = app.response_class(claim.body, status=claim.status_code, mimetype='application/json')
+                response.headers[REPLAYED_HEADER] = "true"
+                return response
+            if claim.state != "new":
+                message, status = claim_error(claim)
+                response = jsonify(ErrorResponse(message=message).__dict__)
+                if status == 409:
+                    response.headers['Retry-After'] = "1"
+                return response, status
+
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except Exception:
+                idempotency_store.release(claim)
+                raise
+            try:
+                if response.status_code < 500:
+                    idempotency_store.complete(claim, response.status_code, response.get_data(as_text=True))
+                else:
+                    idempotency_store.release(claim)  # let the retry run the submission again
+            except Exception as e:
+                logger_manager.logger.error(f"Failed to store {scope} response for replay: {e}")
+            return response
+        return wrapper
+    return decorator
+
 # Initialize Flask app
 # Note: Static files are served by Cloudflare Pages, not by this Flask app
 app = Flask(__name__)
@@ -123,10 +150,6 @@ app.config['MAIL_DEFAULT_SENDER'] = settings.mail_default_sender
 # Initialize Flask-Mail
 mail = Mail(app)
 
-print("✅ Backend-only deployment: Frontend served by Cloudflare Pages")
-print("✅ Static file serving disabled in Flask app")
-print(f"✅ Mail service configured: {settings.mail_server}:{settings.mail_port}")
-
 # CORS - enable for configured frontend origins
 from flask_cors import CORS as _CORS
 
@@ -138,11 +161,18 @@ if frontend_url and frontend_url not in cors_origins:
 
 # Apply CORS with credentials support
 _CORS(app, origins=cors_origins, supports_credentials=True)
-print(f"✅ CORS enabled for origins: {cors_origins}")
 
 # Request logging middleware
 @app.before_request
 def log_request_info():
+    request_db.begin_request(request.endpoint or request.path)
+    if not _started:
+        create_app()  # servers that did not call the factory (flask run, uvicorn, tests)
+    backup_scheduler.start()  # once per worker process
+    outbox_replicator.start()
+    intake_journal.start()
+    event_retention.start()
+    read_after.set(parse_position(request.cookies.get(READ_AFTER_COOKIE)))
     logger_manager.logger.info(f"Request: {request.method} {request.url}")
 
 # Test DELETE endpoint
@@ -198,9 +228,7 @@ def health_check():
     """Health check endpoint"""
     try:
         # Check database connection
-        db = db_manager.get_db()
-        db.execute(text("SELECT 1"))  # Simple database connectivity test
-        db.close()
+        request_db.db().execute(text("SELECT 1"))  # Simple database connectivity test
         db_status = "healthy"
         registration_count = 0  # Simplified for now
     except Exception as e:
@@ -217,10 +245,32 @@ def health_check():
         memory_usage=0.0  # Simplified memory usage
     )
 
-    return jsonify(response.__dict__)
+    body = dict(response.__dict__)
+    body["pool"] = request_db.hold_stats.status()
+    if replica_router.enabled:
+        body["read_replica"] = replica_router.status()
+    if settings.intake_journal_enabled:
+        body["intake"] = {"database": database_breaker.status()}
+        try:
+            body["intake"]["journaled"] = intake_journal.pending()
+        except OSError as e:
+            body["intake"]["error"] = str(e)
+    if settings.supabase_replication:
+        try:
+            body["supabase_outbox"] = outbox_replicator.status()
+        except Exception as e:
+            body["supabase_outbox"] = {"error": str(e)}
+    try:
+        from export_jobs import export_jobs
+
+        body["export_jobs"] = export_jobs.status()
+    except Exception as e:
+        body["export_jobs"] = {"error": str(e)}
+    return jsonify(body)
 
 # Registration endpoints
 @app.route('/api/registration', methods=['POST'])
+@idempotent("registration", registration_form)
 def create_registration():
     """Create a new registration"""
     try:
@@ -229,67 +279,18 @@ def create_registration():
         # Log incoming request data for debugging
         logger_manager.logger.info(f"Registration request received")
 
-        data = request.get_json()
+        data = form_data()
         logger_manager.logger.info(f"Request data: {data}")
 
-        # Ensure year is an integer
-        year_value = data.get('year', 2020)
-        if isinstance(year_value, str):
-            try:
-                year_value = int(year_value)
-                logger_manager.logger.info(f"Converted year string '{data.get('year')}' to int {year_value}")
-            except ValueError:
-                logger_manager.logger.warning(f"Invalid year value: '{data.get('year')}', using default 2020")
-                year_value = 2020
-
         # Create registration object
-        registration = RegistrationCreate(
-            manufacturer=data.get('manufacturer', ''),
-            model=data.get('model', ''),
-            serial=data.get('serial', ''),
-            year=year_value,
-            height=data.get('height', ''),
-            finish=data.get('finish', ''),
-            color_wood=data.get('color_wood', ''),
-            access=data.get('access', ''),
-            city_state=data.get('city_state', ''),
-            ip_address=request.remote_addr,
-            user_agent=request.headers.get('User-Agent')
-        )
+        registration = registration_form(data, request.remote_addr, request.headers.get('User-Agent'))
 
         logger_manager.logger.info(f"Registration object created successfully: manufacturer={registration.manufacturer}, model={registration.model}")
 
-        # Try REST fallback (Supabase) if configured
-        use_rest = os.getenv("USE_SUPABASE_REST", "false").lower() in ("1", "true", "yes")
-        if use_rest:
-            # map to supabase fields expected by table
-            sb_payload = {
-                "manufacturer": registration.manufacturer,
-                "model": registration.model,
-                "serial": registration.serial,
-                "year": registration.year,
-                "height": registration.height,
-                "finish": registration.finish,
-                "color_wood": registration.color_wood,
-                "access": registration.access,
-                "city_state": registration.city_state,
-                "ip_address": registration.ip_address,
-                "user_agent": registration.user_agent
-            }
-            try:
-                created = supabase_create_registration(sb_payload)
-                result_id = created.get("id")
-                logger_manager.logger.info(f"Registration saved via Supabase REST with ID: {result_id}")
-                response = RegistrationResponse(id=result_id, message="Registration created successfully")
-                return jsonify(response.__dict__), 201
-            except Exception as e:
-                logger_manager.logger.error(f"Supabase REST error: {e}", exc_info=True)
-                return jsonify({"message": "Supabase REST error"}), 500
-
-        # Save to database synchronously (default)
-        db = db_manager.get_db()
+        # Save to database synchronously (default), batched with concurrent submissions under group commit;
+        # journaled for replay instead while the database is unavailable
         try:
-            reg = Registration(
+            stored, reference = store("registration", dict(
                 manufacturer=registration.manufacturer,
                 model=registration.model,
                 serial=registration.serial,
@@ -301,19 +302,22 @@ def create_registration():
                 city_state=registration.city_state,
                 ip_address=registration.ip_address,
                 user_agent=registration.user_agent
-            )
-            db.add(reg)
-            db.commit()
-            db.refresh(reg)
-            result_id = reg.id
-            logger_manager.logger.info(f"Registration saved to database with ID: {result_id}")
+            ), db_manager.insert_registration)
         except Exception as db_error:
             logger_manager.logger.error(f"Database error during registration save: {db_error}")
             raise db_error
-        finally:
-            db.close()
+        if reference is not None:
+            return journaled_response(reference, "Registration received")
+        result_id, duplicate_of = stored
+        logger_manager.logger.info(f"Registration saved to database with ID: {result_id}")
+
+        if duplicate_of is not None and result_id == duplicate_of:
+            # Merged duplicate (double click / client retry): nothing new was stored or needs notifying
+            logger_manager.logger.info(f"Duplicate registration merged into ID: {result_id}")
+            return jsonify({"id": result_id, "message": "Registration already received", "duplicate_of": duplicate_of}), 200
 
         response = RegistrationResponse(id=result_id, message="Registration created successfully")
+        match_engine.schedule("registration", result_id)
 
         # Send notification email
         notification_data = {
@@ -328,6 +332,8 @@ def create_registration():
         send_notification_email("registration", notification_data)
 
         logger_manager.logger.info(f"Registration API completed successfully")
+        if duplicate_of is not None:
+            return jsonify({**response.__dict__, "duplicate_of": duplicate_of}), 201
         return jsonify(response.__dict__), 201
 
     except ValidationError as e:
@@ -339,66 +345,31 @@ def create_registration():
 
 # Requirements endpoints
 @app.route('/api/requirements', methods=['POST'])
+@idempotent("requirements", requirements_form)
 def create_requirements():
     """Create a new requirements submission"""
     try:
         from models import Requirements
 
-        data = request.get_json()
-
         # Create requirements object
-        requirements = RequirementsCreate(
-            school_name=data.get('school_name') or data.get('info1'),  # 向后兼容
-            current_pianos=data.get('current_pianos') or data.get('info2'),
-            preferred_type=data.get('preferred_type') or data.get('info3'),
-            teacher_name=data.get('teacher_name') or data.get('info4'),
-            background=data.get('background') or data.get('info5'),
-            commitment=data.get('commitment') or data.get('info6'),
-            ip_address=request.remote_addr,
-            user_agent=request.headers.get('User-Agent')
-        )
-
-        use_rest = os.getenv("USE_SUPABASE_REST", "false").lower() in ("1", "true", "yes")
-        if use_rest:
-            sb_payload = {
-                "school_name": requirements.school_name,
-                "current_pianos": requirements.current_pianos,
-                "preferred_type": requirements.preferred_type,
-                "teacher_name": requirements.teacher_name,
-                "background": requirements.background,
-                "commitment": requirements.commitment,
-                "ip_address": requirements.ip_address,
-                "user_agent": requirements.user_agent
-            }
-            try:
-                created = supabase_create_requirements(sb_payload)
-                result_id = created.get("id")
-                return jsonify(RequirementsResponse(id=result_id, message="Requirements submitted successfully").__dict__), 201
-            except Exception as e:
-                logger_manager.logger.error(f"Supabase REST error for requirements: {e}", exc_info=True)
-                return jsonify({"message": "Supabase REST error"}), 500
-
-        # Save to database synchronously
-        db = db_manager.get_db()
-        try:
-            req = Requirements(
-                school_name=requirements.school_name,
-                current_pianos=requirements.current_pianos,
-                preferred_type=requirements.preferred_type,
-                teacher_name=requirements.teacher_name,
-                background=requirements.background,
-                commitment=requirements.commitment,
-                ip_address=requirements.ip_address,
-                user_agent=requirements.user_agent
-            )
-            db.add(req)
-            db.commit()
-            db.refresh(req)
-            result_id = req.id
-        finally:
-            db.close()
+        requirements = requirements_form(form_data(), request.remote_addr, request.headers.get('User-Agent'))
+
+        # Save to database synchronously (journaled for replay while the database is unavailable)
+        result_id, reference = store("requirements", dict(
+            school_name=requirements.school_name,
+            current_pianos=requirements.current_pianos,
+            preferred_type=requirements.preferred_type,
+            teacher_name=requirements.teacher_name,
+            background=requirements.background,
+            commitment=requirements.commitment,
+            ip_address=requirements.ip_address,
+            user_agent=requirements.user_agent
+        ), functools.partial(db_manager.insert_row, Requirements))
+        if reference is not None:
+            return journaled_response(reference, "Requirements received")
 
         response = RequirementsResponse(id=result_id, message="Requirements submitted successfully")
+        match_engine.schedule("requirement", result_id)
 
         # Send notification email
         notification_data = {
@@ -419,61 +390,29 @@ def create_requirements():
 
 # Contact endpoints
 @app.route('/api/contact', methods=['POST'])
+@idempotent("contact", contact_form)
 def create_contact():
     """Create a new contact message"""
     try:
         from models import Contact
 
-        data = request.get_json() or {}
-        name = data.get('name', '')
-        email = data.get('email', '')
-        message_text = data.get('message', '')
-
-        if not message_text or not message_text.strip():
-            return jsonify(ErrorResponse(message="Message cannot be empty").__dict__), 400
-
-        use_rest = os.getenv("USE_SUPABASE_REST", "false").lower() in ("1", "true", "yes")
-        if use_rest:
-            sb_payload = {
-                "name": name,
-                "email": email,
-                "message": message_text,
-                "ip_address": request.remote_addr,
-                "user_agent": request.headers.get('User-Agent')
-            }
-            try:
-                created = supabase_create_contact(sb_payload)
-                cid = created.get("id")
-                return jsonify({"id": cid, "message": "Contact submitted"}), 201
-            except Exception as e:
-                logger_manager.logger.error(f"Supabase REST error for contact: {e}", exc_info=True)
-                return jsonify({"message": "Supabase REST error"}), 500
+        contact = contact_form(form_data(), request.remote_addr, request.headers.get('User-Agent'))
 
-        db = db_manager.get_db()
-        try:
-            contact = Contact(
-                name=name,
-                email=email,
-                message=message_text,
-                ip_address=request.remote_addr,
-                user_agent=request.headers.get('User-Agent')
-            )
-            db.add(contact)
-            db.commit()
-            db.refresh(contact)
-            cid = contact.id
-        finally:
-            db.close()
+        cid, reference = store("contact", dict(contact.__dict__), functools.partial(db_manager.insert_row, Contact))
+        if reference is not None:
+            return journaled_response(reference, "Contact received")
 
         # Send notification email
         notification_data = {
-            'name': name,
-            'email': email,
-            'message': message_text
+            'name': contact.name,
+            'email': contact.email,
+            'message': contact.message
         }
         send_notification_email("contact", notification_data)
 
         return jsonify({"id": cid, "message": "Contact submitted"}), 201
+    except ValidationError as e:
+        return jsonify(ErrorResponse(message=str(e)).__dict__), 400
     except Exception as e:
         logger_manager.logger.error(f"Contact error: {e}", exc_info=True)
         return jsonify(ErrorResponse(message="Internal server error").__dict__), 500
@@ -487,25 +426,22 @@ def get_contacts():
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 25))
 
-        db = db_manager.get_db()
-        try:
-            query = db.query(Contact).order_by(Contact.created_at.desc())
-            total = query.count()
-            offset = (page - 1) * limit
-            items = query.offset(offset).limit(limit).all()
-            data = [c.to_dict() for c in items]
-            total_pages = (total + limit - 1) // limit
-            pagination = {
-                "page": page,
-                "limit": limit,
-                "total": total,
-                "total_pages": total_pages,
-                "has_next": page < total_pages,
-                "has_prev": page > 1
-            }
-            return jsonify({"success": True, "data": data, "pagination": pagination}), 200
-        finally:
-            db.close()
+        db = request_db.read_db()
+        query = db.query(Contact).order_by(Contact.created_at.desc(), Contact.id.desc())
+        total = query.count()
+        offset = (page - 1) * limit
+        items = query.offset(offset).limit(limit).all()
+        data = [c.to_dict() for c in items]
+        total_pages = (total + limit - 1) // limit
+        pagination = {
+            "page": page,
+            "limit": limit,
+            "total": total,
+            "total_pages": total_pages,
+            "has_next": page < total_pages,
+            "has_prev": page > 1
+        }
+        return jsonify({"success": True, "data": data, "pagination": pagination}), 200
     except Exception as e:
         logger_manager.logger.error(f"Get contacts error: {e}")
         return jsonify({"success": False, "message": "Internal server error"}), 500
@@ -522,58 +458,71 @@ def get_registrations():
         limit = int(request.args.get('limit', 25))
         search = request.args.get('search', '')
 
-        db = db_manager.get_db()
-        try:
-            # Build query
-            query = db.query(Registration)
-
-            # Add search filter if provided
-            if search:
-                search_filter = f"%{search}%"
-                query = query.filter(
-                    or_(
-                        Registration.manufacturer.ilike(search_filter),
-                        Registration.model.ilike(search_filter),
-                        Registration.serial.ilike(search_filter),
-                        Registration.city_state.ilike(search_filter)
-                    )
+        db = request_db.read_db()
+        # Build query
+        query = db.query(Registration)
+
+        # Add search filter if provided
+        if search:
+            search_filter = f"%{search}%"
+            query = query.filter(
+                or_(
+                    Registration.manufacturer.ilike(search_filter),
+                    Registration.model.ilike(search_filter),
+                    Registration.serial.ilike(search_filter),
+                    Registration.city_state.ilike(search_filter)
                 )
+            )
 
-            # Get total count
-            total = query.count()
-
-            # Apply pagination
-            offset = (page - 1) * limit
-            registrations = query.offset(offset).limit(limit).all()
-
-            # Convert to dict
-            data = [reg.to_dict() for reg in registrations]
-
-            # Calculate pagination info
-            total_pages = (total + limit - 1) // limit
-            pagination = {
-                "page": page,
-                "limit": limit,
-                "total": total,
-                "total_pages": total_pages,
-                "has_next": page < total_pages,
-                "has_prev": page > 1
-            }
-
-            # Return format expected by admin.html
-            return jsonify({
-                "success": True,
-                "data": data,
-                "pagination": pagination
-            }), 200
+        # Get total count
+        total = query.count()
+
+        # Apply pagination (newest first, like the dashboard's first page)
+        offset = (page - 1) * limit
+        registrations = query.order_by(Registration.created_at.desc(), Registration.id.desc()).offset(offset).limit(limit).all()
+
+        # Convert to dict
+        data = [reg.to_dict() for reg in registrations]
+
+        # Calculate pagination info
+        total_pages = (total + limit - 1) // limit
+        pagination = {
+            "page": page,
+            "limit": limit,
+            "total": total,
+            "total_pages": total_pages,
+            "has_next": page < total_pages,
+            "has_prev": page > 1
+        }
 
-        finally:
-            db.close()
+        # Return format expected by admin.html
+        return jsonify({
+            "success": True,
+            "data": data,
+            "pagination": pagination
+        }), 200
 
     except Exception as e:
         logger_manager.logger.error(f"Get registrations error: {e}")
         return jsonify({"success": False, "message": "Internal server error"}), 500
 
+@app.route('/api/admin/registrations/duplicates', methods=['GET'])
+def get_duplicate_registrations():
+    """Dedupe report: groups of registrations with the same piano fingerprint"""
+    try:
+        from dedupe import duplicate_report
+
+        limit = max(1, min(int(request.args.get('limit', 100)), 1000))
+        db = request_db.read_db()
+        groups = duplicate_report(db, limit)
+        return jsonify({"success": True, "groups": groups}), 200
+
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except Exception as e:
+        logger_manager.logger.error(f"Get duplicates error: {e}")
+        return jsonify({"success": False, "message": "Internal server error"}), 500
+
 @app.route('/api/admin/requirements', methods=['GET'])
 def get_requirements():
     """Get all requirements (admin)"""
@@ -585,55 +534,51 @@ def get_requirements():
         limit = int(request.args.get('limit', 25))
         search = request.args.get('search', '')
 
-        db = db_manager.get_db()
-        try:
-            # Build query
-            query = db.query(Requirements)
-
-            # Add search filter if provided (search in all text fields)
-            if search:
-                search_filter = f"%{search}%"
-                query = query.filter(
-                    or_(
-                        Requirements.school_name.ilike(search_filter),
-                        Requirements.current_pianos.ilike(search_filter),
-                        Requirements.preferred_type.ilike(search_filter),
-                        Requirements.teacher_name.ilike(search_filter),
-                        Requirements.background.ilike(search_filter),
-                        Requirements.commitment.ilike(search_filter)
-                    )
+        db = request_db.read_db()
+        # Build query
+        query = db.query(Requirements)
+
+        # Add search filter if provided (search in all text fields)
+        if search:
+            search_filter = f"%{search}%"
+            query = query.filter(
+                or_(
+                    Requirements.school_name.ilike(search_filter),
+                    Requirements.current_pianos.ilike(search_filter),
+                    Requirements.preferred_type.ilike(search_filter),
+                    Requirements.teacher_name.ilike(search_filter),
+                    Requirements.background.ilike(search_filter),
+                    Requirements.commitment.ilike(search_filter)
                 )
+            )
 
-            # Get total count
-            total = query.count()
-
-            # Apply pagination
-            offset = (page - 1) * limit
-            requirements = query.offset(offset).limit(limit).all()
-
-            # Convert to dict
-            data = [req.to_dict() for req in requirements]
-
-            # Calculate pagination info
-            total_pages = (total + limit - 1) // limit
-            pagination = {
-                "page": page,
-                "limit": limit,
-                "total": total,
-                "total_pages": total_pages,
-                "has_next": page < total_pages,
-                "has_prev": page > 1
-            }
-
-            # Return format expected by admin.html
-            return jsonify({
-                "success": True,
-                "data": data,
-                "pagination": pagination
-            }), 200
+        # Get total count
+        total = query.count()
+
+        # Apply pagination (newest first, like the dashboard's first page)
+        offset = (page - 1) * limit
+        requirements = query.order_by(Requirements.created_at.desc(), Requirements.id.desc()).offset(offset).limit(limit).all()
+
+        # Convert to dict
+        data = [req.to_dict() for req in requirements]
+
+        # Calculate pagination info
+        total_pages = (total + limit - 1) // limit
+        pagination = {
+            "page": page,
+            "limit": limit,
+            "total": total,
+            "total_pages": total_pages,
+            "has_next": page < total_pages,
+            "has_prev": page > 1
+        }
 
-        finally:
-            db.close()
+        # Return format expected by admin.html
+        return jsonify({
+            "success": True,
+            "data": data,
+            "pagination": pagination
+        }), 200
 
     except Exception as e:
         logger_manager.logger.error(f"Get requirements error: {e}")
@@ -646,33 +591,181 @@ def get_stats():
         from models import Registration, Requirements
         from sqlalchemy import func
 
-        db = db_manager.get_db()
-        try:
-            # Get counts
-            registration_count = db.query(func.count(Registration.id)).scalar()
-            requirements_count = db.query(func.count(Requirements.id)).scalar()
-            total_submissions = registration_count + requirements_count
-
-            stats = {
-                "registrations": registration_count,
-                "requirements": requirements_count,
-                "total_submissions": total_submissions
-            }
-
-            # Return format expected by admin.html
-            return jsonify({
-                "success": True,
-                "stats": stats
-            }), 200
+        db = request_db.read_db()
+        # Get counts
+        registration_count = db.query(func.count(Registration.id)).scalar()
+        requirements_count = db.query(func.count(Requirements.id)).scalar()
+        total_submissions = registration_count + requirements_count
 
-        finally:
-            db.close()
+        stats = {
+            "registrations": registration_count,
+            "requirements": requirements_count,
+            "total_submissions": total_submissions
+        }
+
+        # Return format expected by admin.html
+        return jsonify({
+            "success": True,
+            "stats": stats
+        }), 200
 
     except Exception as e:
         logger_manager.logger.error(f"Get stats error: {e}")
         return jsonify({"success": False, "message": "Internal server error"}), 500
 
+@app.route('/api/admin/stats/timeseries', methods=['GET'])
+def get_stats_timeseries():
+    """Submission trends per day/week, read from the pre-aggregated rollups"""
+    try:
+        from rollups import GRANULARITIES, METRICS, default_range, timeseries
+
+        granularity = request.args.get('granularity', 'day')
+        if granularity not in GRANULARITIES:
+            return jsonify({"success": False, "message": f"granularity must be one of: {', '.join(GRANULARITIES)}"}), 400
+        metrics = [m.strip() for m in request.args.get('metrics', ','.join(METRICS)).split(',') if m.strip()]
+        unknown = [m for m in metrics if m not in METRICS]
+        if unknown:
+            return jsonify({"success": False, "message": f"Unknown metrics: {', '.join(unknown)}"}), 400
+
+        default_start, default_end = default_range(granularity, 30 if granularity == 'day' else 12)
+        start = request.args.get('from', default_start)
+        end = request.args.get('to', default_end)
+        top = max(1, min(int(request.args.get('top', 10)), 50))
+
+        db = request_db.read_db()
+        result = timeseries(db, granularity, metrics, start, end, top)
+
+        return jsonify({
+            "success": True,
+            "granularity": granularity,
+            "from": start,
+            "to": end,
+            **result
+        }), 200
+
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except Exception as e:
+        logger_manager.logger.error(f"Get timeseries error: {e}")
+        return jsonify({"success": False, "message": "Internal server error"}), 500
+
+@app.route('/api/admin/matches/<kind>/<int:record_id>', methods=['GET'])
+def get_matches(kind, record_id):
+    """Top-K donation matches of one registration or requirement"""
+    try:
+        from matching import MODELS, top_matches
+
+        if kind not in MODELS:
+            return jsonify({"success": False, "message": "kind must be registration or requirement"}), 400
+
+        db = request_db.read_db()
+        record = db.get(MODELS[kind], record_id)
+        if record is None:
+            return jsonify({"success": False, "message": f"{kind.capitalize()} not found"}), 404
+        matches = top_matches(db, kind, record_id)
+
+        return jsonify({"success": True, kind: record_id, "matches": matches}), 200
+
+    except Exception as e:
+        logger_manager.logger.error(f"Get matches error: {e}")
+        return jsonify({"success": False, "message": "Internal server error"}), 500
+
+@app.route('/api/admin/nearby/<target>', methods=['GET'])
+def get_nearby(target):
+    """Registrations or requirements near a record (?registration_id=, ?requirement_id=) or a place (?location=)"""
+    try:
+        from geo import gazetteer, nearest, within_radius
+        from models import Registration, Requirements
+
+        targets = {"registrations": Registration, "requirements": Requirements}
+        if target not in targets:
+            return jsonify({"success": False, "message": "target must be registrations or requirements"}), 400
+        model = targets[target]
+        # Without radius_km the nearest `limit` rows are returned, however far away
+        limit = max(1, min(int(request.args.get('limit', 10)), 100))
+        radius = request.args.get('radius_km')
+        radius = float(radius) if radius else None
+        if radius is not None and radius <= 0:
+            return jsonify({"success": False, "message": "radius_km must be positive"}), 400
+
+        db = request_db.read_db()
+        origin, exclude_id = None, None
+        for param, origin_model in (("registration_id", Registration), ("requirement_id", Requirements)):
+            if request.args.get(param):
+                record = db.get(origin_model, int(request.args[param]))
+                if record is None:
+                    return jsonify({"success": False, "message": f"{param} not found"}), 404
+                if record.latitude is None:
+                    return jsonify({"success": False, "message": "Record has no resolvable location"}), 422
+                origin = (record.latitude, record.longitude)
+                exclude_id = record.id if origin_model is model else None
+        if origin is None and request.args.get('location'):
+            location = gazetteer.resolve(request.args['location'])
+            if location is None:
+                return jsonify({"success": False, "message": "Unknown location"}), 422
+            origin = (location.latitude, location.longitude)
+        if origin is None:
+            return jsonify({"success": False, "message": "registration_id, requirement_id or location is required"}), 400
+
+        if radius is not None:
+            found = within_radius(db, model, *origin, radius_km=radius, limit=limit, exclude_id=exclude_id)
+        else:
+            found = nearest(db, model, *origin, limit=limit, exclude_id=exclude_id)
+        results = [{"distance_km": round(distance, 1), **row.to_dict()} for distance, row in found]
+
+        return jsonify({
+            "success": True,
+            "origin": {"latitude": origin[0], "longitude": origin[1]},
+            "radius_km": radius,
+            "data": results
+        }), 200
+
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except Exception as e:
+        logger_manager.logger.error(f"Get nearby error: {e}")
+        return jsonify({"success": False, "message": "Internal server error"}), 500
+
+@app.route('/api/admin/dashboard', methods=['GET'])
+def get_dashboard():
+    """Stats and the first page of every admin list in one response"""
+    try:
+        from dashboard import build_dashboard, combined_etag, parse_known
+
+        limit = max(1, min(int(request.args.get('limit', 10)), 100))
+        known = parse_known(request.args.get('known'))
+
+        payload = build_dashboard(
+            db_manager.get_read_db, limit, known,
+            concurrent=settings.dashboard_concurrent_queries
+        )
+        etag = combined_etag(payload["sections"])
+        if request.if_none_match.contains(etag):
+            return "", 304, {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+
+        response = jsonify({"success": True, **payload})
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response, 200
+
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except Exception as e:
+        logger_manager.logger.error(f"Get dashboard error: {e}")
+        return jsonify({"success": False, "message": "Internal server error"}), 500
+
 # Delete endpoints (using GET method with action parameter to avoid HTTP method issues)
+def remember_admin_write(response):
+    """Keep this admin's following reads on the primary until the read replica has the write"""
+    if replica_router.enabled:
+        try:
+            response.set_cookie(READ_AFTER_COOKIE, str(replica_router.note_write()),
+                                max_age=settings.read_your_writes_seconds, httponly=True,
+                                secure=request.is_secure, samesite="None" if request.is_secure else "Lax")
+        except Exception as e:
+            logger_manager.logger.error(f"Read-your-writes position error: {e}")
+    return response
+
 @app.route('/api/admin/delete/registration/<id>', methods=['GET', 'OPTIONS'])
 def delete_registration(id):
     """Delete a specific registration (admin)"""
@@ -685,19 +778,15 @@ def delete_registration(id):
         except ValueError:
             return jsonify({"success": False, "message": "Invalid ID format"}), 400
 
-        db = db_manager.get_db()
-        try:
-            registration = db.query(Registration).filter(Registration.id == registration_id).first()
-            if not registration:
-                return jsonify({"success": False, "message": "Registration not found"}), 404
-
-            db.delete(registration)
-            db.commit()
+        db = request_db.db()
+        registration = db.query(Registration).filter(Registration.id == registration_id).first()
+        if not registration:
+            return jsonify({"success": False, "message": "Registration not found"}), 404
 
-            return jsonify({"success": True, "message": "Registration deleted successfully"}), 200
+        db.delete(registration)
+        db.commit()
 
-        finally:
-            db.close()
+        return remember_admin_write(jsonify({"success": True, "message": "Registration deleted successfully"})), 200
 
     except Exception as e:
         logger_manager.logger.error(f"Delete registration error: {e}")
@@ -715,19 +804,15 @@ def delete_requirement(id):
         except ValueError:
             return jsonify({"success": False, "message": "Invalid ID format"}), 400
 
-        db = db_manager.get_db()
-        try:
-            requirement = db.query(Requirements).filter(Requirements.id == requirement_id).first()
-            if not requirement:
-                return jsonify({"success": False, "message": "Requirement not found"}), 404
+        db = request_db.db()
+        requirement = db.query(Requirements).filter(Requirements.id == requirement_id).first()
+        if not requirement:
+            return jsonify({"success": False, "message": "Requirement not found"}), 404
 
-            db.delete(requirement)
-            db.commit()
+        db.delete(requirement)
+        db.commit()
 
-            return jsonify({"success": True, "message": "Requirement deleted successfully"}), 200
-
-        finally:
-            db.close()
+        return remember_admin_write(jsonify({"success": True, "message": "Requirement deleted successfully"})), 200
 
     except Exception as e:
         logger_manager.logger.error(f"Delete requirement error: {e}")
@@ -743,17 +828,14 @@ def delete_contact(id):
         except ValueError:
             return jsonify({"success": False, "message": "Invalid ID format"}), 400
 
-        db = db_manager.get_db()
-        try:
-            contact = db.query(Contact).filter(Contact.id == contact_id).first()
-            if not contact:
-                return jsonify({"success": False, "message": "Contact not found"}), 404
+        db = request_db.db()
+        contact = db.query(Contact).filter(Contact.id == contact_id).first()
+        if not contact:
+            return jsonify({"success": False, "message": "Contact not found"}), 404
 
-            db.delete(contact)
-            db.commit()
-            return jsonify({"success": True, "message": "Contact deleted successfully"}), 200
-        finally:
-            db.close()
+        db.delete(contact)
+        db.commit()
+        return remember_admin_write(jsonify({"success": True, "message": "Contact deleted successfully"})), 200
     except Exception as e:
         logger_manager.logger.error(f"Delete contact error: {e}")
         return jsonify({"success": False, "message": "Internal server error"}), 500
@@ -761,144 +843,79 @@ def delete_contact(id):
 # Admin endpoints
 
 # Export endpoints
-@app.route('/api/admin/export/registrations', methods=['GET'])
-def export_registrations():
-    """Export all registrations as Excel file (or CSV fallback)"""
+def send_incremental_export(kind: str, since: str):
+    """Export only rows changed after `since`; these are one-off files, so they bypass the cache"""
+    import tempfile
+    from exports import EXPORTS, default_format, mimetype_for, write_export
+
+    spec = EXPORTS[kind]
+    fmt = default_format()
+    fd, tmp_name = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+
+    db = db_manager.get_read_db(replica=False)  # watermark exports read the primary, like /api/admin/changes
     try:
-        # Try to import Excel modules, fall back to CSV if not available
-        try:
-            from io import BytesIO, StringIO
-            import openpyxl
-            from openpyxl import Workbook
-            from openpyxl.styles import Font, PatternFill
-            use_excel = True
-        except ImportError:
-            from io import StringIO
-            use_excel = False
-            print("WARNING: openpyxl not available, falling back to CSV export")
-
-        from sqlalchemy import create_engine, desc
-        from sqlalchemy.orm import sessionmaker
-        from models import Registration
+        write_export(db, kind, fmt, tmp_name, since=since)
+    except Exception:
+        os.unlink(tmp_name)
+        raise
+    finally:
+        db.close()
 
-        # Direct database connection (avoiding db_manager logger issues)
-        engine = create_engine(settings.database_url)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    response = send_file(tmp_name, mimetype=mimetype_for(fmt), as_attachment=True,
+                         download_name=f"{spec.filename}_changes.{fmt}")
+    response.call_on_close(lambda: os.path.exists(tmp_name) and os.unlink(tmp_name))
+    return response
 
-        db = SessionLocal()
-        try:
-            registrations = (
-                db.query(Registration)
-                .order_by(desc(Registration.created_at))
-                .all()
-            )
+def send_cached_export(kind: str):
+    """Serve an export from the versioned on-disk cache, building it only when the table changed"""
+    from changes import since_timestamp
+    from export_cache import export_cache, table_version
+    from exports import EXPORTS, default_format, mimetype_for, write_export
 
-            if use_excel:
-                # Create Excel workbook
-                wb = Workbook()
-                ws = wb.active
-                ws.title = "Piano Registrations"
-
-                # Header styling
-                header_font = Font(bold=True, color="FFFFFF")
-                header_fill = PatternFill(start_color="2E86C1", end_color="2E86C1", fill_type="solid")
-
-                # Headers
-                headers = [
-                    "ID", "Manufacturer", "Model", "Serial #", "Year", "Type", "Height",
-                    "Finish", "Condition", "Color/Wood", "City/State", "Access", "IP Address", "Created At", "Updated At"
-                ]
-
-                for col_num, header in enumerate(headers, 1):
-                    cell = ws.cell(row=1, column=col_num, value=header)
-                    cell.font = header_font
-                    cell.fill = header_fill
-
-                # Data rows
-                for row_num, reg in enumerate(registrations, 2):
-                    ws.cell(row=row_num, column=1, value=reg.id)
-                    ws.cell(row=row_num, column=2, value=reg.manufacturer or "")
-                    ws.cell(row=row_num, column=3, value=reg.model or "")
-                    ws.cell(row=row_num, column=4, value=reg.serial or "")
-                    ws.cell(row=row_num, column=5, value=reg.year or "")
-                    ws.cell(row=row_num, column=6, value=reg.height or "")  # Type stored in height column
-                    ws.cell(row=row_num, column=7, value=reg.height or "")  # Height/Length (if available)
-                    ws.cell(row=row_num, column=8, value=reg.finish or "")
-                    ws.cell(row=row_num, column=9, value=reg.finish or "")  # Condition stored in finish column
-                    ws.cell(row=row_num, column=10, value=reg.color_wood or "")
-                    ws.cell(row=row_num, column=11, value=reg.city_state or "")
-                    ws.cell(row=row_num, column=12, value=reg.access or "")
-                    ws.cell(row=row_num, column=13, value=reg.ip_address or "")
-                    ws.cell(row=row_num, column=14, value=str(reg.created_at) if reg.created_at else "")
-                    ws.cell(row=row_num, column=15, value=str(reg.updated_at) if reg.updated_at else "")
-
-                # Auto-adjust column widths
-                for column in ws.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)  # Max width 50
-                    ws.column_dimensions[column_letter].width = adjusted_width
-
-                # Save to BytesIO
-                output = BytesIO()
-                wb.save(output)
-                output.seek(0)
-
-                return send_file(
-                    output,
-                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                    as_attachment=True,
-                    download_name='piano_registrations.xlsx'
-                )
-            else:
-                # Fallback to CSV
-                output = StringIO()
-                import csv
-
-                writer = csv.writer(output)
-                # Headers
-                writer.writerow([
-                    "ID", "Manufacturer", "Model", "Serial #", "Year", "Type", "Height",
-                    "Finish", "Condition", "Color/Wood", "City/State", "Access", "IP Address", "Created At", "Updated At"
-                ])
-
-                # Data rows
-                for reg in registrations:
-                    writer.writerow([
-                        reg.id,
-                        reg.manufacturer or "",
-                        reg.model or "",
-                        reg.serial or "",
-                        reg.year or "",
-                        reg.height or "",  # Type stored in height
-                        reg.height or "",  # Height/Length if any
-                        reg.finish or "",
-                        reg.finish or "",  # Condition stored in finish
-                        reg.color_wood or "",
-                        reg.city_state or "",
-                        reg.access or "",
-                        reg.ip_address or "",
-                        str(reg.created_at) if reg.created_at else "",
-                        str(reg.updated_at) if reg.updated_at else ""
-                    ])
-
-                output.seek(0)
-                return send_file(
-                    output,
-                    mimetype='text/csv',
-                    as_attachment=True,
-                    download_name='piano_registrations.csv'
-                )
+    since = since_timestamp(request.args.get('since'), kind)
+    if since:
+        return send_incremental_export(kind, since)
 
-        finally:
-            db.close()
+    spec = EXPORTS[kind]
+    fmt = default_format()
+
+    db = db_manager.get_read_db()
+    try:
+        version = table_version(db, spec.model)
+        handle = export_cache.get_or_build(kind, fmt, version, lambda target: write_export(db, kind, fmt, target))
+    finally:
+        db.close()
+
+    # The open handle stays readable even if another worker evicts or replaces the file.
+    # File responses go through wsgi.file_wrapper (sendfile under gunicorn); the size is
+    # known from fstat, so Last-Modified/ETag revalidation and HTTP Range still apply
+    stat = os.fstat(handle.fileno())
+    response = send_file(
+        handle,
+        mimetype=mimetype_for(fmt),
+        as_attachment=True,
+        download_name=f"{spec.filename}.{fmt}",
+        etag=f"{kind}-{version}-{fmt}",
+        last_modified=stat.st_mtime,
+        max_age=0
+    )
+    response.content_length = stat.st_size
+    try:
+        response.make_conditional(request, accept_ranges=True, complete_length=stat.st_size)
+    except Exception:
+        handle.close()
+        raise
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
 
+@app.route('/api/admin/export/registrations', methods=['GET'])
+def export_registrations():
+    """Export all registrations as Excel file (or CSV fallback)"""
+    try:
+        return send_cached_export("registrations")
+    except InvalidWatermark as e:
+        return jsonify({"success": False, "message": str(e)}), 400
     except Exception as e:
         print(f"Export registrations error: {e}")
         import traceback
@@ -909,136 +926,331 @@ def export_registrations():
 def export_requirements():
     """Export all requirements as Excel file (or CSV fallback)"""
     try:
-        # Try to import Excel modules, fall back to CSV if not available
+        return send_cached_export("requirements")
+    except InvalidWatermark as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except Exception as e:
+        print(f"Export requirements error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"success": False, "message": f"Export failed: {str(e)}"}), 500
+
+@app.route('/api/admin/export-jobs', methods=['POST'])
+def create_export_job():
+    """Start building an export in the background; poll the returned status_url"""
+    from changes import since_timestamp
+    from export_jobs import JobLimitError, export_jobs
+    from exports import EXPORTS, default_format, excel_available
+
+    data = request.get_json(silent=True) or {}
+    kind = data.get('kind') or request.args.get('kind')
+    if kind not in EXPORTS:
+        return jsonify({"success": False, "message": f"Unknown export: {kind}"}), 400
+    fmt = data.get('format') or request.args.get('format') or default_format()
+    if fmt not in ("xlsx", "csv") or (fmt == "xlsx" and not excel_available()):
+        return jsonify({"success": False, "message": f"Unsupported format: {fmt}"}), 400
+    try:
+        since = since_timestamp(data.get('since') or request.args.get('since'), kind)
+    except InvalidWatermark as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    try:
+        job = export_jobs.submit(kind, fmt, since)
+    except JobLimitError as e:
+        return jsonify({"success": False, "message": str(e)}), 429
+    except Exception as e:
+        logger_manager.logger.error(f"Start export job error: {e}")
+        return jsonify({"success": False, "message": "Internal server error"}), 500
+    response = jsonify({"success": True, "job": job})
+    response.headers["Location"] = job["status_url"]
+    return response, 202
+
+@app.route('/api/admin/export-jobs/<job_id>', methods=['GET'])
+def get_export_job(job_id):
+    """Status and row progress of an export job"""
+    from export_jobs import export_jobs
+
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Export job not found"}), 404
+    return jsonify({"success": True, "job": job})
+
+@app.route('/api/admin/export-jobs/<job_id>', methods=['DELETE'])
+def cancel_export_job(job_id):
+    """Cancel an export job, or discard its result"""
+    from export_jobs import export_jobs
+
+    job = export_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Export job not found"}), 404
+    return jsonify({"success": True, "job": job})
+
+@app.route('/api/admin/export-jobs/<job_id>/result', methods=['GET'])
+def export_job_result(job_id):
+    """Download the file of a finished export job"""
+    from export_jobs import DONE, EXPIRED, export_jobs
+    from exports import EXPORTS, mimetype_for
+
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Export job not found"}), 404
+    if job["status"] not in (DONE, EXPIRED):
+        return jsonify({"success": False, "message": f"Export job is {job['status']}", "job": job}), 409
+    path = export_jobs.result_path(job_id)
+    try:
+        handle = open(path, "rb") if path else None
+    except FileNotFoundError:
+        handle = None  # swept since the status check
+    if handle is None:
+        return jsonify({"success": False, "message": "The export result has expired", "job": job}), 410
+
+    suffix = "_changes" if job["since"] else ""
+    return send_file(handle, mimetype=mimetype_for(job["format"]), as_attachment=True,
+                     download_name=f"{EXPORTS[job['kind']].filename}{suffix}.{job['format']}")
+
+@app.route('/api/admin/export/<kind>.ndjson', methods=['GET'])
+def export_ndjson(kind):
+    """Stream a table as NDJSON (one JSON object per line) for machine consumers"""
+    from flask import Response, stream_with_context
+    from changes import CHANGE_TABLES, since_timestamp
+    from exports import NDJSON_MIMETYPE, NDJSON_MODELS, iter_chunks, iter_gzip, iter_ndjson
+
+    model = NDJSON_MODELS.get(kind)
+    if model is None:
+        return jsonify({"success": False, "message": f"Unknown export: {kind}"}), 404
+
+    since = None
+    if request.args.get('since'):
+        if kind not in CHANGE_TABLES:
+            return jsonify({"success": False, "message": f"{kind} does not support since"}), 400
         try:
-            from io import BytesIO, StringIO
-            import openpyxl
-            from openpyxl import Workbook
-            from openpyxl.styles import Font, PatternFill
-            use_excel = True
-        except ImportError:
-            from io import StringIO
-            use_excel = False
-            print("WARNING: openpyxl not available, falling back to CSV export")
-
-        from sqlalchemy import create_engine, desc
-        from sqlalchemy.orm import sessionmaker
-        from models import Requirements
+            since = since_timestamp(request.args.get('since'), kind)
+        except InvalidWatermark as e:
+            return jsonify({"success": False, "message": str(e)}), 400
 
-        # Direct database connection (avoiding db_manager logger issues)
-        engine = create_engine(settings.database_url)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    use_gzip = request.args.get('gzip', '').lower() in ('1', 'true', 'yes') \
+        or request.accept_encodings['gzip'] > 0
 
-        db = SessionLocal()
+    def generate():
+        db = db_manager.get_read_db(replica=since is None)
         try:
-            requirements = (
-                db.query(Requirements)
-                .order_by(desc(Requirements.created_at))
-                .all()
-            )
+            chunks = iter_chunks(iter_ndjson(db, model, since=since))
+            yield from (iter_gzip(chunks) if use_gzip else chunks)
+        finally:
+            db.close()
 
-            if use_excel:
-                # Create Excel workbook
-                wb = Workbook()
-                ws = wb.active
-                ws.title = "Requirements"
-
-                # Header styling
-                header_font = Font(bold=True, color="FFFFFF")
-                header_fill = PatternFill(start_color="28B463", end_color="28B463", fill_type="solid")
-
-                # Headers
-                headers = [
-                    "ID", "School Name", "Current Pianos", "Preferred Type", "Teacher Name", "Background", "Commitment",
-                    "IP Address", "Created At", "Updated At"
-                ]
-
-                for col_num, header in enumerate(headers, 1):
-                    cell = ws.cell(row=1, column=col_num, value=header)
-                    cell.font = header_font
-                    cell.fill = header_fill
-
-                # Data rows
-                for row_num, req in enumerate(requirements, 2):
-                    ws.cell(row=row_num, column=1, value=req.id)
-                    ws.cell(row=row_num, column=2, value=req.school_name or "")
-                    ws.cell(row=row_num, column=3, value=req.current_pianos or "")
-                    ws.cell(row=row_num, column=4, value=req.preferred_type or "")
-                    ws.cell(row=row_num, column=5, value=req.teacher_name or "")
-                    ws.cell(row=row_num, column=6, value=req.background or "")
-                    ws.cell(row=row_num, column=7, value=req.commitment or "")
-                    ws.cell(row=row_num, column=8, value=req.ip_address or "")
-                    ws.cell(row=row_num, column=9, value=str(req.created_at) if req.created_at else "")
-                    ws.cell(row=row_num, column=10, value=str(req.updated_at) if req.updated_at else "")
-
-                # Auto-adjust column widths
-                for column in ws.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)  # Max width 50
-                    ws.column_dimensions[column_letter].width = adjusted_width
-
-                # Save to BytesIO
-                output = BytesIO()
-                wb.save(output)
-                output.seek(0)
-
-                return send_file(
-                    output,
-                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                    as_attachment=True,
-                    download_name='requirements.xlsx'
-                )
-            else:
-                # Fallback to CSV
-                output = StringIO()
-                import csv
-
-                writer = csv.writer(output)
-                # Headers
-                writer.writerow([
-                    "ID", "School Name", "Current Pianos", "Preferred Type", "Teacher Name", "Background", "Commitment",
-                    "IP Address", "Created At", "Updated At"
-                ])
-
-                # Data rows
-                for req in requirements:
-                    writer.writerow([
-                        req.id,
-                        req.school_name or "",
-                        req.current_pianos or "",
-                        req.preferred_type or "",
-                        req.teacher_name or "",
-                        req.background or "",
-                        req.commitment or "",
-                        req.ip_address or "",
-                        str(req.created_at) if req.created_at else "",
-                        str(req.updated_at) if req.updated_at else ""
-                    ])
-
-                output.seek(0)
-                return send_file(
-                    output,
-                    mimetype='text/csv',
-                    as_attachment=True,
-                    download_name='requirements.csv'
-                )
+    headers = {"Content-Disposition": f"attachment; filename={kind}.ndjson"}
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE, headers=headers)
+
+# Archive (old or completed submissions moved out of the hot tables, see archive.py)
+@app.route('/api/admin/complete/<kind>/<int:record_id>', methods=['POST'])
+def complete_record(kind, record_id):
+    """Mark a submission as handled; the next archive run moves it out of the hot table"""
+    try:
+        from archive import ARCHIVE_MODELS
+        from models import submission_time
+
+        model = ARCHIVE_MODELS.get(kind)
+        if model is None:
+            return jsonify({"success": False, "message": f"Unknown table: {kind}"}), 404
+
+        db = request_db.db()
+        record = db.query(model).filter(model.id == record_id).first()
+        if not record:
+            return jsonify({"success": False, "message": "Record not found"}), 404
+        if record.completed_at is None:
+            record.completed_at = submission_time()
+            db.commit()
+        return remember_admin_write(jsonify({"success": True, "data": record.to_dict()})), 200
+    except Exception as e:
+        logger_manager.logger.error(f"Complete {kind} error: {e}")
+        return jsonify({"success": False, "message": "Internal server error"}), 500
+
+@app.route('/api/admin/archive', methods=['GET'])
+def get_archive_summary():
+    """Archived rows, segments and bytes per table"""
+    try:
+        from archive import summary
+
+        db = request_db.read_db(replica=False)
+        return jsonify({"success": True, "archive": summary(db)}), 200
+    except Exception as e:
+        logger_manager.logger.error(f"Get archive summary error: {e}")
+        return jsonify({"success": False, "message": "Internal server error"}), 500
 
+@app.route('/api/admin/archive/<kind>', methods=['GET'])
+def search_archived(kind):
+    """Search archived rows; same parameters and response shape as the admin lists"""
+    try:
+        from archive import ARCHIVE_MODELS, search_archive
+
+        if kind not in ARCHIVE_MODELS:
+            return jsonify({"success": False, "message": f"Unknown table: {kind}"}), 404
+        page = max(int(request.args.get('page', 1)), 1)
+        limit = max(int(request.args.get('limit', 25)), 1)
+
+        db = request_db.read_db(replica=False)
+        data, total = search_archive(db, kind, request.args.get('search', ''), page, limit)
+
+        total_pages = (total + limit - 1) // limit
+        pagination = {
+            "page": page,
+            "limit": limit,
+            "total": total,
+            "total_pages": total_pages,
+            "has_next": page < total_pages,
+            "has_prev": page > 1
+        }
+        return jsonify({"success": True, "data": data, "pagination": pagination}), 200
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except Exception as e:
+        logger_manager.logger.error(f"Search archive error: {e}")
+        return jsonify({"success": False, "message": "Internal server error"}), 500
+
+@app.route('/api/admin/archive/<kind>.ndjson', methods=['GET'])
+def export_archived_ndjson(kind):
+    """Stream archived rows (oldest first) as NDJSON, optionally filtered by ?search="""
+    from flask import Response, stream_with_context
+    from archive import ARCHIVE_MODELS, decode_row, iter_archived
+    from exports import NDJSON_MIMETYPE, iter_chunks, iter_gzip
+
+    model = ARCHIVE_MODELS.get(kind)
+    if model is None:
+        return jsonify({"success": False, "message": f"Unknown table: {kind}"}), 404
+    search = request.args.get('search', '')
+    use_gzip = request.args.get('gzip', '').lower() in ('1', 'true', 'yes') \
+        or request.accept_encodings['gzip'] > 0
+
+    def generate():
+        db = db_manager.get_read_db(replica=False)
+        try:
+            lines = (json.dumps(decode_row(model, row).to_dict(), ensure_ascii=False) + "\n"
+                     for row in iter_archived(db, kind, search, newest_first=False))
+            chunks = iter_chunks(lines)
+            yield from (iter_gzip(chunks) if use_gzip else chunks)
         finally:
             db.close()
 
+    headers = {"Content-Disposition": f"attachment; filename={kind}_archive.ndjson"}
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE, headers=headers)
+
+@app.route('/api/admin/archive/<kind>/export', methods=['GET'])
+def export_archived(kind):
+    """Archived registrations/requirements as the same Excel (or CSV) file as the live export"""
+    import tempfile
+    from archive import ARCHIVE_MODELS, decode_row, iter_archived
+    from exports import EXPORTS, default_format, mimetype_for, write_rows
+
+    if kind not in EXPORTS:
+        return jsonify({"success": False, "message": f"Unknown export: {kind}"}), 404
+    try:
+        fmt = default_format()
+        fd, tmp_name = tempfile.mkstemp(suffix=f".{fmt}")
+        os.close(fd)
+        db = db_manager.get_read_db(replica=False)
+        try:
+            rows = (decode_row(ARCHIVE_MODELS[kind], row) for row in iter_archived(db, kind, request.args.get('search', '')))
+            write_rows(kind, fmt, tmp_name, rows)
+        except Exception:
+            os.unlink(tmp_name)
+            raise
+        finally:
+            db.close()
+
+        response = send_file(tmp_name, mimetype=mimetype_for(fmt), as_attachment=True,
+                             download_name=f"{EXPORTS[kind].filename}_archive.{fmt}")
+        response.call_on_close(lambda: os.path.exists(tmp_name) and os.unlink(tmp_name))
+        return response
     except Exception as e:
-        print(f"Export requirements error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger_manager.logger.error(f"Export archive error: {e}")
         return jsonify({"success": False, "message": f"Export failed: {str(e)}"}), 500
 
+@app.route('/api/admin/changes', methods=['GET'])
+def get_changes():
+    """Incremental sync feed: rows inserted/updated and deleted after a watermark"""
+    try:
+        from changes import CHANGE_TABLES, collect_changes, encode_cursor, parse_since
+
+        tables = [t.strip() for t in request.args.get('tables', ','.join(CHANGE_TABLES)).split(',') if t.strip()]
+        unknown = [t for t in tables if t not in CHANGE_TABLES]
+        if unknown:
+            return jsonify({"success": False, "message": f"Unknown tables: {', '.join(unknown)}"}), 400
+        limit = max(1, min(int(request.args.get('limit', 500)), 5000))
+        state = parse_since(request.args.get('since'))
+
+        db = request_db.read_db(replica=False)  # sync cursors must not run ahead of a lagging replica
+        changes, deleted, new_state, has_more = collect_changes(db, state, tables, limit)
+
+        return jsonify({
+            "success": True,
+            "changes": changes,
+            "deleted": deleted,
+            "next_cursor": encode_cursor(new_state),
+            "has_more": has_more
+        }), 200
+
+    except (InvalidWatermark, ValueError) as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except Exception as e:
+        logger_manager.logger.error(f"Get changes error: {e}")
+        return jsonify({"success": False, "message": "Internal server error"}), 500
+
+@app.route('/api/admin/events', methods=['GET'])
+def stream_events():
+    """Server-Sent Events stream of created/deleted submissions for the admin dashboard"""
+    import queue
+    from flask import Response, stream_with_context
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid Last-Event-ID"}), 400
+
+    # Subscribe before replaying so nothing committed in between is lost; ids dedupe the overlap
+    subscription = event_broadcaster.subscribe()
+
+    def generate():
+        try:
+            yield f"retry: {settings.sse_retry_ms}\n\n"
+            last_sent = last_id or 0
+            if last_id is not None:
+                missed = event_broadcaster.replay(last_id, settings.sse_replay_limit)
+                if missed is None:
+                    # Too far behind to replay: tell the page to reload everything
+                    last_sent = event_broadcaster.latest_id()
+                    yield format_sse({"id": last_sent}, "reset")
+                else:
+                    for payload in missed:
+                        yield format_sse(payload)
+                        last_sent = payload["id"]
+
+            deadline = time.monotonic() + settings.sse_max_stream_seconds
+            while time.monotonic() < deadline:
+                try:
+                    payload = subscription.get(timeout=settings.sse_heartbeat_seconds)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                if payload is None:
+                    break  # dropped as a slow consumer, the client reconnects with Last-Event-ID
+                if payload["id"] <= last_sent:
+                    continue
+                yield format_sse(payload)
+                last_sent = payload["id"]
+        finally:
+            event_broadcaster.unsubscribe(subscription)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+
 # Startup and shutdown events
 def startup_event():
     """Application startup tasks"""
@@ -1056,21 +1268,42 @@ def startup_event():
     logger_manager.logger.info(f"📊 Version: {settings.version}")
     logger_manager.logger.info(f"🌐 Host: {settings.host}:{settings.port}")
     logger_manager.logger.info(f"📁 Database: {settings.database_url}")
+    logger_manager.logger.info(f"✉️  Mail service: {settings.mail_server}:{settings.mail_port}")
+    logger_manager.logger.info(f"🔓 CORS origins: {cors_origins}")
 
 def cleanup_app_context():
     """Application context cleanup tasks"""
     logger_manager.logger.info("🧹 Cleaning up Flask application context")
 
-# Register startup/shutdown functions
-with app.app_context():
-    startup_event()
+_started = False
+_start_lock = threading.Lock()
+
+def create_app():
+    """Return the app after the once-per-process-tree startup (schema check).
+
+    Importing this module does no I/O. Under `gunicorn --preload` (see
+    gunicorn.conf.py) the master calls this before forking, so workers start
+    with the schema already verified; elsewhere it runs on the first request.
+    """
+    global _started
+    if not _started:
+        with _start_lock:
+            if not _started:
+                with app.app_context():
+                    startup_event()
+                _started = True
+    return app
+
+@app.teardown_request
+def release_request_db(exception=None):
+    request_db.end_request()
 
 @app.teardown_appcontext
 def teardown_appcontext(exception=None):
     cleanup_app_context()
 
 if __name__ == '__main__':
-    app.run(
+    create_app().run(
         host=settings.host,
         port=settings.port,
         debug=settings.debug
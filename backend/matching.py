@@ -0,0 +1,355 @@
+"""
+Donation matching between piano registrations and school requirements.
+
+Each record is reduced to a few discrete features: piano type, size class,
+region and, for records located to a city (geo.py), its grid cell. They are stored in an inverted index (match_features), so a new
+record only meets the records that share at least one feature, read with one
+indexed query and never by rescanning the other table. The pair score is the
+sum of the weights of the shared features.
+
+donation_matches keeps the top-K candidates of every record, from both
+sides. When a record arrives, its own list is written, and it is pushed into
+a candidate's list only if it beats that list's current K-th entry. Indexing
+runs on a per-process background thread after the submission is committed, so
+form latency does not depend on it. Existing data is indexed with:
+
+    python backend/matching.py --rebuild
+"""
+import argparse
+import re
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, event, func, select
+
+from config import settings
+from geo import neighborhood, region_of
+from logger import logger_manager
+from models import DonationMatch, MatchFeature, Registration, Requirements, SessionLocal
+
+REGISTRATION = "registration"
+REQUIREMENT = "requirement"
+MODELS = {REGISTRATION: Registration, REQUIREMENT: Requirements}
+OTHER_SIDE = {REGISTRATION: REQUIREMENT, REQUIREMENT: REGISTRATION}
+
+# Weight of a shared feature, by feature kind
+WEIGHTS = {"type": 3, "size": 1, "region": 2, "near": 2, "nearby": 1}
+
+# Geohash precision of the proximity features: 3 characters is a cell of roughly 150 km
+NEAR_PRECISION = 3
+
+TYPE_KEYWORDS = {
+    "grand": ["grand", "三角"],
+    "digital": ["digital", "electric", "electronic", "keyboard", "数码", "电钢琴", "电子"],
+    "upright": ["upright", "vertical", "studio", "console", "spinet", "立式"],
+}
+
+SIZE_KEYWORDS = {
+    "compact": ["spinet", "console", "baby", "compact", "small", "apartment", "小"],
+    "large": ["concert", "large", "full size", "full-size", "semi-concert", "大"],
+    "standard": ["studio", "parlor", "parlour", "medium", "standard", "professional", "中"],
+}
+
+_NUMBER_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(cm|in|inch|inches|\"|')?", re.IGNORECASE)
+
+def _first_keyword_match(text: str, table: Dict[str, List[str]]) -> Optional[str]:
+    for label, keywords in table.items():
+        if any(keyword in text for keyword in keywords):
+            return label
+    return None
+
+def _size_from_measure(text: str, piano_type: Optional[str]) -> Optional[str]:
+    """Size class from a height/length like '48 in' or '120cm'"""
+    for number, unit in _NUMBER_PATTERN.findall(text):
+        value = float(number)
+        if unit.lower() == "cm":
+            value /= 2.54
+        elif not unit and value > 100:
+            value /= 2.54  # bare numbers above 100 are centimetres
+        if not 30 <= value <= 120:
+            continue  # a year, a serial fragment, not a size
+        if piano_type == "grand":
+            return "compact" if value < 60 else "large" if value >= 80 else "standard"
+        return "compact" if value <= 44 else "large" if value >= 52 else "standard"
+    return None
+
+def registration_features(registration) -> Set[str]:
+    # Type is stored in the height column
+    piano_type = _first_keyword_match(f"{registration.height or ''}".lower(), TYPE_KEYWORDS)
+    described = f"{registration.height or ''} {registration.model or ''}".lower()
+    size = _first_keyword_match(described, SIZE_KEYWORDS) or _size_from_measure(described, piano_type)
+    region = region_of(registration.city_state)
+    return _features(piano_type, size, region) | proximity_features(registration)
+
+def requirement_features(requirement) -> Set[str]:
+    wanted = (requirement.preferred_type or "").lower()
+    piano_type = _first_keyword_match(wanted, TYPE_KEYWORDS)
+    size = _first_keyword_match(wanted, SIZE_KEYWORDS) or _size_from_measure(wanted, piano_type)
+    region = region_of(f"{requirement.school_name or ''}, {requirement.background or ''}")
+    return _features(piano_type, size, region) | proximity_features(requirement)
+
+def proximity_features(record) -> Set[str]:
+    """'near:<cell>' for the record's own grid cell and 'nearby:<cell>' for the 8 around it.
+
+    Only city-level locations count; a state centroid says nothing about distance.
+    """
+    if getattr(record, "geo_level", None) != "city" or record.latitude is None:
+        return set()
+    own, *around = neighborhood(record.latitude, record.longitude, NEAR_PRECISION)
+    return {f"near:{own}"} | {f"nearby:{cell}" for cell in around}
+
+def query_features(features: Set[str]) -> Set[str]:
+    """Postings to look up for a record: its own cell matches candidates in the same cell
+    (their near:) or next to it (their nearby:), so only neighbouring cells are read"""
+    query = {f for f in features if not f.startswith("nearby:")}
+    query |= {f"nearby:{f.split(':', 1)[1]}" for f in features if f.startswith("near:")}
+    return query
+
+def _features(piano_type, size, region) -> Set[str]:
+    features = set()
+    if piano_type:
+        features.add(f"type:{piano_type}")
+    if size:
+        features.add(f"size:{size}")
+    if region:
+        features.add(f"region:{region}")
+    return features
+
+def features_of(record_type: str, record) -> Set[str]:
+    if record_type == REGISTRATION:
+        if record.duplicate_of is not None:
+            return set()  # a flagged copy of another registration is not a separate piano
+        return registration_features(record)
+    return requirement_features(record)
+
+def feature_weight(feature: str) -> int:
+    return WEIGHTS.get(feature.split(":", 1)[0], 1)
+
+def score_candidates(db, record_type: str, features: Set[str]) -> Dict[int, Tuple[int, List[str]]]:
+    """Score every record of the other side sharing a feature (one inverted-index query)"""
+    if not features:
+        return {}
+    postings = db.execute(
+        select(MatchFeature.record_id, MatchFeature.feature).where(
+            MatchFeature.record_type == OTHER_SIDE[record_type],
+            MatchFeature.feature.in_(sorted(query_features(features)))
+        )
+    ).all()
+    scores: Counter = Counter()
+    reasons: Dict[int, List[str]] = {}
+    for candidate_id, feature in postings:
+        scores[candidate_id] += feature_weight(feature)
+        reasons.setdefault(candidate_id, []).append(feature)
+    return {candidate_id: (score, sorted(reasons[candidate_id])) for candidate_id, score in scores.items()}
+
+def _top(scored: Dict[int, Tuple[int, List[str]]], k: int) -> List[Tuple[int, int, List[str]]]:
+    # Higher score first, then the older record (smaller id) first
+    ranked = sorted(scored.items(), key=lambda item: (-item[1][0], item[0]))
+    return [(candidate_id, score, reasons) for candidate_id, (score, reasons) in ranked[:k]]
+
+def _chunks(values: List[int], size: int = 500) -> Iterable[List[int]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def write_features(db, record_type: str, record_id: int, features: Set[str]):
+    db.query(MatchFeature).filter(
+        MatchFeature.record_type == record_type, MatchFeature.record_id == record_id
+    ).delete(synchronize_session=False)
+    db.add_all([MatchFeature(record_type=record_type, record_id=record_id, feature=f) for f in sorted(features)])
+
+def write_own_matches(db, record_type: str, record_id: int, top: List[Tuple[int, int, List[str]]]):
+    db.query(DonationMatch).filter(
+        DonationMatch.owner_type == record_type, DonationMatch.owner_id == record_id
+    ).delete(synchronize_session=False)
+    db.add_all([
+        DonationMatch(owner_type=record_type, owner_id=record_id, candidate_id=candidate_id,
+                      score=score, reasons=",".join(reasons))
+        for candidate_id, score, reasons in top
+    ])
+
+def offer_to_candidates(db, record_type: str, record_id: int, scored: Dict[int, Tuple[int, List[str]]], k: int):
+    """Insert the new record into candidates' top-K lists where it beats the current K-th entry"""
+    owner_type = OTHER_SIDE[record_type]
+    for chunk in _chunks(sorted(scored)):
+        table_stats = {
+            owner_id: (count, lowest)
+            for owner_id, count, lowest in db.execute(
+                select(DonationMatch.owner_id, func.count(DonationMatch.id), func.min(DonationMatch.score))
+                .where(DonationMatch.owner_type == owner_type, DonationMatch.owner_id.in_(chunk))
+                .group_by(DonationMatch.owner_id)
+            ).all()
+        }
+        for owner_id in chunk:
+            score, reasons = scored[owner_id]
+            count, lowest = table_stats.get(owner_id, (0, None))
+            if count >= k and score <= lowest:
+                continue
+            db.add(DonationMatch(owner_type=owner_type, owner_id=owner_id, candidate_id=record_id,
+                                 score=score, reasons=",".join(reasons)))
+            if count >= k:
+                # Evict the weakest entry (newest among equal scores) to keep exactly K
+                weakest = db.query(DonationMatch).filter(
+                    DonationMatch.owner_type == owner_type, DonationMatch.owner_id == owner_id,
+                    DonationMatch.candidate_id != record_id
+                ).order_by(DonationMatch.score, DonationMatch.candidate_id.desc()).first()
+                if weakest is not None:
+                    db.delete(weakest)
+
+def index_record(db, record_type: str, record_id: int, k: Optional[int] = None) -> int:
+    """(Re)index one record and update both sides' top-K lists; returns the number of candidates"""
+    k = k or settings.match_top_k
+    record = db.get(MODELS[record_type], record_id)
+    if record is None:
+        return 0
+    features = features_of(record_type, record)
+    write_features(db, record_type, record_id, features)
+    # Drop the record from other lists before re-offering it with its new features
+    db.query(DonationMatch).filter(
+        DonationMatch.owner_type == OTHER_SIDE[record_type], DonationMatch.candidate_id == record_id
+    ).delete(synchronize_session=False)
+
+    scored = score_candidates(db, record_type, features)
+    write_own_matches(db, record_type, record_id, _top(scored, k))
+    offer_to_candidates(db, record_type, record_id, scored, k)
+    return len(scored)
+
+def remove_record(connection, record_type: str, record_id: int):
+    """Forget a deleted record: its features, its own list and its place in other lists"""
+    connection.execute(MatchFeature.__table__.delete().where(and_(
+        MatchFeature.record_type == record_type, MatchFeature.record_id == record_id
+    )))
+    connection.execute(DonationMatch.__table__.delete().where(and_(
+        DonationMatch.owner_type == record_type, DonationMatch.owner_id == record_id
+    )))
+    connection.execute(DonationMatch.__table__.delete().where(and_(
+        DonationMatch.owner_type == OTHER_SIDE[record_type], DonationMatch.candidate_id == record_id
+    )))
+
+def top_matches(db, record_type: str, record_id: int) -> List[Dict]:
+    """Stored top-K matches of one record with the matched records inlined"""
+    rows = db.query(DonationMatch).filter(
+        DonationMatch.owner_type == record_type, DonationMatch.owner_id == record_id
+    ).order_by(DonationMatch.score.desc(), DonationMatch.candidate_id).all()
+    candidate_model = MODELS[OTHER_SIDE[record_type]]
+    candidates = {}
+    for chunk in _chunks([row.candidate_id for row in rows]):
+        for obj in db.query(candidate_model).filter(candidate_model.id.in_(chunk)).all():
+            candidates[obj.id] = obj
+    return [
+        {
+            "score": row.score,
+            "reasons": row.reasons.split(",") if row.reasons else [],
+            OTHER_SIDE[record_type]: candidates[row.candidate_id].to_dict()
+        }
+        for row in rows if row.candidate_id in candidates
+    ]
+
+class MatchEngine:
+    """Runs index_record on one background thread per process, after the submission commit"""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.logger = logger_manager
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Set[Future] = set()
+
+    def _run(self, record_type: str, record_id: int):
+        db = self.session_factory()
+        try:
+            candidates = index_record(db, record_type, record_id)
+            db.commit()
+            self.logger.logger.debug(f"Matched {record_type} {record_id} against {candidates} candidates")
+        except Exception as e:
+            db.rollback()
+            self.logger.logger.error(f"Matching failed for {record_type} {record_id}: {e}")
+            raise
+        finally:
+            db.close()
+
+    def schedule(self, record_type: str, record_id: int) -> Optional[Future]:
+        if not settings.matching_enabled or record_id is None:
+            return None
+        if self._executor is None:
+            # One worker: index updates of the same lists never race each other in this process
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="matching")
+        future = self._executor.submit(self._run, record_type, record_id)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        return future
+
+    def wait(self, timeout: float = 30):
+        """Block until every scheduled indexing job has finished"""
+        for future in list(self._pending):
+            future.exception(timeout=timeout)
+
+def _after_delete(mapper, connection, target):
+    remove_record(connection, REGISTRATION if isinstance(target, Registration) else REQUIREMENT, target.id)
+
+for _model in (Registration, Requirements):
+    event.listen(_model, "after_delete", _after_delete)
+
+def rebuild(session_factory, chunk_size: int = 500, log=print) -> Dict[str, int]:
+    """Rebuild the feature index, then every record's top-K list, in chunks"""
+    k = settings.match_top_k
+    db = session_factory()
+    try:
+        db.query(MatchFeature).delete(synchronize_session=False)
+        db.query(DonationMatch).delete(synchronize_session=False)
+        db.commit()
+
+        counts = {}
+        for record_type, model in MODELS.items():
+            counts[record_type] = 0
+            last_id = 0
+            while True:
+                records = db.query(model).filter(model.id > last_id).order_by(model.id).limit(chunk_size).all()
+                if not records:
+                    break
+                for record in records:
+                    write_features(db, record_type, record.id, features_of(record_type, record))
+                db.commit()
+                last_id = records[-1].id
+                counts[record_type] += len(records)
+
+        for record_type, model in MODELS.items():
+            top_by_features: Dict[frozenset, List[Tuple[int, int, List[str]]]] = {}
+            last_id = 0
+            while True:
+                ids = [row[0] for row in db.query(model.id).filter(model.id > last_id).order_by(model.id).limit(chunk_size)]
+                if not ids:
+                    break
+                features_by_id: Dict[int, Set[str]] = {}
+                for record_id, feature in db.query(MatchFeature.record_id, MatchFeature.feature).filter(
+                    MatchFeature.record_type == record_type, MatchFeature.record_id.in_(ids)
+                ):
+                    features_by_id.setdefault(record_id, set()).add(feature)
+                for record_id in ids:
+                    # Records with the same feature set have the same candidates: score each set once
+                    key = frozenset(features_by_id.get(record_id, set()))
+                    if key not in top_by_features:
+                        top_by_features[key] = _top(score_candidates(db, record_type, set(key)), k)
+                    write_own_matches(db, record_type, record_id, top_by_features[key])
+                db.commit()
+                last_id = ids[-1]
+        log(f"Indexed {counts[REGISTRATION]} registrations and {counts[REQUIREMENT]} requirements")
+        return counts
+    finally:
+        db.close()
+
+# Create global match engine instance
+match_engine = MatchEngine(SessionLocal)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Donation matching index")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild features and top-K lists for all records")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        from models import create_tables
+
+        create_tables()
+        rebuild(SessionLocal, args.chunk_size)
+    else:
+        parser.print_help()
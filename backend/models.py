@@ -1,12 +1,17 @@
-# Import psycopg2 to register the dialect with SQLAlchemy
-import psycopg2
+# The DB driver (psycopg2, sqlite3) is imported by SQLAlchemy when the engine is created
+import hashlib
+import ipaddress
+from typing import Iterable, Optional
 
-# Ensure psycopg is imported before SQLAlchemy
-from sqlalchemy import Column, Integer, String, DateTime, Text, create_engine
+from sqlalchemy import (BigInteger, Column, Float, Integer, LargeBinary, String, DateTime, Text, Index, UniqueConstraint,
+                        create_engine, event, inspect, select)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.sql import func
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import func, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import column_property, sessionmaker
+from sqlalchemy.types import TypeDecorator
 from config import settings
+from sqlite_profile import apply_sqlite_profile, read_only_url
 
 # Ensure SQLAlchemy uses psycopg2 dialect when a plain postgresql URL is provided.
 def _build_sqlalchemy_url(raw_url: str) -> str:
@@ -19,9 +24,104 @@ def _build_sqlalchemy_url(raw_url: str) -> str:
 # Replace settings.database_url in-place so subsequent engine creation uses the adjusted URL.
 settings.database_url = _build_sqlalchemy_url(settings.database_url)
 import os
+from datetime import datetime
 
 Base = declarative_base()
 
+def submission_time() -> datetime:
+    """Insert-time created_at for submissions (UTC, whole seconds like CURRENT_TIMESTAMP).
+
+    Set client-side so insert hooks know the stored value without reading the row back.
+    """
+    return datetime.utcnow().replace(microsecond=0)
+
+# Client metadata of submissions is stored compactly: the IP address packed (4 or 16 bytes; inet on
+# PostgreSQL) and the user agent as a hash into the deduplicated user_agents table. Both read back as
+# text through the usual ip_address / user_agent attributes. client_meta.py converts old rows.
+
+def normalize_ip(value) -> Optional[str]:
+    """Canonical text form of an IP address; None for anything else (stored as NULL)"""
+    try:
+        return str(ipaddress.ip_address(value.strip())) if value else None
+    except (AttributeError, ValueError):
+        return None
+
+class PackedIP(TypeDecorator):
+    """IP address as packed bytes (inet on PostgreSQL), read and written as text"""
+    impl = LargeBinary(16)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import INET
+            return dialect.type_descriptor(INET())
+        return dialect.type_descriptor(LargeBinary(16))
+
+    def process_bind_param(self, value, dialect):
+        value = normalize_ip(value)
+        if value is None or dialect.name == "postgresql":
+            return value
+        return ipaddress.ip_address(value).packed
+
+    def process_result_value(self, value, dialect):
+        if value is None or dialect.name == "postgresql":
+            return value if value is None else str(value)
+        return str(ipaddress.ip_address(bytes(value)))
+
+def user_agent_hash(value: Optional[str]) -> Optional[int]:
+    """Signed 64-bit key of a user agent in the user_agents table"""
+    if value is None:
+        return None
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+class UserAgent(Base):
+    """Distinct user agents of the submissions, keyed by user_agent_hash()"""
+    __tablename__ = "user_agents"
+
+    hash = Column(BigInteger, primary_key=True, autoincrement=False)
+    value = Column(Text, nullable=False)
+
+def _user_agent_text(hash_column):
+    """The submission's user agent as a correlated lookup, loaded with the row (kept as assigned on insert)"""
+    return column_property(
+        select(UserAgent.value).where(UserAgent.hash == hash_column).correlate_except(UserAgent).scalar_subquery(),
+        expire_on_flush=False
+    )
+
+def remember_user_agents(connection, values: Iterable[Optional[str]]):
+    """Add the user agents missing from the lookup table, using the caller's connection (same transaction)"""
+    rows = {user_agent_hash(value): value for value in values if value is not None}
+    if not rows:
+        return
+    table = UserAgent.__table__
+    if connection.dialect.name in ("postgresql", "sqlite"):
+        if connection.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        connection.execute(insert(table).on_conflict_do_nothing(index_elements=[table.c.hash]),
+                           [{"hash": key, "value": value} for key, value in rows.items()])
+        return
+    known = set(connection.execute(select(table.c.hash).where(table.c.hash.in_(list(rows)))).scalars())
+    missing = [{"hash": key, "value": value} for key, value in rows.items() if key not in known]
+    if missing:
+        connection.execute(table.insert(), missing)
+
+def encode_user_agent(connection, values: dict) -> dict:
+    """Core insert values with user_agent replaced by its hash (the lookup row is added too)"""
+    if "user_agent" not in values:
+        return values
+    values = dict(values)
+    agent = values.pop("user_agent")
+    remember_user_agents(connection, [agent])
+    values["user_agent_hash"] = user_agent_hash(agent)
+    return values
+
+def mapped_columns(model, names=None):
+    """Labelled Core expressions for mapped attributes (all by default), decoded user_agent included"""
+    names = names or [prop.key for prop in inspect(model).column_attrs]
+    return [getattr(model, name).expression.label(name) for name in names]
+
 class Registration(Base):
     """Piano registration model"""
     __tablename__ = "registrations"
@@ -36,10 +136,28 @@ class Registration(Base):
     color_wood = Column(String(255), nullable=False)
     city_state = Column(String(255), nullable=False)
     access = Column(String(255))
-    ip_address = Column(String(45))  # IPv6 compatible
-    user_agent = Column(Text)
-    created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    ip_address = Column("client_ip", PackedIP, key="ip_address")
+    user_agent_hash = Column(BigInteger)
+    user_agent = _user_agent_text(user_agent_hash)
+    fingerprint = Column(String(40), index=True)  # normalized manufacturer/serial/model, see dedupe.py
+    duplicate_of = Column(Integer)  # id of the first registration with the same fingerprint
+    latitude = Column(Float)  # resolved from city_state by the offline gazetteer, see geo.py
+    longitude = Column(Float)
+    geo_cell = Column(String(12), index=True)  # geohash of (latitude, longitude)
+    geo_level = Column(String(10))  # city | state
+    created_at = Column(DateTime, default=submission_time, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), index=True)
+    completed_at = Column(DateTime)  # marked handled by an admin; archived by the next archive run (archive.py)
+
+    __table_args__ = (
+        # At most one primary (non-duplicate) row per fingerprint, so concurrent double submits cannot both win
+        Index(
+            "uq_registrations_fingerprint_primary", "fingerprint", unique=True,
+            sqlite_where=text("fingerprint IS NOT NULL AND duplicate_of IS NULL"),
+            postgresql_where=text("fingerprint IS NOT NULL AND duplicate_of IS NULL")
+        ),
+        {"sqlite_autoincrement": True},  # ids of archived rows are never handed out again
+    )
 
     def to_dict(self):
         return {
@@ -55,8 +173,12 @@ class Registration(Base):
             "city_state": self.city_state,
             "ip_address": self.ip_address,
             "user_agent": self.user_agent,
+            "duplicate_of": self.duplicate_of,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
             "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None
         }
 
 class Requirements(Base):
@@ -70,10 +192,18 @@ class Requirements(Base):
     teacher_name = Column(Text)
     background = Column(Text)
     commitment = Column(Text)
-    ip_address = Column(String(45))
-    user_agent = Column(Text)
-    created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    ip_address = Column("client_ip", PackedIP, key="ip_address")
+    user_agent_hash = Column(BigInteger)
+    user_agent = _user_agent_text(user_agent_hash)
+    latitude = Column(Float)  # resolved from school_name/background, see geo.py
+    longitude = Column(Float)
+    geo_cell = Column(String(12), index=True)
+    geo_level = Column(String(10))
+    created_at = Column(DateTime, default=submission_time, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), index=True)
+    completed_at = Column(DateTime)  # see Registration.completed_at
+
+    __table_args__ = {"sqlite_autoincrement": True}  # see Registration
 
     def to_dict(self):
         return {
@@ -86,8 +216,11 @@ class Requirements(Base):
             "commitment": self.commitment,
             "ip_address": self.ip_address,
             "user_agent": self.user_agent,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
             "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None
         }
 
 class SystemLog(Base):
@@ -117,10 +250,14 @@ class Contact(Base):
     name = Column(String(255))
     email = Column(String(255))
     message = Column(Text)
-    ip_address = Column(String(45))
-    user_agent = Column(Text)
-    created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    ip_address = Column("client_ip", PackedIP, key="ip_address")
+    user_agent_hash = Column(BigInteger)
+    user_agent = _user_agent_text(user_agent_hash)
+    created_at = Column(DateTime, default=submission_time, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), index=True)
+    completed_at = Column(DateTime)  # see Registration.completed_at
+
+    __table_args__ = {"sqlite_autoincrement": True}  # see Registration
 
     def to_dict(self):
         return {
@@ -131,21 +268,318 @@ class Contact(Base):
             "ip_address": self.ip_address,
             "user_agent": self.user_agent,
             "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None
+        }
+
+class Tombstone(Base):
+    """Marker left behind by a deleted submission, consumed by the incremental sync feed"""
+    __tablename__ = "tombstones"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    table_name = Column(String(50), nullable=False)
+    record_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, server_default=func.now(), index=True)
+
+    def to_dict(self):
+        return {
+            "table": self.table_name,
+            "id": self.record_id,
+            "deleted_at": self.deleted_at.isoformat() if self.deleted_at else None
+        }
+
+class SubmissionEvent(Base):
+    """Append-only log of new/deleted submissions, streamed to the admin dashboard (SSE)"""
+    __tablename__ = "submission_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    event_type = Column(String(20), nullable=False)  # created | deleted
+    table_name = Column(String(50), nullable=False)
+    record_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "type": self.event_type,
+            "table": self.table_name,
+            "record_id": self.record_id,
+            "created_at": self.created_at.isoformat() if self.created_at else None
         }
 
+class SubmissionRollup(Base):
+    """Pre-aggregated submission counts per time bucket (maintained by rollups.py)"""
+    __tablename__ = "submission_rollups"
+    __table_args__ = (
+        UniqueConstraint("granularity", "metric", "bucket", "dimension", name="uq_submission_rollups_key"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    granularity = Column(String(10), nullable=False)  # day | week
+    metric = Column(String(50), nullable=False)
+    bucket = Column(String(10), nullable=False)  # bucket start date, YYYY-MM-DD
+    dimension = Column(String(100), nullable=False, default="")
+    count = Column(Integer, nullable=False, default=0)
+
+class MatchFeature(Base):
+    """Inverted index of matching features (piano type, size, region) per registration/requirement"""
+    __tablename__ = "match_features"
+    __table_args__ = (
+        Index("ix_match_features_lookup", "record_type", "feature"),
+        Index("ix_match_features_record", "record_type", "record_id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    record_type = Column(String(20), nullable=False)  # registration | requirement
+    record_id = Column(Integer, nullable=False)
+    feature = Column(String(100), nullable=False)  # e.g. type:upright, region:ny
+
+class DonationMatch(Base):
+    """Top-K match candidates kept for each registration and requirement (see matching.py)"""
+    __tablename__ = "donation_matches"
+    __table_args__ = (
+        UniqueConstraint("owner_type", "owner_id", "candidate_id", name="uq_donation_matches_pair"),
+        Index("ix_donation_matches_owner", "owner_type", "owner_id", "score"),
+        Index("ix_donation_matches_candidate", "owner_type", "candidate_id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    owner_type = Column(String(20), nullable=False)  # registration | requirement
+    owner_id = Column(Integer, nullable=False)
+    candidate_id = Column(Integer, nullable=False)  # a requirement for registration owners and vice versa
+    score = Column(Integer, nullable=False)
+    reasons = Column(Text)  # comma separated shared features
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class IdempotencyRecord(Base):
+    """Stored response of a public form submission, replayed to client retries (see idempotency.py)"""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(64), primary_key=True)  # sha256 of the Idempotency-Key header or of client IP + body
+    request_hash = Column(String(64), nullable=False)  # sha256 of the request body
+    status_code = Column(Integer)  # NULL while the first request is still being handled
+    response_body = Column(Text)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class ArchiveSegment(Base):
+    """Manifest of a compressed NDJSON segment of archived rows (see archive.py)"""
+    __tablename__ = "archive_segments"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    table_name = Column(String(50), nullable=False, index=True)
+    path = Column(String(255), nullable=False, unique=True)  # relative to settings.archive_dir
+    first_id = Column(Integer, nullable=False)
+    last_id = Column(Integer, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+class OutboxEntry(Base):
+    """A change still to be pushed to the Supabase copy, written in the same transaction (see outbox.py)"""
+    __tablename__ = "supabase_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)  # push order
+    operation = Column(String(10), nullable=False)  # upsert | delete
+    table_name = Column(String(50), nullable=False)
+    record_id = Column(Integer, nullable=False)
+    payload = Column(Text)  # JSON row for upserts
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    failed_at = Column(DateTime, index=True)  # set after OUTBOX_MAX_ATTEMPTS; no longer retried
+    created_at = Column(DateTime, server_default=func.now())
+
+class ExportJob(Base):
+    """A background export build and its result file (see export_jobs.py)"""
+    __tablename__ = "export_jobs"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    kind = Column(String(20), nullable=False)  # registrations | requirements
+    fmt = Column(String(10), nullable=False)  # xlsx | csv
+    since = Column(String(40))  # watermark timestamp: only rows changed after it
+    status = Column(String(20), nullable=False, index=True)  # queued | running | cancelling | done | failed | cancelled | expired
+    rows_done = Column(Integer, nullable=False, default=0)
+    rows_total = Column(Integer)
+    path = Column(String(255))  # result file name, relative to settings.export_jobs_dir
+    error = Column(Text)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)  # last progress report of the building process
+    finished_at = Column(DateTime)
+    expires_at = Column(DateTime, index=True)  # the result (or the record of the failure) is dropped after this
+
+def record_submission_event(connection, event_type: str, table_name: str, record_id: int):
+    """Append a submission event using the caller's connection (same transaction)"""
+    connection.execute(
+        SubmissionEvent.__table__.insert().values(event_type=event_type, table_name=table_name, record_id=record_id)
+    )
+
+def _record_created(mapper, connection, target):
+    record_submission_event(connection, "created", target.__tablename__, target.id)
+
+def _record_tombstone(mapper, connection, target):
+    """Write the tombstone in the same transaction as the ORM delete"""
+    connection.execute(
+        Tombstone.__table__.insert().values(table_name=target.__tablename__, record_id=target.id)
+    )
+    record_submission_event(connection, "deleted", target.__tablename__, target.id)
+
+def _store_user_agent(mapper, connection, target):
+    agent = target.__dict__.get("user_agent")  # as assigned; an unset attribute is not loaded
+    if agent is not None:
+        target.user_agent_hash = user_agent_hash(agent)
+        remember_user_agents(connection, [agent])
+    elif target.user_agent_hash is None:
+        target.user_agent = None  # so insert hooks reading it do not trigger a load
+
+for _model in (Registration, Requirements, Contact):
+    event.listen(_model, "before_insert", _store_user_agent)
+    event.listen(_model, "after_insert", _record_created)
+    event.listen(_model, "after_delete", _record_tombstone)
+
 # Database setup
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {},
-    echo=settings.debug
-)
+def build_engine(database_url: str, read_only: bool = False):
+    """Create an engine, applying the SQLite production profile when relevant"""
+    sqlite = "sqlite" in database_url
+    engine = create_engine(
+        database_url,
+        connect_args={"check_same_thread": False} if sqlite else {},
+        echo=settings.debug,
+        **({} if sqlite else {"pool_size": settings.db_pool_size, "max_overflow": settings.db_max_overflow})
+    )
+    return apply_sqlite_profile(engine, read_only=read_only)
+
+engine = build_engine(settings.database_url)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Admin reads (lists, stats, exports) use separate read-only connections on SQLite
+_read_only_url = read_only_url(settings.database_url) if settings.sqlite_read_only_admin else None
+read_engine = build_engine(_read_only_url, read_only=True) if _read_only_url else engine
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Optional read replica (DATABASE_READ_URL); routing and lag checks live in replica.py
+if settings.database_read_url:
+    replica_engine = build_engine(read_only_url(settings.database_read_url) or settings.database_read_url, read_only=True)
+    ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+else:
+    replica_engine = ReplicaSessionLocal = None
+
+def all_engines():
+    """The distinct engines of this process (primary, read-only, replica)"""
+    engines = []
+    for candidate in (engine, read_engine, replica_engine):
+        if candidate is not None and candidate not in engines:
+            engines.append(candidate)
+    return engines
+
+def reset_engines_after_fork():
+    """Forget pooled connections inherited from a parent process (gunicorn post_fork).
+
+    They still belong to the parent, so they are dropped without being closed;
+    the worker opens its own on first use.
+    """
+    for pooled in all_engines():
+        pooled.dispose(close=False)
+
 def create_tables():
-    """Create all database tables"""
-    Base.metadata.create_all(bind=engine)
+    """Create all database tables.
+
+    Safe to run from several processes at once (gunicorn workers starting
+    together): a step that loses the race to another process is skipped.
+    """
+    try:
+        Base.metadata.create_all(bind=engine)
+    except DBAPIError:
+        # Another process created some tables between the existence check and CREATE
+        Base.metadata.create_all(bind=engine)
+    ensure_columns()
+    ensure_indexes()
+    ensure_autoincrement()
+
+def ensure_columns():
+    """Add nullable columns introduced after a table was first created"""
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            try:
+                with engine.begin() as conn:
+                    conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+            except DBAPIError:
+                # Duplicate column: another worker ran the same migration first
+                if column.name not in {c["name"] for c in inspect(engine).get_columns(table.name)}:
+                    raise
+
+def ensure_indexes():
+    """Create indexes added to existing tables after they were first created"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except DBAPIError:
+                if index.name not in {i["name"] for i in inspect(engine).get_indexes(table.name)}:
+                    raise
+
+def ensure_autoincrement(bind=None):
+    """Rebuild SQLite submission tables created without AUTOINCREMENT.
+
+    A plain INTEGER PRIMARY KEY hands the highest id out again once that row
+    is deleted, so a new submission would share its id with an archived one
+    (Supabase copy, changes feed, archive search). Each table is copied into
+    the current definition in one IMMEDIATE transaction, old extra columns
+    included, and its sequence starts above the highest id ever archived.
+    """
+    from sqlalchemy.schema import CreateIndex, CreateTable
+
+    bind = bind or engine
+    if bind.dialect.name != "sqlite":
+        return
+    quote = bind.dialect.identifier_preparer.quote
+    for model in (Registration, Requirements, Contact):
+        table = model.__table__
+        old = f"{table.name}__rebuild"
+        raw = bind.raw_connection()
+        try:
+            cursor = raw.cursor()
+            cursor.execute("BEGIN IMMEDIATE")  # also makes concurrent workers wait, then see the new table
+            try:
+                [definition] = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                              (table.name,)).fetchone()
+                if "AUTOINCREMENT" in definition.upper():
+                    cursor.execute("COMMIT")
+                    continue
+                columns = [(row[1], row[2]) for row in cursor.execute(f"PRAGMA table_info({quote(table.name)})")]
+                cursor.execute(f"ALTER TABLE {quote(table.name)} RENAME TO {quote(old)}")
+                indexes = cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? "
+                                         "AND sql IS NOT NULL", (old,)).fetchall()
+                for (name,) in indexes:
+                    cursor.execute(f"DROP INDEX {quote(name)}")
+                cursor.execute(str(CreateTable(table).compile(dialect=bind.dialect)))
+                current = {column.name for column in table.columns}
+                for name, column_type in columns:
+                    if name not in current:  # e.g. the legacy text columns still waiting for client_meta.py
+                        cursor.execute(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(name)} {column_type}")
+                names = ", ".join(quote(name) for name, _ in columns)
+                cursor.execute(f"INSERT INTO {quote(table.name)} ({names}) SELECT {names} FROM {quote(old)}")
+                cursor.execute(f"DROP TABLE {quote(old)}")
+                for index in table.indexes:
+                    cursor.execute(str(CreateIndex(index).compile(dialect=bind.dialect)))
+                [archived] = cursor.execute("SELECT COALESCE(MAX(last_id), 0) FROM archive_segments "
+                                            "WHERE table_name = ?", (table.name,)).fetchone()
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) SELECT ?, 0 WHERE NOT EXISTS "
+                               "(SELECT 1 FROM sqlite_sequence WHERE name = ?)", (table.name, table.name))
+                cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (archived, table.name))
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        finally:
+            raw.close()
 
 def get_db():
     """Get database session"""
@@ -0,0 +1,64 @@
+from typing import Optional, Tuple
+
+def build_notification(form_type: str, form_data: dict) -> Optional[Tuple[str, str]]:
+    """Build (subject, body) of the admin notification email for a form submission"""
+    if form_type == "registration":
+        subject = "🎹 新的钢琴捐赠登记 - Clavisnova"
+        body = f"""
+亲爱的管理员，
+
+您收到了一份新的钢琴捐赠登记：
+
+捐赠信息：
+- 制造商: {form_data.get('manufacturer', 'N/A')}
+- 型号: {form_data.get('model', 'N/A')}
+- 序列号: {form_data.get('serial', 'N/A')}
+- 年份: {form_data.get('year', 'N/A')}
+- 类型: {form_data.get('height', 'N/A')}
+- 地点: {form_data.get('city_state', 'N/A')}
+- 联系方式: {form_data.get('access', 'N/A')}
+
+请及时查看管理员后台处理此捐赠请求。
+
+此邮件由 Clavisnova 系统自动发送。
+"""
+
+    elif form_type == "requirements":
+        subject = "🎹 新的学校需求提交 - Clavisnova"
+        body = f"""
+亲爱的管理员，
+
+您收到了一份新的学校钢琴需求提交：
+
+学校信息：
+- 学校名称: {form_data.get('school_name', 'N/A')}
+- 现有钢琴: {form_data.get('current_pianos', 'N/A')}
+- 偏好类型: {form_data.get('preferred_type', 'N/A')}
+- 教师姓名: {form_data.get('teacher_name', 'N/A')}
+
+请及时查看管理员后台处理此需求。
+
+此邮件由 Clavisnova 系统自动发送。
+"""
+
+    elif form_type == "contact":
+        subject = "🎹 新的联系表单提交 - Clavisnova"
+        body = f"""
+亲爱的管理员，
+
+您收到了一份新的联系表单提交：
+
+联系信息：
+- 姓名: {form_data.get('name', 'N/A')}
+- 邮箱: {form_data.get('email', 'N/A')}
+- 消息内容: {form_data.get('message', 'N/A')}
+
+请及时回复用户咨询。
+
+此邮件由 Clavisnova 系统自动发送。
+"""
+
+    else:
+        return None
+
+    return subject, body
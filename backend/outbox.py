@@ -0,0 +1,240 @@
+"""
+Transactional outbox for the Supabase copy of the submissions.
+
+With USE_SUPABASE_REST=true every insert and admin delete of a registration,
+requirement or contact also writes a supabase_outbox row in the same
+transaction, so the public request only waits for the local commit and a
+change can neither reach Supabase without being committed nor be committed
+without eventually reaching Supabase.
+
+A background replicator (one per process, one process at a time through a
+lock file) pushes the outbox in id order: consecutive entries for the same
+table and operation go out as one upsert or delete request, and entries are
+removed once Supabase accepted them. Upserts carry the local id and resolve
+conflicts on it, so a batch sent twice (crash between push and removal,
+several hosts) is harmless. A failing batch is retried entry by entry; the
+first entry that still fails stops the run (later changes wait behind it)
+and is retried with exponential backoff, then parked as failed after
+OUTBOX_MAX_ATTEMPTS. Pushes go through the Supabase circuit breaker
+(breaker.py): while Supabase is down the replicator pauses without spending
+the entries' attempts. By hand:
+
+    python backend/outbox.py --status
+    python backend/outbox.py --drain
+    python backend/outbox.py --retry-failed
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from itertools import groupby
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import event, func, select
+
+import supabase_client
+from breaker import CircuitOpenError, supabase_breaker
+from config import settings
+from logger import logger_manager
+from models import Contact, OutboxEntry, Registration, Requirements, normalize_ip
+from supabase_client import SYNC_FIELDS
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+def payload(table_name: str, record_id: int, values: Dict) -> Dict:
+    row = {"id": record_id, **{name: values.get(name) for name in SYNC_FIELDS[table_name]}}
+    row["ip_address"] = normalize_ip(row["ip_address"])  # as stored locally (see PackedIP)
+    return row
+
+def enqueue(connection, operation: str, table_name: str, record_id: int, values: Optional[Dict] = None):
+    """Add an outbox entry using the caller's connection (same transaction); no-op unless replication is on"""
+    if not settings.supabase_replication:
+        return
+    body = json.dumps(payload(table_name, record_id, values), default=str) if operation == UPSERT else None
+    connection.execute(OutboxEntry.__table__.insert().values(
+        operation=operation, table_name=table_name, record_id=record_id, payload=body, attempts=0,
+    ))
+
+def _after_insert(mapper, connection, target):
+    values = {name: getattr(target, name) for name in SYNC_FIELDS[target.__tablename__]}
+    enqueue(connection, UPSERT, target.__tablename__, target.id, values)
+
+def _after_delete(mapper, connection, target):
+    enqueue(connection, DELETE, target.__tablename__, target.id)
+
+for _model in (Registration, Requirements, Contact):
+    event.listen(_model, "after_insert", _after_insert)
+    event.listen(_model, "after_delete", _after_delete)
+
+def push_run(entries: List[OutboxEntry]):
+    """Send consecutive entries of one table and operation as a single request"""
+    table_name, operation = entries[0].table_name, entries[0].operation
+    if operation == UPSERT:
+        latest = {entry.record_id: json.loads(entry.payload) for entry in entries}  # one row per id per request
+        supabase_client.upsert_rows(table_name, list(latest.values()))
+    else:
+        supabase_client.delete_rows(table_name, sorted({entry.record_id for entry in entries}))
+
+class OutboxReplicator:
+    def __init__(self, engine, batch_size: int, poll_seconds: float, max_attempts: int,
+                 retry_max_seconds: float, push: Callable[[List[OutboxEntry]], None] = push_run, breaker=None):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.retry_max_seconds = retry_max_seconds
+        self.push = push
+        self.breaker = breaker
+        self.retry_at = 0.0
+        self._pid = None
+        self._stop = threading.Event()
+
+    def _pending(self) -> List[OutboxEntry]:
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(OutboxEntry).where(OutboxEntry.failed_at.is_(None)).order_by(OutboxEntry.id).limit(self.batch_size)
+            ).all()
+
+    def _remove(self, entries: List[OutboxEntry]):
+        table = OutboxEntry.__table__
+        with self.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.id.in_([entry.id for entry in entries])))
+
+    def _record_failure(self, entry: OutboxEntry, error: Exception):
+        attempts = entry.attempts + 1
+        parked = attempts >= self.max_attempts
+        table = OutboxEntry.__table__
+        with self.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.id == entry.id).values(
+                attempts=attempts, last_error=str(error)[:1000], failed_at=datetime.utcnow() if parked else None,
+            ))
+        if parked:
+            logger_manager.logger.error(f"Outbox entry {entry.id} ({entry.operation} {entry.table_name} "
+                                        f"{entry.record_id}) failed {attempts} times, parked: {error}")
+        else:
+            self.retry_at = time.monotonic() + min(self.poll_seconds * 2 ** attempts, self.retry_max_seconds)
+            logger_manager.logger.warning(f"Supabase push failed (attempt {attempts}), retrying later: {error}")
+
+    def _send(self, entries: List[OutboxEntry]):
+        if self.breaker is None:
+            self.push(entries)
+        else:
+            self.breaker.call(self.push, entries)
+
+    def _push_run(self, run: List[OutboxEntry]) -> int:
+        """Push one run; returns how many leading entries were delivered (all of them unless one failed)"""
+        try:
+            self._send(run)
+            self._remove(run)
+            return len(run)
+        except CircuitOpenError:
+            return 0  # Supabase is down: not the entries' fault
+        except Exception as e:
+            if len(run) == 1:
+                self._record_failure(run[0], e)
+                return 0
+        for delivered, entry in enumerate(run):  # isolate the failing entry, keeping the order
+            try:
+                self._send([entry])
+            except CircuitOpenError:
+                return delivered
+            except Exception as e:
+                self._record_failure(entry, e)
+                return delivered
+            self._remove([entry])
+        return len(run)
+
+    def drain_once(self) -> int:
+        """Push up to one batch in order; returns the entries delivered (stops at the first failure)"""
+        if self.breaker is not None and self.breaker.is_open():
+            return 0
+        entries = self._pending()
+        delivered = 0
+        for _, group in groupby(entries, key=lambda entry: (entry.table_name, entry.operation)):
+            run = list(group)
+            sent = self._push_run(run)
+            delivered += sent
+            if sent < len(run):
+                break
+        return delivered
+
+    def drain(self) -> int:
+        """Push until the outbox is empty or a push fails"""
+        total = 0
+        while True:
+            sent = self.drain_once()
+            total += sent
+            if sent < self.batch_size:
+                return total
+
+    def _run_locked(self):
+        with open(settings.data_dir / ".outbox.lock", "w") as lock:
+            try:
+                import fcntl
+
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except ImportError:
+                pass  # no cross-process lock on this platform; upserts make double pushes harmless
+            except OSError:
+                return  # another worker is replicating
+            self.drain()
+
+    def _loop(self):
+        while not self._stop.wait(self.poll_seconds):
+            if time.monotonic() < self.retry_at:
+                continue
+            try:
+                self._run_locked()
+            except Exception as e:
+                logger_manager.logger.error(f"Outbox replication failed: {e}")
+
+    def start(self):
+        """Start the replicator thread once per process (only with USE_SUPABASE_REST=true)"""
+        if not settings.supabase_replication or self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        threading.Thread(target=self._loop, name="supabase-outbox", daemon=True).start()
+
+    def status(self) -> Dict:
+        with self.engine.connect() as conn:
+            pending, oldest = conn.execute(
+                select(func.count(OutboxEntry.id), func.min(OutboxEntry.created_at)).where(OutboxEntry.failed_at.is_(None))
+            ).one()
+            failed = conn.execute(select(func.count(OutboxEntry.id)).where(OutboxEntry.failed_at.isnot(None))).scalar()
+        return {"pending": pending, "failed": failed, "oldest_pending": oldest.isoformat() if oldest else None}
+
+    def retry_failed(self) -> int:
+        """Put parked entries back in the queue"""
+        table = OutboxEntry.__table__
+        with self.engine.begin() as conn:
+            return conn.execute(table.update().where(table.c.failed_at.isnot(None))
+                                .values(failed_at=None, attempts=0)).rowcount
+
+def _build_replicator():
+    from models import engine
+
+    return OutboxReplicator(engine, settings.outbox_batch_size, settings.outbox_poll_seconds,
+                            settings.outbox_max_attempts, settings.outbox_retry_max_seconds,
+                            breaker=supabase_breaker)
+
+outbox_replicator = _build_replicator()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and push the Supabase outbox")
+    parser.add_argument("--status", action="store_true", help="show pending and parked entries")
+    parser.add_argument("--drain", action="store_true", help="push all pending entries now")
+    parser.add_argument("--retry-failed", action="store_true", help="requeue parked entries")
+    args = parser.parse_args()
+
+    from models import create_tables
+
+    create_tables()
+    if args.retry_failed:
+        print(f"Requeued {outbox_replicator.retry_failed()} entries")
+    if args.drain:
+        print(f"Pushed {outbox_replicator.drain()} entries")
+    if args.status or not (args.drain or args.retry_failed):
+        print(json.dumps(outbox_replicator.status(), indent=2))
@@ -0,0 +1,148 @@
+"""
+Read-replica routing for admin reads.
+
+With DATABASE_READ_URL set, admin lists, stats, searches and full exports
+read from that database so they do not compete with form inserts on the
+primary. Replication itself is external (a PostgreSQL streaming replica,
+Litestream/LiteFS for SQLite, ...); this module only decides, per request,
+whether the replica is fresh enough to answer.
+
+Staleness is measured with submission_events, which every insert and delete
+appends to on the primary: the replica lags by the age of the oldest event it
+has not applied yet. Reads fall back to the primary while that exceeds
+READ_REPLICA_MAX_LAG_SECONDS or while the replica is unreachable.
+
+Read-your-writes: an admin delete answers with a `read_after` cookie holding
+the primary's event position, and that client's reads stay on the primary
+until the replica has applied it. The worker that handled the delete also
+remembers the position for READ_YOUR_WRITES_SECONDS, for clients that do not
+send cookies back.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import func, select
+
+from config import settings
+from logger import logger_manager
+from models import SubmissionEvent, engine, replica_engine
+
+READ_AFTER_COOKIE = "read_after"
+
+# Event position the current request must see (from the read_after cookie); set per request
+read_after: ContextVar[Optional[int]] = ContextVar("read_after", default=None)
+
+def parse_position(value) -> Optional[int]:
+    try:
+        position = int(value)
+    except (TypeError, ValueError):
+        return None
+    return position if position > 0 else None
+
+class ReplicaRouter:
+    def __init__(self, primary, replica, max_lag_seconds: float, check_seconds: float, read_your_writes_seconds: float):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag_seconds = max_lag_seconds
+        self.check_seconds = check_seconds
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._replica_position: Optional[int] = None  # None while the replica cannot be checked
+        self._lag: Optional[float] = None
+        self._healthy: Optional[bool] = None
+        self._written_position = 0
+        self._written_until = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.replica is not None
+
+    @staticmethod
+    def position(bind) -> int:
+        """Id of the newest submission event visible through `bind`"""
+        with bind.connect() as conn:
+            return conn.execute(select(func.coalesce(func.max(SubmissionEvent.id), 0))).scalar()
+
+    def primary_position(self) -> int:
+        return self.position(self.primary)
+
+    def _lag_behind(self, replica_position: int) -> float:
+        """Seconds since the oldest primary event the replica has not applied (0 when caught up)"""
+        # Compared with the primary's own clock: created_at is filled by the database
+        now = func.localtimestamp() if self.primary.dialect.name == "postgresql" else func.current_timestamp()
+        with self.primary.connect() as conn:
+            oldest, current = conn.execute(
+                select(func.min(SubmissionEvent.created_at), now).where(SubmissionEvent.id > replica_position)
+            ).one()
+        if oldest is None:
+            return 0.0
+        return max((current - oldest).total_seconds(), 0.0)
+
+    def refresh(self):
+        """Measure the replica position and lag now"""
+        try:
+            replica_position = self.position(self.replica)
+            lag = self._lag_behind(replica_position)
+        except Exception as e:
+            replica_position, lag = None, None
+            logger_manager.logger.warning(f"Read replica check failed, admin reads use the primary: {e}")
+        healthy = replica_position is not None and lag <= self.max_lag_seconds
+        if healthy != self._healthy:
+            if healthy:
+                logger_manager.logger.info(f"Admin reads use the read replica (lag {lag:.1f}s)")
+            elif replica_position is not None:
+                logger_manager.logger.warning(f"Read replica lags {lag:.1f}s, admin reads use the primary")
+        self._replica_position, self._lag, self._healthy = replica_position, lag, healthy
+        self._checked_at = time.monotonic()
+
+    def _current(self):
+        if time.monotonic() - self._checked_at >= self.check_seconds:
+            with self._lock:
+                if time.monotonic() - self._checked_at >= self.check_seconds:
+                    self.refresh()
+        return self._healthy, self._replica_position
+
+    def note_write(self) -> int:
+        """Record an admin write; returns the primary position the writer's later reads must see"""
+        position = self.primary_position()
+        with self._lock:
+            self._written_position = max(self._written_position, position)
+            self._written_until = time.monotonic() + self.read_your_writes_seconds
+        return position
+
+    def use_replica(self, min_position: Optional[int] = None) -> bool:
+        """Whether a read that must see `min_position` can be served by the replica"""
+        if not self.enabled:
+            return False
+        try:
+            healthy, replica_position = self._current()
+            if not healthy:
+                return False
+            if time.monotonic() < self._written_until:
+                min_position = max(min_position or 0, self._written_position)
+            if min_position and replica_position < min_position:
+                # the cached position may predate the write; look again before falling back
+                replica_position = self.position(self.replica)
+                self._replica_position = max(self._replica_position or 0, replica_position)
+            return not min_position or replica_position >= min_position
+        except Exception as e:
+            logger_manager.logger.warning(f"Read replica check failed, using the primary: {e}")
+            return False
+
+    def status(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        healthy, replica_position = self._current()
+        lag = None if self._lag is None else round(self._lag, 1)
+        return {"enabled": True, "in_use": bool(healthy), "position": replica_position, "lag_seconds": lag}
+
+replica_router = ReplicaRouter(
+    engine,
+    replica_engine,
+    max_lag_seconds=settings.read_replica_max_lag_seconds,
+    check_seconds=settings.read_replica_check_seconds,
+    read_your_writes_seconds=settings.read_your_writes_seconds,
+)
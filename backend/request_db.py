@@ -0,0 +1,140 @@
+"""
+Request-scoped database sessions and connection hold-time instrumentation.
+
+Handlers call db() / read_db() instead of opening and closing a session by
+hand. The session is created on first use and, like any SQLAlchemy Session,
+checks a connection out of the pool only when its first statement runs, so a
+request rejected by validation or rate limiting never touches the pool. The
+request teardown closes the sessions and returns their connections.
+
+Checkout/checkin events on every engine add up how long each request held
+pooled connections. Requests holding them longer than POOL_HOLD_WARN_MS are
+logged, and per-process figures (share of requests that used the pool, hold
+time percentiles, connections checked out now) are reported under "pool" in
+/api/health, to size DB_POOL_SIZE from.
+"""
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from config import settings
+from logger import logger_manager
+
+class RequestScope:
+    def __init__(self, name: str):
+        self.name = name
+        self.sessions: Dict[str, Session] = {}
+        self.checkouts = 0
+        self.hold_seconds = 0.0
+
+    def session(self, key: str, factory: Callable[[], Session]) -> Session:
+        if key not in self.sessions:
+            self.sessions[key] = factory()
+        return self.sessions[key]
+
+    def close(self):
+        for session in self.sessions.values():
+            try:
+                session.close()
+            except Exception as e:
+                logger_manager.logger.error(f"Closing the {self.name} request session failed: {e}")
+        self.sessions.clear()
+
+_scope: ContextVar[Optional[RequestScope]] = ContextVar("request_scope", default=None)
+
+class HoldStats:
+    """Connection hold time per request over the last `window` requests of this process"""
+
+    def __init__(self, window: int = 1000):
+        self.requests = 0
+        self.requests_using_pool = 0
+        self.checked_out = 0
+        self._holds = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, scope: RequestScope):
+        with self._lock:
+            self.requests += 1
+            if scope.checkouts:
+                self.requests_using_pool += 1
+                self._holds.append(scope.hold_seconds)
+
+    def status(self) -> Dict:
+        with self._lock:
+            holds = sorted(self._holds)
+            requests, using, checked_out = self.requests, self.requests_using_pool, self.checked_out
+
+        def percentile(p):
+            return round(holds[min(len(holds) - 1, int(p * len(holds)))] * 1000, 1) if holds else None
+
+        return {"requests": requests, "requests_using_pool": using, "checked_out": checked_out,
+                "hold_ms_p50": percentile(0.5), "hold_ms_p95": percentile(0.95), "hold_ms_max": percentile(1.0)}
+
+hold_stats = HoldStats()
+
+def begin_request(name: str):
+    _scope.set(RequestScope(name))
+
+def end_request():
+    """Close the request's sessions (returning their connections) and record its hold time"""
+    scope = _scope.get()
+    if scope is None:
+        return
+    _scope.set(None)
+    scope.close()
+    hold_stats.record(scope)
+    if scope.hold_seconds * 1000 > settings.pool_hold_warn_ms:
+        logger_manager.logger.warning(f"{scope.name} held database connections for {scope.hold_seconds * 1000:.0f}ms "
+                                      f"({scope.checkouts} checkouts)")
+
+def _current() -> RequestScope:
+    scope = _scope.get()
+    if scope is None:
+        raise RuntimeError("request_db sessions are only available while handling a request")
+    return scope
+
+def db() -> Session:
+    """The request's session on the primary"""
+    from database import db_manager
+
+    return _current().session("primary", db_manager.get_db)
+
+def read_db(replica: bool = True) -> Session:
+    """The request's admin read session (see DatabaseManager.get_read_db)"""
+    from database import db_manager
+
+    return _current().session("replica" if replica else "read", lambda: db_manager.get_read_db(replica))
+
+def _on_checkout(dbapi_connection, record, proxy):
+    with hold_stats._lock:
+        hold_stats.checked_out += 1
+    scope = _scope.get()
+    record.info["request_hold"] = (scope, time.monotonic())
+    if scope is not None:
+        scope.checkouts += 1
+
+def _on_checkin(dbapi_connection, record):
+    scope, started = record.info.pop("request_hold", (None, None))
+    if started is None:
+        return  # checked out before instrumentation (or invalidated)
+    with hold_stats._lock:
+        hold_stats.checked_out -= 1
+    if scope is not None:
+        scope.hold_seconds += time.monotonic() - started
+
+def instrument(engine):
+    event.listen(engine, "checkout", _on_checkout)
+    event.listen(engine, "checkin", _on_checkin)
+
+def _instrument_all():
+    from models import all_engines
+
+    for engine in all_engines():
+        instrument(engine)
+
+_instrument_all()
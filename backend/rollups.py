@@ -0,0 +1,277 @@
+"""
+Incrementally maintained time-series rollups of submissions.
+
+submission_rollups holds one counter per (granularity, metric, bucket,
+dimension): registrations per day/week in total and by manufacturer, type
+(stored in the height column) and city/state, plus requirements and contacts
+per day/week. Counters are bumped in the same transaction as every insert and
+decremented on delete, so /api/admin/stats/timeseries reads O(buckets) rows
+instead of grouping the raw tables.
+
+Existing data is loaded with the chunked backfill:
+
+    python backend/rollups.py --backfill
+"""
+import argparse
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, event, func, select
+
+from models import Contact, Registration, Requirements, SubmissionRollup
+
+GRANULARITIES = ("day", "week")
+
+# metric -> (source model, dimension attribute or None for plain totals)
+METRICS = {
+    "registrations": (Registration, None),
+    "registrations_by_manufacturer": (Registration, "manufacturer"),
+    "registrations_by_type": (Registration, "height"),  # Type stored in height column
+    "registrations_by_city": (Registration, "city_state"),
+    "requirements": (Requirements, None),
+    "contacts": (Contact, None),
+}
+
+UNKNOWN = "(unknown)"
+
+RollupKey = Tuple[str, str, str, str]  # granularity, metric, bucket, dimension
+
+def normalize_dimension(value: Optional[str]) -> str:
+    """Group labels case- and whitespace-insensitively"""
+    folded = " ".join((value or "").split()).casefold()
+    return folded[:100] or UNKNOWN
+
+def bucket_start(moment: datetime, granularity: str) -> str:
+    day = moment.date() if isinstance(moment, datetime) else moment
+    if granularity == "week":
+        day = day - timedelta(days=day.weekday())  # ISO weeks start on Monday
+    return day.isoformat()
+
+def rollup_keys(model, values: Dict, created_at: datetime) -> List[RollupKey]:
+    """Counter keys touched by one row of `model`"""
+    keys = []
+    for metric, (source, attribute) in METRICS.items():
+        if source is not model:
+            continue
+        dimension = normalize_dimension(values.get(attribute)) if attribute else ""
+        for granularity in GRANULARITIES:
+            keys.append((granularity, metric, bucket_start(created_at, granularity), dimension))
+    return keys
+
+def _upsert_statement(dialect_name: str):
+    table = SubmissionRollup.__table__
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.granularity, table.c.metric, table.c.bucket, table.c.dimension],
+        set_={"count": table.c.count + stmt.excluded["count"]}
+    )
+
+def _key_clause(key: RollupKey):
+    table = SubmissionRollup.__table__
+    granularity, metric, bucket, dimension = key
+    return and_(table.c.granularity == granularity, table.c.metric == metric,
+                table.c.bucket == bucket, table.c.dimension == dimension)
+
+def increment(connection, deltas: Dict[RollupKey, int]):
+    """Add positive deltas to the counters, creating missing ones"""
+    if not deltas:
+        return
+    table = SubmissionRollup.__table__
+    rows = [
+        {"granularity": g, "metric": m, "bucket": b, "dimension": d, "count": delta}
+        for (g, m, b, d), delta in deltas.items()
+    ]
+    stmt = _upsert_statement(connection.dialect.name)
+    if stmt is not None:
+        connection.execute(stmt, rows)
+        return
+    for key, row in zip(deltas, rows):
+        updated = connection.execute(table.update().where(_key_clause(key)).values(count=table.c.count + row["count"]))
+        if updated.rowcount == 0:
+            connection.execute(table.insert().values(**row))
+
+def decrement(connection, keys: Iterable[RollupKey]):
+    """Subtract one from existing counters (rows that predate the backfill have none)"""
+    table = SubmissionRollup.__table__
+    for key in keys:
+        connection.execute(
+            table.update().where(and_(_key_clause(key), table.c.count > 0)).values(count=table.c.count - 1)
+        )
+
+def _values_of(target) -> Dict:
+    return {attribute: getattr(target, attribute) for _, attribute in METRICS.values() if attribute and hasattr(target, attribute)}
+
+def apply_insert(connection, model, record_id: int, values: Dict):
+    """Count a freshly inserted row (used by the ORM hook and the group-commit writer).
+
+    `values` are the inserted parameters; created_at has a client-side default
+    (models.submission_time), so the bucket is known without reading the row back.
+    """
+    if model not in (Registration, Requirements, Contact):
+        return
+    created_at = values.get("created_at") or datetime.utcnow()
+    increment(connection, Counter(rollup_keys(model, values, created_at)))
+
+def _after_insert(mapper, connection, target):
+    apply_insert(connection, type(target), target.id, {**_values_of(target), "created_at": target.created_at})
+
+def _after_delete(mapper, connection, target):
+    created_at = target.created_at or datetime.utcnow()
+    decrement(connection, rollup_keys(type(target), _values_of(target), created_at))
+
+for _model in (Registration, Requirements, Contact):
+    event.listen(_model, "after_insert", _after_insert)
+    event.listen(_model, "after_delete", _after_delete)
+
+def _scan_counts(engine, model, lower_id: int = 0, upper_id: Optional[int] = None,
+                 chunk_size: int = 1000, connection=None) -> Tuple[Counter, int]:
+    """Counter deltas for rows with lower_id < id (<= upper_id), read in id chunks"""
+    attributes = sorted({attr for source, attr in METRICS.values() if source is model and attr})
+    columns = [model.id, model.created_at] + [getattr(model, attr) for attr in attributes]
+    deltas: Counter = Counter()
+    scanned = 0
+    last_id = lower_id
+    while True:
+        query = select(*columns).where(model.id > last_id)
+        if upper_id is not None:
+            query = query.where(model.id <= upper_id)
+        query = query.order_by(model.id).limit(chunk_size)
+        if connection is not None:
+            rows = connection.execute(query).all()
+        else:
+            with engine.connect() as conn:
+                rows = conn.execute(query).all()
+        if not rows:
+            return deltas, scanned
+        for row in rows:
+            values = dict(zip(attributes, row[2:]))
+            deltas.update(rollup_keys(model, values, row[1] or datetime.utcnow()))
+        last_id = rows[-1][0]
+        scanned += len(rows)
+
+def _scan_archive(engine) -> Tuple[Counter, int]:
+    """Counter deltas for the rows moved into archive segments"""
+    from sqlalchemy.orm import Session
+    from archive import ARCHIVE_MODELS, decode_row, iter_archived
+
+    deltas: Counter = Counter()
+    scanned = 0
+    with Session(engine) as db:
+        for kind, model in ARCHIVE_MODELS.items():
+            for row in iter_archived(db, kind):
+                obj = decode_row(model, row)
+                deltas.update(rollup_keys(model, _values_of(obj), obj.created_at or datetime.utcnow()))
+                scanned += 1
+    return deltas, scanned
+
+def backfill(engine, chunk_size: int = 1000, log=print) -> int:
+    """Rebuild all counters from the source tables.
+
+    The bulk of each table (ids up to its max id when the backfill starts) is
+    counted in id chunks without holding a transaction. The live counters are
+    then replaced in one transaction, which also counts the rows inserted
+    meanwhile, so readers see either the old or the new totals and concurrent
+    inserts are counted exactly once. A row deleted while the bulk scan runs may
+    stay counted until the next backfill. Archived rows (archive.py) still count;
+    run the backfill while no archive run is moving rows.
+    """
+    models = (Registration, Requirements, Contact)
+    with engine.connect() as conn:
+        upper = {model: conn.execute(select(func.max(model.id))).scalar() or 0 for model in models}
+
+    staged: Counter = Counter()
+    total = 0
+    for model in models:
+        deltas, scanned = _scan_counts(engine, model, upper_id=upper[model], chunk_size=chunk_size)
+        staged.update(deltas)
+        total += scanned
+        log(f"Counted {scanned} {model.__tablename__} rows")
+
+    deltas, scanned = _scan_archive(engine)
+    staged.update(deltas)
+    total += scanned
+    if scanned:
+        log(f"Counted {scanned} archived rows")
+
+    table = SubmissionRollup.__table__
+    with engine.begin() as conn:
+        conn.execute(table.delete())
+        for model in models:
+            # Rows committed after the bulk scan started already bumped the counters just deleted
+            deltas, scanned = _scan_counts(engine, model, lower_id=upper[model],
+                                           chunk_size=chunk_size, connection=conn)
+            staged.update(deltas)
+            total += scanned
+        items = list(staged.items())
+        for start in range(0, len(items), chunk_size):
+            increment(conn, dict(items[start:start + chunk_size]))
+    log(f"Backfilled rollups for {total} rows")
+    return total
+
+def default_range(granularity: str, buckets: int, today: Optional[date] = None) -> Tuple[str, str]:
+    end = bucket_start(today or datetime.utcnow().date(), granularity)
+    step = 7 if granularity == "week" else 1
+    start = date.fromisoformat(end) - timedelta(days=step * (buckets - 1))
+    return start.isoformat(), end
+
+def bucket_range(start: str, end: str, granularity: str, max_buckets: int = 1000) -> List[str]:
+    step = timedelta(days=7 if granularity == "week" else 1)
+    current = date.fromisoformat(bucket_start(date.fromisoformat(start), granularity))
+    last = date.fromisoformat(end)
+    if (last - current) // step >= max_buckets:
+        raise ValueError(f"Range too large (max {max_buckets} buckets)")
+    buckets = []
+    while current <= last:
+        buckets.append(current.isoformat())
+        current += step
+    return buckets
+
+def timeseries(db, granularity: str, metrics: List[str], start: str, end: str, top: int = 10) -> Dict:
+    """Dense per-bucket series; dimension metrics keep their `top` largest dimensions"""
+    buckets = bucket_range(start, end, granularity)
+    rows = []
+    if buckets:
+        rows = db.query(SubmissionRollup).filter(
+            SubmissionRollup.granularity == granularity,
+            SubmissionRollup.metric.in_(metrics),
+            SubmissionRollup.bucket >= buckets[0],
+            SubmissionRollup.bucket <= buckets[-1],
+            SubmissionRollup.count > 0
+        ).all()
+
+    counts: Dict[str, Dict[str, Counter]] = {metric: {} for metric in metrics}
+    for row in rows:
+        counts[row.metric].setdefault(row.dimension, Counter())[row.bucket] += row.count
+
+    def dense(counter: Counter) -> List[Dict]:
+        return [{"bucket": bucket, "count": counter.get(bucket, 0)} for bucket in buckets]
+
+    series = {}
+    for metric in metrics:
+        if METRICS[metric][1] is None:
+            series[metric] = dense(counts[metric].get("", Counter()))
+        else:
+            ranked = sorted(counts[metric].items(), key=lambda item: (-sum(item[1].values()), item[0]))
+            series[metric] = {dimension: dense(counter) for dimension, counter in ranked[:top]}
+    return {"buckets": buckets, "series": series}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain submission rollups")
+    parser.add_argument("--backfill", action="store_true", help="rebuild all rollups from the source tables")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.backfill:
+        from models import create_tables, engine
+
+        create_tables()
+        print(f"Backfilled {backfill(engine, args.chunk_size)} rows")
+    else:
+        parser.print_help()
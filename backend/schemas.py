@@ -126,6 +126,53 @@ class ContactCreate:
         if not self.message or not self.message.strip():
             raise ValidationError("Message cannot be empty")
 
+# Submitted JSON forms -> validated objects (raise ValidationError); shared by main.py and asgi.py
+
+def registration_form(data: Dict[str, Any], ip_address: Optional[str] = None,
+                      user_agent: Optional[str] = None) -> RegistrationCreate:
+    year = data.get('year', 2020)
+    if isinstance(year, str):
+        try:
+            year = int(year)
+        except ValueError:
+            year = 2020  # the form's placeholder value
+    return RegistrationCreate(
+        manufacturer=data.get('manufacturer', ''),
+        model=data.get('model', ''),
+        serial=data.get('serial', ''),
+        year=year,
+        height=data.get('height', ''),
+        finish=data.get('finish', ''),
+        color_wood=data.get('color_wood', ''),
+        access=data.get('access', ''),
+        city_state=data.get('city_state', ''),
+        ip_address=ip_address,
+        user_agent=user_agent
+    )
+
+def requirements_form(data: Dict[str, Any], ip_address: Optional[str] = None,
+                      user_agent: Optional[str] = None) -> RequirementsCreate:
+    return RequirementsCreate(
+        school_name=data.get('school_name') or data.get('info1'),  # 向后兼容
+        current_pianos=data.get('current_pianos') or data.get('info2'),
+        preferred_type=data.get('preferred_type') or data.get('info3'),
+        teacher_name=data.get('teacher_name') or data.get('info4'),
+        background=data.get('background') or data.get('info5'),
+        commitment=data.get('commitment') or data.get('info6'),
+        ip_address=ip_address,
+        user_agent=user_agent
+    )
+
+def contact_form(data: Dict[str, Any], ip_address: Optional[str] = None,
+                 user_agent: Optional[str] = None) -> ContactCreate:
+    return ContactCreate(
+        name=data.get('name', ''),
+        email=data.get('email', ''),
+        message=data.get('message', ''),
+        ip_address=ip_address,
+        user_agent=user_agent
+    )
+
 @dataclass
 class ContactResponse:
     id: int
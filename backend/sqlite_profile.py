@@ -0,0 +1,69 @@
+"""
+SQLite production profile.
+
+Every new SQLite connection gets WAL journaling, a busy timeout and relaxed
+fsync (synchronous=NORMAL is durable in WAL mode up to the last checkpoint),
+plus mmap / page cache / temp_store sizing. Several gunicorn workers can then
+insert concurrently without "database is locked" errors, and admin reads can
+run on separate read-only connections that never block writers.
+"""
+from typing import Optional
+
+from sqlalchemy import event
+
+from config import settings
+
+_SQLITE_PREFIXES = ("sqlite://", "sqlite+pysqlite://", "sqlite+aiosqlite://")
+
+def is_sqlite(url: str) -> bool:
+    return bool(url) and url.startswith(_SQLITE_PREFIXES)
+
+def sqlite_path(url: str) -> Optional[str]:
+    """Return the database file path of a SQLite URL, or None for in-memory databases"""
+    if not is_sqlite(url):
+        return None
+    path = url.split(":///", 1)[1] if ":///" in url else ""
+    path = path.split("?", 1)[0]
+    if not path or path == ":memory:" or path.startswith("file:"):
+        return None
+    return path
+
+def read_only_url(url: str) -> Optional[str]:
+    """SQLite URL that opens the same file in read-only mode (mode=ro URI)"""
+    path = sqlite_path(url)
+    if path is None:
+        return None
+    driver = url.split(":///", 1)[0]
+    return f"{driver}:///file:{path}?mode=ro&uri=true"
+
+def profile_pragmas(read_only: bool = False) -> list:
+    """PRAGMA statements applied to each new connection"""
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(settings.sqlite_busy_timeout)}",
+        f"PRAGMA mmap_size = {int(settings.sqlite_mmap_size)}",
+        f"PRAGMA cache_size = {int(settings.sqlite_cache_size)}",
+        f"PRAGMA temp_store = {settings.sqlite_temp_store}",
+    ]
+    if not read_only:
+        # journal_mode needs write access; it is persistent in the file once set
+        pragmas.insert(0, f"PRAGMA journal_mode = {settings.sqlite_journal_mode}")
+        pragmas.insert(1, f"PRAGMA synchronous = {settings.sqlite_synchronous}")
+    return pragmas
+
+def apply_sqlite_profile(engine, read_only: bool = False):
+    """Register a connect hook running the profile pragmas (no-op for other databases)"""
+    if not is_sqlite(str(engine.url)):
+        return engine
+
+    pragmas = profile_pragmas(read_only)
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return engine
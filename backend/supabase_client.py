@@ -1,10 +1,19 @@
 import os
-import requests
-from typing import Any, Dict, Optional
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_SERVICE_ROLE = os.getenv("SUPABASE_SERVICE_ROLE", "")
 
+# Columns of the Supabase tables besides the id (pushed by outbox.py, compared by consistency.py)
+SYNC_FIELDS = {
+    "registrations": ["manufacturer", "model", "serial", "year", "height", "finish", "color_wood",
+                      "access", "city_state", "ip_address", "user_agent"],
+    "requirements": ["school_name", "current_pianos", "preferred_type", "teacher_name", "background",
+                     "commitment", "ip_address", "user_agent"],
+    "contacts": ["name", "email", "message", "ip_address", "user_agent"],
+}
+
 def _headers() -> Dict[str, str]:
     return {
         "apikey": SUPABASE_SERVICE_ROLE,
@@ -13,40 +22,62 @@ def _headers() -> Dict[str, str]:
         "Prefer": "return=representation"
     }
 
-def create_registration(data: Dict[str, Any]) -> Dict[str, Any]:
-    """Insert a registration row via Supabase REST API."""
+def _rest_url(path: str) -> str:
     if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE:
         raise RuntimeError("Supabase REST not configured (SUPABASE_URL/SUPABASE_SERVICE_ROLE)")
+    return f"{SUPABASE_URL.rstrip('/')}/rest/v1/{path}"
+
+_local = threading.local()
+
+def _session():
+    """One keep-alive session per thread (requests.Session is not shared across threads)"""
+    if getattr(_local, "session", None) is None:
+        import requests  # only the REST mode needs it, so workers do not load it at startup
+
+        _local.session = requests.Session()
+    return _local.session
 
-    url = f"{SUPABASE_URL.rstrip('/')}/rest/v1/registrations"
-    resp = requests.post(url, json=data, headers=_headers(), timeout=10)
+def upsert_rows(table: str, rows: List[Dict[str, Any]]) -> None:
+    """Insert rows with their ids, overwriting rows with the same id (safe to repeat)."""
+    headers = {**_headers(), "Prefer": "resolution=merge-duplicates,return=minimal"}
+    resp = _session().post(_rest_url(table), params={"on_conflict": "id"}, json=rows, headers=headers, timeout=30)
     resp.raise_for_status()
-    # Supabase returns an array of rows when Prefer=return=representation
-    json_body = resp.json()
-    if isinstance(json_body, list) and len(json_body) > 0:
-        return json_body[0]
-    return json_body
 
-def create_requirements(data: Dict[str, Any]) -> Dict[str, Any]:
-    if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE:
-        raise RuntimeError("Supabase REST not configured (SUPABASE_URL/SUPABASE_SERVICE_ROLE)")
-    url = f"{SUPABASE_URL.rstrip('/')}/rest/v1/requirements"
-    resp = requests.post(url, json=data, headers=_headers(), timeout=10)
+def delete_rows(table: str, ids: Sequence[int]) -> None:
+    """Delete rows by id (ids already gone are ignored)."""
+    headers = {**_headers(), "Prefer": "return=minimal"}
+    params = {"id": f"in.({','.join(str(record_id) for record_id in ids)})"}
+    resp = _session().delete(_rest_url(table), params=params, headers=headers, timeout=30)
     resp.raise_for_status()
-    json_body = resp.json()
-    if isinstance(json_body, list) and len(json_body) > 0:
-        return json_body[0]
-    return json_body
 
-def create_contact(data: Dict[str, Any]) -> Dict[str, Any]:
-    if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE:
-        raise RuntimeError("Supabase REST not configured (SUPABASE_URL/SUPABASE_SERVICE_ROLE)")
-    url = f"{SUPABASE_URL.rstrip('/')}/rest/v1/contacts"
-    resp = requests.post(url, json=data, headers=_headers(), timeout=10)
+def call_rpc(name: str, params: Dict[str, Any]) -> Any:
+    """Call a Postgres function exposed by PostgREST (POST /rest/v1/rpc/<name>)."""
+    resp = _session().post(_rest_url(f"rpc/{name}"), json=params, headers=_headers(), timeout=30)
     resp.raise_for_status()
-    json_body = resp.json()
-    if isinstance(json_body, list) and len(json_body) > 0:
-        return json_body[0]
-    return json_body
+    return resp.json()
 
+def select_range(table: str, columns: Sequence[str], lo: int, hi: int, page_size: int = 1000) -> List[Dict[str, Any]]:
+    """Rows with lo <= id < hi ordered by id, paged below the PostgREST max-rows limit."""
+    rows: List[Dict[str, Any]] = []
+    while True:
+        params = [("select", ",".join(columns)), ("id", f"gte.{lo}"), ("id", f"lt.{hi}"),
+                  ("order", "id.asc"), ("limit", str(page_size))]
+        resp = _session().get(_rest_url(table), params=params, headers=_headers(), timeout=30)
+        resp.raise_for_status()
+        page = resp.json()
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        lo = page[-1]["id"] + 1
 
+def id_bounds(table: str) -> Optional[Tuple[int, int]]:
+    """(smallest id, largest id) of a table, or None when it is empty."""
+    found = []
+    for order in ("id.asc", "id.desc"):
+        resp = _session().get(_rest_url(table), params={"select": "id", "order": order, "limit": "1"},
+                              headers=_headers(), timeout=30)
+        resp.raise_for_status()
+        found.append(resp.json())
+    if not found[0]:
+        return None
+    return found[0][0]["id"], found[1][0]["id"]
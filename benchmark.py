@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+接口压测与性能基线
+
+在临时目录中准备一个预置数据的 SQLite 数据库（或用 --database-url 指向本地 PostgreSQL），
+以部署相同的方式启动后端（默认 gunicorn gthread），依次对各接口施加并发负载，统计每个接口的
+p50/p95/p99 延迟、吞吐量与服务进程（含所有 worker）的峰值 RSS。
+
+结果可保存为 JSON 基线，之后的运行与基线对比，超过阈值的退化会列出并以退出码 1 结束，
+便于部署前在 CI 中发现性能回退。
+
+用法:
+    python3 benchmark.py --seed-rows 20000 --save benchmarks/baseline.json
+    python3 benchmark.py --seed-rows 20000 --compare benchmarks/baseline.json
+    python3 benchmark.py --endpoints registration,admin_search --rate 50 --duration 20
+    python3 benchmark.py --report benchmarks/baseline.json benchmarks/current.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from benchmark_async import SlowSMTPServer, free_port, percentile
+
+BACKEND_DIR = Path(__file__).resolve().parent / 'backend'
+
+MANUFACTURERS = ["Yamaha", "Kawai", "Steinway", "Baldwin", "Pearl River", "Young Chang", "Petrof", "Bösendorfer"]
+CITIES = ["New York, NY", "Los Angeles, CA", "Chicago, IL", "Houston, TX", "Seattle, WA", "Boston, MA", "Denver, CO"]
+SEARCH_TERMS = ["yamaha", "kawai", "steinway", "boston", "chicago", "U1", "K-300"]
+
+# name -> request builder (run id, request index) -> (method, path, json body)
+ENDPOINTS = {
+    "registration": lambda run, i: ("POST", "/api/registration", {
+        "manufacturer": MANUFACTURERS[i % len(MANUFACTURERS)],
+        "model": "Bench",
+        "serial": f"BENCH-{run}-{i}",  # unique, so neither dedupe nor idempotent replay short-circuits it
+        "year": 1990 + i % 30,
+        "height": "Upright",
+        "finish": "Good",
+        "color_wood": "Black",
+        "city_state": CITIES[i % len(CITIES)],
+    }),
+    "admin_list": lambda run, i: ("GET", f"/api/admin/registrations?page={1 + i % 20}&limit=25", None),
+    "admin_search": lambda run, i: ("GET", f"/api/admin/registrations?search={SEARCH_TERMS[i % len(SEARCH_TERMS)]}&limit=25", None),
+    "requirements_list": lambda run, i: ("GET", f"/api/admin/requirements?page={1 + i % 20}&limit=25", None),
+    "stats": lambda run, i: ("GET", "/api/admin/stats", None),
+    "export_xlsx": lambda run, i: ("GET", "/api/admin/export/registrations", None),
+    "export_ndjson": lambda run, i: ("GET", "/api/admin/export/registrations.ndjson", None),
+}
+
+# Baseline metrics compared between runs: name -> True when higher is worse
+METRICS = {"p50_ms": True, "p95_ms": True, "p99_ms": True, "throughput_rps": False, "peak_rss_mb": True}
+
+def seed_database(database_url: str, rows: int, seed: int = 42):
+    """Create the schema and bulk-load `rows` registrations (plus requirements/contacts) with generate_data.py"""
+    subprocess.run([sys.executable, str(Path(__file__).resolve().parent / 'generate_data.py'),
+                    '--registrations', str(rows), '--logs', '0', '--seed', str(seed), '--until', '2025-01-01',
+                    '--database-url', database_url],
+                   check=True, stdout=subprocess.DEVNULL)
+
+def start_server(server: str, port: int, workers: int, env: dict, preload: bool = True):
+    """Start the backend the way it is deployed and wait until /api/health answers
+
+    preload=False starts gunicorn with GUNICORN_PRELOAD=false (every worker imports the app itself).
+    """
+    if server == 'gunicorn':
+        env = {**env, "GUNICORN_PRELOAD": "true" if preload else "false"}
+        cmd = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-w', str(workers),
+               '-b', f'127.0.0.1:{port}', 'main:app']
+    elif server == 'asgi':
+        cmd = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+               '--workers', str(workers), '--log-level', 'warning']
+    else:
+        raise ValueError(f"Unknown server: {server}")
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{server} server exited with code {proc.returncode}")
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/api/health', timeout=1).status_code == 200:
+                return proc
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{server} server did not become healthy")
+
+def process_tree_rss(pid: int) -> int:
+    """Resident memory in bytes of a process and all its descendants (Linux /proc; 0 elsewhere)"""
+    children = {}
+    for entry in Path('/proc').glob('[0-9]*'):
+        try:
+            stat = (entry / 'stat').read_text()
+            # the command name may contain spaces: fields after the closing parenthesis
+            ppid = int(stat.rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry.name))
+
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        stack.extend(children.get(current, []))
+        try:
+            for line in Path(f'/proc/{current}/status').read_text().splitlines():
+                if line.startswith('VmRSS:'):
+                    total += int(line.split()[1]) * 1024
+                    break
+        except OSError:
+            continue
+    return total
+
+class RssSampler:
+    """Samples the server's total RSS in the background and keeps the peak"""
+
+    def __init__(self, pid: int, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, process_tree_rss(self.pid))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, process_tree_rss(self.pid))
+
+def drive_endpoint(base_url: str, name: str, total: int, concurrency: int, rate: float = 0.0, run_id: str = "") -> dict:
+    """Send `total` requests to one endpoint and summarize latency and throughput.
+
+    Without a rate the load is closed-loop: `concurrency` clients send back to
+    back. With a rate, request i is due at start + i/rate (open loop) and its
+    latency counts from that due time, so queueing behind a slow server is
+    included instead of hidden (no coordinated omission).
+    """
+    build = ENDPOINTS[name]
+    local = threading.local()
+    started = time.perf_counter()
+
+    def one(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        due = started + i / rate if rate else time.perf_counter()
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        method, path, body = build(run_id, i)
+        try:
+            response = session.request(method, base_url + path, json=body, timeout=120)
+            response.content  # read the whole body (exports stream)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        return ok, time.perf_counter() - due
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency * 1000 for ok, latency in results if ok]
+    return {
+        "requests": total,
+        "errors": total - len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 1) if latencies else None,
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).resolve().parent,
+                              capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+def run_benchmark(endpoints, requests_per_endpoint=200, concurrency=16, rate=0.0, duration=0.0,
+                  server='gunicorn', workers=4, seed_rows=5000, database_url=None, smtp_delay=None, warmup=10,
+                  log=print) -> dict:
+    """Seed a database, start the server and load each endpoint in turn; returns the result document"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        url = database_url or f"sqlite:///{tmp}/benchmark.db"
+        if seed_rows:
+            log(f"🌱 Seeding {seed_rows} registrations...")
+            seed_database(url, seed_rows)
+
+        env = os.environ.copy()
+        env.update({
+            "DATABASE_URL": url,
+            "LOG_LEVEL": "WARNING",
+            "USE_SUPABASE_REST": "false",
+            "NOTIFICATION_EMAIL": "",
+        })
+        if smtp_delay is not None:
+            smtp_port = free_port()
+            SlowSMTPServer(smtp_port, smtp_delay).start()
+            env.update({
+                "MAIL_SERVER": "127.0.0.1", "MAIL_PORT": str(smtp_port), "MAIL_USE_TLS": "false",
+                "MAIL_USE_SSL": "false", "MAIL_USERNAME": "", "MAIL_DEFAULT_SENDER": "bench@localhost",
+                "NOTIFICATION_EMAIL": "admin@localhost",
+            })
+
+        port = free_port()
+        log(f"🚀 {server} ({workers} workers) on port {port}...")
+        proc = start_server(server, port, workers, env)
+        run_id = str(int(time.time()))
+        try:
+            for name in endpoints:
+                if warmup:
+                    drive_endpoint(f'http://127.0.0.1:{port}', name, warmup, concurrency, run_id=f"{run_id}w")
+                total = int(rate * duration) if rate and duration else requests_per_endpoint
+                with RssSampler(proc.pid) as sampler:
+                    result = drive_endpoint(f'http://127.0.0.1:{port}', name, total, concurrency, rate, run_id)
+                result["peak_rss_mb"] = round(sampler.peak / (1024 * 1024), 1) if sampler.peak else None
+                results[name] = result
+                log(f"   {name:<18} {result['throughput_rps']:>8} rps  p99 {result['p99_ms']!s:>8} ms  errors {result['errors']}")
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "server": server,
+            "workers": workers,
+            "seed_rows": seed_rows,
+            "database": "postgresql" if database_url and database_url.startswith("postgres") else "sqlite",
+            "concurrency": concurrency,
+            "rate": rate,
+            "requests": requests_per_endpoint if not (rate and duration) else int(rate * duration),
+        },
+        "endpoints": results,
+    }
+
+def compare(baseline: dict, current: dict, threshold: float = 0.2, min_delta_ms: float = 5.0):
+    """Compare two result documents; returns (rows, regressions).
+
+    A metric regresses when it is worse than the baseline by more than
+    `threshold` (a fraction); latency changes under `min_delta_ms` are noise.
+    """
+    rows, regressions = [], []
+    # An open-loop run's throughput is set by its rate, not by the server
+    open_loop = baseline.get("meta", {}).get("rate") or current.get("meta", {}).get("rate")
+    for name, now in current.get("endpoints", {}).items():
+        before = baseline.get("endpoints", {}).get(name)
+        if before is None:
+            rows.append((name, None, None, None, None, "new"))
+            continue
+        for metric, higher_is_worse in METRICS.items():
+            old, new = before.get(metric), now.get(metric)
+            if old is None or new is None or (metric == "throughput_rps" and open_loop):
+                continue
+            change = (new - old) / old if old else 0.0
+            worse = change > threshold if higher_is_worse else change < -threshold
+            if worse and metric.endswith("_ms") and new - old < min_delta_ms:
+                worse = False
+            status = "REGRESSION" if worse else "ok"
+            rows.append((name, metric, old, new, change, status))
+            if worse:
+                regressions.append((name, metric, old, new, change))
+        if now.get("errors") and not before.get("errors"):
+            rows.append((name, "errors", before.get("errors"), now["errors"], None, "REGRESSION"))
+            regressions.append((name, "errors", before.get("errors"), now["errors"], None))
+    return rows, regressions
+
+def setting_differences(baseline: dict, current: dict):
+    """Run settings (server, workers, seeded rows, load shape) that differ between two results"""
+    before, now = baseline.get("meta", {}), current.get("meta", {})
+    keys = ("server", "workers", "seed_rows", "database", "concurrency", "rate", "requests")
+    return [(key, before.get(key), now.get(key)) for key in keys if before.get(key) != now.get(key)]
+
+def print_report(rows, regressions, log=print):
+    log(f"{'endpoint':<18} {'metric':<15} {'baseline':>10} {'current':>10} {'change':>8}  status")
+    for name, metric, old, new, change, status in rows:
+        change_text = f"{change:+.0%}" if change is not None else ""
+        log(f"{name:<18} {metric or '':<15} {old if old is not None else '':>10} "
+            f"{new if new is not None else '':>10} {change_text:>8}  {status}")
+    log(f"\n{'❌' if regressions else '✅'} {len(regressions)} regression(s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API and compare against stored baselines")
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help=f"comma separated: {', '.join(ENDPOINTS)}")
+    parser.add_argument('--requests', type=int, default=200, help="requests per endpoint (closed loop)")
+    parser.add_argument('--concurrency', type=int, default=16, help="client threads")
+    parser.add_argument('--rate', type=float, default=0.0, help="open-loop requests/second per endpoint")
+    parser.add_argument('--duration', type=float, default=0.0, help="seconds per endpoint when --rate is set")
+    parser.add_argument('--server', choices=['gunicorn', 'asgi'], default='gunicorn')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed-rows', type=int, default=5000, help="registrations seeded before the run")
+    parser.add_argument('--database-url', help="benchmark an existing database (e.g. local PostgreSQL) instead")
+    parser.add_argument('--smtp-delay', type=float, help="send notifications to a fake SMTP server stalling this long")
+    parser.add_argument('--warmup', type=int, default=10, help="uncounted requests sent to each endpoint first")
+    parser.add_argument('--save', help="write the results (JSON baseline) to this file")
+    parser.add_argument('--compare', help="compare the results with this baseline; exit 1 on regression")
+    parser.add_argument('--report', nargs=2, metavar=('BASELINE', 'CURRENT'), help="only compare two saved results")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed fraction a metric may worsen")
+    parser.add_argument('--min-delta-ms', type=float, default=5.0, help="ignore latency changes smaller than this")
+    args = parser.parse_args()
+
+    if args.report:
+        baseline, current = (json.loads(Path(path).read_text()) for path in args.report)
+    else:
+        endpoints = [name.strip() for name in args.endpoints.split(',') if name.strip()]
+        unknown = [name for name in endpoints if name not in ENDPOINTS]
+        if unknown:
+            parser.error(f"unknown endpoints: {', '.join(unknown)}")
+        current = run_benchmark(endpoints, args.requests, args.concurrency, args.rate, args.duration,
+                                args.server, args.workers, args.seed_rows, args.database_url, args.smtp_delay,
+                                args.warmup)
+        if args.save:
+            Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+            Path(args.save).write_text(json.dumps(current, indent=2))
+            print(f"\n📄 Results written to {args.save}")
+        if not args.compare:
+            return 0
+        baseline = json.loads(Path(args.compare).read_text())
+
+    print()
+    for key, old, new in setting_differences(baseline, current):
+        print(f"⚠️  {key} differs from the baseline: {old} -> {new}")
+    rows, regressions = compare(baseline, current, args.threshold, args.min_delta_ms)
+    print_report(rows, regressions)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
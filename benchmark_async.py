@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+对比基准：gunicorn 同步部署 vs. ASGI 异步模式
+
+启动一个故意变慢的本地 SMTP 服务器（模拟慢速邮件服务），分别以
+  gunicorn -w 4 main:app          （当前 Render 部署方式）
+  uvicorn asgi:app --workers 1    （异步模式）
+启动后端，对 /api/registration 发起并发请求，输出吞吐量与延迟分位数。
+
+用法:
+    python3 benchmark_async.py --requests 200 --concurrency 100 --smtp-delay 0.5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent / 'backend'
+
+PAYLOAD = {
+    "manufacturer": "Steinway",
+    "model": "Model D",
+    "serial": "123456",
+    "year": 1995,
+    "height": "Grand Piano",
+    "finish": "Excellent",
+    "color_wood": "Black",
+    "city_state": "New York, NY"
+}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+class SlowSMTPServer:
+    """最小 SMTP 服务器：接受任何邮件，但在 DATA 结束后等待 delay 秒"""
+
+    def __init__(self, port, delay):
+        self.port = port
+        self.delay = delay
+        self.loop = asyncio.new_event_loop()
+
+    async def handle(self, reader, writer):
+        writer.write(b"220 localhost ESMTP bench\r\n")
+        in_data = False
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if in_data:
+                if line == b".\r\n":
+                    in_data = False
+                    await asyncio.sleep(self.delay)
+                    writer.write(b"250 OK\r\n")
+                continue
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                writer.write(b"250 localhost\r\n")
+            elif command == b"DATA":
+                in_data = True
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif command == b"QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+    def start(self):
+        async def serve():
+            server = await asyncio.start_server(self.handle, '127.0.0.1', self.port)
+            async with server:
+                await server.serve_forever()
+
+        thread = threading.Thread(target=lambda: self.loop.run_until_complete(serve()), daemon=True)
+        thread.start()
+
+def start_server(mode, port, env):
+    if mode == 'gunicorn':
+        cmd = [sys.executable, '-m', 'gunicorn', '-w', '4', '-b', f'127.0.0.1:{port}', 'main:app']
+    else:
+        cmd = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+               '--workers', '1', '--log-level', 'warning']
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/api/health', timeout=1).status_code == 200:
+                return proc
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not become healthy")
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+def drive_load(port, total, concurrency):
+    url = f'http://127.0.0.1:{port}/api/registration'
+
+    def one(_):
+        start = time.perf_counter()
+        try:
+            ok = requests.post(url, json=PAYLOAD, timeout=120).status_code == 201
+        except requests.RequestException:
+            ok = False
+        return ok, time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency * 1000 for ok, latency in results if ok]
+    errors = sum(1 for ok, _ in results if not ok)
+    return {
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 1) if latencies else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare gunicorn sync vs. ASGI async serving")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--smtp-delay', type=float, default=0.5, help="seconds the fake SMTP server stalls per mail")
+    parser.add_argument('--modes', default='gunicorn,asgi')
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    smtp_port = free_port()
+    SlowSMTPServer(smtp_port, args.smtp_delay).start()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in args.modes.split(','):
+            env = os.environ.copy()
+            env.update({
+                "DATABASE_URL": f"sqlite:///{tmp}/bench_{mode}.db",
+                "MAIL_SERVER": "127.0.0.1",
+                "MAIL_PORT": str(smtp_port),
+                "MAIL_USE_TLS": "false",
+                "MAIL_USE_SSL": "false",
+                "MAIL_USERNAME": "",
+                "MAIL_DEFAULT_SENDER": "bench@localhost",
+                "NOTIFICATION_EMAIL": "admin@localhost",
+                "LOG_LEVEL": "WARNING",
+                "USE_SUPABASE_REST": "false",
+            })
+            port = free_port()
+            print(f"🚀 {mode}: starting on port {port}...")
+            proc = start_server(mode, port, env)
+            try:
+                results[mode] = drive_load(port, args.requests, args.concurrency)
+            finally:
+                proc.terminate()
+                proc.wait(timeout=10)
+
+    print()
+    print(f"{'mode':<10} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for mode, r in results.items():
+        print(f"{mode:<10} {r['throughput_rps']:>8} {r['p50_ms']!s:>9} {r['p95_ms']!s:>9} {r['p99_ms']!s:>9} {r['errors']:>7}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+        print(f"\n📄 Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
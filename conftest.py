@@ -0,0 +1,17 @@
+"""
+pytest 公共配置：测试使用临时 SQLite 数据库、归档、备份、提交日志与导出任务目录，且不启动定时备份，避免写入 backend/data 下的真实数据
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+_test_dir = tempfile.mkdtemp(prefix="clavisnova-test-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_test_dir}/test.db")
+os.environ.setdefault("ARCHIVE_DIR", f"{_test_dir}/archive")
+os.environ.setdefault("BACKUP_DIR", f"{_test_dir}/backup")
+os.environ.setdefault("INTAKE_JOURNAL_DIR", f"{_test_dir}/journal")
+os.environ.setdefault("EXPORT_JOBS_DIR", f"{_test_dir}/export_jobs")
+os.environ.setdefault("BACKUP_INTERVAL_HOURS", "0")
@@ -564,6 +564,10 @@ function closeSuccessModal() {
 // Submit form data to backend API with timeout and retry
 async function submitFormData(endpoint, data, maxRetries = 2) {
     const url = endpoint.startsWith('http') ? endpoint : `${API_BASE}${endpoint}`;
+    // Same key on every retry, so the server replays the first response instead of saving twice
+    const idempotencyKey = (window.crypto && crypto.randomUUID)
+        ? crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
 
     for (let attempt = 0; attempt <= maxRetries; attempt++) {
         try {
@@ -577,6 +581,7 @@ async function submitFormData(endpoint, data, maxRetries = 2) {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'Idempotency-Key': idempotencyKey,
                 },
                 body: JSON.stringify(data),
                 signal: controller.signal
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+可复现的大规模合成数据生成器
+
+按给定随机种子生成逼真的钢琴登记、学校需求、联系消息与系统日志：制造商与城市按 Zipf 分布倾斜，
+中英文混合文本，真实的浏览器 User-Agent，约 1% 的重复登记（带 duplicate_of）。数据绕过 ORM，
+SQLite 用 executemany、PostgreSQL 用 COPY 分批写入，几分钟内即可得到 10 万到 1000 万行的数据库，
+用于测试索引、分页、搜索与导出。相同的种子与参数生成相同的数据。
+
+用法:
+    python3 generate_data.py --registrations 1000000 --seed 7
+    python3 generate_data.py --registrations 100000 --database-url postgresql://localhost/clavisnova_test
+    python3 generate_data.py --registrations 50000 --rollups --matching
+"""
+
+import argparse
+import bisect
+import csv
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+from pathlib import Path
+from random import Random
+
+BACKEND_DIR = Path(__file__).resolve().parent / 'backend'
+
+# Most common first: weights fall off as 1/rank^ZIPF_EXPONENT
+ZIPF_EXPONENT = 1.1
+
+MANUFACTURERS = {
+    "Yamaha": ["U1", "U3", "b1", "C3", "P22", "Clavinova CLP-745"],
+    "Kawai": ["K-300", "K-500", "GL-10", "CA49"],
+    "Pearl River 珠江": ["UP118M", "GP160", "EU122"],
+    "Steinway & Sons": ["Model D", "Model B", "Model M", "Model K"],
+    "Baldwin": ["Hamilton", "Acrosonic", "BP190"],
+    "Young Chang": ["Y121", "G157"],
+    "Hailun 海伦": ["HU5-P", "HG178"],
+    "Boston": ["UP-118E", "GP-156"],
+    "Roland": ["HP704", "F701", "RD-88"],
+    "Wurlitzer": ["Spinet 2500", "Console 1495"],
+    "Samick": ["JS-121", "SIG-57"],
+    "Casio": ["Privia PX-870", "Celviano AP-470"],
+    "Xinghai 星海": ["XU-120", "K-88"],
+    "Petrof": ["P 125", "P 159"],
+    "Kimball": ["Artist Console", "La Petite"],
+    "Bösendorfer": ["Imperial", "200"],
+    "Mason & Hamlin": ["Model A", "Model 50"],
+    "Schimmel": ["C 121", "K 213"],
+    "Estonia": ["L190"],
+    "Fazioli": ["F212"],
+}
+HEIGHTS = ["Upright", "Grand", "Baby Grand", "Digital", "Console", "Spinet", "Studio upright",
+           "立式", "三角钢琴", "数码钢琴", '48"', "121cm", "5'2\""]
+FINISHES = ["Good", "Excellent", "Fair", "Needs tuning", "Polished", "Satin", "良好", "一般", "需要调音"]
+COLORS = ["Black", "Polished Ebony", "Walnut", "Mahogany", "Cherry", "White", "Oak", "黑色", "胡桃木", "白色"]
+ACCESS = ["Ground floor", "2nd floor, elevator", "3 steps at entrance", "Stairs, no elevator",
+          "Garage", "一楼", "二楼有电梯", "三楼无电梯"]
+
+SCHOOL_KINDS = ["Elementary School", "Middle School", "High School", "Academy", "Community Music Center",
+                "Charter School", "Arts Magnet School"]
+SCHOOL_NAMES = ["Lincoln", "Washington", "Jefferson", "Roosevelt", "Franklin", "Kennedy", "Madison",
+                "Riverside", "Oak Grove", "Maple", "Hillcrest", "Sunset", "Eastside", "Westview"]
+CN_SCHOOL_PREFIXES = ["育才", "实验", "第一", "光明", "阳光", "希望", "红星", "新华", "华侨", "明德"]
+CN_SCHOOL_KINDS = ["小学", "中学", "实验学校", "音乐学校", "中文学校"]
+PREFERRED_TYPES = ["upright", "grand", "digital", "any", "upright or digital", "baby grand",
+                   "立式钢琴", "三角钢琴", "数码钢琴", "都可以"]
+BACKGROUNDS = [
+    "Our music program serves {n} students and we have no working piano.",
+    "Title I school, the choir rehearses with a keyboard that is missing keys.",
+    "We started an after-school piano club this year with {n} kids on the waitlist.",
+    "学校有 {n} 名学生参加音乐课，目前只有一台旧电子琴。",
+    "我们是一所乡村学校，希望为合唱团配一台钢琴。",
+    "Bilingual program (中英双语), {n} students take weekly music lessons.",
+]
+COMMITMENTS = [
+    "We will tune it twice a year and keep it in the music room.",
+    "The PTA has budgeted for moving and tuning.",
+    "Our music teacher will maintain it and report usage every semester.",
+    "学校承诺每年调音两次，并安排专人保管。",
+    "家长会已经筹集搬运费用。",
+]
+FIRST_NAMES = ["Emily", "Michael", "Sarah", "David", "Jessica", "James", "Maria", "Daniel", "Laura", "Kevin"]
+LAST_NAMES = ["Smith", "Johnson", "Garcia", "Lee", "Brown", "Nguyen", "Martinez", "Chen", "Wang", "Davis"]
+CN_SURNAMES = ["王", "李", "张", "刘", "陈", "杨", "黄", "赵", "周", "吴"]
+CN_GIVEN = ["伟", "芳", "娜", "敏", "静", "磊", "洋", "艳", "勇", "军", "杰", "娟"]
+CONTACT_MESSAGES = [
+    "Hi, I have a piano to donate but I'm not sure it qualifies. Can you help?",
+    "Do you pick up pianos in {city}?",
+    "How long does it usually take to match a donation?",
+    "我想捐一台钢琴，请问需要提供哪些信息？",
+    "请问你们在{city}有合作的搬运公司吗？",
+    "Our school received the piano last week, thank you so much! 非常感谢！",
+]
+EMAIL_DOMAINS = ["gmail.com", "yahoo.com", "outlook.com", "icloud.com", "qq.com", "163.com", "school.edu"]
+
+# (user agent, weight): desktop and mobile browsers plus in-app webviews
+USER_AGENTS = [
+    ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36", 30),
+    ("Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1", 22),
+    ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15", 12),
+    ("Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36", 10),
+    ("Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0", 6),
+    ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 Edg/124.0.0.0", 6),
+    ("Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148 MicroMessenger/8.0.47(0x18002f2c) NetType/WIFI Language/zh_CN", 5),
+    ("Mozilla/5.0 (Linux; Android 13; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/24.0 Chrome/117.0.0.0 Mobile Safari/537.36", 4),
+    ("Mozilla/5.0 (iPad; CPU OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) CriOS/124.0.6367.88 Mobile/15E148 Safari/604.1", 3),
+    ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36", 2),
+]
+LOG_LEVELS = [("INFO", 80), ("WARNING", 15), ("ERROR", 5)]
+LOG_MESSAGES = {
+    "INFO": ["Form submission: {form}", "Notification email sent for {form} submission", "Export generated: {form}"],
+    "WARNING": ["Invalid year value, using default 2020", "Notification email not configured, skipping"],
+    "ERROR": ["Failed to send notification email: timed out", "Database error during {form} save: database is locked"],
+}
+
+COLUMNS = {
+    "registrations": ["id", "manufacturer", "model", "serial", "year", "height", "finish", "color_wood", "city_state",
+                      "access", "client_ip", "user_agent_hash", "fingerprint", "duplicate_of", "latitude", "longitude",
+                      "geo_cell", "geo_level", "created_at", "updated_at"],
+    "requirements": ["id", "school_name", "current_pianos", "preferred_type", "teacher_name", "background",
+                     "commitment", "client_ip", "user_agent_hash", "latitude", "longitude", "geo_cell", "geo_level",
+                     "created_at", "updated_at"],
+    "contacts": ["id", "name", "email", "message", "client_ip", "user_agent_hash", "created_at", "updated_at"],
+    "system_logs": ["id", "level", "message", "data", "created_at"],
+}
+
+class Picker:
+    """Weighted choice over a fixed population (cumulative weights, O(log n) per pick)"""
+
+    def __init__(self, population, weights=None):
+        self.population = list(population)
+        weights = weights or [1.0 / (rank ** ZIPF_EXPONENT) for rank in range(1, len(self.population) + 1)]
+        self.cum_weights = list(accumulate(weights))
+        self.total = self.cum_weights[-1]
+
+    def __call__(self, rng: Random):
+        index = bisect.bisect_right(self.cum_weights, rng.random() * self.total)
+        return self.population[min(index, len(self.population) - 1)]
+
+def load_cities():
+    """Gazetteer cities in file order (larger cities first) with their state names and grid cells"""
+    from geo import US_STATES, gazetteer
+
+    state_names = {code: name.title() for name, code in US_STATES.items() if len(name) > 2}
+    return [(location, state_names.get(location.state, location.state.upper()), location.cell)
+            for location in gazetteer.cities.values()]
+
+class Generator:
+    """Deterministic row factory: each table draws from its own seeded random stream"""
+
+    def __init__(self, seed: int, until: datetime, days: int):
+        self.seed = seed
+        self.until = until
+        self.span = timedelta(days=days)
+        self.manufacturer = Picker(MANUFACTURERS)
+        cities = load_cities()
+        self.city = Picker(cities)
+        from models import user_agent_hash
+
+        # Rows reference user agents by their key in the user_agents lookup table (see generate())
+        self.user_agent = Picker([user_agent_hash(ua) for ua, _ in USER_AGENTS], [w for _, w in USER_AGENTS])
+        self.log_level = Picker([level for level, _ in LOG_LEVELS], [w for _, w in LOG_LEVELS])
+        # A few busy networks (schools, libraries) submit far more than the rest
+        self.network = Picker([f"{10 + n % 200}.{(n * 37) % 256}" for n in range(500)])
+
+    def rng(self, table: str) -> Random:
+        return Random(f"{self.seed}:{table}")
+
+    def timestamp(self, rng: Random, index: int, total: int) -> datetime:
+        """Increasing with the id, denser towards `until` (traffic grew over time)"""
+        fraction = ((index + rng.random()) / max(total, 1)) ** 1.5
+        return (self.until - self.span + self.span * fraction).replace(microsecond=0)
+
+    def ip(self, rng: Random) -> str:
+        if rng.random() < 0.1:
+            return "2001:db8:%x:%x::%x" % (rng.getrandbits(16), rng.getrandbits(16), rng.getrandbits(16))
+        return f"{self.network(rng)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+
+    def place(self, rng: Random):
+        location, state_name, cell = self.city(rng)
+        style = rng.random()
+        if style < 0.8:
+            text = f"{location.city}, {location.state.upper()}"
+        elif style < 0.9:
+            text = f"{location.city}, {state_name}"
+        else:
+            text = f"{location.city.lower()} {location.state}"
+        return text, location, cell
+
+    def person(self, rng: Random) -> str:
+        if rng.random() < 0.3:
+            return rng.choice(CN_SURNAMES) + "".join(rng.choice(CN_GIVEN) for _ in range(rng.randint(1, 2)))
+        return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+    def registrations(self, first_id: int, total: int, duplicate_rate: float):
+        from dedupe import registration_fingerprint
+
+        rng = self.rng("registrations")
+        recent = []  # primaries a later duplicate may copy
+        for index in range(total):
+            record_id = first_id + index
+            created = self.timestamp(rng, index, total)
+            city_state, location, cell = self.place(rng)
+            if recent and rng.random() < duplicate_rate:
+                primary_id, manufacturer, model, serial, fingerprint = rng.choice(recent)
+                duplicate_of = primary_id
+            else:
+                manufacturer = self.manufacturer(rng)
+                model = rng.choice(MANUFACTURERS[manufacturer])
+                serial = f"{rng.choice('ABCDEFGHJKLMNPRSTUVWXYZ')}{rng.randint(10000, 9999999)}-{record_id}"
+                fingerprint = registration_fingerprint(manufacturer, serial, model)
+                duplicate_of = None
+                recent.append((record_id, manufacturer, model, serial, fingerprint))
+                if len(recent) > 1000:
+                    recent.pop(0)
+            yield (
+                record_id, manufacturer, model, serial, rng.randint(1920, 2023), rng.choice(HEIGHTS),
+                rng.choice(FINISHES), rng.choice(COLORS), city_state, rng.choice(ACCESS), self.ip(rng),
+                self.user_agent(rng), fingerprint, duplicate_of, location.latitude, location.longitude,
+                cell, location.level, created, created,
+            )
+
+    def requirements(self, first_id: int, total: int):
+        rng = self.rng("requirements")
+        for index in range(total):
+            created = self.timestamp(rng, index, total)
+            city_state, location, cell = self.place(rng)
+            if rng.random() < 0.25:
+                school = f"{rng.choice(CN_SCHOOL_PREFIXES)}{rng.choice(CN_SCHOOL_KINDS)}, {city_state}"
+            else:
+                school = f"{rng.choice(SCHOOL_NAMES)} {rng.choice(SCHOOL_KINDS)}, {city_state}"
+            yield (
+                first_id + index, school, rng.choice(["0", "1", "2", "3", "一台旧钢琴", "none"]),
+                rng.choice(PREFERRED_TYPES), self.person(rng),
+                rng.choice(BACKGROUNDS).format(n=rng.randint(15, 600)), rng.choice(COMMITMENTS),
+                self.ip(rng), self.user_agent(rng), location.latitude, location.longitude,
+                cell, location.level, created, created,
+            )
+
+    def contacts(self, first_id: int, total: int):
+        rng = self.rng("contacts")
+        for index in range(total):
+            created = self.timestamp(rng, index, total)
+            location = self.city(rng)[0]
+            name = self.person(rng)
+            handle = f"{rng.choice(FIRST_NAMES).lower()}.{rng.randint(1, 9999)}"
+            yield (
+                first_id + index, name, f"{handle}@{rng.choice(EMAIL_DOMAINS)}",
+                rng.choice(CONTACT_MESSAGES).format(city=location.city), self.ip(rng), self.user_agent(rng),
+                created, created,
+            )
+
+    def system_logs(self, first_id: int, total: int):
+        rng = self.rng("system_logs")
+        for index in range(total):
+            level = self.log_level(rng)
+            form = rng.choice(["registration", "requirements", "contact"])
+            data = json.dumps({"form_type": form, "ip": self.ip(rng)}, ensure_ascii=False)
+            yield (first_id + index, level, rng.choice(LOG_MESSAGES[level]).format(form=form), data,
+                   self.timestamp(rng, index, total))
+
+def _batches(rows, size: int):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+def bulk_load(engine, table: str, rows, batch_size: int = 10000) -> int:
+    """Write rows (tuples in COLUMNS order) with COPY on PostgreSQL, executemany elsewhere"""
+    from sqlalchemy import DateTime
+    from models import PackedIP
+
+    columns = COLUMNS[table]
+    # Stored exactly as the ORM would: timestamps as text on SQLite, IPs packed (inet on PostgreSQL)
+    processors = {i: DateTime().bind_processor(engine.dialect) for i, column in enumerate(columns) if column.endswith("_at")}
+    if "client_ip" in columns:
+        processors[columns.index("client_ip")] = PackedIP().bind_processor(engine.dialect)
+    processors = {i: processor for i, processor in processors.items() if processor}
+    postgres = engine.dialect.name == "postgresql"
+    placeholder = {"qmark": "?", "numeric": ":1", "named": ":p"}.get(engine.dialect.paramstyle, "%s")
+
+    loaded = 0
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for batch in _batches(rows, batch_size):
+            if processors:
+                batch = [tuple(processors[i](v) if i in processors else v for i, v in enumerate(row)) for row in batch]
+            if postgres:
+                buffer = io.StringIO()
+                # Strings are quoted, so '' stays an empty string and only None becomes NULL
+                csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+            else:
+                cursor.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([placeholder] * len(columns))})",
+                    batch
+                )
+            raw.commit()
+            loaded += len(batch)
+        if postgres and loaded:
+            # Explicit ids bypass the sequence: move it past them
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))")
+            raw.commit()
+    finally:
+        raw.close()
+    return loaded
+
+def generate(engine, counts: dict, seed: int = 42, until: datetime = None, days: int = 365,
+             duplicate_rate: float = 0.01, batch_size: int = 10000, log=print) -> dict:
+    """Generate and bulk-load `counts` rows per table; returns rows loaded per table"""
+    from sqlalchemy import text
+    from models import remember_user_agents
+
+    until = until or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    generator = Generator(seed, until, days)
+    with engine.begin() as conn:
+        remember_user_agents(conn, [ua for ua, _ in USER_AGENTS])
+    loaded = {}
+    for table, total in counts.items():
+        if not total:
+            continue
+        with engine.connect() as conn:
+            first_id = (conn.execute(text(f"SELECT MAX(id) FROM {table}")).scalar() or 0) + 1
+        rows = getattr(generator, table)(first_id, total, duplicate_rate) if table == "registrations" \
+            else getattr(generator, table)(first_id, total)
+        started = time.perf_counter()
+        loaded[table] = bulk_load(engine, table, rows, batch_size)
+        elapsed = time.perf_counter() - started
+        log(f"✅ {table}: {loaded[table]} rows in {elapsed:.1f}s ({loaded[table] / max(elapsed, 1e-9):,.0f} rows/s)")
+    return loaded
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate deterministic synthetic data at scale")
+    parser.add_argument('--registrations', type=int, default=100000)
+    parser.add_argument('--requirements', type=int, help="default: registrations / 4")
+    parser.add_argument('--contacts', type=int, help="default: registrations / 10")
+    parser.add_argument('--logs', type=int, help="system_logs rows, default: registrations")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--until', help="newest created_at (YYYY-MM-DD), default today; fix it for identical reruns")
+    parser.add_argument('--days', type=int, default=365, help="created_at spans this many days before --until")
+    parser.add_argument('--duplicate-rate', type=float, default=0.01, help="share of registrations copying an earlier piano")
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--database-url', help="default: DATABASE_URL / settings")
+    parser.add_argument('--rollups', action="store_true", help="rebuild the stats rollups afterwards")
+    parser.add_argument('--matching', action="store_true", help="rebuild the donation matching index afterwards")
+    args = parser.parse_args()
+
+    # settings are read at import time, so the target database is chosen before importing the backend
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    sys.path.insert(0, str(BACKEND_DIR))
+    from models import SessionLocal, create_tables, engine
+
+    create_tables()
+    counts = {
+        "registrations": args.registrations,
+        "requirements": args.requirements if args.requirements is not None else args.registrations // 4,
+        "contacts": args.contacts if args.contacts is not None else args.registrations // 10,
+        "system_logs": args.logs if args.logs is not None else args.registrations,
+    }
+    until = datetime.strptime(args.until, "%Y-%m-%d") if args.until else None
+    print(f"🎹 Generating {sum(counts.values()):,} rows (seed {args.seed}) into {engine.url.render_as_string(hide_password=True)}")
+    generate(engine, counts, args.seed, until, args.days, args.duplicate_rate, args.batch_size)
+
+    if args.rollups:
+        from rollups import backfill
+        backfill(engine, chunk_size=10000)
+    if args.matching:
+        from matching import rebuild
+        rebuild(SessionLocal)
+    if not (args.rollups and args.matching):
+        print("ℹ️  Rows were bulk-loaded without the insert hooks: run with --rollups/--matching "
+              "(or backend/rollups.py --backfill, backend/matching.py --rebuild) for stats and matches")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+启动耗时与内存报告
+
+用 `python -X importtime` 统计导入后端（main）时各模块的累计耗时，找出拖慢冷启动的重依赖；
+再分别以预加载（gunicorn.conf.py，主进程导入并检查表结构后 fork）和不预加载的方式启动
+gunicorn，比较从启动到 /api/health 可用的时间、以及每个 worker 的 RSS 与 PSS
+（PSS 按共享页面平摊，能体现 fork 后写时复制共享的内存）。
+
+用法:
+    python3 startup_report.py
+    python3 startup_report.py --top 25 --workers 4
+    python3 startup_report.py --imports-only
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark import BACKEND_DIR, start_server
+from benchmark_async import free_port
+
+def parse_importtime(stderr: str):
+    """Parse `-X importtime` output into (module, self_us, cumulative_us, depth) rows.
+
+    Nested imports are indented under the module that triggered them (depth > 0);
+    the cumulative times of the depth-0 rows add up to the whole import.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+        except ValueError:
+            continue
+    return rows
+
+def _test_env(database_url: str) -> dict:
+    env = os.environ.copy()
+    env.update({"DATABASE_URL": database_url, "LOG_LEVEL": "WARNING", "USE_SUPABASE_REST": "false"})
+    return env
+
+def measure_import(env: dict, module: str = 'main') -> dict:
+    """Import the backend in a fresh interpreter; returns wall time, RSS and the importtime rows"""
+    code = (f"import time; t = time.perf_counter(); import {module}; elapsed = time.perf_counter() - t\n"
+            "rss = next(int(l.split()[1]) for l in open('/proc/self/status') if l.startswith('VmRSS:'))"
+            " if __import__('os').path.exists('/proc/self/status') else 0\n"
+            "print(elapsed, rss)")
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=BACKEND_DIR, env=env,
+                          capture_output=True, text=True, check=True)
+    elapsed, rss_kb = proc.stdout.split()[-2:]
+    return {
+        "seconds": float(elapsed),
+        "rss_mb": int(rss_kb) / 1024,
+        "modules": parse_importtime(proc.stderr),
+    }
+
+def _memory_kb(pid: int, field: str) -> int:
+    """A field of /proc/<pid>/smaps_rollup (Pss, Rss, ...) in kB; 0 if unavailable"""
+    try:
+        for line in Path(f'/proc/{pid}/smaps_rollup').read_text().splitlines():
+            if line.startswith(f'{field}:'):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+def _children(pid: int):
+    try:
+        return [int(child) for child in Path(f'/proc/{pid}/task/{pid}/children').read_text().split()]
+    except OSError:
+        return []
+
+def measure_server(env: dict, workers: int, preload: bool) -> dict:
+    """Start gunicorn and report time-to-healthy and the per-worker memory once all workers are up"""
+    port = free_port()
+    started = time.perf_counter()
+    proc = start_server('gunicorn', port, workers, env, preload=preload)
+    healthy = time.perf_counter() - started
+    try:
+        deadline = time.time() + 30
+        while len(_children(proc.pid)) < workers and time.time() < deadline:
+            time.sleep(0.1)
+        time.sleep(0.5)  # let the last worker finish booting
+        pids = _children(proc.pid)
+        return {
+            "preload": preload,
+            "healthy_seconds": healthy,
+            "workers": len(pids),
+            "master_rss_mb": _memory_kb(proc.pid, 'Rss') / 1024,
+            "worker_rss_mb": sum(_memory_kb(pid, 'Rss') for pid in pids) / 1024 / max(len(pids), 1),
+            "worker_pss_mb": sum(_memory_kb(pid, 'Pss') for pid in pids) / 1024 / max(len(pids), 1),
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+def print_import_report(result: dict, top: int = 15, log=print):
+    log(f"\n📦 import main: {result['seconds'] * 1000:.0f} ms, RSS {result['rss_mb']:.1f} MB")
+    log(f"{'module':<45}{'self ms':>10}{'cumulative ms':>16}")
+    heaviest = sorted(result["modules"], key=lambda row: row[2], reverse=True)[:top]
+    for name, self_us, cumulative_us, _ in heaviest:
+        log(f"{name:<45}{self_us / 1000:>10.1f}{cumulative_us / 1000:>16.1f}")
+
+def print_server_report(results, log=print):
+    log("\n🚀 gunicorn startup")
+    log(f"{'mode':<12}{'healthy s':>10}{'workers':>9}{'master RSS':>12}{'worker RSS':>12}{'worker PSS':>12}")
+    for r in results:
+        mode = 'preload' if r["preload"] else 'no preload'
+        log(f"{mode:<12}{r['healthy_seconds']:>10.2f}{r['workers']:>9}{r['master_rss_mb']:>11.1f}M"
+            f"{r['worker_rss_mb']:>11.1f}M{r['worker_pss_mb']:>11.1f}M")
+
+def main():
+    parser = argparse.ArgumentParser(description="Report backend import time and gunicorn startup cost")
+    parser.add_argument('--top', type=int, default=15, help="heaviest modules to list")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--database-url', help="database to start against (default: a temporary SQLite file)")
+    parser.add_argument('--imports-only', action='store_true', help="skip starting gunicorn")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = _test_env(args.database_url or f"sqlite:///{tmp}/startup.db")
+        print_import_report(measure_import(env), args.top)
+        if not args.imports_only:
+            print_server_report([measure_server(env, args.workers, preload) for preload in (False, True)])
+
+if __name__ == "__main__":
+    main()
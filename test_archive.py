@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+测试冷热分层归档：旧的或已处理的记录分块移入压缩 NDJSON 分段，归档后仍可搜索与导出
+"""
+
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+PIANO = {"manufacturer": "Baldwin", "model": "Acrosonic", "year": 1970, "height": "Spinet",
+         "finish": "Fair", "color_wood": "Walnut", "city_state": "Boston, MA"}
+
+@contextmanager
+def _archive_dir():
+    from config import settings
+
+    original = settings.archive_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.archive_dir = Path(tmp)
+        try:
+            yield settings.archive_dir
+        finally:
+            settings.archive_dir = original
+
+def _engine(tmp):
+    from models import Base, build_engine
+
+    engine = build_engine(f"sqlite:///{tmp}/archive.db")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+def test_age_and_completed_rules():
+    """超过保留期或已标记完成的行被移走，每块一个分段文件与一条清单记录"""
+    from sqlalchemy import func, select
+    from sqlalchemy.orm import Session
+    from archive import run_archive, verify
+    from models import ArchiveSegment, Contact, Registration, Tombstone
+
+    with _archive_dir() as folder, tempfile.TemporaryDirectory() as tmp:
+        engine = _engine(tmp)
+        old = datetime.utcnow() - timedelta(days=400)
+        with engine.begin() as conn:
+            conn.execute(Registration.__table__.insert(), [
+                {**PIANO, "serial": f"OLD-{n}", "created_at": old + timedelta(minutes=n), "completed_at": None}
+                for n in range(5)
+            ] + [
+                {**PIANO, "serial": "NEW-DONE", "created_at": datetime.utcnow(), "completed_at": datetime.utcnow()},
+                {**PIANO, "serial": "NEW-OPEN", "created_at": datetime.utcnow(), "completed_at": None},
+            ])
+            conn.execute(Contact.__table__.insert(), [{"message": "old", "created_at": old}])
+
+        moved = run_archive(engine, after_days=365, chunk_size=2, log=lambda *_: None)
+        assert moved == {"registrations": 6, "requirements": 0, "contacts": 1}
+
+        with engine.connect() as conn:
+            assert conn.execute(select(Registration.serial)).scalars().all() == ["NEW-OPEN"]
+            segments = conn.execute(select(ArchiveSegment).order_by(ArchiveSegment.id)).all()
+            assert conn.execute(select(func.count(Tombstone.id))).scalar() == 0  # not deletions for sync clients
+        assert [(s.table_name, s.row_count) for s in segments] == [("registrations", 2)] * 3 + [("contacts", 1)]
+
+        with gzip.open(folder / segments[0].path, "rt", encoding="utf-8") as source:
+            first = [json.loads(line) for line in source]
+        assert [row["serial"] for row in first] == ["OLD-0", "OLD-1"]
+        assert first[0]["created_at"].startswith(old.date().isoformat())
+
+        with Session(engine) as db:
+            assert verify(db) == []
+            (folder / segments[0].path).write_bytes(b"corrupted")
+            assert verify(db) == [segments[0].path]
+
+        # nothing left to move; an unreferenced file from an aborted chunk is cleaned up
+        stray = folder / "registrations" / "0000000001-0000000002-deadbeef.ndjson.gz"
+        stray.write_bytes(b"")
+        os.utime(stray, (time.time() - 7200, time.time() - 7200))
+        assert run_archive(engine, after_days=365, log=lambda *_: None)["registrations"] == 0
+        assert not stray.exists()
+        engine.dispose()
+
+def test_failed_chunk_keeps_rows():
+    """删除失败时整块回滚，刚写出的分段文件被删除"""
+    from sqlalchemy import func, select
+    import archive
+    from models import ArchiveSegment, Registration
+
+    with _archive_dir() as folder, tempfile.TemporaryDirectory() as tmp:
+        engine = _engine(tmp)
+        with engine.begin() as conn:
+            conn.execute(Registration.__table__.insert(), [{**PIANO, "serial": "FAIL", "completed_at": datetime.utcnow()}])
+
+        original = archive.remove_record
+        archive.MATCH_TYPES, saved = {"registrations": "registration"}, archive.MATCH_TYPES
+
+        def broken(*args):
+            raise RuntimeError("disk full")
+        archive.remove_record = broken
+        try:
+            archive.run_archive(engine, after_days=0, log=lambda *_: None)
+            assert False, "expected the chunk to fail"
+        except RuntimeError:
+            pass
+        finally:
+            archive.remove_record, archive.MATCH_TYPES = original, saved
+
+        with engine.connect() as conn:
+            assert conn.execute(select(func.count(Registration.id))).scalar() == 1
+            assert conn.execute(select(func.count(ArchiveSegment.id))).scalar() == 0
+        assert list(folder.glob("*/*")) == []
+        engine.dispose()
+
+def test_archived_max_id_is_not_reused():
+    """归档最大 id 的行后新提交不会复用该 id；旧库迁移为 AUTOINCREMENT 后同样如此，且保留原有行与旧列"""
+    from sqlalchemy import inspect, select, text
+    from archive import run_archive
+    from models import Registration, ensure_autoincrement
+
+    def submit(engine, serial, **values):
+        with engine.begin() as conn:
+            return conn.execute(Registration.__table__.insert().values(**PIANO, serial=serial, **values)).inserted_primary_key[0]
+
+    with _archive_dir(), tempfile.TemporaryDirectory() as tmp:
+        engine = _engine(tmp)
+        submit(engine, "M1")
+        archived = submit(engine, "M2", completed_at=datetime.utcnow())
+        run_archive(engine, after_days=0, kinds=["registrations"], log=lambda *_: None)
+        assert submit(engine, "M3") == archived + 1
+        engine.dispose()
+
+    with _archive_dir(), tempfile.TemporaryDirectory() as tmp:
+        engine = _engine(tmp)
+        with engine.begin() as conn:  # a database created before AUTOINCREMENT, with a not yet backfilled column
+            definition = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'registrations'")).scalar()
+            conn.exec_driver_sql("DROP TABLE registrations")
+            conn.exec_driver_sql(definition.replace(" AUTOINCREMENT", ""))
+            conn.exec_driver_sql("ALTER TABLE registrations ADD COLUMN user_agent TEXT")
+        submit(engine, "L1")
+        archived = submit(engine, "L2", completed_at=datetime.utcnow())
+        with engine.begin() as conn:
+            conn.exec_driver_sql("UPDATE registrations SET user_agent = 'legacy agent' WHERE serial = 'L1'")
+        run_archive(engine, after_days=0, kinds=["registrations"], log=lambda *_: None)
+
+        ensure_autoincrement(engine)
+        ensure_autoincrement(engine)  # already migrated: no-op
+        assert submit(engine, "L3") == archived + 1
+        with engine.connect() as conn:
+            assert conn.execute(select(Registration.serial).order_by(Registration.id)).scalars().all() == ["L1", "L3"]
+            assert conn.exec_driver_sql("SELECT user_agent FROM registrations WHERE serial = 'L1'").scalar() == "legacy agent"
+        index_names = {index["name"] for index in inspect(engine).get_indexes("registrations")}
+        assert "uq_registrations_fingerprint_primary" in index_names
+        engine.dispose()
+
+def test_archived_rows_searchable_and_exportable():
+    """管理员标记完成后归档，仍能通过归档接口搜索、导出 NDJSON 与表格"""
+    import main
+    from archive import run_archive, verify
+    from models import SessionLocal, engine
+
+    client = main.app.test_client()
+    ids = []
+    for n in range(3):
+        response = client.post('/api/registration', json={**PIANO, "serial": f"ARCH-{n}"},
+                               environ_base={'REMOTE_ADDR': f'10.7.0.{n}'})
+        ids.append(response.get_json()["id"])
+    for record_id in ids[:2]:
+        done = client.post(f'/api/admin/complete/registrations/{record_id}')
+        assert done.status_code == 200 and done.get_json()["data"]["completed_at"]
+    assert client.post('/api/admin/complete/registrations/999999').status_code == 404
+    assert client.post('/api/admin/complete/pianos/1').status_code == 404
+
+    # 年龄规则关闭：只移走刚标记完成的两行
+    assert run_archive(engine, after_days=0, log=lambda *_: None)["registrations"] == 2
+
+    hot = client.get('/api/admin/registrations?search=ARCH-').get_json()["data"]
+    assert [row["serial"] for row in hot] == ["ARCH-2"]
+
+    found = client.get('/api/admin/archive/registrations?search=arch-&limit=1').get_json()
+    assert found["pagination"]["total"] == 2 and found["pagination"]["has_next"]
+    assert found["data"][0]["serial"] == "ARCH-1" and found["data"][0]["completed_at"]
+    assert set(found["data"][0]) == set(hot[0])  # same fields as the live list
+    assert client.get('/api/admin/archive/registrations?search=nomatch').get_json()["data"] == []
+    assert client.get('/api/admin/archive/pianos').status_code == 404
+
+    lines = client.get('/api/admin/archive/registrations.ndjson?search=ARCH-').get_data(as_text=True).splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ids[:2]
+    sheet = client.get('/api/admin/archive/registrations/export?search=ARCH-')
+    assert sheet.status_code == 200 and len(sheet.data) > 0
+
+    summary = client.get('/api/admin/archive').get_json()["archive"]
+    assert summary["registrations"]["rows"] >= 2 and summary["registrations"]["bytes"] > 0
+
+    db = SessionLocal()
+    try:
+        assert verify(db) == []
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    test_age_and_completed_rules()
+    test_failed_chunk_keeps_rows()
+    test_archived_max_id_is_not_reused()
+    test_archived_rows_searchable_and_exportable()
+    print("✅ 归档测试通过")
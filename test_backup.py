@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+测试在线备份：SQLite 分步备份与校验后恢复、校验和被篡改时拒绝恢复、写入并发时备份、
+备份轮换与定时判断，以及 PostgreSQL COPY 转储格式的解析
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+PIANO = {"manufacturer": "Steinway", "model": "M", "year": 1925, "height": "Grand",
+         "finish": "Good", "color_wood": "Mahogany", "city_state": "Portland, OR"}
+
+@contextmanager
+def _patched(target, name, value):
+    original = getattr(target, name)
+    setattr(target, name, value)
+    try:
+        yield value
+    finally:
+        setattr(target, name, original)
+
+def _engine(path, rows=0):
+    from models import Base, Registration, build_engine
+
+    engine = build_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    if rows:
+        with engine.begin() as conn:
+            conn.execute(Registration.__table__.insert(),
+                         [{**PIANO, "serial": f"BK-{n}"} for n in range(rows)])
+    return engine
+
+def _count(path, table="registrations"):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+def test_backup_and_verified_restore():
+    """备份压缩并带清单；恢复到新文件后行数一致，已存在的数据库需 force 才会被替换"""
+    from backup import BackupError, create_backup, load_manifest, manifest_path, restore_backup, verify_backup
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = _engine(f"{tmp}/live.db", rows=120)
+        path = create_backup(engine, backup_dir=Path(tmp) / "backup")
+        engine.dispose()
+
+        assert path.name.endswith(".sqlite.gz") and manifest_path(path).exists()
+        with gzip.open(path) as compressed:
+            assert compressed.read(16) == b"SQLite format 3\x00"
+        manifest = load_manifest(path)
+        assert manifest["engine"] == "sqlite" and manifest["tables"]["registrations"] == 120
+        assert manifest["sha256"] == hashlib.sha256(path.read_bytes()).hexdigest()
+        assert verify_backup(path)["file"] == path.name
+
+        restored = f"{tmp}/restored.db"
+        restore_backup(path, f"sqlite:///{restored}")
+        assert _count(restored) == 120
+
+        try:
+            restore_backup(path, f"sqlite:///{restored}")
+            assert False, "expected an existing database to need force"
+        except BackupError:
+            pass
+        Path(f"{restored}-wal").write_bytes(b"stale")
+        restore_backup(path, f"sqlite:///{restored}", force=True)
+        assert _count(restored) == 120 and not Path(f"{restored}-wal").exists()
+
+def test_tampered_backup_is_refused():
+    """校验和或行数与清单不符时，校验失败且不替换目标数据库"""
+    from backup import BackupError, create_backup, manifest_path, restore_backup, verify_backup
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = _engine(f"{tmp}/live.db", rows=10)
+        path = create_backup(engine, backup_dir=Path(tmp) / "backup")
+        engine.dispose()
+        target = _engine(f"{tmp}/target.db", rows=3)
+        target.dispose()
+
+        manifest = json.loads(manifest_path(path).read_text())
+        manifest["tables"]["registrations"] = 11
+        manifest_path(path).write_text(json.dumps(manifest))
+        for attempt in (lambda: verify_backup(path), lambda: restore_backup(path, f"sqlite:///{tmp}/target.db", force=True)):
+            try:
+                attempt()
+                assert False, "expected the row counts to be rejected"
+            except BackupError as e:
+                assert "registrations" in str(e)
+
+        data = bytearray(path.read_bytes())
+        data[len(data) // 2] ^= 0xFF
+        path.write_bytes(bytes(data))
+        try:
+            restore_backup(path, f"sqlite:///{tmp}/target.db", force=True)
+            assert False, "expected the checksum to be rejected"
+        except BackupError as e:
+            assert "checksum" in str(e)
+        assert _count(f"{tmp}/target.db") == 3
+
+def test_backup_during_writes():
+    """备份期间写入照常进行，备份是某一时刻的完整一致副本"""
+    from backup import create_backup, verify_backup
+    from config import settings
+    from models import Registration
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = _engine(f"{tmp}/live.db", rows=3000)
+        stop, written = threading.Event(), []
+
+        def writer():
+            while not stop.is_set():
+                with engine.begin() as conn:
+                    conn.execute(Registration.__table__.insert().values(**PIANO, serial=f"W-{len(written)}"))
+                written.append(1)
+                time.sleep(0.001)
+
+        thread = threading.Thread(target=writer)
+        with _patched(settings, "backup_step_pages", 4), _patched(settings, "backup_step_sleep_ms", 1):
+            thread.start()
+            try:
+                path = create_backup(engine, backup_dir=Path(tmp) / "backup")
+            finally:
+                stop.set()
+                thread.join()
+        engine.dispose()
+
+        assert written, "the writer was blocked for the whole backup"
+        copied = verify_backup(path)["tables"]["registrations"]
+        assert 3000 <= copied <= 3000 + len(written)
+
+def test_postgres_dump_format():
+    """COPY 块按表拆分，数据行原样交给 copy_expert；校验按块统计行数"""
+    from backup import BackupError, _LineReader, file_sha256, iter_copy_blocks, manifest_path, verify_backup
+
+    dump = ('-- Clavisnova backup\n'
+            'COPY "registrations" ("id", "serial") FROM stdin;\n1\tA-1\n2\tline\\nbreak\n\\.\n'
+            'COPY "contacts" ("id", "message") FROM stdin;\n\\.\n')
+    blocks = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "clavisnova-20250101T000000Z.pgdump.gz"
+        with gzip.open(path, "wt", encoding="utf-8") as output:
+            output.write(dump)
+        with gzip.open(path, "rt", encoding="utf-8", newline="\n") as source:
+            for statement, lines in iter_copy_blocks(source):
+                reader = _LineReader(lines)
+                chunks = iter(lambda: reader.read(3), "")
+                blocks.append((statement, "".join(chunks)))
+        assert blocks == [('COPY "registrations" ("id", "serial") FROM stdin', "1\tA-1\n2\tline\\nbreak\n"),
+                          ('COPY "contacts" ("id", "message") FROM stdin', "")]
+
+        manifest = {"file": path.name, "engine": "postgresql", "sha256": file_sha256(path),
+                    "tables": {"registrations": 2, "contacts": 0}}
+        manifest_path(path).write_text(json.dumps(manifest))
+        assert verify_backup(path)["engine"] == "postgresql"
+
+        with gzip.open(path, "wt", encoding="utf-8") as output:
+            output.write(dump[:dump.index("\\.")])  # truncated inside the first block
+        manifest_path(path).write_text(json.dumps({**manifest, "sha256": file_sha256(path)}))
+        try:
+            verify_backup(path)
+            assert False, "expected a truncated dump to be rejected"
+        except BackupError:
+            pass
+
+def _fake_backup(folder, name, age_hours):
+    from backup import manifest_path
+
+    path = folder / name
+    path.write_bytes(b"x")
+    manifest_path(path).write_text(json.dumps({"file": name}))
+    stamp = time.time() - age_hours * 3600
+    os.utime(path, (stamp, stamp))
+    return path
+
+def test_rotation_and_schedule():
+    """只保留最新的若干份；最新备份超过间隔才到期，锁被占用时不执行"""
+    import fcntl
+    from backup import BackupScheduler, list_backups, rotate
+    from config import settings
+
+    with tempfile.TemporaryDirectory() as tmp, _patched(settings, "backup_dir", Path(tmp)):
+        folder = Path(tmp)
+        scheduler = BackupScheduler(interval_hours=24, keep=2)
+        assert scheduler.due()
+
+        for day in range(1, 5):
+            _fake_backup(folder, f"clavisnova-2025010{day}T000000Z.sqlite.gz", age_hours=(4 - day) * 24 + 1)
+        (folder / "clavisnova-20250105T000000Z.sqlite.gz.tmp").write_bytes(b"partial")  # no manifest: ignored
+        assert not scheduler.due()  # newest is an hour old
+
+        removed = rotate(2)
+        assert [path.name[11:19] for path in removed] == ["20250101", "20250102"]
+        assert [path.name[11:19] for path in list_backups()] == ["20250103", "20250104"]
+        assert not (folder / "clavisnova-20250101T000000Z.sqlite.gz.json").exists()
+
+        os.utime(list_backups()[-1], (time.time() - 25 * 3600,) * 2)
+        assert scheduler.due()
+        with open(folder / ".lock", "w") as held:
+            fcntl.flock(held, fcntl.LOCK_EX | fcntl.LOCK_NB)  # another worker is backing up
+            assert scheduler.run_if_due() is None
+        path = scheduler.run_if_due()
+        assert path is not None and list_backups() == [list_backups()[0], path] and not scheduler.due()
+
+if __name__ == "__main__":
+    test_backup_and_verified_restore()
+    test_tampered_backup_is_refused()
+    test_backup_during_writes()
+    test_rotation_and_schedule()
+    test_postgres_dump_format()
+    print("✅ 备份测试通过")
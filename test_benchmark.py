@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+测试压测工具：基线对比规则与一次小规模的真实运行
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+def _result(p99, rps, rate=0.0, errors=0):
+    return {
+        "meta": {"server": "gunicorn", "workers": 1, "rate": rate},
+        "endpoints": {"admin_list": {"p50_ms": 10.0, "p95_ms": 20.0, "p99_ms": p99, "throughput_rps": rps,
+                                     "peak_rss_mb": 100.0, "errors": errors}},
+    }
+
+def test_compare_flags_regressions():
+    from benchmark import compare, setting_differences
+
+    rows, regressions = compare(_result(50.0, 100.0), _result(80.0, 70.0))
+    assert {(name, metric) for name, metric, *_ in regressions} == {("admin_list", "p99_ms"), ("admin_list", "throughput_rps")}
+
+    # 小于 min_delta_ms 的延迟变化视为噪声；开环运行的吞吐由速率决定，不参与比较
+    _, regressions = compare(_result(2.0, 100.0), _result(4.0, 100.0))
+    assert regressions == []
+    _, regressions = compare(_result(50.0, 100.0), _result(50.0, 30.0, rate=30.0))
+    assert regressions == []
+
+    _, regressions = compare(_result(50.0, 100.0), _result(50.0, 100.0, errors=3))
+    assert [metric for _, metric, *_ in regressions] == ["errors"]
+    assert setting_differences(_result(1, 1), _result(1, 1, rate=5.0)) == [("rate", 0.0, 5.0)]
+
+def test_process_tree_rss():
+    from benchmark import process_tree_rss
+
+    if not os.path.isdir('/proc'):
+        return
+    assert process_tree_rss(os.getpid()) > 0
+
+def test_small_run():
+    """真实启动 gunicorn，对两个接口各发少量请求"""
+    from benchmark import run_benchmark
+
+    result = run_benchmark(["registration", "admin_list"], requests_per_endpoint=10, concurrency=2,
+                           workers=1, seed_rows=50, warmup=0, log=lambda *_: None)
+    assert set(result["endpoints"]) == {"registration", "admin_list"}
+    for stats in result["endpoints"].values():
+        assert stats["errors"] == 0 and stats["requests"] == 10
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+        assert stats["throughput_rps"] > 0
+    assert result["meta"]["seed_rows"] == 50
+
+if __name__ == "__main__":
+    test_compare_flags_regressions()
+    test_process_tree_rss()
+    test_small_run()
+    print("✅ 压测工具测试通过")
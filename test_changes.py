@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+测试增量同步接口 /api/admin/changes 与导出的 since 过滤
+"""
+
+import sys
+import os
+import json
+import time
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+def _all_changes(client, cursor, tables="contacts"):
+    """按游标翻页直到 has_more 为 False（等待当前秒结束，让最新写入可见）"""
+    time.sleep(1.05)
+    inserted, updated, deleted = [], [], []
+    while True:
+        url = f'/api/admin/changes?tables={tables}&limit=2' + (f'&since={cursor}' if cursor else '')
+        body = client.get(url).get_json()
+        assert body["success"]
+        inserted += [r["id"] for r in body["changes"]["contacts"]["inserted"]]
+        updated += [r["id"] for r in body["changes"]["contacts"]["updated"]]
+        deleted += [(d["table"], d["id"]) for d in body["deleted"]]
+        cursor = body["next_cursor"]
+        if not body["has_more"]:
+            return inserted, updated, deleted, cursor
+
+def test_changes_feed():
+    """插入、更新、删除都能在游标之后被捕获，且不重复"""
+    import main
+    from database import db_manager
+    from models import Contact
+
+    client = main.app.test_client()
+    _, _, _, cursor = _all_changes(client, None)
+
+    ids = [client.post('/api/contact', json={"message": f"sync {i}"}).get_json()["id"] for i in range(5)]
+    inserted, updated, deleted, cursor = _all_changes(client, cursor)
+    assert sorted(inserted) == sorted(ids) and not updated and not deleted
+
+    # 同一秒内的修改也不能被游标漏掉
+    db = db_manager.get_db()
+    try:
+        db.query(Contact).filter(Contact.id == ids[0]).update({"message": "edited"})
+        db.commit()
+    finally:
+        db.close()
+    client.get(f'/api/admin/delete/contact/{ids[1]}')
+
+    inserted, updated, deleted, cursor = _all_changes(client, cursor)
+    assert ids[0] in updated and not inserted
+    assert ("contacts", ids[1]) in deleted
+
+    # 没有新变化时返回空
+    inserted, updated, deleted, _ = _all_changes(client, cursor)
+    assert not inserted and not updated and not deleted
+    print("✅ 增量同步接口测试通过")
+
+def _feed(client, since, tables):
+    """不等待时钟，按 limit=1 翻页收集 contacts 的 id 与删除记录"""
+    seen, deleted = [], []
+    for _ in range(50):
+        url = f'/api/admin/changes?tables={tables}&limit=1' + (f'&since={since}' if since else '')
+        body = client.get(url).get_json()
+        assert body["success"]
+        contacts = body["changes"].get("contacts", {"inserted": [], "updated": []})
+        seen += [r["id"] for r in contacts["inserted"] + contacts["updated"]]
+        deleted += [(d["table"], d["id"]) for d in body["deleted"]]
+        since = body["next_cursor"]
+        if not body["has_more"]:
+            return seen, deleted, since
+    raise AssertionError("changes feed did not terminate")
+
+def test_subsecond_timestamps_page_once():
+    """同一秒内带微秒的更新时间逐行翻页，每行只出现一次且能结束"""
+    import main
+    from datetime import datetime
+    from database import db_manager
+    from models import Contact
+
+    client = main.app.test_client()
+    db = db_manager.get_db()
+    try:
+        rows = [Contact(message=f"subsecond {i}",
+                        created_at=datetime(2020, 1, 1, 12, 0, 0, 100000 * (i + 1)),
+                        updated_at=datetime(2020, 1, 1, 12, 0, 0, 100000 * (i + 1)))
+                for i in range(3)]
+        rows.append(Contact(message="whole second", created_at=datetime(2020, 1, 1, 12, 0, 0),
+                            updated_at=datetime(2020, 1, 1, 12, 0, 0)))
+        db.add_all(rows)
+        db.commit()
+        ids = [r.id for r in rows]
+    finally:
+        db.close()
+
+    seen, _, _ = _feed(client, "2020-01-01T12:00:00", "contacts")
+    picked = [i for i in seen if i in ids]
+    assert picked == [ids[3], ids[0], ids[1], ids[2]]
+
+def test_tombstones_tracked_per_table():
+    """只订阅部分表时，其他表的删除不会因为游标前移而丢失"""
+    import main
+
+    client = main.app.test_client()
+    _, _, cursor = _feed(client, None, "contacts,registrations")
+
+    requirement = client.post('/api/requirements', json={
+        "school_name": "Tombstone School", "current_pianos": "0", "preferred_type": "upright",
+        "teacher_name": "T", "background": "b", "commitment": "c"
+    }).get_json()["id"]
+    contact = client.post('/api/contact', json={"message": "tombstone"}).get_json()["id"]
+    client.get(f'/api/admin/delete/requirement/{requirement}')
+    client.get(f'/api/admin/delete/contact/{contact}')
+
+    _, deleted, cursor = _feed(client, cursor, "contacts")
+    assert ("contacts", contact) in deleted
+    _, deleted, _ = _feed(client, cursor, "contacts,requirements")
+    assert ("requirements", requirement) in deleted and ("contacts", contact) not in deleted
+
+def test_changes_rejects_bad_watermark():
+    import main
+
+    client = main.app.test_client()
+    assert client.get('/api/admin/changes?since=not-a-cursor!').status_code == 400
+    assert client.get('/api/admin/changes?tables=users').status_code == 400
+
+def test_ndjson_since_filter():
+    """时间戳形式的 since 只导出之后变化的行"""
+    import main
+
+    client = main.app.test_client()
+    new_id = client.post('/api/contact', json={"message": "after watermark"}).get_json()["id"]
+    lines = client.get('/api/admin/export/contacts.ndjson?since=2000-01-01T00:00:00Z').data.decode().splitlines()
+    assert new_id in [json.loads(line)["id"] for line in lines]
+    assert client.get('/api/admin/export/contacts.ndjson?since=2999-01-01T00:00:00').data == b""
+    assert client.get('/api/admin/export/system_logs.ndjson?since=2000-01-01').status_code == 400
+
+if __name__ == "__main__":
+    test_changes_feed()
+    test_subsecond_timestamps_page_once()
+    test_tombstones_tracked_per_table()
+    test_changes_rejects_bad_watermark()
+    test_ndjson_since_filter()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+测试 IP 与 User-Agent 的紧凑存储：IP 以二进制保存，User-Agent 去重存入查找表只在行内保存哈希；
+读取、导出、归档时透明还原为文本；旧的文本列可分批回填并删除
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+PIANO = {"manufacturer": "Kawai", "model": "K-300", "year": 2015, "height": "Upright", "finish": "Good",
+         "color_wood": "Black", "access": "Ground floor", "city_state": "Portland, OR"}
+AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_4) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15"
+
+def _engine(tmp):
+    from models import Base, build_engine
+
+    engine = build_engine(f"sqlite:///{tmp}/meta.db")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+def test_submissions_store_compact_and_read_back_text():
+    """提交时 IP 存为 16 字节、User-Agent 只存一份；管理列表照常返回文本"""
+    import main
+    from sqlalchemy import text
+    from models import engine
+
+    client = main.create_app().test_client()
+    ids = []
+    for serial in ("UA-1", "UA-2"):
+        response = client.post('/api/registration', json={**PIANO, "serial": serial}, headers={"User-Agent": AGENT},
+                               environ_base={'REMOTE_ADDR': '2001:DB8::1'})
+        assert response.status_code == 201
+        ids.append(response.get_json()["id"])
+
+    with engine.connect() as conn:
+        stored = conn.execute(text("SELECT client_ip, user_agent_hash FROM registrations WHERE id IN (:a, :b)"),
+                              {"a": ids[0], "b": ids[1]}).all()
+        copies = conn.execute(text("SELECT COUNT(*) FROM user_agents WHERE value = :v"), {"v": AGENT}).scalar()
+    assert [len(ip) for ip, _ in stored] == [16, 16] and stored[0][1] == stored[1][1]
+    assert copies == 1
+
+    rows = client.get('/api/admin/registrations?search=UA-').get_json()["data"]
+    assert {(row["ip_address"], row["user_agent"]) for row in rows} == {("2001:db8::1", AGENT)}
+
+def test_core_inserts_archive_and_consistency_decode():
+    """组提交的 Core 插入同样编码；归档段与一致性校验读到的是文本"""
+    from consistency import LocalSide
+    from archive import run_archive, search_archive
+    from group_commit import GroupCommitWriter
+    from models import Registration
+    from sqlalchemy.orm import Session
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = _engine(tmp)
+        writer = GroupCommitWriter(engine, max_batch=8, max_wait=0.01)
+        try:
+            record_id = writer.insert(Registration, {**PIANO, "serial": "CORE-1", "ip_address": "192.0.2.7",
+                                                     "user_agent": AGENT, "completed_at": datetime.utcnow()})
+        finally:
+            writer.stop()
+
+        [row] = LocalSide(engine).rows("registrations", (record_id, record_id + 1))
+        assert (row["ip_address"], row["user_agent"]) == ("192.0.2.7", AGENT)
+
+        run_archive(engine, after_days=0, kinds=["registrations"], log=lambda *_: None)
+        with Session(engine) as db:
+            data, total = search_archive(db, "registrations", "CORE-1", 1, 10)
+        assert total == 1 and (data[0]["ip_address"], data[0]["user_agent"]) == ("192.0.2.7", AGENT)
+        engine.dispose()
+
+def test_backfill_converts_legacy_columns_in_chunks():
+    """旧库中的文本列分批回填为紧凑列，无效 IP 置空，导出缓存版本随之变化，回填完成后可删除旧列"""
+    from sqlalchemy import inspect, text
+    from sqlalchemy.orm import Session
+    from client_meta import backfill, drop_legacy, status
+    from export_cache import table_version
+    from models import Contact
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = _engine(tmp)
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ALTER TABLE contacts ADD COLUMN ip_address VARCHAR(45)")
+            conn.exec_driver_sql("ALTER TABLE contacts ADD COLUMN user_agent TEXT")
+            conn.execute(text("INSERT INTO contacts (name, message, ip_address, user_agent, updated_at) "
+                              "VALUES (:n, 'm', :ip, :ua, '2020-01-01 00:00:00')"), [
+                {"n": f"old {n}", "ip": f"198.51.100.{n}", "ua": AGENT if n % 2 else "curl/8.0"} for n in range(7)
+            ] + [{"n": "unknown ip", "ip": "unknown", "ua": None}])
+        assert status(engine) == {"contacts": 8}
+        with Session(engine) as db:
+            version = table_version(db, Contact)
+
+        assert backfill(engine, chunk_size=3, log=lambda *_: None) == 8
+        assert status(engine) == {"contacts": 0}
+        with Session(engine) as db:
+            rows = {c.name: c.to_dict() for c in db.query(Contact)}
+        assert (rows["old 3"]["ip_address"], rows["old 3"]["user_agent"]) == ("198.51.100.3", AGENT)
+        assert rows["old 4"]["user_agent"] == "curl/8.0"
+        assert rows["unknown ip"]["ip_address"] is None
+        with Session(engine) as db:
+            assert table_version(db, Contact) != version  # cached exports with blank IPs are not served again
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("SELECT COUNT(*) FROM user_agents").scalar() == 2
+
+        assert backfill(engine, log=lambda *_: None) == 0  # nothing left
+        assert sorted(drop_legacy(engine, log=lambda *_: None)) == ["contacts.ip_address", "contacts.user_agent"]
+        assert "ip_address" not in {c["name"] for c in inspect(engine).get_columns("contacts")}
+        assert status(engine) == {}
+        engine.dispose()
+
+if __name__ == "__main__":
+    test_submissions_store_compact_and_read_back_text()
+    test_core_inserts_archive_and_consistency_decode()
+    test_backfill_converts_legacy_columns_in_chunks()
+    print("✅ IP 与 User-Agent 紧凑存储测试通过")
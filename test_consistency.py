@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+测试本地数据库与 Supabase 副本的一致性校验：用本地假 PostgREST 服务器模拟 Supabase，
+验证只比较范围摘要、只拉取不一致的范围，并给出精确到字段的差异
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+PIANO = {"manufacturer": "Yamaha", "model": "U1", "year": 1990, "height": "Upright", "finish": "Good",
+         "color_wood": "Black", "access": "Stairs", "city_state": "Austin, TX", "ip_address": "10.0.0.1",
+         "user_agent": "Mozilla/5.0"}
+
+def _digest(row, columns):
+    text = "\x1f".join("\\N" if row.get(name) is None else str(row[name]) for name in columns)
+    return hashlib.md5(text.encode()).hexdigest()
+
+class FakePostgREST(BaseHTTPRequestHandler):
+    """GET /rest/v1/<table>?select=&id=gte.&id=lt.&order=&limit=, POST /rest/v1/rpc/clavisnova_range_digests,
+    upserts (POST /rest/v1/<table>?on_conflict=id) and DELETE /rest/v1/<table>?id=in.(...); fail_next answers 503"""
+    tables = {}
+    requests = []
+    fail_next = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        table = url.path.rsplit("/", 1)[-1]
+        rows = sorted(self.tables[table].values(), key=lambda row: row["id"])
+        params = parse_qsl(url.query)
+        for key, value in params:
+            if key == "id":
+                op, number = value.split(".")
+                rows = [row for row in rows if (row["id"] >= int(number) if op == "gte" else row["id"] < int(number))]
+        query = dict(params)
+        if query.get("order") == "id.desc":
+            rows.reverse()
+        rows = rows[:int(query.get("limit", len(rows)))]
+        columns = query["select"].split(",")
+        self.requests.append(("GET", table, query.get("select")))
+        self._reply([{name: row.get(name) for name in columns} for row in rows])
+
+    def _unavailable(self):
+        if FakePostgREST.fail_next <= 0:
+            return False
+        FakePostgREST.fail_next -= 1
+        self.send_response(503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        return True
+
+    def do_DELETE(self):
+        url = urlparse(self.path)
+        table = url.path.rsplit("/", 1)[-1]
+        ids = [int(n) for n in dict(parse_qsl(url.query))["id"][len("in.("):-1].split(",")]
+        self.requests.append(("DELETE", table, ids))
+        if not self._unavailable():
+            for record_id in ids:
+                self.tables[table].pop(record_id, None)
+            self._reply([])
+
+    def do_POST(self):
+        assert self.headers["Authorization"] == "Bearer test-key"
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        url = urlparse(self.path)
+        if "/rpc/" not in url.path:
+            table = url.path.rsplit("/", 1)[-1]
+            ids = [row["id"] for row in body]
+            assert dict(parse_qsl(url.query)) == {"on_conflict": "id"} and len(ids) == len(set(ids))
+            assert "merge-duplicates" in self.headers["Prefer"]
+            self.requests.append(("UPSERT", table, ids))
+            if not self._unavailable():
+                self.tables.setdefault(table, {}).update({row["id"]: row for row in body})
+                self._reply([])
+            return
+        self.requests.append(("RPC", body["table_name"], len(body["los"])))
+        rows = sorted(self.tables[body["table_name"]].values(), key=lambda row: row["id"])
+        result = []
+        for lo, hi in zip(body["los"], body["his"]):
+            inside = [row for row in rows if lo <= row["id"] < hi]
+            joined = "".join(_digest(row, ["id", *body["columns"]]) for row in inside)
+            result.append({"lo": lo, "hi": hi, "row_count": len(inside), "digest": hashlib.md5(joined.encode()).hexdigest()})
+        self._reply(result)
+
+@contextmanager
+def _supabase(tables):
+    import supabase_client
+
+    FakePostgREST.tables, FakePostgREST.requests, FakePostgREST.fail_next = tables, [], 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakePostgREST)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    saved = supabase_client.SUPABASE_URL, supabase_client.SUPABASE_SERVICE_ROLE
+    supabase_client.SUPABASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    supabase_client.SUPABASE_SERVICE_ROLE = "test-key"
+    try:
+        yield FakePostgREST.requests
+    finally:
+        supabase_client.SUPABASE_URL, supabase_client.SUPABASE_SERVICE_ROLE = saved
+        server.shutdown()
+        server.server_close()
+
+def _local(tmp, rows):
+    from models import Base, Registration, build_engine, encode_user_agent
+
+    engine = build_engine(f"sqlite:///{tmp}/local.db")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(Registration.__table__.insert(), [
+            encode_user_agent(conn, {**PIANO, "id": n, "serial": f"S-{n}", "completed_at": None})
+            for n in range(1, rows + 1)
+        ])
+    return engine
+
+def _copy(rows):
+    return {n: {**PIANO, "id": n, "serial": f"S-{n}"} for n in range(1, rows + 1)}
+
+def test_identical_copies_compare_by_digest_only():
+    """两边一致时只需一轮范围摘要，不拉取任何行"""
+    from consistency import check, consistent
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = _local(tmp, 5000)
+        with _supabase({"registrations": _copy(5000), "requirements": {}, "contacts": {}}) as requests:
+            report = check(engine)
+        engine.dispose()
+
+    assert consistent(report)
+    assert report["registrations"]["levels"] == 1 and report["registrations"]["rows_fetched"] == 0
+    assert not [r for r in requests if r[0] == "GET" and r[2] != "id"]  # only the id bounds
+    assert [r for r in requests if r[0] == "RPC"] == [("RPC", "registrations", 16)]
+
+def test_precise_diff_fetches_only_divergent_ranges():
+    """缺失、多出、字段不同的行都被精确报告；只拉取包含差异的小范围；本地已归档的行单独列出"""
+    from archive import run_archive
+    from consistency import LEAF_SIZE, check, consistent
+    from models import Registration
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = _local(tmp, 20000)
+        remote = _copy(20000)
+        del remote[7]                              # lost on the way to Supabase
+        remote[12345]["city_state"] = "Dallas, TX"  # edited on one side only
+        remote[19999]["access"] = None
+        remote[20001] = {**PIANO, "id": 20001, "serial": "ONLY-REMOTE"}
+        with engine.begin() as conn:              # archived locally, still on Supabase
+            conn.execute(Registration.__table__.update().where(Registration.id == 15000)
+                         .values(completed_at=datetime.utcnow()))
+        run_archive(engine, after_days=0, kinds=["registrations"], log=lambda *_: None)
+
+        with _supabase({"registrations": remote}) as requests:
+            result = check(engine, ["registrations"])["registrations"]
+        engine.dispose()
+
+    assert result["missing_remote"] == [7]
+    assert result["missing_local"] == [20001]
+    assert result["archived"] == [15000]
+    assert result["changed"] == [
+        {"id": 12345, "fields": {"city_state": ["Austin, TX", "Dallas, TX"]}},
+        {"id": 19999, "fields": {"access": ["Stairs", None]}},
+    ]
+    assert not consistent({"registrations": result})
+
+    # 五处差异，每处最多一个叶子范围的行被拉取（两边各一份），远小于两万行
+    assert result["rows_fetched"] <= 5 * LEAF_SIZE * 2
+    row_fetches = [r for r in requests if r[0] == "GET" and r[2] != "id"]
+    assert 0 < len(row_fetches) <= 5
+
+if __name__ == "__main__":
+    test_identical_copies_compare_by_digest_only()
+    test_precise_diff_fetches_only_divergent_ranges()
+    print("✅ 一致性校验测试通过")
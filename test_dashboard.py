@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+测试管理后台单次请求接口 /api/admin/dashboard
+"""
+
+import sys
+import os
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+def test_dashboard_matches_list_endpoints():
+    """统计与各列表首页与单独接口一致"""
+    import main
+
+    client = main.app.test_client()
+    client.post('/api/contact', json={"message": "dashboard"})
+
+    body = client.get('/api/admin/dashboard?limit=5').get_json()
+    assert body["success"]
+    stats = client.get('/api/admin/stats').get_json()["stats"]
+    assert body["stats"]["registrations"] == stats["registrations"]
+    assert body["stats"]["requirements"] == stats["requirements"]
+    assert body["stats"]["total_submissions"] == stats["total_submissions"]
+
+    contacts = client.get('/api/admin/contacts?page=1&limit=5').get_json()
+    section = body["sections"]["contacts"]
+    assert [c["id"] for c in section["data"]] == [c["id"] for c in contacts["data"]]
+    assert section["pagination"] == contacts["pagination"]
+    assert set(body["sections"]) == {"registrations", "requirements", "contacts"}
+
+def test_dashboard_first_page_continues_with_list_page_two():
+    """仪表盘第一页之后接列表接口第二页，不重复也不遗漏（均为最新在前）"""
+    import main
+    from models import Registration, Requirements, SessionLocal
+
+    client = main.app.test_client()
+    for n in range(5):
+        client.post('/api/registration', json={
+            "manufacturer": "Yamaha", "model": "U1", "serial": f"DASH-PAGE-{n}", "year": 1990, "height": "Upright",
+            "finish": "Good", "color_wood": "Black", "access": "Ground floor", "city_state": "Boise, ID"})
+        client.post('/api/requirements', json={"school_name": f"Dashboard School {n}", "background": "paging"})
+
+    body = client.get('/api/admin/dashboard?limit=2').get_json()
+    for name, model in (("registrations", Registration), ("requirements", Requirements)):
+        second = client.get(f'/api/admin/{name}?page=2&limit=2').get_json()
+        ids = [row["id"] for row in body["sections"][name]["data"] + second["data"]]
+        with SessionLocal() as db:
+            newest = db.query(model.id).order_by(model.created_at.desc(), model.id.desc()).limit(4).all()
+        assert ids == [row.id for row in newest], name
+
+def test_dashboard_etags():
+    """已知 ETag 的分区不再返回数据；整体 ETag 支持 304"""
+    import main
+
+    client = main.app.test_client()
+    first = client.get('/api/admin/dashboard?limit=5')
+    sections = first.get_json()["sections"]
+    known = ",".join(f"{name}:{s['etag']}" for name, s in sections.items())
+
+    again = client.get(f'/api/admin/dashboard?limit=5&known={known}').get_json()
+    assert all(s.get("unchanged") and "data" not in s for s in again["sections"].values())
+
+    assert client.get('/api/admin/dashboard?limit=5', headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    # A new contact invalidates only the contacts section
+    client.post('/api/contact', json={"message": "dashboard change"})
+    changed = client.get(f'/api/admin/dashboard?limit=5&known={known}').get_json()["sections"]
+    assert "data" in changed["contacts"] and changed["contacts"]["etag"] != sections["contacts"]["etag"]
+    assert changed["registrations"].get("unchanged") and changed["requirements"].get("unchanged")
+
+def test_dashboard_concurrent_queries():
+    """并发模式与单会话模式结果一致"""
+    from dashboard import build_dashboard
+    from database import db_manager
+
+    serial = build_dashboard(db_manager.get_read_db, 5)
+    concurrent = build_dashboard(db_manager.get_read_db, 5, concurrent=True)
+    assert serial == concurrent
+
+if __name__ == "__main__":
+    test_dashboard_matches_list_endpoints()
+    test_dashboard_first_page_continues_with_list_page_two()
+    test_dashboard_etags()
+    test_dashboard_concurrent_queries()
+    print("✅ 仪表盘接口测试通过")
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+测试重复钢琴登记检测（规范化指纹 + 索引查找）
+"""
+
+import sys
+import os
+import threading
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+PIANO = {
+    "manufacturer": "C. Bechstein", "model": "A 124", "serial": "DEDUP-0001", "year": "1995",
+    "height": "Upright", "finish": "Good", "color_wood": "Black", "city_state": "Berlin",
+    "access": "Elevator"
+}
+
+def test_fingerprint_normalization():
+    from dedupe import registration_fingerprint
+
+    base = registration_fingerprint("C. Bechstein", "DEDUP-0001", "A 124")
+    assert base == registration_fingerprint("  c bechstein ", "dedup 0001", "a-124")
+    assert base == registration_fingerprint("C. BÉCHSTEIN", "Dedup.0001", "A124")
+    assert base != registration_fingerprint("C. Bechstein", "DEDUP-0002", "A 124")
+    assert registration_fingerprint("Yamaha", "  - ", "U1") is None
+
+def test_duplicate_flagged_on_insert():
+    """同一钢琴再次提交时标记 duplicate_of"""
+    import main
+
+    client = main.app.test_client()
+    first = client.post('/api/registration', json=PIANO)
+    assert first.status_code == 201 and "duplicate_of" not in first.get_json()
+    first_id = first.get_json()["id"]
+
+    again = client.post('/api/registration', json={**PIANO, "manufacturer": "c bechstein", "serial": "dedup 0001"})
+    assert again.status_code == 201 and again.get_json()["duplicate_of"] == first_id
+
+    report = client.get('/api/admin/registrations/duplicates').get_json()
+    group = next(g for g in report["groups"] if g["primary"]["id"] == first_id)
+    assert group["duplicate_ids"] == [again.get_json()["id"]]
+
+def test_merge_policy():
+    """merge 策略下重复提交直接返回已有记录"""
+    import main
+    from config import settings
+    from models import Registration, SessionLocal
+
+    client = main.app.test_client()
+    piano = {**PIANO, "serial": "DEDUP-MERGE"}
+    first_id = client.post('/api/registration', json=piano).get_json()["id"]
+
+    settings.duplicate_registration_policy = "merge"
+    try:
+        # 另一客户端登记同一台钢琴（同一客户端的重试由幂等键处理，见 test_idempotency.py）
+        again = client.post('/api/registration', json=piano, environ_base={'REMOTE_ADDR': '10.0.0.2'})
+    finally:
+        settings.duplicate_registration_policy = "flag"
+    assert again.status_code == 200
+    assert again.get_json()["id"] == first_id
+
+    db = SessionLocal()
+    try:
+        assert db.query(Registration).filter(Registration.serial == "DEDUP-MERGE").count() == 1
+    finally:
+        db.close()
+
+def test_concurrent_double_submit():
+    """并发重复提交只产生一个主记录"""
+    import main
+    from models import Registration, SessionLocal
+
+    client = main.app.test_client()
+    piano = {**PIANO, "serial": "DEDUP-RACE"}
+    statuses = []
+    def submit(address):
+        statuses.append(client.post('/api/registration', json=piano, environ_base={'REMOTE_ADDR': address}).status_code)
+
+    threads = [threading.Thread(target=submit, args=(f"10.0.1.{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert statuses == [201] * 8
+
+    db = SessionLocal()
+    try:
+        rows = db.query(Registration).filter(Registration.serial == "DEDUP-RACE").all()
+        primaries = [r for r in rows if r.duplicate_of is None]
+        assert len(rows) == 8 and len(primaries) == 1
+        assert all(r.duplicate_of == primaries[0].id for r in rows if r is not primaries[0])
+    finally:
+        db.close()
+
+def test_backfill_flags_existing_rows():
+    """回填为旧数据补齐指纹并标记重复"""
+    from dedupe import backfill_fingerprints
+    from models import Registration, SessionLocal, engine
+
+    # Rows saved before fingerprints existed have none
+    legacy = dict(PIANO, year=1995, serial="DEDUP-LEGACY")
+    db = SessionLocal()
+    try:
+        rows = [Registration(**legacy) for _ in range(3)]
+        db.add_all(rows)
+        db.commit()
+        ids = [r.id for r in rows]
+    finally:
+        db.close()
+
+    stats = backfill_fingerprints(engine, chunk_size=2, log=lambda message: None)
+    assert stats["duplicates"] >= 2
+
+    db = SessionLocal()
+    try:
+        rows = db.query(Registration).filter(Registration.id.in_(ids)).order_by(Registration.id).all()
+        assert rows[0].duplicate_of is None and rows[0].fingerprint
+        assert [r.duplicate_of for r in rows[1:]] == [ids[0], ids[0]]
+    finally:
+        db.close()
+
+def test_ensure_columns_tolerates_concurrent_migration():
+    """多个 worker 同时补列时，落后的一方遇到重复列不会崩溃"""
+    import models
+
+    real_inspect = models.inspect
+    stale = []
+
+    class StaleInspector:
+        """模拟在另一个 worker 执行 ALTER 之前做的检查"""
+
+        def __init__(self, bind):
+            self.inspector = real_inspect(bind)
+
+        def get_columns(self, table_name):
+            columns = self.inspector.get_columns(table_name)
+            if table_name == "registrations" and not stale:
+                stale.append(table_name)
+                return [c for c in columns if c["name"] != "fingerprint"]
+            return columns
+
+        def get_indexes(self, table_name):
+            return self.inspector.get_indexes(table_name)
+
+    models.inspect = StaleInspector
+    try:
+        models.create_tables()
+    finally:
+        models.inspect = real_inspect
+    assert stale == ["registrations"]
+
+if __name__ == "__main__":
+    test_fingerprint_normalization()
+    test_duplicate_flagged_on_insert()
+    test_merge_policy()
+    test_concurrent_double_submit()
+    test_backfill_flags_existing_rows()
+    test_ensure_columns_tolerates_concurrent_migration()
+    print("✅ 重复登记检测测试通过")
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+测试管理后台实时事件流 /api/admin/events（SSE）
+"""
+
+import sys
+import os
+import json
+import queue
+import time
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+def _parse_sse(text):
+    """把 text/event-stream 文本解析成 (event, id, data) 列表，忽略注释与 retry"""
+    events = []
+    for block in text.split("\n\n"):
+        fields = {}
+        for line in block.splitlines():
+            if line.startswith(":") or ":" not in line:
+                continue
+            key, _, value = line.partition(": ")
+            fields[key] = value
+        if "event" in fields:
+            events.append((fields["event"], int(fields["id"]), json.loads(fields["data"])))
+    return events
+
+def test_submission_events_recorded():
+    """新增与删除都会在同一事务中写入 submission_events"""
+    import main
+    from events import event_broadcaster
+
+    client = main.app.test_client()
+    before = event_broadcaster.latest_id()
+    new_id = client.post('/api/contact', json={"message": "event test"}).get_json()["id"]
+    assert client.get(f'/api/admin/delete/contact/{new_id}').status_code == 200
+
+    events = event_broadcaster.fetch_after(before, 10)
+    assert [(e["type"], e["table"], e["record_id"]) for e in events] == [
+        ("created", "contacts", new_id), ("deleted", "contacts", new_id)
+    ]
+
+def test_broadcaster_fans_out():
+    """一次提交推送给所有订阅者"""
+    import main
+    from events import event_broadcaster
+
+    client = main.app.test_client()
+    first, second = event_broadcaster.subscribe(), event_broadcaster.subscribe()
+    try:
+        new_id = client.post('/api/contact', json={"message": "fan out"}).get_json()["id"]
+        for subscription in (first, second):
+            payload = subscription.get(timeout=3)
+            assert payload["type"] == "created" and payload["record_id"] == new_id
+    finally:
+        event_broadcaster.unsubscribe(first)
+        event_broadcaster.unsubscribe(second)
+
+def test_file_signal_wakes_other_worker():
+    """SQLite 下另一个 worker 通过信号文件被立即唤醒，而不是等兜底轮询"""
+    from config import settings
+    from events import EventBroadcaster, FileSignalChannel
+    from models import Contact, ReadSessionLocal, SessionLocal
+
+    other_worker = EventBroadcaster(ReadSessionLocal, FileSignalChannel(settings.events_signal_path), fallback_interval=30)
+    subscription = other_worker.subscribe()
+    try:
+        db = SessionLocal()
+        try:
+            db.add(Contact(message="cross worker"))
+            db.commit()
+        finally:
+            db.close()
+        started = time.monotonic()
+        payload = subscription.get(timeout=5)
+        assert payload["table"] == "contacts"
+        assert time.monotonic() - started < 2
+    finally:
+        other_worker.unsubscribe(subscription)
+
+class _FlakyChannel:
+    """第一次 wait 抛出异常，模拟 LISTEN 连接断开"""
+
+    def __init__(self):
+        self.failures = 1
+
+    def signal(self):
+        pass
+
+    def wait(self, wake, timeout):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("connection lost")
+        wake.wait(timeout)
+
+def test_broadcaster_survives_channel_errors():
+    """通道等待出错时广播线程继续运行，已打开的订阅不丢失"""
+    from events import EventBroadcaster
+    from models import Contact, ReadSessionLocal, SessionLocal
+
+    broadcaster = EventBroadcaster(ReadSessionLocal, _FlakyChannel(), fallback_interval=0.1)
+    subscription = broadcaster.subscribe()
+    try:
+        thread = broadcaster._thread
+        db = SessionLocal()
+        try:
+            db.add(Contact(message="after channel error"))
+            db.commit()
+        finally:
+            db.close()
+        broadcaster.notify()
+        assert subscription.get(timeout=5)["table"] == "contacts"
+        assert broadcaster._thread is thread and thread.is_alive()
+
+        broadcaster._thread = None
+        broadcaster._ensure_started()
+        assert subscription in broadcaster._subscribers
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+class _RecordingChannel:
+    """记录调用方式的事务型通道（模拟 PostgreSQL NOTIFY）"""
+    transactional = True
+
+    def __init__(self):
+        self.calls = []
+
+    def signal(self):
+        self.calls.append("after commit")
+
+    def signal_in(self, connection):
+        self.calls.append("in transaction" if connection.in_transaction() else "autocommit")
+
+    def wait(self, wake, timeout):
+        wake.wait(timeout)
+
+def test_transactional_channel_notifies_before_commit():
+    """PostgreSQL 通道在写事务内发 NOTIFY，提交后不再另开连接"""
+    from events import event_broadcaster
+    from models import Contact, SessionLocal
+
+    original, recording = event_broadcaster.channel, _RecordingChannel()
+    event_broadcaster.channel = recording
+    try:
+        db = SessionLocal()
+        try:
+            db.add(Contact(message="notify in transaction"))
+            db.commit()
+        finally:
+            db.close()
+    finally:
+        event_broadcaster.channel = original
+    assert recording.calls == ["in transaction"]
+
+def test_group_commit_records_events():
+    """组提交路径（Core INSERT）同样写入事件"""
+    from events import event_broadcaster
+    from group_commit import GroupCommitWriter
+    from models import Contact, engine
+
+    before = event_broadcaster.latest_id()
+    writer = GroupCommitWriter(engine, on_commit=event_broadcaster.notify)
+    try:
+        new_id = writer.insert(Contact, {"message": "group event"})
+    finally:
+        writer.stop()
+    events = event_broadcaster.fetch_after(before, 10)
+    assert ("created", "contacts", new_id) in [(e["type"], e["table"], e["record_id"]) for e in events]
+
+def test_sse_replay_with_last_event_id():
+    """断线重连时按 Last-Event-ID 补发错过的事件，并发送 retry 与心跳"""
+    import main
+    from config import settings
+    from events import event_broadcaster
+
+    client = main.app.test_client()
+    last_seen = event_broadcaster.latest_id()
+    ids = [client.post('/api/contact', json={"message": f"missed {i}"}).get_json()["id"] for i in range(3)]
+
+    original = (settings.sse_max_stream_seconds, settings.sse_heartbeat_seconds)
+    settings.sse_max_stream_seconds, settings.sse_heartbeat_seconds = 0.5, 0.2
+    try:
+        response = client.get('/api/admin/events', headers={"Last-Event-ID": str(last_seen)})
+        assert response.mimetype == 'text/event-stream'
+        text = response.get_data(as_text=True)
+    finally:
+        settings.sse_max_stream_seconds, settings.sse_heartbeat_seconds = original
+
+    assert text.startswith(f"retry: {settings.sse_retry_ms}")
+    assert ": heartbeat" in text
+    events = _parse_sse(text)
+    assert [data["record_id"] for _, _, data in events] == ids
+    assert [event_id for _, event_id, _ in events] == sorted(event_id for _, event_id, _ in events)
+
+    assert client.get('/api/admin/events', headers={"Last-Event-ID": "abc"}).status_code == 400
+
+def test_events_pruned_outside_replay_window():
+    """超过保留时间且不在最新 SSE_REPLAY_LIMIT 条内的事件被删除，最新的事件始终保留"""
+    import tempfile
+    from datetime import datetime, timedelta
+    from sqlalchemy import select
+    from events import EventRetention
+    from models import Base, SubmissionEvent, build_engine
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_engine(f"sqlite:///{tmp}/events.db")
+        Base.metadata.create_all(bind=engine)
+        old = datetime.utcnow() - timedelta(hours=48)
+        with engine.begin() as conn:
+            conn.execute(SubmissionEvent.__table__.insert(), [
+                {"event_type": "created", "table_name": "contacts", "record_id": n, "created_at": old} for n in range(6)
+            ] + [{"event_type": "created", "table_name": "contacts", "record_id": 6, "created_at": datetime.utcnow()}])
+
+        retention = EventRetention(engine, keep=3, retention_hours=24)
+        assert retention.prune() == 4  # old and outside the newest 3
+        assert retention.prune() == 0
+        with engine.connect() as conn:
+            assert conn.execute(select(SubmissionEvent.record_id).order_by(SubmissionEvent.id)).scalars().all() == [4, 5, 6]
+
+        assert EventRetention(engine, keep=0, retention_hours=0).prune() == 2  # the newest row always stays
+        with engine.connect() as conn:
+            assert conn.execute(select(SubmissionEvent.record_id)).scalars().all() == [6]
+        engine.dispose()
+
+if __name__ == "__main__":
+    test_submission_events_recorded()
+    test_broadcaster_fans_out()
+    test_file_signal_wakes_other_worker()
+    test_broadcaster_survives_channel_errors()
+    test_transactional_channel_notifies_before_commit()
+    test_group_commit_records_events()
+    test_sse_replay_with_last_event_id()
+    test_events_pruned_outside_replay_window()
+    print("✅ 实时事件流测试通过")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+测试导出文件缓存：表未变化时不重新生成，支持ETag与Range
+"""
+
+import sys
+import os
+import tempfile
+import time
+from pathlib import Path
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+def test_export_cache_lru_eviction():
+    """超过容量时按最近使用顺序淘汰"""
+    from export_cache import ExportCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ExportCache(Path(tmp), max_bytes=250)
+        builds = []
+
+        def builder(content):
+            def build(target):
+                builds.append(content)
+                target.write_bytes(content * 100)
+            return build
+
+        def fetch(kind, version, content):
+            with cache.get_or_build(kind, "csv", version, builder(content)) as handle:
+                return handle.read()
+
+        first = fetch("registrations", "v1", b"a")
+        assert fetch("registrations", "v1", b"a") == first
+        assert builds == [b"a"]
+
+        fetch("requirements", "v1", b"b")
+        time.sleep(0.01)
+        cache.lookup("registrations", "csv", "v1").close()  # 最近使用
+        fetch("contacts", "v1", b"c")
+
+        names = sorted(p.name for p in Path(tmp).iterdir())
+        assert names == ["contacts-v1.csv", "registrations-v1.csv"]
+
+        # 新版本生成后旧版本立即失效
+        fetch("registrations", "v2", b"d")
+        assert not (Path(tmp) / "registrations-v1.csv").exists()
+    print("✅ 导出缓存LRU测试通过")
+
+def test_oversized_entry_still_served():
+    """单个文件超过容量上限时仍能返回刚生成的文件，命中不改变修改时间"""
+    from export_cache import ExportCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ExportCache(Path(tmp), max_bytes=100)
+        with cache.get_or_build("contacts", "csv", "v1", lambda target: target.write_bytes(b"x" * 500)) as handle:
+            assert handle.read() == b"x" * 500
+        mtime = (Path(tmp) / "contacts-v1.csv").stat().st_mtime_ns
+        time.sleep(0.01)
+        cache.lookup("contacts", "csv", "v1").close()
+        assert (Path(tmp) / "contacts-v1.csv").stat().st_mtime_ns == mtime
+
+        handle = cache.lookup("contacts", "csv", "v1")
+        # 其他 worker 在打开之后删除文件，已打开的句柄仍可读取
+        (Path(tmp) / "contacts-v1.csv").unlink()
+        with handle:
+            assert handle.read() == b"x" * 500
+        assert cache.lookup("contacts", "csv", "v1") is None
+
+
+def test_export_endpoint_uses_cache():
+    """重复导出命中缓存，支持 If-None-Match 与 Range"""
+    import exports
+    from export_cache import export_cache
+    import main
+
+    calls = []
+    original = exports.write_export
+
+    def counting_write_export(*args, **kwargs):
+        calls.append(args[1])
+        return original(*args, **kwargs)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        export_cache.root = Path(tmp)
+        exports.write_export = counting_write_export
+        try:
+            client = main.app.test_client()
+            client.post('/api/contact', json={"message": "warm up"})
+
+            first = client.get('/api/admin/export/requirements')
+            assert first.status_code == 200
+            etag = first.headers["ETag"]
+            assert first.headers["Last-Modified"]
+            time.sleep(1.05)
+
+            again = client.get('/api/admin/export/requirements')
+            assert again.status_code == 200 and again.data == first.data
+            assert again.headers["Last-Modified"] == first.headers["Last-Modified"]
+            assert calls == ["requirements"]
+
+            not_modified = client.get('/api/admin/export/requirements', headers={"If-None-Match": etag})
+            assert not_modified.status_code == 304
+
+            partial = client.get('/api/admin/export/requirements', headers={"Range": "bytes=0-9"})
+            assert partial.status_code == 206 and partial.data == first.data[:10]
+
+            client.post('/api/requirements', json={"school_name": "Cache Test School"})
+            changed = client.get('/api/admin/export/requirements')
+            assert changed.headers["ETag"] != etag
+            assert calls == ["requirements", "requirements"]
+        finally:
+            exports.write_export = original
+    print("✅ 导出接口缓存测试通过")
+
+if __name__ == "__main__":
+    test_export_cache_lru_eviction()
+    test_oversized_entry_still_served()
+    test_export_endpoint_uses_cache()
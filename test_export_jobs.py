@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+测试后台导出任务：POST 创建任务后在进程池中生成文件，GET 轮询行进度并下载结果；
+任务可在排队或生成途中取消；结果文件过期后被清理并返回 410
+"""
+
+import csv
+import io
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+PIANO = {"manufacturer": "Baldwin", "model": "Acrosonic", "year": 1968, "height": "Spinet", "finish": "Fair",
+         "color_wood": "Walnut", "access": "Stairs", "city_state": "Austin, TX"}
+
+@contextmanager
+def _patched(target, name, value):
+    original = getattr(target, name)
+    setattr(target, name, value)
+    try:
+        yield value
+    finally:
+        setattr(target, name, original)
+
+def _queue(jobs, kind="registrations", fmt="csv"):
+    """Queue a job without handing it to the pool"""
+    class Unstarted:
+        def submit(self, fn, *args):
+            from concurrent.futures import Future
+
+            return Future()
+
+    with _patched(jobs, "_pool", lambda: Unstarted()):
+        return jobs.submit(kind, fmt)["id"]
+
+def test_job_runs_in_process_pool_and_serves_result():
+    """任务在独立进程中生成 CSV，轮询可看到完成状态与行数，结果可下载"""
+    import main
+    from sqlalchemy import func
+    from models import Registration, SessionLocal
+
+    client = main.create_app().test_client()
+    for n in range(3):
+        assert client.post('/api/registration', json={**PIANO, "serial": f"JOB-{n}"}).status_code == 201
+    with SessionLocal() as db:
+        total = db.query(func.count(Registration.id)).scalar()
+
+    response = client.post('/api/admin/export-jobs', json={"kind": "registrations", "format": "csv"})
+    assert response.status_code == 202
+    job = response.get_json()["job"]
+    assert response.headers["Location"] == job["status_url"] and job["status"] == "queued"
+
+    deadline = time.time() + 120
+    while job["status"] in ("queued", "running") and time.time() < deadline:
+        time.sleep(0.2)
+        job = client.get(job["status_url"]).get_json()["job"]
+    assert job["status"] == "done", job
+    assert job["rows_done"] == job["rows_total"] == total and job["progress"] == 100.0
+
+    result = client.get(job["result_url"])
+    assert result.status_code == 200
+    rows = list(csv.reader(io.StringIO(result.get_data(as_text=True))))
+    assert len(rows) == total + 1 and {"JOB-0", "JOB-1", "JOB-2"} <= {row[3] for row in rows[1:]}
+    result.close()
+
+    assert client.post('/api/admin/export-jobs', json={"kind": "donors"}).status_code == 400
+    assert client.get('/api/admin/export-jobs/no-such-job').status_code == 404
+
+def test_cancel_queued_and_running_jobs():
+    """排队中的任务直接取消、不再生成；生成中的任务在下一次进度报告时停止并删除半成品"""
+    import main
+    from config import settings
+    from export_jobs import CANCELLED, CANCELLING, RUNNING, JobCancelled, export_jobs
+    from models import ExportJob
+
+    client = main.create_app().test_client()
+    queued = _queue(export_jobs)
+    assert client.get(f'/api/admin/export-jobs/{queued}/result').status_code == 409
+    assert client.delete(f'/api/admin/export-jobs/{queued}').get_json()["job"]["status"] == CANCELLED
+    assert export_jobs.run(queued) == CANCELLED
+    assert not list(settings.export_jobs_dir.glob(f"{queued}*"))
+
+    running = _queue(export_jobs)
+    table = ExportJob.__table__
+    with export_jobs.engine.begin() as conn:
+        conn.execute(table.update().where(table.c.id == running).values(status=RUNNING))
+    with _patched(export_jobs, "progress_rows", 2):
+        rows = export_jobs.tracked(running, range(10))
+        assert [next(rows) for _ in range(3)] == [0, 1, 2]  # progress recorded after row 2
+        assert export_jobs.get(running)["rows_done"] == 2
+        assert export_jobs.cancel(running)["status"] == CANCELLING
+        try:
+            list(rows)
+            raise AssertionError("expected JobCancelled")
+        except JobCancelled:
+            pass
+
+def test_results_expire():
+    """结果超过 TTL 后删除文件，下载返回 410；达到并发上限时拒绝新任务"""
+    import main
+    from export_jobs import EXPIRED, JobLimitError, export_jobs
+    from models import ExportJob
+
+    client = main.create_app().test_client()
+    job_id = _queue(export_jobs)
+    assert export_jobs.run(job_id) == "done"
+    path = export_jobs.result_path(job_id)
+    assert path.exists()
+
+    table = ExportJob.__table__
+    with export_jobs.engine.begin() as conn:
+        conn.execute(table.update().where(table.c.id == job_id).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    assert client.get(f'/api/admin/export-jobs/{job_id}').get_json()["job"]["status"] == EXPIRED
+    assert client.get(f'/api/admin/export-jobs/{job_id}/result').status_code == 410
+    assert export_jobs.sweep() >= 1 and not path.exists()
+
+    with _patched(export_jobs, "max_active", 0):
+        try:
+            _queue(export_jobs)
+            raise AssertionError("expected JobLimitError")
+        except JobLimitError:
+            pass
+        assert client.post('/api/admin/export-jobs', json={"kind": "requirements"}).status_code == 429
+
+if __name__ == "__main__":
+    test_job_runs_in_process_pool_and_serves_result()
+    test_cancel_queued_and_running_jobs()
+    test_results_expire()
+    print("✅ 后台导出任务测试通过")
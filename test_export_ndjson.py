@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+测试NDJSON流式导出
+"""
+
+import sys
+import os
+import gzip
+import json
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+def test_ndjson_export():
+    """每行一个JSON对象，支持gzip，未知表返回404"""
+    import main
+
+    client = main.app.test_client()
+    created = client.post('/api/contact', json={"name": "钢琴 Donor", "message": "NDJSON line"}).get_json()["id"]
+
+    response = client.get('/api/admin/export/contacts.ndjson', headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.data.decode("utf-8").splitlines()]
+    assert [r["id"] for r in rows] == sorted(r["id"] for r in rows)
+    assert any(r["id"] == created and r["name"] == "钢琴 Donor" for r in rows)
+
+    compressed = client.get('/api/admin/export/contacts.ndjson?gzip=1')
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(compressed.data) == response.data
+
+    # q=0 表示客户端拒绝 gzip
+    negotiated = client.get('/api/admin/export/contacts.ndjson', headers={"Accept-Encoding": "gzip"})
+    assert negotiated.headers["Content-Encoding"] == "gzip"
+    refused = client.get('/api/admin/export/contacts.ndjson', headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert "Content-Encoding" not in refused.headers and refused.data == response.data
+
+    assert client.get('/api/admin/export/system_logs.ndjson').status_code == 200
+    assert client.get('/api/admin/export/users.ndjson').status_code == 404
+    print("✅ NDJSON导出测试通过")
+
+if __name__ == "__main__":
+    test_ndjson_export()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+测试离线地名解析、geohash 网格索引与附近查询 /api/admin/nearby
+"""
+
+import sys
+import os
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+def _piano(serial, city_state):
+    return {
+        "manufacturer": "Kawai", "model": "K300", "serial": serial, "year": "2005",
+        "height": "Player", "finish": "Good", "color_wood": "Black", "city_state": city_state,
+        "access": "Ground floor"
+    }
+
+def test_resolve_free_text_locations():
+    from geo import gazetteer
+
+    assert gazetteer.resolve("Austin, TX").city == "Austin"
+    assert gazetteer.resolve("  st. louis , Missouri ").city == "Saint Louis"
+    assert gazetteer.resolve("Portland, ME").state == "me"
+    assert gazetteer.resolve("Portland").state == "or"  # 同名城市取表中靠前（较大）的
+    assert gazetteer.resolve("Brooklyn NY 11201").city == "Brooklyn"
+    assert gazetteer.resolve("Lincoln High School in Austin, Texas").city == "Austin"
+
+    state_only = gazetteer.resolve("Somewhere small, VT")
+    assert state_only.level == "state" and state_only.state == "vt"
+    assert gazetteer.resolve("We need a mobile keyboard") is None
+    assert gazetteer.resolve("") is None
+
+def test_geohash_and_cover():
+    from geo import covered_radius_km, distance_km, encode_geohash, neighborhood, precision_for_radius
+
+    assert encode_geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    cells = neighborhood(30.267, -97.743, 4)
+    assert len(cells) == 9 and cells[0] == encode_geohash(30.267, -97.743, 4)
+
+    # 选中的精度下 3x3 网格一定覆盖半径
+    precision = precision_for_radius(30.267, 50)
+    assert covered_radius_km(30.267, precision) >= 50 > covered_radius_km(30.267, precision + 1)
+    assert 110 < distance_km(30.267, -97.743, 29.424, -98.494) < 125  # Austin - San Antonio
+
+def test_locations_stored_on_insert():
+    """ORM 与组提交两条写入路径都保存坐标与网格"""
+    import main
+    from config import settings
+    from database import db_manager
+    from models import Registration, SessionLocal
+
+    client = main.app.test_client()
+    orm_id = client.post('/api/registration', json=_piano("GEO-ORM", "Seattle, WA")).get_json()["id"]
+
+    settings.group_commit_enabled = True
+    try:
+        grouped_id, _ = db_manager.insert_registration(dict(_piano("GEO-GROUP", "Tacoma, WA"), year=2005))
+    finally:
+        settings.group_commit_enabled = False
+        if db_manager._group_writer is not None:
+            db_manager._group_writer.stop()
+            db_manager._group_writer = None
+
+    db = SessionLocal()
+    try:
+        for record_id, city in ((orm_id, "Seattle"), (grouped_id, "Tacoma")):
+            row = db.get(Registration, record_id)
+            assert row.geo_level == "city" and row.geo_cell and len(row.geo_cell) == 6
+            assert row.latitude > 47
+    finally:
+        db.close()
+
+def test_nearby_reads_only_neighbouring_cells():
+    """半径查询只读取起点周围的网格，且结果按距离排序"""
+    import main
+    from sqlalchemy import event
+    from geo import within_radius, nearest
+    from matching import match_engine
+    from models import Registration, SessionLocal, engine
+
+    client = main.app.test_client()
+    ids = {city: client.post('/api/registration', json=_piano(f"GEO-{city}", f"{city}, TX")).get_json()["id"]
+           for city in ("Austin", "San Antonio", "Dallas", "Houston")}
+    match_engine.wait()  # 后台匹配线程的查询不计入
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    db = SessionLocal()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        found = within_radius(db, Registration, 30.267, -97.743, radius_km=150)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    try:
+        ours = [row.id for _, row in found if row.id in ids.values()]
+        assert ours == [ids["Austin"], ids["San Antonio"]]
+        assert all(distance <= 150 for distance, _ in found)
+        reads = [statement for statement, _ in statements if "FROM registrations" in statement]
+        assert reads and all("registrations.geo_cell >=" in statement for statement in reads)
+
+        closest = [row.id for _, row in nearest(db, Registration, 29.760, -95.370, limit=50) if row.id in ids.values()]
+        assert closest[0] == ids["Houston"]
+    finally:
+        db.close()
+
+def test_nearby_endpoint():
+    import main
+
+    client = main.app.test_client()
+    school = client.post('/api/requirements', json={
+        "school_name": "Eastside Elementary, Denver, CO", "current_pianos": "0", "preferred_type": "upright",
+        "teacher_name": "T", "background": "b", "commitment": "c"
+    }).get_json()["id"]
+    near = client.post('/api/registration', json=_piano("GEO-BOULDER", "Boulder, CO")).get_json()["id"]
+    far = client.post('/api/registration', json=_piano("GEO-PUEBLO", "Pueblo, CO")).get_json()["id"]
+
+    body = client.get(f'/api/admin/nearby/registrations?requirement_id={school}&radius_km=60').get_json()
+    assert body["success"]
+    found = [r["id"] for r in body["data"]]
+    assert near in found and far not in found
+    assert body["data"] == sorted(body["data"], key=lambda r: r["distance_km"])
+
+    body = client.get('/api/admin/nearby/requirements?location=Aurora, CO&limit=1').get_json()
+    assert body["data"][0]["id"] == school
+
+    # 匹配引擎把相邻网格作为邻近特征
+    from matching import match_engine
+    match_engine.wait()
+    matches = client.get(f'/api/admin/matches/requirement/{school}').get_json()["matches"]
+    boulder = next(m for m in matches if m["registration"]["id"] == near)
+    assert any(reason.startswith(("near:", "nearby:")) for reason in boulder["reasons"])
+
+    assert client.get('/api/admin/nearby/contacts?location=Denver, CO').status_code == 400
+    assert client.get('/api/admin/nearby/registrations').status_code == 400
+    assert client.get('/api/admin/nearby/registrations?location=Atlantis').status_code == 422
+
+if __name__ == "__main__":
+    test_resolve_free_text_locations()
+    test_geohash_and_cover()
+    test_locations_stored_on_insert()
+    test_nearby_reads_only_neighbouring_cells()
+    test_nearby_endpoint()
+    print("✅ 地理位置测试通过")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+测试表单提交的组提交写入路径
+"""
+
+import sys
+import os
+import tempfile
+import threading
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+def _engine(tmp):
+    from models import Base, build_engine
+
+    engine = build_engine(f"sqlite:///{tmp}/group_commit.db")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+def test_group_commit_batches_concurrent_inserts():
+    """并发到达的插入合并为少量事务，每个调用方拿到自己的ID"""
+    from sqlalchemy import event, text
+    from group_commit import GroupCommitWriter
+    from models import Contact
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = _engine(tmp)
+        commits = []
+        event.listen(engine, "commit", lambda conn: commits.append(1))
+
+        writer = GroupCommitWriter(engine, max_batch=64, max_wait=0.05)
+        barrier = threading.Barrier(40)
+        ids = []
+
+        def submit(i):
+            barrier.wait()
+            ids.append(writer.insert(Contact, {"name": f"donor {i}", "message": f"hello {i}"}))
+
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(40)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        writer.stop()
+
+        with engine.connect() as conn:
+            stored = dict(conn.execute(text("SELECT id, name FROM contacts")).fetchall())
+        engine.dispose()
+
+    assert sorted(ids) == sorted(stored) and len(set(ids)) == 40
+    print(f"📊 40 次提交只用了 {len(commits)} 个事务")
+    assert len(commits) < 40
+
+def test_group_commit_isolates_failing_row():
+    """批内某一行失败时只让该调用方报错，其余行正常提交"""
+    from group_commit import GroupCommitWriter
+    from models import Contact, Registration
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = _engine(tmp)
+        writer = GroupCommitWriter(engine, max_batch=8, max_wait=0.05)
+
+        good = writer.submit(Contact, {"message": "ok"})
+        bad = writer.submit(Registration, {"manufacturer": None})  # violates NOT NULL
+        also_good = writer.submit(Contact, {"message": "also ok"})
+
+        assert good.result(timeout=10) and also_good.result(timeout=10)
+        try:
+            bad.result(timeout=10)
+            raise AssertionError("NOT NULL violation was not reported")
+        except Exception as e:
+            assert "NOT NULL" in str(e) or "IntegrityError" in type(e).__name__
+        writer.stop()
+        engine.dispose()
+    print("✅ 组提交错误隔离测试通过")
+
+if __name__ == "__main__":
+    test_group_commit_batches_concurrent_inserts()
+    test_group_commit_isolates_failing_row()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+测试表单提交的幂等重放：Idempotency-Key 请求头或同一 IP 的相同请求体
+"""
+
+import sys
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+def _count(model, **filters):
+    from models import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return db.query(model).filter_by(**filters).count()
+    finally:
+        db.close()
+
+@contextmanager
+def _patched(target, name, value):
+    original = getattr(target, name)
+    setattr(target, name, value)
+    try:
+        yield value
+    finally:
+        setattr(target, name, original)
+
+class _Mailer:
+    """替换 send_notification_email，记录发送次数"""
+
+    def __init__(self, delay=0.0):
+        self.sent = []
+        self.delay = delay
+
+    def __call__(self, form_type, form_data):
+        time.sleep(self.delay)
+        self.sent.append(form_type)
+
+def test_key_replays_original_response():
+    import main
+    from models import Contact
+
+    client = main.app.test_client()
+    body = {"name": "Idem", "email": "idem@example.com", "message": "IDEM-KEY"}
+
+    with _patched(main, "send_notification_email", _Mailer()) as mailer:
+        first = client.post('/api/contact', json=body, headers={"Idempotency-Key": "key-1"})
+        again = client.post('/api/contact', json=body, headers={"Idempotency-Key": "key-1"},
+                            environ_base={'REMOTE_ADDR': '10.9.0.1'})
+    assert first.status_code == again.status_code == 201
+    assert again.get_json() == first.get_json()
+    assert again.headers["Idempotent-Replayed"] == "true" and "Idempotent-Replayed" not in first.headers
+    assert _count(Contact, message="IDEM-KEY") == 1 and mailer.sent == ["contact"]
+
+    # 同一个键换了请求体是客户端错误
+    changed = client.post('/api/contact', json={**body, "message": "other"}, headers={"Idempotency-Key": "key-1"})
+    assert changed.status_code == 422
+    assert client.post('/api/contact', json=body, headers={"Idempotency-Key": "x" * 300}).status_code == 400
+
+def test_body_window_without_key():
+    """没有请求头时，同一 IP 在窗口内的相同请求体被视为重试"""
+    import main
+    from config import settings
+    from models import Requirements
+
+    client = main.app.test_client()
+    body = {"school_name": "IDEM-SCHOOL", "current_pianos": "0", "preferred_type": "upright",
+            "teacher_name": "T", "background": "b", "commitment": "c"}
+
+    with _patched(main, "send_notification_email", _Mailer()) as mailer:
+        first = client.post('/api/requirements', json=body)
+        reordered = dict(reversed(list(body.items())))
+        assert client.post('/api/requirements', json=reordered).get_json() == first.get_json()
+        assert client.post('/api/requirements', json=body, environ_base={'REMOTE_ADDR': '10.9.0.2'}).status_code == 201
+        assert _count(Requirements, school_name="IDEM-SCHOOL") == 2 and len(mailer.sent) == 2
+
+        with _patched(settings, "idempotency_window_seconds", 0):
+            assert client.post('/api/requirements', json=body).get_json()["id"] != first.get_json()["id"]
+
+def test_failed_submission_can_be_retried():
+    """服务器错误不被记住，重试会重新执行"""
+    import main
+    from database import db_manager
+    from models import Contact
+
+    original = db_manager.insert_row
+    calls = []
+
+    def flaky(model, values):
+        calls.append(model)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return original(model, values)
+
+    client = main.app.test_client()
+    body = {"message": "IDEM-FLAKY"}
+    with _patched(main, "send_notification_email", _Mailer()), _patched(db_manager, "insert_row", flaky):
+        assert client.post('/api/contact', json=body, headers={"Idempotency-Key": "flaky"}).status_code == 500
+        assert client.post('/api/contact', json=body, headers={"Idempotency-Key": "flaky"}).status_code == 201
+    assert _count(Contact, message="IDEM-FLAKY") == 1
+
+def test_retry_waits_for_inflight_request():
+    """首个请求仍在发送邮件时到达的重试等待并得到同一响应"""
+    import main
+    from models import Contact
+
+    client = main.app.test_client()
+    responses = []
+
+    def submit():
+        responses.append(client.post('/api/contact', json={"message": "IDEM-SLOW"}, headers={"Idempotency-Key": "slow"}))
+
+    with _patched(main, "send_notification_email", _Mailer(delay=0.5)) as mailer:
+        threads = [threading.Thread(target=submit) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+
+    assert [r.status_code for r in responses] == [201, 201, 201]
+    assert len({r.get_json()["id"] for r in responses}) == 1
+    assert _count(Contact, message="IDEM-SLOW") == 1 and len(mailer.sent) == 1
+
+def test_expired_keys_are_purged():
+    import main
+    from datetime import datetime
+    from sqlalchemy import select, update
+    from idempotency import idempotency_store
+    from models import Contact, IdempotencyRecord, engine
+
+    client = main.app.test_client()
+    body = {"message": "IDEM-EXPIRED"}
+    table = IdempotencyRecord.__table__
+    with _patched(main, "send_notification_email", _Mailer()):
+        client.post('/api/contact', json=body, headers={"Idempotency-Key": "expiring"})
+        with engine.begin() as conn:
+            conn.execute(update(table).values(expires_at=datetime(2000, 1, 1)))
+
+        # 过期后同一个键是新的提交
+        assert client.post('/api/contact', json=body, headers={"Idempotency-Key": "expiring"}).status_code == 201
+    assert _count(Contact, message="IDEM-EXPIRED") == 2
+    assert idempotency_store.purge() >= 1
+    with engine.connect() as conn:
+        assert conn.execute(select(table.c.key)).all()  # the fresh key is kept
+
+def test_asgi_replay():
+    try:
+        from starlette.testclient import TestClient
+    except ImportError:
+        print("⚠️  starlette未安装，跳过ASGI测试")
+        return
+
+    import asgi
+    from models import Contact
+
+    sent = []
+
+    async def mailer(form_type, form_data):
+        sent.append(form_type)
+
+    with _patched(asgi, "send_notification_email", mailer), TestClient(asgi.app) as client:
+        body = {"message": "IDEM-ASGI"}
+        first = client.post('/api/contact', json=body, headers={"Idempotency-Key": "asgi"})
+        again = client.post('/api/contact', json=body, headers={"Idempotency-Key": "asgi"})
+    assert first.status_code == again.status_code == 201
+    assert again.json() == first.json() and again.headers["Idempotent-Replayed"] == "true"
+    assert _count(Contact, message="IDEM-ASGI") == 1 and sent == ["contact"]
+
+if __name__ == "__main__":
+    test_key_replays_original_response()
+    test_body_window_without_key()
+    test_failed_submission_can_be_retried()
+    test_retry_waits_for_inflight_request()
+    test_expired_keys_are_purged()
+    test_asgi_replay()
+    print("✅ 幂等提交测试通过")
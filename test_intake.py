@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+测试断路器与提交日志：数据库故障时提交写入本地日志并立即返回 202，断路器打开后快速失败，
+恢复后按接收顺序回放且不重复；Supabase 不可用时发件箱暂停而不消耗重试次数
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+PIANO = {"manufacturer": "Steinway", "model": "M", "year": 1925, "height": "Grand", "finish": "Good",
+         "color_wood": "Walnut", "access": "Elevator", "city_state": "Denver, CO"}
+
+@contextmanager
+def _patched(target, name, value):
+    original = getattr(target, name)
+    setattr(target, name, value)
+    try:
+        yield value
+    finally:
+        setattr(target, name, original)
+
+def _outage(*args, **kwargs):
+    from sqlalchemy.exc import OperationalError
+
+    raise OperationalError("INSERT INTO registrations", {}, Exception("could not connect to server"))
+
+def _journal(tmp, breaker, flush_ms=5):
+    from intake import IntakeJournal, _session
+
+    return IntakeJournal(tmp, flush_ms, breaker, _session)
+
+def test_breaker_states():
+    """连续失败后打开，超时后只放行一个探测请求；探测成功关闭，失败重新打开；慢调用计为失败"""
+    from breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=0.05, slow_seconds=1)
+    breaker.record_failure("boom")
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_success(seconds=2)  # slow
+    assert breaker.state == OPEN and breaker.is_open() and not breaker.allow()
+    try:
+        breaker.call(lambda: None)
+        raise AssertionError("expected CircuitOpenError")
+    except CircuitOpenError:
+        pass
+
+    time.sleep(0.06)
+    assert not breaker.is_open()
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow() and breaker.is_open()  # only one probe at a time
+    breaker.record_failure("still down")
+    assert breaker.state == OPEN
+
+    time.sleep(0.06)
+    assert breaker.call(lambda: 42) == 42
+    assert breaker.status() == {"state": CLOSED, "failures": 0}
+
+    try:
+        breaker.call(lambda: int("x"))  # the backend answered: a bad request is not an outage
+    except ValueError:
+        pass
+    assert breaker.state == CLOSED
+
+def test_outage_journals_and_replays_in_order():
+    """数据库故障时返回 202 并写入日志，断路器打开后不再尝试连接；恢复后按顺序回放，重复回放不会重复插入"""
+    import intake
+    import main
+    from sqlalchemy import select
+    from breaker import CircuitBreaker
+    from database import db_manager
+    from models import Registration, SessionLocal
+
+    client = main.create_app().test_client()
+    breaker = CircuitBreaker("database", failure_threshold=2, reset_seconds=0.05, slow_seconds=5)
+    calls = []
+
+    def failing_insert(values):
+        calls.append(values["serial"])
+        _outage()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = _journal(tmp, breaker)
+        replayed = []
+        journal.on_replayed = lambda kind, new_id, values: replayed.append((kind, values["serial"]))
+        with _patched(intake, "database_breaker", breaker), _patched(main, "database_breaker", breaker), \
+                _patched(intake, "intake_journal", journal), _patched(db_manager, "insert_registration", failing_insert):
+            references = []
+            for serial in ("J-1", "J-2", "J-3"):
+                response = client.post('/api/registration', json={**PIANO, "serial": serial})
+                assert response.status_code == 202
+                body = response.get_json()
+                assert body["queued"] and body["id"] is None
+                references.append(body["reference"])
+            assert calls == ["J-1", "J-2"]  # the third failed fast on the open breaker
+            assert journal.pending() == 3
+
+        [path] = journal.files()
+        saved = path.read_bytes()
+        assert [json.loads(line)["id"] for line in saved.splitlines()] == references
+
+        time.sleep(0.06)  # past the reset timeout: the replay is the probe
+        assert journal.replay() == 3
+        assert breaker.state == "closed" and journal.files() == []
+        assert replayed == [("registration", "J-1"), ("registration", "J-2"), ("registration", "J-3")]
+        with SessionLocal() as db:
+            rows = db.execute(select(Registration.id, Registration.serial)
+                              .where(Registration.serial.in_(["J-1", "J-2", "J-3"])).order_by(Registration.id)).all()
+        assert [serial for _, serial in rows] == ["J-1", "J-2", "J-3"]
+
+        path.write_bytes(saved)  # interrupted before the file was removed: replayed again
+        assert journal.replay() == 0
+        with SessionLocal() as db:
+            assert db.query(Registration).filter(Registration.serial.in_(["J-1", "J-2", "J-3"])).count() == 3
+
+def test_replay_stops_on_outage_and_rejects_bad_entries():
+    """回放遇到故障即停止并保留日志；数据错误的条目写入 rejected.jsonl，不阻塞后面的条目"""
+    from breaker import CircuitBreaker
+    from models import Contact, SessionLocal
+
+    breaker = CircuitBreaker("database", failure_threshold=1, reset_seconds=0.05, slow_seconds=5)
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = _journal(tmp, breaker)
+        journal.append("contact", {"name": "bad", "no_such_column": 1})
+        journal.append("contact", {"name": "good", "email": "good@example.com", "message": "after the bad one"})
+
+        with _patched(journal, "_apply", _outage):
+            assert journal.replay() == 0
+        assert breaker.state == "open" and journal.pending() == 2
+        assert journal.replay() == 0  # open: not even tried
+
+        time.sleep(0.06)
+        assert journal.replay() == 1
+        rejected = [json.loads(line) for line in open(os.path.join(tmp, "rejected.jsonl"))]
+        assert [entry["values"]["name"] for entry in rejected] == ["bad"]
+        assert journal.files() == []
+        with SessionLocal() as db:
+            assert db.query(Contact).filter(Contact.message == "after the bad one").count() == 1
+
+def test_concurrent_appends_share_fsyncs():
+    """同一时间窗口内的并发提交合并为少量 fsync，全部在返回前落盘"""
+    from breaker import CircuitBreaker
+
+    fsyncs = []
+    real_fsync = os.fsync
+
+    def counting_fsync(fd):
+        fsyncs.append(fd)
+        real_fsync(fd)
+
+    with tempfile.TemporaryDirectory() as tmp, _patched(os, "fsync", counting_fsync):
+        journal = _journal(tmp, CircuitBreaker("database", 5, 30, 5), flush_ms=50)
+        barrier = threading.Barrier(20)
+        references = []
+
+        def submit(n):
+            barrier.wait()
+            references.append(journal.append("contact", {"name": f"donor {n}", "message": "m"}))
+
+        threads = [threading.Thread(target=submit, args=(n,)) for n in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(set(references)) == 20 and journal.pending() == 20 and len(journal.files()) == 1
+    print(f"📊 20 次提交只用了 {len(fsyncs)} 次 fsync")
+    assert len(fsyncs) < 20
+
+def test_outbox_pauses_while_supabase_breaker_is_open():
+    """Supabase 断路器打开时发件箱暂停推送，不增加记录的失败次数"""
+    from sqlalchemy.orm import Session
+    from breaker import CircuitBreaker
+    from config import settings
+    from models import Base, Contact, OutboxEntry, build_engine
+    from outbox import OutboxReplicator
+
+    pushes = []
+
+    def push(entries):
+        pushes.append(len(entries))
+        raise ConnectionError("Supabase unreachable")
+
+    with tempfile.TemporaryDirectory() as tmp, _patched(settings, "supabase_replication", True):
+        engine = build_engine(f"sqlite:///{tmp}/outbox.db")
+        Base.metadata.create_all(bind=engine)
+        with Session(engine) as db:
+            db.add_all([Contact(name=f"c{n}", message="m") for n in range(3)])
+            db.commit()
+        breaker = CircuitBreaker("supabase", failure_threshold=1, reset_seconds=60, slow_seconds=5)
+        replicator = OutboxReplicator(engine, batch_size=10, poll_seconds=0.01, max_attempts=3,
+                                      retry_max_seconds=1, push=push, breaker=breaker)
+
+        assert replicator.drain() == 0 and pushes == [3]  # the failing batch opened the breaker
+        for _ in range(5):
+            assert replicator.drain() == 0
+        assert pushes == [3]
+        with Session(engine) as db:
+            assert [entry.attempts for entry in db.query(OutboxEntry).order_by(OutboxEntry.id)] == [0, 0, 0]
+        engine.dispose()
+
+if __name__ == "__main__":
+    test_breaker_states()
+    test_outage_journals_and_replays_in_order()
+    test_replay_stops_on_outage_and_rejects_bad_entries()
+    test_concurrent_appends_share_fsyncs()
+    test_outbox_pauses_while_supabase_breaker_is_open()
+    print("✅ 断路器与提交日志测试通过")
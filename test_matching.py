@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+测试钢琴捐赠与学校需求的匹配引擎（倒排索引 + 增量 top-K）
+"""
+
+import sys
+import os
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+def _piano(serial, piano_type, city_state, model="U1"):
+    return {
+        "manufacturer": "Yamaha", "model": model, "serial": serial, "year": "1990",
+        "height": piano_type, "finish": "Good - Playable", "color_wood": "Black",
+        "city_state": city_state, "access": "Ground floor"
+    }
+
+def _school(name, preferred_type, background=""):
+    return {
+        "school_name": name, "current_pianos": "0", "preferred_type": preferred_type,
+        "teacher_name": "T", "background": background, "commitment": "yes"
+    }
+
+def _snapshot():
+    from models import DonationMatch, SessionLocal
+    db = SessionLocal()
+    try:
+        return sorted((m.owner_type, m.owner_id, m.candidate_id, m.score) for m in db.query(DonationMatch).all())
+    finally:
+        db.close()
+
+def test_feature_extraction():
+    from matching import region_of, registration_features, requirement_features
+    from models import Registration, Requirements
+
+    assert region_of("Manhattan, NY") == "ny"
+    assert region_of("A school in New York City") == "ny"
+    assert region_of("Somewhere") is None
+    assert registration_features(Registration(height="Grand", model="C3 baby", city_state="Austin, TX")) == {
+        "type:grand", "size:compact", "region:tx"
+    }
+    assert requirement_features(Requirements(preferred_type="An upright, 48 in", school_name="PS 1, Brooklyn, NY")) == {
+        "type:upright", "size:standard", "region:ny"
+    }
+
+def test_matches_ranked_and_incremental():
+    """新提交即时进入双方 top-K，且增量结果与全量重建一致"""
+    import main
+    from config import settings
+    from matching import match_engine, rebuild
+    from models import SessionLocal
+
+    client = main.app.test_client()
+    original_k = settings.match_top_k
+    settings.match_top_k = 3
+    try:
+        rebuild(SessionLocal, log=lambda message: None)
+
+        schools = [
+            client.post('/api/requirements', json=_school("Lincoln High, Austin, TX", "Grand piano")).get_json()["id"],
+            client.post('/api/requirements', json=_school("River School", "grand", "We are in Texas")).get_json()["id"],
+            client.post('/api/requirements', json=_school("Hill Academy, Denver, CO", "upright")).get_json()["id"],
+        ]
+        pianos = [
+            client.post('/api/registration', json=_piano(f"MATCH-{i}", "Grand", "Dallas, TX")).get_json()["id"]
+            for i in range(5)
+        ]
+        upright = client.post('/api/registration', json=_piano("MATCH-U", "Upright", "Boulder, CO")).get_json()["id"]
+        match_engine.wait()
+
+        body = client.get(f'/api/admin/matches/registration/{pianos[0]}').get_json()
+        assert body["success"]
+        top = body["matches"][0]
+        assert top["requirement"]["id"] in schools[:2]
+        assert top["score"] == 5 and top["reasons"] == ["region:tx", "type:grand"]
+
+        body = client.get(f'/api/admin/matches/requirement/{schools[2]}').get_json()
+        assert body["matches"][0]["registration"]["id"] == upright
+
+        # Requirement lists are capped at K even though five grand pianos in TX match
+        body = client.get(f'/api/admin/matches/requirement/{schools[0]}').get_json()
+        assert len(body["matches"]) == 3
+
+        incremental = _snapshot()
+        rebuild(SessionLocal, log=lambda message: None)
+        assert _snapshot() == incremental
+    finally:
+        settings.match_top_k = original_k
+
+def test_delete_removes_matches():
+    import main
+    from matching import match_engine
+
+    client = main.app.test_client()
+    school = client.post('/api/requirements', json=_school("Delete School, Reno, NV", "digital")).get_json()["id"]
+    piano = client.post('/api/registration', json=_piano("MATCH-DEL", "Digital", "Reno, NV")).get_json()["id"]
+    match_engine.wait()
+    assert client.get(f'/api/admin/matches/requirement/{school}').get_json()["matches"]
+
+    client.get(f'/api/admin/delete/registration/{piano}')
+    assert client.get(f'/api/admin/matches/requirement/{school}').get_json()["matches"] == []
+    assert client.get(f'/api/admin/matches/registration/{piano}').status_code == 404
+    assert client.get(f'/api/admin/matches/school/{school}').status_code == 400
+
+if __name__ == "__main__":
+    test_feature_extraction()
+    test_matches_ranked_and_incremental()
+    test_delete_removes_matches()
+    print("✅ 匹配引擎测试通过")
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+测试 Supabase 发件箱：提交与发件箱记录在同一事务中写入本地库，后台复制器按顺序批量推送、
+失败重试、同一记录去重，最终远端与本地一致；公开接口不再等待 Supabase
+"""
+
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from test_consistency import FakePostgREST, _supabase  # noqa: E402  local fake PostgREST server
+
+PIANO = {"manufacturer": "Bechstein", "model": "A", "year": 1960, "height": "Grand", "finish": "Good",
+         "color_wood": "Black", "access": "Ground floor", "city_state": "Chicago, IL"}
+
+@contextmanager
+def _patched(target, name, value):
+    original = getattr(target, name)
+    setattr(target, name, value)
+    try:
+        yield value
+    finally:
+        setattr(target, name, original)
+
+@contextmanager
+def _replication():
+    from config import settings
+
+    with _patched(settings, "supabase_replication", True):
+        yield
+
+def _engine(tmp):
+    from models import Base, build_engine
+
+    engine = build_engine(f"sqlite:///{tmp}/outbox.db")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+def _replicator(engine, **options):
+    from outbox import OutboxReplicator
+
+    return OutboxReplicator(engine, **{"batch_size": 3, "poll_seconds": 0.01, "max_attempts": 3,
+                                       "retry_max_seconds": 1, **options})
+
+def _entries(engine):
+    from sqlalchemy import select
+    from models import OutboxEntry
+
+    with engine.connect() as conn:
+        return conn.execute(select(OutboxEntry).order_by(OutboxEntry.id)).all()
+
+def test_submission_commits_locally_with_outbox_entry():
+    """公开接口只写本地库；发件箱记录与提交同事务，回滚时一起消失"""
+    import main
+    from sqlalchemy.orm import Session
+    from models import Contact, engine
+    from outbox import outbox_replicator
+
+    client = main.create_app().test_client()
+    with _replication(), _patched(outbox_replicator, "start", lambda: None):  # no background pushes here
+        before = len(_entries(engine))
+        created = client.post('/api/registration', json={**PIANO, "serial": "OB-1"},
+                              environ_base={'REMOTE_ADDR': '10.9.0.1'})
+        assert created.status_code == 201  # no Supabase configured: the request did not call it
+
+        entry = _entries(engine)[-1]
+        assert len(_entries(engine)) == before + 1
+        assert (entry.operation, entry.table_name, entry.record_id) == ("upsert", "registrations", created.get_json()["id"])
+        assert '"serial": "OB-1"' in entry.payload and '"ip_address": "10.9.0.1"' in entry.payload
+
+        with Session(engine) as db:
+            db.add(Contact(name="x", email="x@example.com", message="rolled back"))
+            db.flush()
+            db.rollback()
+        assert len(_entries(engine)) == before + 1
+
+    client.post('/api/contact', json={"name": "n", "email": "n@example.com", "message": "off"},
+                environ_base={'REMOTE_ADDR': '10.9.0.2'})
+    assert len(_entries(engine)) == before + 1  # replication off: no outbox rows
+
+def test_group_commit_path_enqueues():
+    """组提交的 Core 插入同样写发件箱"""
+    from group_commit import GroupCommitWriter
+    from models import Requirements
+
+    with tempfile.TemporaryDirectory() as tmp, _replication():
+        engine = _engine(tmp)
+        writer = GroupCommitWriter(engine, max_batch=8, max_wait=0.01)
+        try:
+            ids = [writer.insert(Requirements, {"school_name": f"School {n}"}) for n in range(3)]
+        finally:
+            writer.stop()
+        assert [(e.table_name, e.record_id) for e in _entries(engine)] == [("requirements", i) for i in ids]
+        engine.dispose()
+
+def test_replicator_pushes_in_order_and_converges():
+    """按顺序分批推送，服务不可用时保留并退避重试，恢复后远端与本地一致"""
+    from sqlalchemy.orm import Session
+    from consistency import check, consistent
+    from models import Registration
+
+    with tempfile.TemporaryDirectory() as tmp, _replication():
+        engine = _engine(tmp)
+        with Session(engine) as db:
+            rows = [Registration(**PIANO, serial=f"R-{n}") for n in range(5)]
+            db.add_all(rows)
+            db.commit()
+            db.delete(rows[1])
+            db.commit()
+        replicator = _replicator(engine)
+
+        with _supabase({"registrations": {}, "requirements": {}, "contacts": {}}) as requests:
+            FakePostgREST.fail_next = 2  # the batch and then its first entry alone
+            assert replicator.drain() == 0
+            head = _entries(engine)[0]
+            assert head.attempts == 1 and "503" in head.last_error and head.failed_at is None
+            assert replicator.retry_at > 0
+
+            assert replicator.drain() == 6
+            assert _entries(engine) == []
+            assert [r[0] for r in requests] == ["UPSERT", "UPSERT", "UPSERT", "UPSERT", "DELETE"]
+            assert requests[-3:] == [("UPSERT", "registrations", [1, 2, 3]), ("UPSERT", "registrations", [4, 5]),
+                                     ("DELETE", "registrations", [2])]
+            assert sorted(FakePostgREST.tables["registrations"]) == [1, 3, 4, 5]
+
+            # a batch delivered twice (crash before the outbox rows were removed) is harmless
+            with engine.begin() as conn:
+                from outbox import UPSERT, enqueue
+                enqueue(conn, UPSERT, "registrations", 3, {**PIANO, "serial": "R-2"})
+                enqueue(conn, UPSERT, "registrations", 3, {**PIANO, "serial": "R-2"})
+            assert replicator.drain() == 2
+            assert requests[-1] == ("UPSERT", "registrations", [3])  # deduplicated within the request
+
+            assert consistent(check(engine))
+        engine.dispose()
+
+def test_poison_entry_is_parked():
+    """反复失败的记录在达到上限后被搁置，后面的变更继续推送；可重新排队"""
+    from sqlalchemy.orm import Session
+    from models import Contact
+
+    with tempfile.TemporaryDirectory() as tmp, _replication():
+        engine = _engine(tmp)
+        with Session(engine) as db:
+            db.add_all([Contact(name=name, message="m") for name in ("bad", "ok-1", "ok-2")])
+            db.commit()
+
+        pushed = []
+
+        def push(entries):
+            if any('"bad"' in entry.payload for entry in entries):
+                raise ValueError("400 invalid input")
+            pushed.extend(entry.record_id for entry in entries)
+
+        replicator = _replicator(engine, push=push, max_attempts=2)
+        assert replicator.drain() == 0 and pushed == []  # later entries wait behind the failing one
+        assert replicator.drain() == 0  # second failure parks it
+        assert replicator.status() == {"pending": 2, "failed": 1, "oldest_pending": replicator.status()["oldest_pending"]}
+        assert replicator.drain() == 2 and pushed == [2, 3]
+
+        assert replicator.retry_failed() == 1
+        assert replicator.status()["pending"] == 1
+        engine.dispose()
+
+if __name__ == "__main__":
+    test_submission_commits_locally_with_outbox_entry()
+    test_group_commit_path_enqueues()
+    test_replicator_pushes_in_order_and_converges()
+    test_poison_entry_is_parked()
+    print("✅ Supabase 发件箱测试通过")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+测试请求级数据库会话：首次执行语句时才从连接池取连接，请求结束时统一释放；
+校验失败的请求不占用连接；记录每个请求持有连接的时间
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+@contextmanager
+def _patched(target, name, value):
+    original = getattr(target, name)
+    setattr(target, name, value)
+    try:
+        yield value
+    finally:
+        setattr(target, name, original)
+
+def test_session_is_lazy_and_released_at_teardown():
+    """同一请求内共用一个会话；未执行语句前不取连接；结束时归还连接并计入持有时间"""
+    import main
+    import request_db
+    from sqlalchemy import text
+
+    app = main.create_app()
+    with app.test_request_context('/api/admin/stats'):
+        request_db.begin_request("test")
+        scope = request_db._scope.get()
+        session = request_db.db()
+        assert request_db.db() is session and request_db.read_db(replica=False) is not session
+        assert scope.checkouts == 0  # no statement yet: the pool was not touched
+
+        session.execute(text("SELECT 1"))
+        assert scope.checkouts == 1 and scope.hold_seconds == 0.0  # still held
+        request_db.end_request()
+        assert scope.sessions == {} and scope.hold_seconds > 0
+
+    try:
+        request_db.db()
+        raise AssertionError("expected RuntimeError outside a request")
+    except RuntimeError:
+        pass
+
+def test_rejected_requests_never_touch_the_pool():
+    """参数校验失败的请求不取连接；正常请求取连接并在结束后归还"""
+    import main
+    import request_db
+
+    client = main.create_app().test_client()
+    stats = request_db.hold_stats
+    before = stats.status()
+    assert client.get('/api/admin/delete/contact/not-a-number').status_code == 400
+    assert client.get('/api/admin/stats/timeseries?granularity=hour').status_code == 400
+    after = stats.status()
+    assert after["requests"] == before["requests"] + 2
+    assert after["requests_using_pool"] == before["requests_using_pool"]
+
+    assert client.get('/api/admin/contacts').status_code == 200
+    health = client.get('/api/health').get_json()
+    assert health["pool"]["requests_using_pool"] >= before["requests_using_pool"] + 1
+    assert health["pool"]["hold_ms_max"] is not None
+
+def test_invalid_submissions_never_touch_the_pool():
+    """校验失败的表单提交在认领幂等键之前就被拒绝，不占用连接"""
+    import main
+    import request_db
+    from config import settings
+
+    client = main.create_app().test_client()
+    with _patched(settings, "idempotency_enabled", True):
+        before = request_db.hold_stats.status()
+        assert client.post('/api/registration', json={"manufacturer": "", "serial": "X"}).status_code == 400
+        assert client.post('/api/requirements', json={}).status_code == 400
+        assert client.post('/api/contact', json={"name": "no message"}).status_code == 400
+        assert client.post('/api/contact', data="not json", content_type="application/json").status_code == 400
+        after = request_db.hold_stats.status()
+    assert after["requests"] == before["requests"] + 4
+    assert after["requests_using_pool"] == before["requests_using_pool"]
+
+    assert client.post('/api/contact', json={"message": "valid"}).status_code == 201
+    assert request_db.hold_stats.status()["requests_using_pool"] == before["requests_using_pool"] + 1
+
+def test_long_holds_are_logged():
+    """持有连接超过 POOL_HOLD_WARN_MS 的请求记一条警告"""
+    import main
+    from config import settings
+    from logger import logger_manager
+
+    client = main.create_app().test_client()
+    warnings = []
+    with _patched(settings, "pool_hold_warn_ms", -1), \
+            _patched(logger_manager.logger, "warning", lambda message, *args, **kwargs: warnings.append(message)):
+        client.get('/api/admin/stats')
+    assert any("held database connections" in message for message in warnings)
+
+if __name__ == "__main__":
+    test_session_is_lazy_and_released_at_teardown()
+    test_rejected_requests_never_touch_the_pool()
+    test_invalid_submissions_never_touch_the_pool()
+    test_long_holds_are_logged()
+    print("✅ 请求级数据库会话测试通过")
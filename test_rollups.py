@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+测试提交趋势汇总表（增量维护 + 分块回填）与 /api/admin/stats/timeseries
+"""
+
+import sys
+import os
+from datetime import date
+
+# 添加backend到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+REGISTRATION = {
+    "manufacturer": "  Yamaha ", "model": "U1", "serial": "R-1", "year": "1990",
+    "height": "Upright", "finish": "Good", "color_wood": "Black", "city_state": "Austin, TX",
+    "access": "Ground floor"
+}
+
+def _today_count(client, metric, dimension=None):
+    body = client.get(f'/api/admin/stats/timeseries?metrics={metric}').get_json()
+    assert body["success"]
+    series = body["series"][metric]
+    if dimension is not None:
+        series = series.get(dimension, [{"count": 0}])
+    return series[-1]["count"]
+
+def _snapshot():
+    from models import SessionLocal, SubmissionRollup
+    db = SessionLocal()
+    try:
+        return sorted(
+            (r.granularity, r.metric, r.bucket, r.dimension, r.count)
+            for r in db.query(SubmissionRollup).all() if r.count
+        )
+    finally:
+        db.close()
+
+def test_rollups_follow_inserts_and_deletes():
+    """插入与删除即时反映在日/周汇总中"""
+    import main
+
+    client = main.app.test_client()
+    before = _today_count(client, "registrations")
+    before_yamaha = _today_count(client, "registrations_by_manufacturer", "yamaha")
+
+    ids = [client.post('/api/registration', json={**REGISTRATION, "manufacturer": name}).get_json()["id"]
+           for name in ("Yamaha", "YAMAHA", "Steinway")]
+    assert _today_count(client, "registrations") == before + 3
+    assert _today_count(client, "registrations_by_manufacturer", "yamaha") == before_yamaha + 2
+
+    client.get(f'/api/admin/delete/registration/{ids[0]}')
+    assert _today_count(client, "registrations") == before + 2
+    assert _today_count(client, "registrations_by_manufacturer", "yamaha") == before_yamaha + 1
+
+    week = client.get('/api/admin/stats/timeseries?granularity=week&metrics=registrations').get_json()
+    assert date.fromisoformat(week["buckets"][-1]).weekday() == 0
+    assert len(week["buckets"]) == 12
+
+def test_backfill_matches_incremental():
+    """分块回填的结果与增量维护一致（含组提交写入路径）"""
+    import main
+    from group_commit import GroupCommitWriter
+    from models import Contact, engine
+    from rollups import backfill
+
+    client = main.app.test_client()
+    client.post('/api/requirements', json={
+        "school_name": "Rollup School", "current_pianos": "1", "preferred_type": "upright",
+        "teacher_name": "T", "background": "b", "commitment": "c"
+    })
+    writer = GroupCommitWriter(engine)
+    try:
+        writer.insert(Contact, {"message": "rollup via group commit"})
+    finally:
+        writer.stop()
+
+    incremental = _snapshot()
+    backfill(engine, chunk_size=2, log=lambda message: None)
+    assert _snapshot() == incremental
+
+def test_backfill_counts_concurrent_inserts_once():
+    """回填期间写入的新行只计数一次"""
+    import main
+    from models import Contact, SessionLocal, engine
+    from rollups import backfill
+
+    inserted = []
+
+    def insert_during_scan(message):
+        if not inserted:
+            db = SessionLocal()
+            try:
+                contact = Contact(message="inserted during backfill")
+                db.add(contact)
+                db.commit()
+                inserted.append(contact.id)
+            finally:
+                db.close()
+
+    backfill(engine, chunk_size=2, log=insert_during_scan)
+    assert inserted
+    during = _snapshot()
+    backfill(engine, chunk_size=2, log=lambda message: None)
+    assert _snapshot() == during
+
+def test_insert_does_not_read_back_created_at():
+    """插入时直接用写入的 created_at 计算分桶，不再额外查询"""
+    from sqlalchemy import event
+    from models import Contact, SessionLocal, engine
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        db = SessionLocal()
+        try:
+            db.add(Contact(message="no read back"))
+            db.commit()
+        finally:
+            db.close()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert not [s for s in statements if s.lstrip().upper().startswith("SELECT") and "contacts" in s]
+
+def test_timeseries_validation():
+    import main
+
+    client = main.app.test_client()
+    assert client.get('/api/admin/stats/timeseries?granularity=month').status_code == 400
+    assert client.get('/api/admin/stats/timeseries?metrics=nope').status_code == 400
+    assert client.get('/api/admin/stats/timeseries?from=2000-01-01&to=2026-01-01').status_code == 400
+
+if __name__ == "__main__":
+    test_rollups_follow_inserts_and_deletes()
+    test_backfill_matches_incremental()
+    test_backfill_counts_concurrent_inserts_once()
+    test_insert_does_not_read_back_created_at()
+    test_timeseries_validation()
+    print("✅ 趋势汇总测试通过")
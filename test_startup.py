@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+测试启动流程：导入 main 不做数据库 I/O，create_app 只初始化一次，fork 后的连接池重置
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+
+def _run(code, database_url):
+    env = {**os.environ, "DATABASE_URL": database_url, "LOG_LEVEL": "WARNING"}
+    return subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, env=env,
+                          capture_output=True, text=True, check=True).stdout.split()
+
+def test_import_has_no_side_effects():
+    """导入时不建表，create_app 建表且重复调用无副作用"""
+    code = (
+        "import main, models, sys\n"
+        "from sqlalchemy import inspect\n"
+        "print('requests' in sys.modules, len(inspect(models.engine).get_table_names()))\n"
+        "main.create_app(); main.create_app()\n"
+        "print(len(inspect(models.engine).get_table_names()))\n"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        requests_loaded, before, after = _run(code, f"sqlite:///{tmp}/startup.db")
+    assert requests_loaded == "False"
+    assert before == "0" and int(after) > 0
+
+def test_forked_child_gets_fresh_connections():
+    """子进程丢弃继承的连接池后重新连接，父进程池中的连接不受影响"""
+    if not hasattr(os, 'fork'):
+        return
+    import models
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.pool import QueuePool
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pooled = create_engine(f"sqlite:///{tmp}/fork.db", poolclass=QueuePool)
+        original = (models.engine, models.read_engine)
+        models.engine = models.read_engine = pooled
+        try:
+            with pooled.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            assert pooled.pool.checkedin() == 1
+
+            pid = os.fork()
+            if pid == 0:
+                code = 1
+                try:
+                    models.reset_engines_after_fork()
+                    code = 0 if pooled.pool.checkedin() == 0 else 1
+                    with pooled.connect() as conn:
+                        code = code or (0 if conn.execute(text("SELECT 1")).scalar() == 1 else 1)
+                finally:
+                    os._exit(code)
+            _, status = os.waitpid(pid, 0)
+            assert os.waitstatus_to_exitcode(status) == 0
+
+            assert pooled.pool.checkedin() == 1
+            with pooled.connect() as conn:
+                assert conn.execute(text("SELECT 1")).scalar() == 1
+        finally:
+            models.engine, models.read_engine = original
+            pooled.dispose()
+
+def test_parse_importtime():
+    from startup_report import parse_importtime
+
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |     _json\n"
+        "import time:       300 |        420 |   json\n"
+        "import time:      1000 |       1420 | main\n"
+    )
+    rows = parse_importtime(stderr)
+    assert rows == [("_json", 120, 120, 2), ("json", 300, 420, 1), ("main", 1000, 1420, 0)]
+
+if __name__ == "__main__":
+    test_import_has_no_side_effects()
+    test_forked_child_gets_fresh_connections()
+    test_parse_importtime()
+    print("✅ 启动流程测试通过")